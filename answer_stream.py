@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Streaming Answer Endpoint (Server-Sent Events)
+
+The Pathway REST server returns /v1/pw_ai_answer only once the whole LLM
+response is complete. This module serves a streaming variant next to it that
+emits server-sent events while the LLM tokens arrive, so time-to-first-token
+becomes the user-visible latency.
+
+Key Features:
+- POST /v1/pw_ai_answer_stream with the same body as /v1/pw_ai_answer
+- Same retrieval, reranking, context formatting and prompt template as the
+  configured question answerer (retrieval goes through /v1/retrieve)
+- SSE events: ``context`` (sources), ``token`` (text deltas), ``done``
+  (full response and timings) and ``error``
+- TTFT and total-latency histograms in the metrics registry
+- Identical concurrent questions share one retrieval and one LLM token stream
+- LLM calls go through the configured LLMGovernor; while the provider is
+  degraded the answer is built from the retrieved documents only
+- The question answerer's QueryRouter (if any) picks the model tier
+- POST /v1/retrieve_batch streams batch retrieval results as NDJSON
+  (batch_retrieve.BatchRetriever) when a batch retriever is configured
+- /v1/jobs submit/poll/result/cancel routes for long-running analyses
+  (job_queue.JobService) when a job service is configured
+
+Event stream example:
+    event: context
+    data: {"sources": ["data/cdsco_banned_02Aug2024.pdf"], "retrieval_ms": 84.1}
+
+    event: token
+    data: {"text": "**Nimesulide**"}
+
+    event: done
+    data: {"response": "...", "ttft_ms": 912.4, "total_ms": 7310.2}
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from llm_governor import CircuitOpenError, GovernorTimeout, is_retryable, retrieval_only_answer
+from metrics import REGISTRY
+from single_flight import SingleFlight, StreamFlight, flight_key
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> bytes:
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class StreamingAnswerServer:
+    """
+    aiohttp server streaming RAG answers token by token.
+
+    Args:
+        question_answerer: The configured PharmaRAGQuestionAnswerer; its LLM
+            settings, reranker, context processor and prompt template are reused
+        retrieve_url: URL of the Pathway /v1/retrieve endpoint
+        host: Interface to bind
+        port: Port of the streaming server
+        batch_retriever: Optional batch_retrieve.BatchRetriever serving
+            /v1/retrieve_batch as NDJSON
+        retrieve_batch_url: URL of the Pathway /v1/retrieve_batch endpoint
+        job_service: Optional job_queue.JobService serving /v1/jobs; its
+            workers run on this server's event loop
+    """
+
+    def __init__(
+        self,
+        question_answerer,
+        retrieve_url: str = "http://127.0.0.1:8001/v1/retrieve",
+        host: str = "0.0.0.0",
+        port: int = 8003,
+        batch_retriever=None,
+        retrieve_batch_url: str = "http://127.0.0.1:8001/v1/retrieve_batch",
+        job_service=None,
+    ):
+        self.qa = question_answerer
+        self.retrieve_url = retrieve_url
+        self.batch_retriever = batch_retriever
+        self.retrieve_batch_url = retrieve_batch_url
+        self.job_service = job_service
+        self.host = host
+        self.port = port
+
+        self._ttft_ms = REGISTRY.histogram("answer_stream_ttft_ms", "Time to first streamed LLM token")
+        self._total_ms = REGISTRY.histogram("answer_stream_total_ms", "Total duration of streamed answers")
+        self._retrieval_ms = REGISTRY.histogram("answer_stream_retrieval_ms", "Retrieval + rerank time of streamed answers")
+        self._retrieval_flight = SingleFlight("stream_retrieval")
+        self._llm_flight = StreamFlight("stream_llm")
+
+    async def _retrieve_and_rerank(
+        self, prompt: str, filters: Optional[str], k: Optional[int] = None, top_n: Optional[int] = None
+    ) -> List[dict]:
+        async with ClientSession(timeout=ClientTimeout(total=60)) as session:
+            docs = await self.retrieve(session, prompt, filters, k)
+        return await asyncio.to_thread(self.rerank, prompt, docs, top_n)
+
+    async def retrieve(
+        self, session: ClientSession, prompt: str, filters: Optional[str], k: Optional[int] = None
+    ) -> List[dict]:
+        """Retrieve k (default search_topk) candidates through the Pathway retrieve endpoint."""
+        payload = {"query": prompt, "k": k or self.qa.search_topk, "metadata_filter": filters}
+        async with session.post(self.retrieve_url, json=payload) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    def rerank(self, prompt: str, docs: List[dict], top_n: Optional[int] = None) -> List[dict]:
+        """Apply the question answerer's reranker (if any) and keep top_n (default rerank_topk)."""
+        if not docs or self.qa.reranker is None:
+            return docs
+        scores = self.qa.reranker.__wrapped__(docs, [prompt] * len(docs))
+        ranked = [doc for _, doc in sorted(zip(scores, docs), key=lambda pair: -pair[0])]
+        return ranked[: top_n or self.qa.rerank_topk]
+
+    def build_prompt(self, prompt: str, docs: List[dict]) -> str:
+        """Same context formatting and RAG template (per-query part) as /v1/pw_ai_answer."""
+        context = self.qa.docs_to_context_transformer.__wrapped__(docs)
+        return self.qa.prompt_udf.__wrapped__(context, prompt)
+
+    async def stream_llm(
+        self, rag_prompt: str, model: Optional[str], max_tokens: Optional[int] = None, tier: str = "default"
+    ) -> AsyncIterator[str]:
+        """Yield text deltas of the configured LiteLLM chat model."""
+        import litellm
+
+        kwargs = dict(self.qa.llm.kwargs)
+        kwargs.pop("verbose", None)
+        if model:
+            kwargs["model"] = model
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+
+        messages = [{"role": "user", "content": rag_prompt}]
+        if hasattr(self.qa, "chat_messages"):
+            messages = self.qa.chat_messages(rag_prompt, kwargs.get("model"))
+        record_usage = getattr(self.qa.llm, "record_usage", None)
+        if record_usage is not None:
+            kwargs["stream_options"] = {"include_usage": True}
+        response = await litellm.acompletion(messages=messages, stream=True, **kwargs)
+        async for chunk in response:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None and record_usage is not None:
+                record_usage(usage, tier)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+    def llm_tokens(
+        self, rag_prompt: str, model: Optional[str], max_tokens: Optional[int] = None, tier: str = "default"
+    ) -> AsyncIterator[str]:
+        """LLM token stream, governed by the LLM's governor when one is configured."""
+        governor = getattr(self.qa.llm, "governor", None)
+        if governor is None:
+            return self.stream_llm(rag_prompt, model, max_tokens, tier)
+        return governor.stream(lambda: self.stream_llm(rag_prompt, model, max_tokens, tier))
+
+    def route(self, prompt: str, model: Optional[str], filters: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Model tier and retrieval plan of the question answerer's router, or None without one."""
+        router = getattr(self.qa, "router", None)
+        if router is None:
+            return None
+        return router.route(
+            prompt, model, self.qa.llm.model, self.qa.llm.kwargs.get("max_tokens"), filters, self.qa.search_topk
+        )
+
+    async def stream_handler(self, request: web.Request) -> web.StreamResponse:
+        """POST /v1/pw_ai_answer_stream"""
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "Invalid JSON body"}, status=400)
+        prompt = (body.get("prompt") or "").strip()
+        if not prompt:
+            return web.json_response({"error": "No prompt provided"}, status=400)
+
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx/Traefik)
+            }
+        )
+        await response.prepare(request)
+
+        started = time.perf_counter()
+        ttft_ms = None
+        parts: List[str] = []
+        try:
+            filters = body.get("filters")
+            # Intent classification embeds the query, so it runs off the event loop
+            route = await asyncio.to_thread(self.route, prompt, body.get("model"), filters)
+            plan = (filters, None, None)
+            if route is not None:
+                plan = (route["metadata_filter"], route["k"], route["top_n"])
+            docs: List[dict] = []
+            if route is None or route["retrieve"]:
+                docs = await self._retrieval_flight.do_async(
+                    flight_key(" ".join(prompt.lower().split()), *plan),
+                    lambda: self._retrieve_and_rerank(prompt, *plan),
+                )
+            retrieval_ms = (time.perf_counter() - started) * 1000.0
+            self._retrieval_ms.observe(retrieval_ms)
+            await response.write(format_sse("context", {
+                "sources": list(dict.fromkeys(doc.get("metadata", {}).get("path", "") for doc in docs)),
+                "retrieval_ms": round(retrieval_ms, 1),
+            }))
+
+            model, max_tokens = body.get("model"), None
+            if route is not None:
+                model, max_tokens = route["model"], route["max_tokens"]
+
+            degraded = False
+            if route is not None and route["tier"] == "none":
+                tokens = self._local_tokens(route, docs)
+            elif route is not None and route["tier"] == "summary":
+                request = self.qa.summary_cache.document_query(docs)
+                async with ClientSession(timeout=ClientTimeout(total=60)) as session:
+                    chunks = await self.retrieve(session, request["query"], request["metadata_filter"], request["k"])
+                summary = await self.qa.summarize_documents(docs, chunks, model)
+                degraded = summary is None
+                tokens = self._text_tokens(retrieval_only_answer(docs) if degraded else summary)
+            else:
+                rag_prompt = self.build_prompt(prompt, docs)
+                tier = route["tier"] if route is not None else "default"
+                tokens = self._llm_flight.stream(
+                    flight_key(rag_prompt, model, max_tokens),
+                    lambda: self.llm_tokens(rag_prompt, model, max_tokens, tier),
+                )
+            try:
+                async for delta in tokens:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000.0
+                        self._ttft_ms.observe(ttft_ms)
+                    parts.append(delta)
+                    await response.write(format_sse("token", {"text": delta}))
+            except Exception as e:
+                degradable = isinstance(e, (CircuitOpenError, GovernorTimeout)) or is_retryable(e)
+                if parts or not degradable:
+                    raise
+                logger.warning(f"⚡ LLM unavailable, streaming retrieval-only answer: {e}")
+                degraded = True
+                fallback = retrieval_only_answer(docs)
+                ttft_ms = (time.perf_counter() - started) * 1000.0
+                parts.append(fallback)
+                await response.write(format_sse("token", {"text": fallback}))
+
+            total_ms = (time.perf_counter() - started) * 1000.0
+            self._total_ms.observe(total_ms)
+            done = {
+                "response": "".join(parts),
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "total_ms": round(total_ms, 1),
+            }
+            if degraded:
+                done["degraded"] = True
+            if route is not None:
+                done["tier"] = route["tier"]
+                self.qa.router.observe(route)
+            if body.get("return_context_docs"):
+                done["context_docs"] = docs
+            await response.write(format_sse("done", done))
+        except (ConnectionResetError, asyncio.CancelledError):
+            logger.info("🔌 Client disconnected from answer stream")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Streaming answer failed: {e}")
+            await response.write(format_sse("error", {"error": str(e)}))
+
+        await response.write_eof()
+        return response
+
+    async def _local_tokens(self, route: Dict[str, Any], docs: List[dict]) -> AsyncIterator[str]:
+        yield self.qa.router.local_answer(route, docs)
+
+    async def _text_tokens(self, text: str) -> AsyncIterator[str]:
+        yield text
+
+    async def health_handler(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "healthy", "service": "answer-stream"})
+
+    async def retrieve_batch_handler(self, request: web.Request) -> web.StreamResponse:
+        """POST /v1/retrieve_batch: NDJSON results of a batch of queries, in input order."""
+        return await self.batch_retriever.stream(request, self.retrieve_batch_url)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/pw_ai_answer_stream", self.stream_handler)
+        app.router.add_get("/v1/health", self.health_handler)
+        if self.batch_retriever is not None:
+            app.router.add_post("/v1/retrieve_batch", self.retrieve_batch_handler)
+        if self.job_service is not None:
+            self.job_service.add_routes(app)
+        return app
+
+    def run(self) -> None:
+        """Blocking; call from a background thread next to the Pathway server."""
+        logger.info(f"📡 Streaming answer server on http://{self.host}:{self.port}/v1/pw_ai_answer_stream")
+        web.run_app(self.create_app(), host=self.host, port=self.port, handle_signals=False, print=None)
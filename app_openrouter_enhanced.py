@@ -172,18 +172,72 @@ class EnhancedPharmaComplianceApp:
             logger.info("💡 Enhanced API Endpoints:")
             logger.info("   POST /v1/pw_ai_answer           - Government compliance analysis")
             logger.info("   POST /v1/pw_list_documents      - List regulatory documents")  
-            logger.info("   POST /v1/retrieve               - Enhanced semantic search") 
+            logger.info("   POST /v1/retrieve               - Enhanced semantic search")
+            logger.info("   POST /v1/retrieve_batch         - Batch semantic search (JSON array)")
+            logger.info("   GET  /v1/metrics                - Batching, cache and latency metrics")
+            logger.info("   POST :8003/v1/pw_ai_answer_stream - Streaming (SSE) compliance analysis")
+            logger.info("   POST :8003/v1/retrieve_batch    - Batch semantic search (NDJSON stream)")
+            logger.info("   POST :8003/v1/jobs              - Asynchronous jobs (submit, poll, result, cancel)")
             
             # Create enhanced Pathway REST server with pharmaceutical compliance capabilities
             from pathway.xpacks.llm.servers import QASummaryRestServer
             
             # Initialize server with configuration from YAML file
+            question_answerer = config["question_answerer"]
             server = QASummaryRestServer(
                 host=config.get("host", "0.0.0.0"),  # Accept connections from any IP
                 port=config.get("port", 8001),       # Enhanced version port
-                rag_question_answerer=config["question_answerer"]  # RAG pipeline with government prompts
+                rag_question_answerer=question_answerer,  # RAG pipeline with government prompts
+                # Stamp arrival times so deadline_ms counts from when the request came in
+                request_validator=getattr(question_answerer, "stamp_arrival", None),
             )
-            
+
+            # Expose batching, cache and latency metrics of the performance components
+            from metrics import metrics_snapshot
+            server.serve_callable(
+                route="/v1/metrics",
+                schema=None,
+                callable_func=metrics_snapshot,
+                retry_strategy=None,
+                cache_strategy=None,
+                methods=("GET", "POST"),
+            )
+
+            # Batched retrieval: many queries per request, one embedding pass per batch
+            batch_retriever = config.get("batch_retriever")
+            if batch_retriever is not None:
+                from batch_retrieve import RetrieveBatchSchema
+                server.serve(
+                    "/v1/retrieve_batch",
+                    RetrieveBatchSchema,
+                    batch_retriever.retrieve_batch,
+                    methods=("POST",),
+                )
+
+            # Asynchronous jobs for analyses that outlast synchronous timeouts
+            job_service = config.get("jobs")
+            if job_service is not None:
+                job_service.base_url = f"http://127.0.0.1:{config.get('port', 8001)}"
+
+            # Streaming (SSE) variant of /v1/pw_ai_answer on its own port
+            import threading
+            from answer_stream import StreamingAnswerServer
+            stream_server = StreamingAnswerServer(
+                config["question_answerer"],
+                retrieve_url=f"http://127.0.0.1:{config.get('port', 8001)}/v1/retrieve",
+                port=config.get("stream_port", 8003),
+                batch_retriever=batch_retriever,
+                retrieve_batch_url=f"http://127.0.0.1:{config.get('port', 8001)}/v1/retrieve_batch",
+                job_service=job_service,
+            )
+            threading.Thread(target=stream_server.run, daemon=True).start()
+
+            # Optional synthetic probe of the time from ./data to searchable
+            canary = config.get("ingestion_canary")
+            if canary is not None:
+                canary.retrieve_url = f"http://127.0.0.1:{config.get('port', 8001)}/v1/retrieve"
+                canary.start()
+
             # Start the enhanced server with persistence and error tolerance
             server.run(
                 with_cache=True,  # Enable caching for faster responses
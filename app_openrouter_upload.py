@@ -9,11 +9,9 @@ import pathway as pw
 from dotenv import load_dotenv
 import logging
 from pathlib import Path
-import shutil
-from aiohttp import web
-import aiofiles
-import threading
-import time
+
+from metrics import metrics_snapshot
+from upload_service import UploadServiceSupervisor
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +29,8 @@ class PharmaComplianceApp:
         self.config_path = config_path
         self.data_dir = Path("./data")
         self.data_dir.mkdir(exist_ok=True)
+        self.ingestion_status = None  # IngestionStatusTracker from the config, set in run()
+        self.upload_supervisor = None  # Upload service child process, unless a process manager runs it
         self.validate_environment()
         
     def validate_environment(self):
@@ -76,91 +76,20 @@ class PharmaComplianceApp:
         """
         logger.info("🔬 Pharmaceutical domain context activated")
 
-    async def upload_handler(self, request):
-        """Handle file upload requests"""
-        try:
-            reader = await request.multipart()
-            
-            while True:
-                part = await reader.next()
-                if part is None:
-                    break
-                    
-                if part.name == 'file':
-                    filename = part.filename
-                    if not filename:
-                        return web.json_response(
-                            {"error": "No filename provided"}, 
-                            status=400
-                        )
-                    
-                    # Validate file type
-                    allowed_extensions = {'.pdf', '.txt', '.doc', '.docx'}
-                    file_ext = Path(filename).suffix.lower()
-                    if file_ext not in allowed_extensions:
-                        return web.json_response(
-                            {"error": f"File type {file_ext} not supported. Allowed: {list(allowed_extensions)}"}, 
-                            status=400
-                        )
-                    
-                    # Save file to data directory
-                    file_path = self.data_dir / filename
-                    
-                    async with aiofiles.open(file_path, 'wb') as f:
-                        while True:
-                            chunk = await part.read_chunk(8192)
-                            if not chunk:
-                                break
-                            await f.write(chunk)
-                    
-                    file_size = file_path.stat().st_size
-                    logger.info(f"📄 File uploaded successfully: {filename} ({file_size} bytes)")
-                    
-                    return web.json_response({
-                        "message": "File uploaded and queued for RAG indexing",
-                        "filename": filename,
-                        "size": file_size,
-                        "path": str(file_path),
-                        "status": "Processing - will be available for queries in ~30 seconds"
-                    })
-            
-            return web.json_response({"error": "No file found in request"}, status=400)
-            
-        except Exception as e:
-            logger.error(f"❌ Upload error: {e}")
-            return web.json_response({"error": str(e)}, status=500)
-
-    async def health_handler(self, request):
-        """Enhanced health check endpoint"""
-        try:
-            file_count = len(list(self.data_dir.glob("*")))
-            return web.json_response({
-                "status": "healthy",
-                "service": "Pharmaceutical RAG System with Upload",
-                "data_directory": str(self.data_dir),
-                "indexed_files": file_count,
-                "upload_endpoint": "/v1/upload",
-                "query_endpoint": "/v1/pw_ai_answer",
-                "supported_formats": [".pdf", ".txt", ".doc", ".docx"]
-            })
-        except Exception as e:
-            return web.json_response({
-                "status": "error",
-                "error": str(e)
-            }, status=500)
-
-    def create_upload_server(self):
-        """Create aiohttp server with upload and health endpoints"""
-        app = web.Application()
-        app.router.add_post('/v1/upload', self.upload_handler)
-        app.router.add_get('/v1/health', self.health_handler)
-        return app
-
-    def run_upload_server(self):
-        """Run upload server on port 8001"""
-        upload_app = self.create_upload_server()
-        logger.info("🎯 Upload server starting on http://0.0.0.0:8001")
-        web.run_app(upload_app, host="0.0.0.0", port=8001)
+    def start_upload_service(self):
+        """Run upload_service.py as a supervised child process, unless a process manager runs it"""
+        # UPLOAD_SERVICE=external: supervisord or systemd starts and restarts upload_service.py
+        mode = os.getenv("UPLOAD_SERVICE", "child")
+        if mode == "external":
+            logger.info("🎯 Upload service is run by the process manager (UPLOAD_SERVICE=external)")
+            return
+        if mode != "child":
+            raise ValueError(f"UPLOAD_SERVICE must be 'child' or 'external', not {mode!r}")
+        status_db = self.ingestion_status.path if self.ingestion_status is not None else ""
+        self.upload_supervisor = UploadServiceSupervisor(
+            ["--data-dir", str(self.data_dir), "--status-db", status_db]
+        )
+        self.upload_supervisor.start()
 
     def run(self):
         """Run the pharmaceutical compliance RAG system"""
@@ -176,20 +105,30 @@ class PharmaComplianceApp:
             
             with open(self.config_path) as f:
                 config = pw.load_yaml(f)
+            self.ingestion_status = config.get("ingestion_status")
             
-            # Start upload server in background thread
-            upload_thread = threading.Thread(target=self.run_upload_server, daemon=True)
-            upload_thread.start()
+            # Uploads are served by their own process (upload_service.py), sharing only ./data
+            # and the ingestion status database with this one
+            self.start_upload_service()
+
+            canary = config.get("ingestion_canary")
+            if canary is not None:
+                canary.retrieve_url = f"http://127.0.0.1:{config.get('port', 8000)}/v1/retrieve"
+                canary.start()
             
             logger.info("🚀 Starting document processing pipeline...")
             logger.info("📡 Main RAG server starting on http://0.0.0.0:8000")
-            logger.info("🎯 Upload server running on http://0.0.0.0:8001")
+            logger.info("🎯 Upload service (separate process) on http://0.0.0.0:8001")
             logger.info("🔍 Ready to process pharmaceutical regulatory documents")
             
             # Enhanced API endpoints info
             logger.info("💡 API Endpoints:")
             logger.info("   GET  http://localhost:8001/v1/health    - System health & file stats")
-            logger.info("   POST http://localhost:8001/v1/upload    - Upload PDF/TXT files")
+            logger.info("   POST http://localhost:8001/v1/upload    - Upload PDF/TXT files or ZIP/TAR archives")
+            logger.info("   POST http://localhost:8001/v1/upload/resumable - Resumable, parallel uploads (tus-style)")
+            logger.info("   GET  http://localhost:8001/v1/uploads/{id} - Ingestion state (SSE: .../events)")
+            logger.info("   GET  http://localhost:8001/v1/metrics   - Upload metrics")
+            logger.info("   GET  http://localhost:8000/v1/metrics   - Ingestion backlog and time-to-searchable metrics")
             logger.info("   POST http://localhost:8000/v1/pw_ai_answer - LLM-powered queries")
             logger.info("   POST http://localhost:8000/v1/pw_list_documents - List documents")
             
@@ -201,6 +140,16 @@ class PharmaComplianceApp:
                 port=config.get("port", 8000),
                 rag_question_answerer=config["question_answerer"]
             )
+
+            # Ingestion backlog, time-to-searchable and canary metrics are recorded by the pipeline in this process
+            server.serve_callable(
+                route="/v1/metrics",
+                schema=None,
+                callable_func=metrics_snapshot,
+                retry_strategy=None,
+                cache_strategy=None,
+                methods=("GET", "POST"),
+            )
             
             # Run the main server
             server.run(
@@ -215,6 +164,9 @@ class PharmaComplianceApp:
         except Exception as e:
             logger.error(f"❌ Error starting application: {e}")
             raise
+        finally:
+            if self.upload_supervisor is not None:
+                self.upload_supervisor.stop()
 
 def main():
     """Main entry point"""
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Bulk Archive Uploads
+
+Regulators send ZIPs of dozens of notifications. Instead of unpacking them and
+uploading one file at a time, clients upload the archive (``/v1/upload`` or
+the resumable endpoint) and the upload server extracts it:
+
+- ZIP members are extracted by a worker pool, each worker reading its member
+  through its own handle, so decompression, hashing and writing run in parallel
+- TAR archives (also .tar.gz/.tgz, .tar.bz2, .tar.xz) are read as one stream,
+  since a compressed tar can only be decompressed in order; the fsync of each
+  member is handed to the pool while the next member is read
+- Every member goes through UploadStore: written to a temporary file, hashed,
+  renamed into ./data atomically, or answered as a duplicate. Renames happen
+  in archive order, so of identical members the first one is stored
+
+The upload server registers the extracted documents as one batch with the
+ingestion status tracker (``GET /v1/uploads/batches/{id}``).
+
+Key Features:
+- ZIP and TAR (plain, gzip, bzip2, xz) archives, streamed member by member
+- Parallel extraction, content-hash deduplication within and across archives
+- Unsupported, hidden, nested-archive and encrypted members are skipped with a reason
+- Limits on member count and total uncompressed size against archive bombs: an
+  archive over either limit is rejected as a whole, nothing of it is stored
+"""
+
+import logging
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from metrics import REGISTRY
+from upload_store import UploadRejected, UploadStore, fsync_file, safe_filename
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tgz", ".tar.gz", ".tbz2", ".tar.bz2", ".txz", ".tar.xz")
+# Path(...).suffix of the archive names above, for extension allow-lists
+ARCHIVE_EXTENSIONS = {".zip", ".tar", ".tgz", ".gz", ".tbz2", ".bz2", ".txz", ".xz"}
+EXTRACT_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000)
+
+
+class ArchiveError(ValueError):
+    """The upload is not a readable archive or exceeds the extraction limits."""
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class ArchiveExtractor:
+    """
+    Extracts uploaded archives into the data directory through an UploadStore.
+
+    Args:
+        store: UploadStore of the data directory
+        allowed_extensions: Member extensions to extract (None: any); others are skipped
+        max_workers: Extraction threads
+        max_members: Largest number of extracted members per archive
+        max_total_bytes: Largest total uncompressed size per archive
+    """
+
+    def __init__(
+        self,
+        store: UploadStore,
+        allowed_extensions: Optional[Iterable[str]] = None,
+        max_workers: int = 4,
+        max_members: int = 1000,
+        max_total_bytes: int = 2 * 1024 * 1024 * 1024,
+    ):
+        self.store = store
+        self.allowed_extensions = set(allowed_extensions) if allowed_extensions else None
+        self.max_workers = max_workers
+        self.max_members = max_members
+        self.max_total_bytes = max_total_bytes
+
+        self._members = REGISTRY.counter(
+            "archive_members_total", "Archive members by outcome (stored, replaced, duplicate, skipped)"
+        )
+        self._extract_ms = REGISTRY.histogram(
+            "archive_extract_ms", "Time to extract one archive", buckets=EXTRACT_BUCKETS_MS
+        )
+
+    # ------------------------------------------------------------------
+    # Member selection
+    # ------------------------------------------------------------------
+
+    def _skip_reason(self, member: str, regular: bool, encrypted: bool = False) -> Optional[str]:
+        parts = PurePosixPath(member.replace("\\", "/")).parts
+        if not regular:
+            return "not a regular file"
+        if any(part.startswith(".") or part == "__MACOSX" for part in parts):
+            return "hidden file"
+        if is_archive(member):
+            return "nested archive"
+        extension = PurePosixPath(member).suffix.lower()
+        if self.allowed_extensions is not None and extension not in self.allowed_extensions:
+            return f"unsupported type {extension or '(none)'}"
+        if encrypted:
+            return "encrypted"
+        return None
+
+    @staticmethod
+    def _target_name(member: str, used: Set[str]) -> str:
+        """The member's file name; members of different folders with the same name keep their folders."""
+        parts = [part for part in PurePosixPath(member.replace("\\", "/")).parts if part not in ("/", "..")]
+        name = safe_filename(parts[-1])
+        if name in used:
+            name = safe_filename("_".join(parts))
+        used.add(name)
+        return name
+
+    # ------------------------------------------------------------------
+    # Extraction
+    # ------------------------------------------------------------------
+
+    def _zip_member(self, archive_path: str, member: str) -> Tuple[str, str, int]:
+        with zipfile.ZipFile(archive_path) as archive, archive.open(member) as source:
+            spooled = self.store.spool(source)
+        return self._synced(spooled)
+
+    def _synced(self, spooled: Tuple[str, str, int]) -> Tuple[str, str, int]:
+        try:
+            fsync_file(spooled[0])
+        except OSError:
+            self.store.discard(spooled[0])
+            raise
+        return spooled
+
+    def _extract_zip(self, archive_path: str, pool: ThreadPoolExecutor, skipped: List[Dict[str, str]]):
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                infos = archive.infolist()
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f"Unreadable ZIP archive: {e}") from None
+
+        selected = []
+        for info in infos:
+            if info.is_dir():
+                continue
+            reason = self._skip_reason(info.filename, True, bool(info.flag_bits & 0x1))
+            if reason:
+                skipped.append({"member": info.filename, "reason": reason})
+            else:
+                selected.append(info)
+        if len(selected) > self.max_members:
+            raise ArchiveError(f"Archive has {len(selected)} documents; the limit is {self.max_members}")
+        total = sum(info.file_size for info in selected)  # ZipFile stops reading members at their declared size
+        if total > self.max_total_bytes:
+            raise ArchiveError(f"Archive expands to {total} bytes; the limit is {self.max_total_bytes}")
+
+        used: Set[str] = set()
+        jobs: List[Tuple[str, str, Future]] = []
+        for info in selected:
+            target = self._target_name(info.filename, used)
+            jobs.append((info.filename, target, pool.submit(self._zip_member, archive_path, info.filename)))
+        return jobs
+
+    def _discard(self, jobs: List[Tuple[str, str, Future]]) -> None:
+        """Delete the temporary files of members that will not be committed."""
+        for _, _, job in jobs:
+            try:
+                self.store.discard(job.result()[0])
+            except OSError:
+                pass  # _synced already removed it
+
+    def _extract_tar(self, archive_path: str, pool: ThreadPoolExecutor, skipped: List[Dict[str, str]]):
+        jobs: List[Tuple[str, str, Future]] = []
+        used: Set[str] = set()
+        selected = 0
+        total = 0
+        try:
+            with tarfile.open(archive_path, "r|*") as archive:  # One pass over the (compressed) stream
+                for info in archive:
+                    if info.isdir():
+                        continue
+                    reason = self._skip_reason(info.name, info.isfile())
+                    if reason:
+                        skipped.append({"member": info.name, "reason": reason})
+                        continue
+                    # Limits are only known to be exceeded part way through the stream: drop what was spooled
+                    selected += 1
+                    total += info.size
+                    if selected > self.max_members:
+                        self._discard(jobs)
+                        raise ArchiveError(
+                            f"Archive has at least {selected} documents; the limit is {self.max_members}"
+                        )
+                    if total > self.max_total_bytes:
+                        self._discard(jobs)
+                        raise ArchiveError(
+                            f"Archive expands to at least {total} bytes; the limit is {self.max_total_bytes}"
+                        )
+                    try:
+                        tmp_path, sha256, size = self.store.spool(archive.extractfile(info))
+                    except UploadRejected as e:
+                        skipped.append({"member": info.name, "reason": str(e)})
+                        continue
+                    target = self._target_name(info.name, used)
+                    jobs.append((info.name, target, pool.submit(self._synced, (tmp_path, sha256, size))))
+        except tarfile.TarError as e:
+            if not jobs:
+                raise ArchiveError(f"Unreadable TAR archive: {e}") from None
+            skipped.append({"member": "(rest of archive)", "reason": f"truncated archive: {e}"})
+        return jobs
+
+    def extract(self, archive_path: str, archive_name: str) -> Dict[str, Any]:
+        """
+        Extract an archive into the data directory (blocking).
+
+        Args:
+            archive_path: The complete archive, e.g. from UploadStore.receive
+            archive_name: Client-provided archive name
+
+        Returns:
+            {"archive", "files": [{"member", "document_id", "filename", "path", "size",
+            "sha256", "duplicate", "replaced"}], "skipped": [{"member", "reason"}]}
+
+        Raises:
+            ArchiveError: Not a ZIP or TAR archive, or over the limits (nothing is extracted)
+        """
+        started = time.monotonic()
+        skipped: List[Dict[str, str]] = []
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="archive") as pool:
+            if zipfile.is_zipfile(archive_path):
+                jobs = self._extract_zip(archive_path, pool, skipped)
+            elif tarfile.is_tarfile(archive_path):
+                jobs = self._extract_tar(archive_path, pool, skipped)
+            else:
+                raise ArchiveError(f"{archive_name} is not a ZIP or TAR archive")
+
+            # Renamed into place in archive order, so the first of identical members is the one stored
+            files = []
+            for member, target, job in jobs:
+                try:
+                    tmp_path, sha256, size = job.result()
+                    files.append({"member": member, **self.store.commit(tmp_path, target, sha256, size)})
+                except (UploadRejected, zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+                    skipped.append({"member": member, "reason": str(e)})
+
+        for entry in files:
+            outcome = "duplicate" if entry["duplicate"] else "replaced" if entry["replaced"] else "stored"
+            self._members.inc(outcome=outcome)
+        self._members.inc(len(skipped), outcome="skipped")
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+        self._extract_ms.observe(elapsed_ms)
+        new = sum(not entry["duplicate"] for entry in files)
+        logger.info(
+            f"🗜️ Extracted {os.path.basename(archive_name)} in {elapsed_ms:.0f}ms: {new} new, "
+            f"{len(files) - new} duplicates, {len(skipped)} skipped"
+        )
+        return {"archive": archive_name, "files": files, "skipped": skipped}
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Batch Retrieval for Bulk Audits
+
+/v1/retrieve answers one query per HTTP call, so auditing 50k product listings
+costs 50k round trips, 50k single-row embedding calls and 50k index probes.
+/v1/retrieve_batch takes an array of queries instead. The queries of a batch
+become rows of one Pathway commit, so the embedder sees them as one batch
+(one forward pass) and the KNN index is probed with all of them at once.
+
+Two endpoints share the request format:
+- Pathway server (port 8001): POST /v1/retrieve_batch answers up to
+  ``max_items`` queries with one JSON array in input order
+- Streaming server (port 8003): POST /v1/retrieve_batch accepts any number of
+  queries, sends them to the Pathway endpoint in chunks of ``chunk_size``
+  (``concurrency`` chunks in flight) and streams one NDJSON line per query, in
+  input order, as the chunks complete
+
+Request:
+    {"queries": ["nimesulide", {"query": "codeine syrup", "k": 3, "min_similarity": 0.4}],
+     "k": 5, "metadata_filter": null, "min_similarity": null}
+
+Per-item ``k``, ``metadata_filter``, ``filepath_globpattern`` and
+``min_similarity`` override the batch-level values. Results with a cosine
+similarity (1 - dist) below ``min_similarity`` are dropped, as in
+similarity_filter.py.
+
+NDJSON response lines:
+    {"index": 0, "results": [{"text": "...", "metadata": {...}, "dist": 0.21}]}
+    {"index": 1, "error": "query must be a non-empty string"}
+
+Key Features:
+- One batched embedding pass and index search per chunk of queries
+- Per-item k, metadata filter and similarity threshold
+- Invalid items answered with an error line instead of failing the batch
+- Item counts and chunk latency on /v1/metrics
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import pathway as pw
+from aiohttp import ClientSession, ClientTimeout, web
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ITEM_FIELDS = ("k", "metadata_filter", "filepath_globpattern", "min_similarity")
+
+
+class RetrieveBatchSchema(pw.Schema):
+    queries: pw.Json
+    k: int | None = pw.column_definition(default_value=None)
+    metadata_filter: str | None = pw.column_definition(default_value=None)
+    filepath_globpattern: str | None = pw.column_definition(default_value=None)
+    min_similarity: float | None = pw.column_definition(default_value=None)
+
+
+def parse_items(queries: Any, defaults: Dict[str, Any], max_items: int, max_k: int) -> List[Dict[str, Any]]:
+    """
+    Normalise the items of a batch request.
+
+    Every item becomes ``{"index", "query", "k", "metadata_filter",
+    "filepath_globpattern", "min_similarity", "error"}``. A request that is not
+    a list of 1..max_items queries yields a single item with index -1 and the
+    error.
+    """
+    if not isinstance(queries, list) or not queries:
+        return [{"index": -1, "error": "queries must be a non-empty list"}]
+    if len(queries) > max_items:
+        return [{"index": -1, "error": f"at most {max_items} queries per request, got {len(queries)}"}]
+
+    items = []
+    for index, raw in enumerate(queries):
+        item = {"index": index, **defaults, "error": None}
+        if isinstance(raw, dict):
+            item.update({field: raw[field] for field in ITEM_FIELDS if raw.get(field) is not None})
+            raw = raw.get("query")
+        item["query"] = raw
+        if not isinstance(raw, str) or not raw.strip():
+            item["error"] = "query must be a non-empty string"
+        elif isinstance(item["k"], bool) or not isinstance(item["k"], int) or not 1 <= item["k"] <= max_k:
+            item["error"] = f"k must be an integer between 1 and {max_k}"
+        elif item["min_similarity"] is not None and not isinstance(item["min_similarity"], (int, float)):
+            item["error"] = "min_similarity must be a number"
+        items.append(item)
+    return items
+
+
+def apply_threshold(docs: List[dict], min_similarity: Optional[float]) -> List[dict]:
+    """Drop results whose cosine similarity (1 - dist) is below ``min_similarity``."""
+    if min_similarity is None:
+        return docs
+    return [doc for doc in docs if 1.0 - doc.get("dist", 1.0) >= min_similarity]
+
+
+class BatchRetriever:
+    """
+    Batched retrieval over the document store.
+
+    Args:
+        indexer: The $document_store of the question answerer
+        default_k: k of items without one
+        max_k: Largest k an item may ask for
+        max_items: Queries per request on the Pathway endpoint
+        chunk_size: Queries per Pathway request sent by the streaming endpoint
+        concurrency: Chunks in flight per streaming request
+    """
+
+    def __init__(
+        self,
+        indexer,
+        default_k: int = 6,
+        max_k: int = 100,
+        max_items: int = 1000,
+        chunk_size: int = 256,
+        concurrency: int = 2,
+    ):
+        if chunk_size > max_items:
+            raise ValueError("chunk_size cannot exceed max_items")
+        self.indexer = indexer
+        self.default_k = default_k
+        self.max_k = max_k
+        self.max_items = max_items
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+
+        self._items = REGISTRY.counter("retrieve_batch_items_total", "Batch retrieval items by outcome")
+        self._chunk_ms = REGISTRY.histogram("retrieve_batch_chunk_ms", "Pathway round trip of one batch chunk")
+
+    @pw.table_transformer
+    def retrieve_batch(self, batches: pw.Table) -> pw.Table:
+        """Answer each batch request with the results of its queries in input order."""
+
+        @pw.udf
+        def items(
+            queries: pw.Json,
+            k: int | None,
+            metadata_filter: str | None,
+            filepath_globpattern: str | None,
+            min_similarity: float | None,
+        ) -> list[pw.Json]:
+            defaults = {
+                "k": k or self.default_k,
+                "metadata_filter": metadata_filter,
+                "filepath_globpattern": filepath_globpattern,
+                "min_similarity": min_similarity,
+            }
+            return [pw.Json(item) for item in parse_items(queries.value, defaults, self.max_items, self.max_k)]
+
+        @pw.udf
+        def found(item: pw.Json, docs: pw.Json) -> pw.Json:
+            return pw.Json({
+                "index": item["index"].as_int(),
+                "results": apply_threshold(docs.as_list(), item.value["min_similarity"]),
+            })
+
+        @pw.udf
+        def failed(item: pw.Json) -> pw.Json:
+            return pw.Json({"index": item["index"].as_int(), "error": item["error"].as_str()})
+
+        @pw.udf
+        def response(entries: tuple) -> pw.Json:
+            entries = sorted((entry.value for entry in entries), key=lambda entry: entry["index"])
+            if entries and entries[0]["index"] == -1:
+                return pw.Json({"error": entries[0]["error"]})
+            for entry in entries:
+                self._items.inc(outcome="error" if "error" in entry else "ok")
+            return pw.Json(entries)
+
+        rows = batches.select(request=pw.this.id, item=items(
+            pw.this.queries, pw.this.k, pw.this.metadata_filter, pw.this.filepath_globpattern, pw.this.min_similarity
+        )).flatten(pw.this.item)
+        valid = pw.this.item["error"].as_str().is_none()
+        queries = rows.filter(valid)
+        invalid = rows.filter(~valid)
+
+        retrieved = queries + self.indexer.retrieve_query(
+            queries.select(
+                query=pw.unwrap(pw.this.item["query"].as_str()),
+                k=pw.unwrap(pw.this.item["k"].as_int()),
+                metadata_filter=pw.this.item["metadata_filter"].as_str(),
+                filepath_globpattern=pw.this.item["filepath_globpattern"].as_str(),
+            )
+        ).select(docs=pw.this.result)
+
+        entries = retrieved.select(pw.this.request, entry=found(pw.this.item, pw.this.docs))
+        errors = invalid.select(pw.this.request, entry=failed(pw.this.item))
+        pw.universes.promise_are_pairwise_disjoint(entries, errors)
+        grouped = entries.concat(errors).groupby(pw.this.request, id=pw.this.request).reduce(
+            entries=pw.reducers.tuple(pw.this.entry)
+        )
+        return batches.select(result=response(grouped.ix(pw.this.id).entries))
+
+    async def _fetch_chunk(
+        self, session: ClientSession, url: str, body: Dict[str, Any], queries: List[Any]
+    ) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with session.post(url, json={**body, "queries": queries}) as response:
+                response.raise_for_status()
+                result = await response.json()
+            if isinstance(result, dict):
+                raise ValueError(result.get("error", "unexpected response"))
+            outcome = "ok"
+            return result
+        finally:
+            self._chunk_ms.observe((time.perf_counter() - started) * 1000.0, outcome=outcome)
+
+    async def stream(self, request: web.Request, url: str) -> web.StreamResponse:
+        """
+        POST /v1/retrieve_batch of the streaming server: NDJSON, one line per query.
+
+        Args:
+            request: aiohttp request with the batch body
+            url: The Pathway /v1/retrieve_batch endpoint
+        """
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "Invalid JSON body"}, status=400)
+        queries = body.get("queries") if isinstance(body, dict) else None
+        if not isinstance(queries, list) or not queries:
+            return web.json_response({"error": "queries must be a non-empty list"}, status=400)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        pending: deque = deque()
+
+        async def write(offset: int, size: int, task: asyncio.Task) -> None:
+            try:
+                lines = [{**entry, "index": offset + entry["index"]} for entry in await task]
+            except Exception as e:
+                logger.warning(f"⚠️ Batch chunk at {offset} failed: {e}")
+                self._items.inc(size, outcome="error")
+                lines = [{"index": offset + i, "error": f"retrieval failed: {e}"} for i in range(size)]
+            await response.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8"))
+
+        async with ClientSession(timeout=ClientTimeout(total=300)) as session:
+            try:
+                for offset in range(0, len(queries), self.chunk_size):
+                    chunk = queries[offset:offset + self.chunk_size]
+                    task = asyncio.create_task(self._fetch_chunk(session, url, body, chunk))
+                    pending.append((offset, len(chunk), task))
+                    if len(pending) >= self.concurrency:
+                        await write(*pending.popleft())
+                while pending:
+                    await write(*pending.popleft())
+            finally:
+                for _, _, task in pending:
+                    task.cancel()
+        await response.write_eof()
+        return response
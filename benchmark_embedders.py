@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Embedder Benchmark: PyTorch SentenceTransformer vs. quantized ONNX
+
+This script embeds the ./data corpus with both embedder backends and reports:
+- Throughput (embeddings/sec) for each backend
+- Vector agreement (mean cosine similarity between the two backends)
+- Index recall parity: recall@k of ONNX nearest neighbours against the
+  PyTorch neighbours for a set of pharmaceutical queries
+
+Usage:
+    python benchmark_embedders.py
+    python benchmark_embedders.py --data-dir ./data --k 10 --json bench.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Representative queries for recall measurement
+BENCHMARK_QUERIES = [
+    "Is nimesulide banned in India?",
+    "fixed dose combination of paracetamol and phenylephrine ban",
+    "CDSCO gazette notification GSR prohibition 2024",
+    "drugs banned for children below 12 years",
+    "Schedule H1 drugs requiring prescription",
+    "withdrawal of prohibition of fixed dose combination",
+    "import banned drugs Delhi drugs control department",
+    "chloramphenicol and nitrofurans in food producing animals",
+    "not of standard quality NSQ alert",
+    "Section 26A Drugs and Cosmetics Act 1940 notification",
+]
+
+
+def extract_text(path: Path) -> str:
+    """Extract plain text from a PDF or text document."""
+    if path.suffix.lower() == ".pdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(str(path))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    return path.read_text(encoding="utf-8", errors="ignore")
+
+
+def load_corpus_chunks(data_dir: str = "./data", chunk_words: int = 300) -> List[str]:
+    """
+    Load the document corpus and split it into word-count chunks.
+
+    Chunking approximates TokenCountSplitter closely enough for benchmarking;
+    it does not need to reproduce the exact chunks of the live index.
+    """
+    chunks: List[str] = []
+    for path in sorted(Path(data_dir).iterdir()):
+        if path.suffix.lower() not in {".pdf", ".txt"}:
+            continue
+        try:
+            words = extract_text(path).split()
+        except Exception as e:
+            print(f"⚠️ Skipping {path.name}: {e}")
+            continue
+        for start in range(0, len(words), chunk_words):
+            chunk = " ".join(words[start:start + chunk_words]).strip()
+            if chunk:
+                chunks.append(chunk)
+    return chunks
+
+
+def embed_all(embedder, texts: List[str], batch_size: int) -> np.ndarray:
+    """Embed texts through the embedder's batched Pathway entry point."""
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embedder.__wrapped__(texts[start:start + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def time_embedding(embedder, texts: List[str], batch_size: int, repeats: int = 1) -> Dict:
+    """Measure embeddings/sec after a warm-up pass."""
+    embed_all(embedder, texts[:batch_size], batch_size)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        vectors = embed_all(embedder, texts, batch_size)
+    elapsed = time.perf_counter() - start
+    return {
+        "vectors": vectors,
+        "seconds": elapsed,
+        "embeddings_per_sec": len(texts) * repeats / elapsed if elapsed else float("inf"),
+    }
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return vectors / norms
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact cosine top-k neighbour ids for each query."""
+    scores = normalize(queries) @ normalize(corpus).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Mean overlap of candidate neighbour sets with the reference sets."""
+    hits = [len(set(ref) & set(cand)) / len(ref) for ref, cand in zip(reference, candidate)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PyTorch vs. ONNX int8 embedders")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--chunk-words", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--no-quantize", action="store_true", help="Benchmark the fp32 ONNX export")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    from pathway.xpacks.llm.embedders import SentenceTransformerEmbedder
+    from onnx_embedder import OnnxInt8Embedder
+
+    print("🧪 Embedder Benchmark: PyTorch vs. ONNX")
+    print("=" * 60)
+
+    chunks = load_corpus_chunks(args.data_dir, args.chunk_words)
+    print(f"📄 Corpus: {len(chunks)} chunks from {args.data_dir}")
+    if not chunks:
+        print("❌ No documents found")
+        return
+
+    backends = {
+        "pytorch_fp32": SentenceTransformerEmbedder(model=args.model),
+        "onnx_int8" if not args.no_quantize else "onnx_fp32": OnnxInt8Embedder(
+            model=args.model, quantize=not args.no_quantize
+        ),
+    }
+
+    results = {}
+    for name, embedder in backends.items():
+        print(f"⏱️ Embedding corpus with {name}...")
+        results[name] = time_embedding(embedder, chunks, args.batch_size, args.repeats)
+        results[name]["query_vectors"] = embed_all(embedder, BENCHMARK_QUERIES, args.batch_size)
+        print(f"   {results[name]['embeddings_per_sec']:.1f} embeddings/sec")
+
+    reference_name, candidate_name = list(backends)
+    reference, candidate = results[reference_name], results[candidate_name]
+
+    k = min(args.k, len(chunks))
+    agreement = float(np.mean(np.sum(
+        normalize(reference["vectors"]) * normalize(candidate["vectors"]), axis=1
+    )))
+    # Queries and corpus embedded with the same backend, as in a re-built index
+    recall = recall_at_k(
+        top_k(reference["vectors"], reference["query_vectors"], k),
+        top_k(candidate["vectors"], candidate["query_vectors"], k),
+    )
+    # ONNX queries against the PyTorch-built index, as when only the query path is switched
+    mixed_recall = recall_at_k(
+        top_k(reference["vectors"], reference["query_vectors"], k),
+        top_k(reference["vectors"], candidate["query_vectors"], k),
+    )
+
+    report = {
+        "chunks": len(chunks),
+        "k": k,
+        "backends": {
+            name: {
+                "seconds": round(result["seconds"], 3),
+                "embeddings_per_sec": round(result["embeddings_per_sec"], 1),
+            }
+            for name, result in results.items()
+        },
+        "speedup": round(candidate["embeddings_per_sec"] / reference["embeddings_per_sec"], 2),
+        "mean_cosine_agreement": round(agreement, 4),
+        f"recall@{k}": round(recall, 4),
+        f"recall@{k}_mixed_index": round(mixed_recall, 4),
+    }
+
+    print("\n📊 RESULTS")
+    print("=" * 60)
+    for name, stats in report["backends"].items():
+        print(f"   {name:<14} {stats['embeddings_per_sec']:>10.1f} embeddings/sec")
+    print(f"   Speedup:                 {report['speedup']}x")
+    print(f"   Mean cosine agreement:   {report['mean_cosine_agreement']}")
+    print(f"   Recall@{k} (rebuilt):     {report[f'recall@{k}']}")
+    print(f"   Recall@{k} (mixed):       {report[f'recall@{k}_mixed_index']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
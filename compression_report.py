@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Vector Compression Report: memory per chunk and recall@k
+
+Embeds the ./data corpus once at full precision and evaluates every
+compression setting of vector_compression.VectorCompressor against exact
+float32 search:
+- fp16 and int8 scalar quantization
+- PCA reduction to each --pca-dims dimension (fitted on the corpus)
+- each setting again with full-precision rescoring of the top candidates
+
+Usage:
+    python compression_report.py
+    python compression_report.py --pca-dims 256 128 64 --k 10 --json compression.json
+    python compression_report.py --save-pca 128      # write models/pca/pca_128.npz for serving
+"""
+
+import argparse
+import json
+from typing import Dict, List
+
+import numpy as np
+
+from benchmark_embedders import BENCHMARK_QUERIES, DEFAULT_MODEL, embed_all, load_corpus_chunks, recall_at_k, top_k
+from vector_compression import VectorCompressor, _unit
+
+
+def search(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Cosine top-k over decoded vectors, as the COS index would return."""
+    scores = _unit(queries) @ _unit(corpus).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def rescore(full_corpus: np.ndarray, full_queries: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    """Reorder compressed-index candidates by full-precision cosine and keep k."""
+    corpus, queries = _unit(full_corpus), _unit(full_queries)
+    result = []
+    for query, ids in zip(queries, candidates):
+        scores = corpus[ids] @ query
+        result.append(ids[np.argsort(-scores)[:k]])
+    return np.asarray(result)
+
+
+def evaluate(
+    compressor: VectorCompressor,
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    reference: np.ndarray,
+    k: int,
+    rescore_factor: int,
+) -> Dict:
+    """recall@k of one compression setting, with and without rescoring."""
+    compressor.fit(corpus)
+    decoded_corpus = compressor.decode(compressor.encode(corpus))
+    decoded_queries = compressor.decode(compressor.encode(queries))
+
+    plain = search(decoded_corpus, decoded_queries, k)
+    pool = search(decoded_corpus, decoded_queries, min(len(corpus), k * rescore_factor))
+    rescored = rescore(corpus, queries, pool, k)
+
+    dim = corpus.shape[1]
+    return {
+        "bytes_per_chunk": compressor.bytes_per_vector(dim),
+        "compression_ratio": round(dim * 4 / compressor.bytes_per_vector(dim), 2),
+        f"recall@{k}": round(recall_at_k(reference, plain), 4),
+        f"recall@{k}_rescored": round(recall_at_k(reference, rescored), 4),
+    }
+
+
+def build_settings(pca_dims: List[int], dim: int, corpus_size: int) -> Dict[str, VectorCompressor]:
+    settings = {
+        "float32": VectorCompressor("none"),
+        "fp16": VectorCompressor("fp16"),
+        "int8": VectorCompressor("int8"),
+    }
+    for pca_dim in pca_dims:
+        if pca_dim >= dim or pca_dim > corpus_size:
+            print(f"⚠️ Skipping PCA-{pca_dim}: needs < {dim} dims and at least {pca_dim} chunks")
+            continue
+        settings[f"pca{pca_dim}"] = VectorCompressor("pca", pca_dim)
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and recall of vector compression settings")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--chunk-words", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pca-dims", type=int, nargs="+", default=[256, 128, 64])
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Candidates rescored = k * factor")
+    parser.add_argument("--save-pca", type=int, help="Fit and save a PCA basis of this dimension for serving")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    from pathway.xpacks.llm.embedders import SentenceTransformerEmbedder
+
+    print("🗜️ Vector Compression Report")
+    print("=" * 60)
+
+    chunks = load_corpus_chunks(args.data_dir, args.chunk_words)
+    print(f"📄 Corpus: {len(chunks)} chunks from {args.data_dir}")
+    if not chunks:
+        print("❌ No documents found")
+        return
+
+    embedder = SentenceTransformerEmbedder(model=args.model)
+    corpus = embed_all(embedder, chunks, args.batch_size)
+    queries = embed_all(embedder, BENCHMARK_QUERIES, args.batch_size)
+    k = min(args.k, len(chunks))
+    reference = top_k(corpus, queries, k)
+
+    results = {
+        name: evaluate(compressor, corpus, queries, reference, k, args.rescore_factor)
+        for name, compressor in build_settings(args.pca_dims, corpus.shape[1], len(chunks)).items()
+    }
+
+    print(f"\n📊 RESULTS (reference: exact float32 search, {corpus.shape[1]} dims)")
+    print("=" * 60)
+    print(f"   {'setting':<10} {'bytes/chunk':>12} {'MB/100k':>9} {'recall@' + str(k):>10} {'rescored':>10}")
+    for name, result in results.items():
+        mb_per_100k = result["bytes_per_chunk"] * 100_000 / 1024 ** 2
+        print(
+            f"   {name:<10} {result['bytes_per_chunk']:>12} {mb_per_100k:>9.1f} "
+            f"{result[f'recall@{k}']:>10} {result[f'recall@{k}_rescored']:>10}"
+        )
+    print("   (vector payload only; HNSW graph links add the same overhead to every setting)")
+
+    if args.save_pca:
+        path = f"models/pca/pca_{args.save_pca}.npz"
+        VectorCompressor("pca", args.save_pca).fit(corpus).save(path)
+        print(f"\n💾 PCA basis written to {path}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"chunks": len(chunks), "k": k, "settings": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
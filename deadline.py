@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Deadline-Aware Answer Planning
+
+The frontend waits up to 120 s for an answer, mobile users give up much
+sooner. A request to /v1/pw_ai_answer may carry ``deadline_ms``; the policy
+below turns the remaining budget into a cheaper plan for that request, from
+mild to drastic:
+
+1. ``skip_rerank``: keep the retrieval order, retrieve only rerank_topk chunks
+2. ``shrink_k``: retrieve fewer chunks (shorter prompt, faster first token)
+3. ``fast_model``: switch to the small fast model
+4. ``cap_tokens``: cap the output to what the model can generate in time
+5. ``retrieval_only``: no LLM call, answer with the cited source excerpts
+
+The LLM call itself gets the absolute deadline (PharmaLiteLLMChat turns it into
+a provider timeout and stops retrying), and if it cannot finish in time the
+answer falls back to the retrieval-only answer as well. The applied
+degradations are returned in the response.
+
+Key Features:
+- Threshold-based plan, tunable in the YAML configuration
+- Reranking cost and threshold derived from the reranker's own ``budget_ms``
+- Budget counted from the request's arrival at the server, not from planning
+- Token cap derived from a tokens-per-second estimate of the chosen model
+- Requests without a deadline are not changed
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEGRADATIONS = ("skip_rerank", "shrink_k", "fast_model", "cap_tokens", "retrieval_only")
+
+DEADLINE_NOTICE = (
+    "⏱️ A full compliance analysis could not be completed within the requested time. "
+    "Most relevant regulatory excerpts:"
+)
+
+# Expected time of a cross-encoder without a per-request budget (CPU)
+DEFAULT_RERANK_MS = 1500
+
+
+class DeadlinePolicy:
+    """
+    Map a client deadline to per-request degradations.
+
+    Args:
+        skip_rerank_below_ms: Budgets below this skip the cross-encoder reranker
+            (default: ``rerank_ms / rerank_max_share``)
+        shrink_k_below_ms: Budgets below this retrieve only ``min_k`` chunks
+        min_k: Chunks retrieved under ``shrink_k``
+        fast_model_below_ms: Budgets below this use ``fast_model``
+        fast_model: Model used under ``fast_model`` (OpenRouter model id)
+        retrieval_ms: Expected retrieval time
+        rerank_ms: Expected reranking time (default: the reranker's ``budget_ms``,
+            or DEFAULT_RERANK_MS for a reranker without a budget)
+        rerank_max_share: Largest share of a budget reranking may take
+        first_token_ms: Expected time to the first output token
+        tokens_per_s: Expected output rate of the full model
+        fast_tokens_per_s: Expected output rate of ``fast_model``
+        min_tokens: Below this output budget the LLM is skipped (retrieval only)
+        margin_ms: Reserved for building and sending the response
+    """
+
+    def __init__(
+        self,
+        skip_rerank_below_ms: Optional[int] = None,
+        shrink_k_below_ms: int = 8000,
+        min_k: int = 4,
+        fast_model_below_ms: int = 20000,
+        fast_model: str = "anthropic/claude-3.5-haiku",
+        retrieval_ms: int = 300,
+        rerank_ms: Optional[int] = None,
+        rerank_max_share: float = 0.1,
+        first_token_ms: int = 1500,
+        tokens_per_s: float = 40.0,
+        fast_tokens_per_s: float = 100.0,
+        min_tokens: int = 120,
+        margin_ms: int = 250,
+    ):
+        self.skip_rerank_below_ms = skip_rerank_below_ms
+        self.shrink_k_below_ms = shrink_k_below_ms
+        self.min_k = min_k
+        self.fast_model_below_ms = fast_model_below_ms
+        self.fast_model = fast_model
+        self.retrieval_ms = retrieval_ms
+        self.rerank_ms = rerank_ms
+        self.rerank_max_share = rerank_max_share
+        self.first_token_ms = first_token_ms
+        self.tokens_per_s = tokens_per_s
+        self.fast_tokens_per_s = fast_tokens_per_s
+        self.min_tokens = min_tokens
+        self.margin_ms = margin_ms
+
+        self._degradations = REGISTRY.counter("deadline_degradations_total", "Degradations applied to meet client deadlines")
+        self._requests = REGISTRY.counter("deadline_requests_total", "Answer requests with a client deadline")
+
+    def apply(
+        self,
+        route: Dict,
+        deadline_ms: Optional[int],
+        rerank_topk: Optional[int] = None,
+        rerank_budget_ms: Optional[float] = None,
+    ) -> Dict:
+        """
+        Degrade a route (see query_router.QueryRouter.route) to fit ``deadline_ms``.
+
+        Args:
+            route: Route with ``tier``, ``rule``, ``model``, ``max_tokens``, ``k``
+                and ``top_n``
+            deadline_ms: Client budget counted from ``route["started"]`` (request
+                arrival); None leaves the route as is
+            rerank_topk: Chunks kept by the reranker (None: no reranker configured)
+            rerank_budget_ms: Per-request budget of the reranker, if it has one
+
+        Returns:
+            The route with ``deadline`` (absolute epoch seconds for the LLM
+            call), ``skip_rerank``, ``retrieval_only`` and the list of applied
+            ``degradations``
+        """
+        route = {**route, "deadline": None, "skip_rerank": False, "retrieval_only": False, "degradations": []}
+        if deadline_ms is None:
+            return route
+        self._requests.inc()
+        route["deadline"] = route.get("started", time.time()) + (deadline_ms - self.margin_ms) / 1000.0
+        if route["tier"] == "none":
+            return route  # Answered locally, nothing to degrade
+
+        degradations = route["degradations"]
+        budget_ms = deadline_ms - self.margin_ms - self.retrieval_ms
+        rerank_ms = self.rerank_ms
+        if rerank_ms is None:
+            rerank_ms = rerank_budget_ms if rerank_budget_ms is not None else DEFAULT_RERANK_MS
+        skip_rerank_below_ms = self.skip_rerank_below_ms
+        if skip_rerank_below_ms is None:
+            skip_rerank_below_ms = rerank_ms / self.rerank_max_share
+        reranking = rerank_topk is not None
+        if reranking and deadline_ms < skip_rerank_below_ms:
+            reranking = False
+            route["skip_rerank"] = True
+            route["k"] = min(route["k"] or rerank_topk, rerank_topk)
+            route["top_n"] = None
+            degradations.append("skip_rerank")
+        if reranking:
+            budget_ms -= rerank_ms
+        if deadline_ms < self.shrink_k_below_ms and (route["k"] is None or route["k"] > self.min_k):
+            route["k"] = self.min_k
+            if route["top_n"] is not None:
+                route["top_n"] = min(route["top_n"], self.min_k)
+            degradations.append("shrink_k")
+
+        tokens_per_s = self.tokens_per_s
+        if route["model"] == self.fast_model:
+            tokens_per_s = self.fast_tokens_per_s
+        elif deadline_ms < self.fast_model_below_ms and route["rule"] != "explicit_model":
+            route["model"] = self.fast_model
+            tokens_per_s = self.fast_tokens_per_s
+            degradations.append("fast_model")
+
+        max_tokens = int((budget_ms - self.first_token_ms) / 1000.0 * tokens_per_s)
+        if max_tokens < self.min_tokens:
+            route["retrieval_only"] = True
+            degradations.append("retrieval_only")
+        elif route["max_tokens"] is None or max_tokens < route["max_tokens"]:
+            route["max_tokens"] = max_tokens
+            degradations.append("cap_tokens")
+
+        for degradation in degradations:
+            self._degradations.inc(degradation=degradation)
+        if degradations:
+            logger.info(f"⏱️ {deadline_ms}ms deadline: {', '.join(degradations)}")
+        return route
+
+    def record(self, degradation: str) -> None:
+        """Count a degradation applied after planning (LLM missed the deadline)."""
+        self._degradations.inc(degradation=degradation)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Drug Registry for Direct Status Lookups
+
+A small in-memory registry of drug and fixed dose combination (FDC) names,
+optionally with their regulatory status. The query router uses it to
+recognise single-drug lookups, and registry entries with a status are
+answered directly without retrieval or an LLM call.
+
+Key Features:
+- Plain text (one name per line) or CSV (name,status,notification,date,source)
+- One compiled regex over all names; the longest FDC name wins
+- Formatted answer with the gazette notification and source document
+
+CSV example:
+    name,status,notification,date,source
+    Nimesulide (paediatric),banned for children below 12 years,GSR 1182(E),2011-02-10,cdsco_banned_01Jan2018.pdf
+"""
+
+import csv
+import logging
+import re
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RECORD_FIELDS = ("name", "status", "notification", "date", "source")
+
+
+class DrugRegistry:
+    """
+    Drug / FDC names with optional status records.
+
+    Args:
+        path: ``.csv`` file with at least a ``name`` column, or a text file
+            with one name per line ('#' starts a comment)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict[str, str]] = {}
+        if path.lower().endswith(".csv"):
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    name = (row.get("name") or "").strip()
+                    if name:
+                        record = {field: (row.get(field) or "").strip() for field in RECORD_FIELDS}
+                        self.records[name.lower()] = record
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    name = line.split("#", 1)[0].strip()
+                    if name:
+                        self.records[name.lower()] = {"name": name}
+
+        self._pattern = None
+        if self.records:
+            names = sorted(self.records, key=len, reverse=True)  # Prefer the longest FDC name
+            self._pattern = re.compile(
+                r"(?<!\w)(" + "|".join(re.escape(name) for name in names) + r")(?!\w)", re.IGNORECASE
+            )
+        logger.info(f"💊 Drug registry loaded {len(self.records)} entries from {path}")
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def match(self, query: str) -> List[str]:
+        """Registry names mentioned in the query (lower case, in order, unique)."""
+        if self._pattern is None:
+            return []
+        return list(dict.fromkeys(match.lower() for match in self._pattern.findall(query)))
+
+    def status_record(self, name: str) -> Optional[Dict[str, str]]:
+        """The record of ``name`` if it carries a status."""
+        record = self.records.get(name.lower())
+        return record if record and record.get("status") else None
+
+    @staticmethod
+    def answer(record: Dict[str, str]) -> str:
+        """Direct answer for a registry hit."""
+        lines = [f"**{record['name']}**: {record['status']}"]
+        if record.get("notification"):
+            date = f" dated {record['date']}" if record.get("date") else ""
+            lines.append(f"- Notification: {record['notification']}{date}")
+        if record.get("source"):
+            lines.append(f"- Source: {record['source']}")
+        lines.append("- Answered from the CDSCO drug registry; ask for a detailed analysis for more context.")
+        return "\n".join(lines)
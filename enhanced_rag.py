@@ -6,10 +6,24 @@ This module extends Pathway's BaseRAGQuestionAnswerer to include
 similarity threshold filtering to prevent hallucinations.
 """
 
+import asyncio
+import json
+import time
+
 import pathway as pw
-from pathway.xpacks.llm.question_answering import BaseRAGQuestionAnswerer
+from pathway.xpacks.llm.question_answering import BaseRAGQuestionAnswerer, _get_RAG_prompt_udf
 from typing import List, Dict, Any
 
+from deadline import DEADLINE_NOTICE, DeadlinePolicy
+from lanes import lane_or_default
+from llm_governor import retrieval_only_answer
+from metrics import REGISTRY
+from pharma_llm import PharmaLiteLLMChat
+from prompt_caching import CACHE_CONTROL_MODELS, chat_messages, split_prompt_template
+from reranker import BudgetedCrossEncoderReranker
+from structured_answer import STRUCTURED_SYSTEM_PROMPT, StructuredAnswerFormat, empty_answer
+from summary_cache import DocumentSummaryCache
+
 class FilteredRAGQuestionAnswerer(BaseRAGQuestionAnswerer):
     """
     Enhanced RAG Question Answerer with similarity threshold filtering.
@@ -61,6 +75,419 @@ class FilteredRAGQuestionAnswerer(BaseRAGQuestionAnswerer):
         
         return filtered_docs
 
+class PharmaRAGQuestionAnswerer(BaseRAGQuestionAnswerer):
+    """
+    RAG Question Answerer used by the enhanced pharmaceutical server.
+
+    Adds optional stages to BaseRAGQuestionAnswerer: budgeted reranking,
+    query routing to model tiers and cached document summaries, per-request
+    deadlines, prompt caching, JSON answers and scheduling lanes. Without an
+    LLM answer the response is built from the retrieved documents and marked
+    ``"degraded": true``.
+    """
+
+    def __init__(
+        self,
+        *args,
+        router=None,
+        summary_cache=None,
+        deadline_policy=None,
+        cache_system_prompt: bool = True,
+        cache_control_models: List[str] | None = None,
+        structured=None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.system_prompt = None
+        self.cache_control_models = tuple(cache_control_models or CACHE_CONTROL_MODELS)
+        prompt_template = kwargs.get("prompt_template")
+        if cache_system_prompt and isinstance(prompt_template, str):
+            self.system_prompt, user_template = split_prompt_template(prompt_template)
+            if self.system_prompt is not None:
+                self.prompt_udf = _get_RAG_prompt_udf(user_template)
+        self.router = router
+        if router is not None and summary_cache is None:
+            summary_cache = DocumentSummaryCache()
+        self.summary_cache = summary_cache
+        if deadline_policy is None:
+            deadline_policy = DeadlinePolicy()
+        self.deadline_policy = deadline_policy
+        if structured is None:
+            structured = StructuredAnswerFormat()
+        self.structured = structured
+        self._request_ms = REGISTRY.histogram(
+            "request_latency_ms", "Time from arrival to response of /v1/pw_ai_answer and /v1/retrieve"
+        )
+
+    def chat_messages(self, rag_prompt: str, model: str | None = None) -> List[dict]:
+        """Chat messages for a RAG prompt: cacheable system prompt (if split off) and the query part."""
+        return chat_messages(self.system_prompt, rag_prompt, model, self.cache_control_models)
+
+    def _init_schemas(self, default_llm_name: str | None = None) -> None:
+        """
+        Pathway's schemas; /v1/pw_ai_answer also accepts ``deadline_ms``, ``response_format`` and ``lane``.
+
+        ``received_at`` (answer and retrieve) is set by :meth:`stamp_arrival` when the request reaches the server.
+        """
+        super()._init_schemas(default_llm_name)
+
+        class PharmaAnswerQuerySchema(pw.Schema):
+            prompt: str
+            filters: str | None = pw.column_definition(default_value=None)
+            model: str | None = pw.column_definition(default_value=default_llm_name)
+            return_context_docs: bool = pw.column_definition(default_value=False)
+            deadline_ms: int | None = pw.column_definition(default_value=None)
+            response_format: str | None = pw.column_definition(default_value=None)
+            lane: str | None = pw.column_definition(default_value=None)
+            received_at: float | None = pw.column_definition(default_value=None)
+
+        class PharmaRetrieveQuerySchema(self.indexer.RetrieveQuerySchema):
+            received_at: float | None = pw.column_definition(default_value=None)
+
+        self.AnswerQuerySchema = PharmaAnswerQuerySchema
+        self.RetrieveQuerySchema = PharmaRetrieveQuerySchema
+
+    @staticmethod
+    def stamp_arrival(payload: dict, headers) -> None:
+        """
+        ``request_validator`` of the REST endpoints: record when a request arrived.
+
+        Deadlines and ``request_latency_ms`` count from this time, so the wait
+        for Pathway's next commit and for earlier batches is part of them.
+        """
+        payload["received_at"] = time.time()
+
+    @pw.table_transformer
+    def retrieve(self, retrieve_queries: pw.Table) -> pw.Table:
+        """Retrieve documents from the index, recording the request latency."""
+        @pw.udf
+        def observed(result: pw.Json, received_at: float | None) -> pw.Json:
+            if received_at is not None:
+                self._request_ms.observe((time.time() - received_at) * 1000.0, endpoint="/v1/retrieve")
+            return result
+
+        results = retrieve_queries + self.indexer.retrieve_query(retrieve_queries.without(pw.this.received_at))
+        return results.select(result=observed(pw.this.result, pw.this.received_at))
+
+    def plan(
+        self,
+        prompt: str,
+        model: str | None,
+        filters: str | None = None,
+        deadline_ms: int | None = None,
+        response_format: str | None = None,
+        lane: str | None = None,
+        received_at: float | None = None,
+    ) -> dict:
+        """Route (tier, model, retrieval plan, answer format, lane) of one request, degraded to fit its deadline."""
+        default_model, default_max_tokens = self.llm.model, self.llm.kwargs.get("max_tokens")
+        if self.router is not None:
+            route = self.router.route(prompt, model, default_model, default_max_tokens, filters, self.search_topk)
+        else:
+            route = {
+                "tier": "full", "rule": "default", "intent": None, "model": model or default_model,
+                "max_tokens": default_max_tokens, "retrieve": True, "k": self.search_topk,
+                "metadata_filter": filters, "top_n": None, "started": time.time(),
+            }
+        if received_at is not None:
+            route["started"] = received_at
+        route["format"] = "text"
+        route["lane"] = lane_or_default(lane)
+        if response_format == "json":
+            route = self.structured.apply(route)
+        rerank_topk = self.rerank_topk if self.reranker is not None else None
+        rerank_budget_ms = getattr(self.reranker, "budget_ms", None)
+        return self.deadline_policy.apply(route, deadline_ms, rerank_topk, rerank_budget_ms)
+
+    @pw.table_transformer
+    def answer_query(self, pw_ai_queries: pw.Table) -> pw.Table:
+        """Answer a question based on the available information."""
+        @pw.udf
+        def plan(
+            prompt: str,
+            model: str | None,
+            filters: str | None,
+            deadline_ms: int | None,
+            response_format: str | None,
+            lane: str | None,
+            received_at: float | None,
+        ) -> pw.Json:
+            return pw.Json(self.plan(prompt, model, filters, deadline_ms, response_format, lane, received_at))
+
+        @pw.udf
+        def prepare_response(response: str | None, docs: pw.Json, return_context_docs: bool, route: pw.Json) -> pw.Json:
+            route = route.value
+            doc_list = docs.as_list()
+            degradations = list(route["degradations"])
+            structured = route["format"] == "json"
+            api_response: dict = {"response": json.loads(response) if structured and response else response}
+            if response is None:
+                missed = route["deadline"] is not None and time.time() >= route["deadline"]
+                if missed and "retrieval_only" not in degradations:
+                    # The LLM could not finish in time: cite the sources instead
+                    degradations.append("retrieval_only")
+                    self.deadline_policy.record("retrieval_only")
+                if structured:
+                    api_response = {"response": empty_answer(), "degraded": True}
+                else:
+                    notice = {"notice": DEADLINE_NOTICE} if missed else {}
+                    api_response = {"response": retrieval_only_answer(doc_list, **notice), "degraded": True}
+            if self.router is not None:
+                api_response["tier"] = route["tier"]
+                self.router.observe(route)
+            if degradations:
+                api_response["degradations"] = degradations
+            if return_context_docs:
+                api_response["context_docs"] = doc_list
+            self._request_ms.observe((time.time() - route["started"]) * 1000.0, endpoint="/v1/pw_ai_answer")
+            return pw.Json(api_response)
+
+        pw_ai_queries = pw_ai_queries.with_columns(
+            route=plan(
+                pw.this.prompt,
+                pw.this.model,
+                pw.this.filters,
+                pw.this.deadline_ms,
+                pw.this.response_format,
+                pw.this.lane,
+                pw.this.received_at,
+            )
+        )
+        pw_ai_queries = pw_ai_queries.with_columns(
+            top_n=pw.coalesce(pw.this.route["top_n"].as_int(), self.rerank_topk or self.search_topk)
+        )
+        # Greetings and registry hits are answered without sources
+        retrieve = pw.this.route["retrieve"].as_bool(unwrap=True)
+        direct_queries = pw_ai_queries.filter(~retrieve)
+        pw_ai_queries = pw_ai_queries.filter(retrieve)
+
+        pw_ai_results = pw_ai_queries + self.indexer.retrieve_query(
+            pw_ai_queries.select(
+                metadata_filter=pw.this.route["metadata_filter"].as_str(),
+                filepath_globpattern=pw.cast(str | None, None),
+                query=pw.this.prompt,
+                k=pw.unwrap(pw.this.route["k"].as_int()),
+            )
+        ).select(
+            docs=pw.this.result,
+        )
+
+        if self.reranker is not None:
+            skip_rerank = pw.this.route["skip_rerank"].as_bool(unwrap=True)
+            reranked = self._apply_reranking(pw_ai_results.filter(~skip_rerank))
+            unranked = pw_ai_results.filter(skip_rerank)
+            pw.universes.promise_are_pairwise_disjoint(reranked, unranked)
+            pw_ai_results = reranked.concat(unranked)
+
+        pw_ai_results += pw_ai_results.select(
+            context=self.docs_to_context_transformer(pw.this.docs)
+        )
+
+        pw_ai_results += pw_ai_results.select(
+            rag_prompt=self.prompt_udf(pw.this.context, pw.this.prompt)
+        )
+
+        @pw.udf
+        def no_docs(prompt: str) -> pw.Json:
+            return pw.Json([])
+
+        direct_results = direct_queries.with_columns(
+            docs=no_docs(pw.this.prompt), context="", rag_prompt=""
+        )
+        pw.universes.promise_are_pairwise_disjoint(pw_ai_results, direct_results)
+        pw_ai_results = self._answer_routed(pw_ai_results.concat(direct_results))
+
+        pw_ai_results += pw_ai_results.select(
+            result=prepare_response(
+                pw.this.response, pw.this.docs, pw.this.return_context_docs, pw.this.route
+            )
+        )
+
+        return pw_ai_results
+
+    def _answer_routed(self, pw_ai_results: pw.Table) -> pw.Table:
+        """
+        Fill the response column per route.
+
+        ``none`` and retrieval-only rows never reach the LLM UDF, ``summary``
+        rows go through the document summary cache, structured (JSON) rows
+        get the extraction prompt and validated output; the other rows call
+        the LLM with the route's model, max_tokens and deadline.
+        """
+
+        @pw.udf
+        def rag_messages(rag_prompt: str, model: str | None) -> pw.Json:
+            return pw.Json(self.chat_messages(rag_prompt, model))
+
+        @pw.udf
+        def structured_messages(context: str, prompt: str, model: str | None) -> pw.Json:
+            user_prompt = self.structured.user_prompt(context, prompt)
+            return pw.Json(chat_messages(STRUCTURED_SYSTEM_PROMPT, user_prompt, model, self.cache_control_models))
+
+        @pw.udf
+        def response_format(model: str | None) -> pw.Json | None:
+            schema_format = self.structured.response_format(model)
+            return pw.Json(schema_format) if schema_format is not None else None
+
+        @pw.udf
+        def validated(response: str | None) -> str | None:
+            answer = self.structured.validate(response)
+            return json.dumps(answer) if answer is not None else None
+
+        @pw.udf
+        def local_answer(route: pw.Json, docs: pw.Json) -> str | None:
+            route = route.value
+            if route["format"] == "json":
+                return None if route["retrieval_only"] else json.dumps(self.structured.local(route))
+            if route["retrieval_only"]:
+                return retrieval_only_answer(docs.as_list(), notice=DEADLINE_NOTICE)
+            return self.router.local_answer(route, docs.as_list())
+
+        @pw.udf
+        def document_query(docs: pw.Json) -> pw.Json:
+            return pw.Json(self.summary_cache.document_query(docs.as_list()))
+
+        @pw.udf
+        async def summary_answer(route: pw.Json, docs: pw.Json, document_chunks: pw.Json) -> str | None:
+            return await self.summarize_documents(
+                docs.as_list(),
+                document_chunks.as_list(),
+                route.value["model"],
+                route.value["deadline"],
+                route.value["lane"],
+            )
+
+        tier = pw.this.route["tier"].as_str()
+        local = (tier == "none") | pw.this.route["retrieval_only"].as_bool(unwrap=True)
+        structured = pw.this.route["format"].as_str() == "json"
+        local_rows = pw_ai_results.filter(local)
+        structured_rows = pw_ai_results.filter(~local & structured)
+        summary_rows = pw_ai_results.filter(~local & ~structured & (tier == "summary"))
+        llm_rows = pw_ai_results.filter(~local & ~structured & (tier != "summary"))
+
+        llm_kwargs = {
+            "model": pw.this.route["model"].as_str(),
+            "max_tokens": pw.this.route["max_tokens"].as_int(),
+        }
+        if isinstance(self.llm, PharmaLiteLLMChat):
+            llm_kwargs["tier"] = tier
+            llm_kwargs["deadline"] = pw.this.route["deadline"].as_float()
+            llm_kwargs["lane"] = pw.this.route["lane"].as_str()
+        llm_rows = llm_rows.with_columns(
+            response=self.llm(rag_messages(pw.this.rag_prompt, llm_kwargs["model"]), **llm_kwargs)
+        ).await_futures()
+        structured_rows = structured_rows.with_columns(
+            response=self.llm(
+                structured_messages(pw.this.context, pw.this.prompt, llm_kwargs["model"]),
+                temperature=self.structured.temperature,
+                response_format=response_format(llm_kwargs["model"]),
+                **llm_kwargs,
+            )
+        ).await_futures()
+        structured_rows = structured_rows.with_columns(response=validated(pw.this.response))
+        local_rows = local_rows.with_columns(response=local_answer(pw.this.route, pw.this.docs))
+        # Summaries are built from the top document's own chunks, not from the question's retrieval
+        summary_rows = summary_rows.with_columns(document_query=document_query(pw.this.docs))
+        summary_rows += self.indexer.retrieve_query(
+            summary_rows.select(
+                metadata_filter=pw.this.document_query["metadata_filter"].as_str(),
+                filepath_globpattern=pw.cast(str | None, None),
+                query=pw.unwrap(pw.this.document_query["query"].as_str()),
+                k=pw.unwrap(pw.this.document_query["k"].as_int()),
+            )
+        ).select(
+            document_chunks=pw.this.result,
+        )
+        summary_rows = summary_rows.with_columns(
+            response=summary_answer(pw.this.route, pw.this.docs, pw.this.document_chunks)
+        ).without(pw.this.document_query, pw.this.document_chunks)
+
+        pw.universes.promise_are_pairwise_disjoint(llm_rows, structured_rows, local_rows, summary_rows)
+        return llm_rows.concat(structured_rows, local_rows, summary_rows)
+
+    async def summarize_documents(
+        self,
+        docs: List[dict],
+        document_chunks: List[dict],
+        model: str | None = None,
+        deadline: float | None = None,
+        lane: str = "interactive",
+    ) -> str | None:
+        """
+        Cached summary of the best matching document (None if unavailable).
+
+        The cache runs in a worker thread; a miss calls the LLM UDF's function
+        (``self.llm.func``, with the UDF's executor options) on the caller's event loop.
+        """
+        loop = asyncio.get_running_loop()
+        kwargs = {"model": model or self.llm.model, "max_tokens": self.summary_cache.max_tokens}
+        if isinstance(self.llm, PharmaLiteLLMChat):
+            kwargs["tier"] = "summary"
+            kwargs["deadline"] = deadline
+            kwargs["lane"] = lane
+
+        def llm_call(messages: List[dict]) -> str | None:
+            answer = self.llm.func(messages, **kwargs)
+            if asyncio.iscoroutine(answer):
+                answer = asyncio.run_coroutine_threadsafe(answer, loop).result()
+            return answer
+
+        return await asyncio.to_thread(self.summary_cache.summarize, docs, document_chunks, llm_call)
+
+    def _apply_reranking(self, pw_ai_results: pw.Table) -> pw.Table:
+        """
+        Rerank retrieved documents.
+
+        Same flow as the Pathway implementation, but the reranker receives the
+        whole document (text, metadata and 'dist') instead of the bare text, so
+        BudgetedCrossEncoderReranker can fall back to the retrieval order.
+        """
+
+        @pw.udf
+        def add_score_to_doc(doc: pw.Json, score: float) -> dict:
+            return {**doc.as_dict(), "reranker_score": score}
+
+        @pw.udf
+        def limit_documents(docs: tuple, k: int) -> pw.Json:
+            return pw.Json([doc.value for doc in docs[:k]])
+
+        # One row per (query, candidate chunk)
+        exploded = pw_ai_results.flatten(pw_ai_results.docs, origin_id="query_id")
+
+        keep = pw.this.top_n if "top_n" in pw_ai_results.column_names() else self.rerank_topk
+        # Concurrent requests with the same question keep separate rerank budgets
+        per_request = {}
+        if isinstance(self.reranker, BudgetedCrossEncoderReranker):
+            per_request["request_id"] = pw.this.query_id
+        scored = exploded.select(
+            pw.this.query_id,
+            top_n=keep,
+            doc=pw.this.docs,
+            reranker_score=self.reranker(pw.this.docs, pw.this.prompt, **per_request),
+        ).await_futures()
+
+        scored = scored.with_columns(
+            sort_key=-pw.this.reranker_score,
+            doc_with_score=add_score_to_doc(pw.this.doc, pw.this.reranker_score),
+        )
+
+        # Reassemble each request's candidates in score order and keep the top k
+        reranked = (
+            scored.groupby(pw.this.query_id, sort_by=pw.this.sort_key)
+            .reduce(
+                query_id=pw.this.query_id,
+                top_n=pw.reducers.max(pw.this.top_n),
+                docs=pw.reducers.tuple(pw.this.doc_with_score),
+            )
+            .with_id(pw.this.query_id)
+            .select(docs=limit_documents(pw.this.docs, pw.this.top_n))
+        )
+
+        # Requests that retrieved nothing keep their (empty) docs untouched
+        return pw_ai_results.update_cells(
+            reranked.promise_universe_is_subset_of(pw_ai_results)
+        )
+
 # Configuration for enhanced YAML
 enhanced_config_template = """
 # Enhanced RAG Configuration with Similarity Filtering
@@ -1,9 +1,10 @@
-from flask import Flask, render_template_string, request, redirect, url_for, jsonify
+from flask import Flask, render_template_string, request, redirect, url_for, jsonify, Response, stream_with_context
 import os
 import requests
 import json
 from werkzeug.utils import secure_filename
 import time
+import threading
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'pharma-safe-secret-key-2024'
@@ -18,14 +19,42 @@ if not os.path.exists(upload_path):
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf'}
 
+# Streaming (SSE) answer endpoint of the enhanced RAG server
+STREAM_API_URL = os.getenv("STREAM_API_URL", "http://82.112.235.26:8003/v1/pw_ai_answer_stream")
+
+# Asynchronous job API (submit, poll, result) for analyses that outlast the 120s timeout
+JOBS_API_URL = os.getenv("JOBS_API_URL", "http://82.112.235.26:8003/v1/jobs")
+
+# Resumable (tus-style) upload endpoint of the upload server; large files are sent in parts through the relay below
+RESUMABLE_UPLOAD_URL = os.getenv("RESUMABLE_UPLOAD_URL", "http://82.112.235.26:8001/v1/upload/resumable")
+RESUMABLE_REQUEST_HEADERS = ('Tus-Resumable', 'Upload-Length', 'Upload-Metadata', 'Upload-Offset', 'Upload-Part-Size',
+                             'Content-Type')
+RESUMABLE_RESPONSE_HEADERS = ('Tus-Resumable', 'Tus-Version', 'Tus-Extension', 'Tus-Max-Size', 'Upload-Offset',
+                              'Upload-Length', 'Upload-Part-Size', 'Upload-Part-Offsets', 'Cache-Control')
+
+# Optional JSONL query log (arrival time, endpoint, prompt) for replay_load_test.py
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "")
+query_log_lock = threading.Lock()
+
+def log_query(endpoint, query):
+    """Append one search request to the query log when QUERY_LOG_PATH is set"""
+    if not QUERY_LOG_PATH:
+        return
+    entry = json.dumps({"ts": time.time(), "endpoint": endpoint, "prompt": query}, ensure_ascii=False)
+    try:
+        with query_log_lock, open(QUERY_LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(entry + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write query log: {str(e)}")
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def call_search_api(query):
+def call_search_api(query, deadline_ms=None):
     """
     Real API function to call the external search API
     API Endpoint: http://82.112.235.26:8001/v1/pw_ai_answer
-    Format: {"prompt": "query text"}
+    Format: {"prompt": "query text", "deadline_ms": optional client budget}
     """
     api_url = "http://82.112.235.26:8001/v1/pw_ai_answer"
     
@@ -33,6 +62,11 @@ def call_search_api(query):
     request_data = {
         "prompt": query
     }
+    timeout = 120  # 2 minutes timeout
+    if deadline_ms:
+        # The server degrades the answer to fit the client's budget
+        request_data["deadline_ms"] = int(deadline_ms)
+        timeout = min(timeout, deadline_ms / 1000 + 5)
     
     headers = {
         'Content-Type': 'application/json'
@@ -45,7 +79,7 @@ def call_search_api(query):
     print(f"📡 Making external API call...")
     
     try:
-        # Make the API call with 2-minute timeout
+        # Make the API call with 2-minute timeout (or the client deadline)
         print("📡 Sending request...")
         print(f"🌐 URL: {api_url}")
         print(f"📦 Headers: {headers}")
@@ -55,7 +89,7 @@ def call_search_api(query):
             api_url,
             json=request_data,
             headers=headers,
-            timeout=120  # 2 minutes timeout
+            timeout=timeout
         )
         
         print(f"✅ Response Status: {response.status_code}")
@@ -82,10 +116,10 @@ def call_search_api(query):
             }
             
     except requests.exceptions.Timeout:
-        print("⏰ API call timed out after 2 minutes")
+        print(f"⏰ API call timed out after {timeout:.0f} seconds")
         return {
             "status": "error",
-            "error": "API request timed out after 2 minutes",
+            "error": f"API request timed out after {timeout:.0f} seconds",
             "prompt": query,
             "api_url": api_url
         }
@@ -171,10 +205,8 @@ def analyze():
         return redirect('/')
     
     try:
-        # Call API for search queries
-        if analysis_type == 'search':
-            api_response = call_search_api(query)
-        
+        # Results are passed from the search page via sessionStorage; re-querying
+        # here would block the page load for a second full LLM answer
         template = load_template('result.html')
         return render_template_string(template)
     except Exception as e:
@@ -296,6 +328,52 @@ def api_upload_files():
             'message': f'Upload failed: {str(e)}'
         }), 500
 
+def relay_resumable_upload(url, location_base):
+    """
+    Forward one resumable upload call to the upload server.
+
+    PATCH bodies are streamed through in chunks as they arrive (no file.save,
+    no second copy in memory); each part stays below MAX_CONTENT_LENGTH.
+    """
+    headers = {name: request.headers[name] for name in RESUMABLE_REQUEST_HEADERS if name in request.headers}
+    body = None
+    if request.method == 'PATCH':
+        body = iter(lambda: request.stream.read(64 * 1024), b'')
+    try:
+        upstream = requests.request(request.method, url, headers=headers, data=body, timeout=(10, 120))
+    except requests.exceptions.RequestException as e:
+        print(f"🌐 Upload API connection error: {str(e)}")
+        return jsonify({'error': f'Connection error: {str(e)}'}), 502
+
+    response = Response(upstream.content, status=upstream.status_code,
+                        content_type=upstream.headers.get('Content-Type'))
+    for name in RESUMABLE_RESPONSE_HEADERS:
+        if name in upstream.headers:
+            response.headers[name] = upstream.headers[name]
+    if 'Location' in upstream.headers:
+        # Point clients at the relay instead of the upload server
+        response.headers['Location'] = f"{location_base}/{upstream.headers['Location'].rstrip('/').rsplit('/', 1)[-1]}"
+    return response
+
+@app.route('/pharmai/api/uploads/resumable', methods=['POST', 'OPTIONS'])
+@app.route('/api/uploads/resumable', methods=['POST', 'OPTIONS'])
+def api_create_resumable_upload():
+    """
+    Start a resumable upload.
+
+    Headers: Upload-Length and Upload-Metadata ("filename <base64>"). The
+    response names the part size; the browser then PATCHes the parts in
+    parallel and resumes each one from HEAD's Upload-Part-Offsets after a
+    broken connection.
+    """
+    return relay_resumable_upload(RESUMABLE_UPLOAD_URL, request.path.rstrip('/'))
+
+@app.route('/pharmai/api/uploads/resumable/<upload_id>', methods=['HEAD', 'GET', 'PATCH', 'DELETE'])
+@app.route('/api/uploads/resumable/<upload_id>', methods=['HEAD', 'GET', 'PATCH', 'DELETE'])
+def api_resumable_upload(upload_id):
+    """Offsets (HEAD), progress and result (GET), a part (PATCH) or cancellation (DELETE)"""
+    return relay_resumable_upload(f"{RESUMABLE_UPLOAD_URL}/{upload_id}", request.path.rsplit('/', 1)[0])
+
 @app.route('/pharmai/api/search', methods=['POST'])
 @app.route('/api/search', methods=['POST'])
 def api_search():
@@ -307,8 +385,9 @@ def api_search():
         
         query = data['prompt']
         print(f"📥 Received prompt from frontend: {query}")
+        log_query("answer", query)
         
-        response = call_search_api(query)
+        response = call_search_api(query, data.get('deadline_ms'))
         
         print(f"📤 Sending response to frontend: {json.dumps(response, indent=2)}")
         return jsonify(response)
@@ -316,6 +395,97 @@ def api_search():
         print(f"❌ Backend API Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/pharmai/api/search/stream', methods=['POST'])
+@app.route('/api/search/stream', methods=['POST'])
+def api_search_stream():
+    """
+    Streaming passthrough for search queries.
+
+    Relays the server-sent events of /v1/pw_ai_answer_stream to the browser as
+    they arrive (context, token, done, error), so the first tokens are visible
+    long before the full answer is complete.
+    """
+    data = request.get_json(silent=True)
+    if not data or 'prompt' not in data:
+        return jsonify({'error': 'No prompt provided'}), 400
+
+    query = data['prompt']
+    print(f"📥 Received streaming prompt from frontend: {query}")
+    log_query("stream", query)
+
+    try:
+        upstream = requests.post(
+            STREAM_API_URL,
+            json={"prompt": query},
+            headers={'Accept': 'text/event-stream'},
+            stream=True,
+            timeout=(10, 120)  # connect timeout, max gap between chunks
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"🌐 Streaming connection error: {str(e)}")
+        return jsonify({'error': f'Connection error: {str(e)}'}), 502
+
+    if upstream.status_code != 200:
+        upstream.close()
+        return jsonify({'error': f'API returned status {upstream.status_code}'}), upstream.status_code
+
+    def relay():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                if chunk:
+                    yield chunk
+        finally:
+            upstream.close()
+
+    return Response(
+        stream_with_context(relay()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def relay_job_api(method, url, payload=None):
+    """Forward one job API call and return its JSON body and status unchanged"""
+    try:
+        upstream = requests.request(method, url, json=payload, timeout=30)
+    except requests.exceptions.RequestException as e:
+        print(f"🌐 Job API connection error: {str(e)}")
+        return jsonify({'error': f'Connection error: {str(e)}'}), 502
+    try:
+        body = upstream.json()
+    except ValueError:
+        body = {'error': f'API returned status {upstream.status_code}'}
+    return jsonify(body), upstream.status_code
+
+@app.route('/pharmai/api/jobs', methods=['POST'])
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """
+    Submit a long-running analysis as a job.
+
+    Returns the job id at once (202); the browser then polls
+    /api/jobs/<job_id> and fetches /api/jobs/<job_id>/result, so no request
+    has to stay open for the whole analysis.
+    """
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('payload'), dict):
+        return jsonify({'error': 'No job payload provided'}), 400
+    if data.get('kind', 'answer') == 'answer' and 'prompt' in data['payload']:
+        log_query("job", data['payload']['prompt'])
+    print(f"📥 Submitting {data.get('kind', 'answer')} job")
+    return relay_job_api('POST', JOBS_API_URL, data)
+
+@app.route('/pharmai/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def api_job(job_id):
+    """Job status (GET) or cancellation (DELETE)"""
+    return relay_job_api(request.method, f"{JOBS_API_URL}/{job_id}")
+
+@app.route('/pharmai/api/jobs/<job_id>/result', methods=['GET'])
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def api_job_result(job_id):
+    """Job result: 200 when ready, 202 while queued or running"""
+    return relay_job_api('GET', f"{JOBS_API_URL}/{job_id}/result")
+
 @app.route('/pharmai/api/analyze-documents', methods=['POST'])
 @app.route('/api/analyze-documents', methods=['POST'])
 def api_analyze_documents():
@@ -448,7 +618,7 @@ def not_found(error):
 @app.errorhandler(413)
 def too_large(error):
     """Handle file too large errors"""
-    return jsonify({'error': 'File too large. Maximum size is 16MB'}), 413
+    return jsonify({'error': 'File too large. Maximum size is 16MB - use /api/uploads/resumable for larger files'}), 413
 
 @app.errorhandler(500)
 def internal_error(error):
@@ -458,7 +628,8 @@ def internal_error(error):
 if __name__ == '__main__':
     print("🚀 Starting PharmaSafe Server...")
     print("🌐 Access the application at: http://localhost:8002/ or http://localhost:8002/pharmai")
-    print("📡 API endpoints: /api/search, /api/upload-files (with /pharmai prefix support)")
+    print("📡 API endpoints: /api/search, /api/search/stream, /api/jobs, /api/upload-files, /api/uploads/resumable "
+          "(with /pharmai prefix support)")
     print("❤️ Health check: /health or /pharmai/health")
     print("\n🔧 Dual routes configured for Traefik compatibility:")
     print("   • Main app: / and /pharmai")
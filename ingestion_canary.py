@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Ingestion Canary: Synthetic Time-to-Searchable Probe
+
+The ingestion status records (ingestion_status.py) measure how long real
+documents take to become searchable, but only when documents arrive. The
+canary measures it continuously: every ``interval_s`` it drops a small
+synthetic text file into ./data, probes /v1/retrieve until the file's chunk is
+returned, records the elapsed time and deletes the file again (which also
+removes it from the index).
+
+Probes are restricted to the canary file with ``filepath_globpattern``, and
+the canary text is a nonsense token, so canaries do not show up in answers to
+real questions.
+
+Usage:
+    # One probe against a running server (exit code 1 if not searchable in time)
+    python ingestion_canary.py --once --url http://127.0.0.1:8001
+
+    # Probe every 10 minutes
+    python ingestion_canary.py --interval 600
+
+Key Features:
+- End-to-end probe: file system detection, parsing, splitting, embedding, index insert
+- ``ingestion_canary_ms`` histogram, last result gauges and outcome counter on /v1/metrics
+- Runs in-process (``ingestion_canary`` block of the YAML config) or as a CLI
+- Removes its files after each probe and leftovers from interrupted runs
+"""
+
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict
+
+from aiohttp import ClientSession, ClientTimeout
+
+from ingestion_status import CANARY_PREFIX, SEARCHABLE_BUCKETS_MS
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionCanary:
+    """
+    Periodic synthetic document probe.
+
+    Args:
+        data_dir: Directory watched by the Pathway pipeline
+        retrieve_url: Pathway /v1/retrieve endpoint (the apps set it from their port)
+        interval_s: Seconds between probes
+        timeout_s: Seconds after which an unsearchable canary counts as a timeout
+        probe_interval_s: Seconds between retrieve requests of one probe
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "./data",
+        retrieve_url: str = "http://127.0.0.1:8001/v1/retrieve",
+        interval_s: float = 600.0,
+        timeout_s: float = 900.0,
+        probe_interval_s: float = 2.0,
+    ):
+        self.data_dir = data_dir
+        self.retrieve_url = retrieve_url
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.probe_interval_s = probe_interval_s
+
+        self._searchable_ms = REGISTRY.histogram(
+            "ingestion_canary_ms", "Time until a canary document was retrievable", buckets=SEARCHABLE_BUCKETS_MS
+        )
+        self._last_ms = REGISTRY.gauge("ingestion_canary_last_ms", "Time to searchable of the last found canary")
+        self._last_success = REGISTRY.gauge(
+            "ingestion_canary_last_success", "Unix time of the last canary found by retrieval"
+        )
+        self._probes = REGISTRY.counter("ingestion_canary_total", "Canary probes by outcome")
+
+    def _write(self, token: str) -> str:
+        path = os.path.join(self.data_dir, f"{CANARY_PREFIX}{token}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Ingestion canary {token}. Synthetic notice used to measure time to searchable.\n")
+        return path
+
+    def remove_leftovers(self) -> int:
+        """Delete canary files of interrupted probes; returns their number."""
+        removed = 0
+        for path in glob.glob(os.path.join(self.data_dir, f"{CANARY_PREFIX}*")):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    async def _is_searchable(self, session: ClientSession, token: str) -> bool:
+        payload = {
+            "query": f"Ingestion canary {token}",
+            "k": 1,
+            "filepath_globpattern": f"**/{CANARY_PREFIX}{token}.txt",
+        }
+        async with session.post(self.retrieve_url, json=payload) as response:
+            response.raise_for_status()
+            docs = await response.json()
+        return any(token in doc.get("text", "") for doc in docs or [])
+
+    async def probe_once(self) -> Dict[str, Any]:
+        """
+        Drop one canary and wait until it is retrievable.
+
+        Returns:
+            {"outcome": "found" | "timeout" | "error", "token", "searchable_ms", "error"}
+        """
+        token = uuid.uuid4().hex
+        result: Dict[str, Any] = {"outcome": "error", "token": token, "searchable_ms": None, "error": None}
+        try:
+            path = await asyncio.to_thread(self._write, token)
+        except OSError as e:
+            result["error"] = f"Cannot write canary: {e}"
+            self._probes.inc(outcome="error")
+            return result
+
+        landed = time.monotonic()
+        try:
+            async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+                while time.monotonic() - landed < self.timeout_s:
+                    try:
+                        if await self._is_searchable(session, token):
+                            elapsed_ms = (time.monotonic() - landed) * 1000.0
+                            result.update(outcome="found", searchable_ms=round(elapsed_ms, 1), error=None)
+                            break
+                    except Exception as e:
+                        result["error"] = str(e) or type(e).__name__  # Keep probing: the server may be busy
+                    await asyncio.sleep(self.probe_interval_s)
+                else:
+                    result["outcome"] = "timeout"
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        self._probes.inc(outcome=result["outcome"])
+        if result["outcome"] == "found":
+            self._searchable_ms.observe(result["searchable_ms"])
+            self._last_ms.set(result["searchable_ms"])
+            self._last_success.set(time.time())
+            logger.info(f"🐤 Canary searchable after {result['searchable_ms']:.0f}ms")
+        else:
+            reason = result["error"] or "no match"
+            logger.warning(f"⚠️ Canary not searchable within {self.timeout_s:.0f}s: {reason}")
+        return result
+
+    async def run(self) -> None:
+        """Probe every ``interval_s`` until cancelled."""
+        if self.remove_leftovers():
+            logger.info("🧹 Removed canary files of an interrupted run")
+        while True:
+            started = time.monotonic()
+            await self.probe_once()
+            await asyncio.sleep(max(self.interval_s - (time.monotonic() - started), 0.0))
+
+    def start(self) -> threading.Thread:
+        """Run the canary on its own event loop in a daemon thread."""
+        thread = threading.Thread(target=lambda: asyncio.run(self.run()), name="ingestion-canary", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long a new document takes to become searchable")
+    parser.add_argument("--data-dir", default="./data", help="Directory watched by the pipeline")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Pathway server base URL")
+    parser.add_argument("--interval", type=float, default=600.0, help="Seconds between probes")
+    parser.add_argument("--timeout", type=float, default=900.0, help="Seconds until a probe times out")
+    parser.add_argument("--once", action="store_true", help="Run a single probe and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    canary = IngestionCanary(
+        data_dir=args.data_dir,
+        retrieve_url=args.url.rstrip("/") + "/v1/retrieve",
+        interval_s=args.interval,
+        timeout_s=args.timeout,
+    )
+    if not args.once:
+        asyncio.run(canary.run())
+        return
+    canary.remove_leftovers()
+    result = asyncio.run(canary.probe_once())
+    print(f"🐤 {result['outcome']}: {result['searchable_ms'] or '-'} ms {result['error'] or ''}")
+    raise SystemExit(0 if result["outcome"] == "found" else 1)
+
+
+if __name__ == "__main__":
+    main()
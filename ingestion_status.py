@@ -0,0 +1,827 @@
+#!/usr/bin/env python3
+"""
+Per-File Ingestion Status Tracking
+
+"Available for queries in ~30 seconds" is a guess. Every file that reaches
+./data (through /v1/upload or rsync) is tracked through the stages of the
+Pathway document pipeline instead:
+
+    received -> parsed -> chunked -> embedded -> indexed
+                (any stage) -> failed
+
+TrackedDocumentStore is a DocumentStore that reports its intermediate tables
+(input files, parsed documents, chunks and the embedded chunks of the vector
+index) to an IngestionStatusTracker. A file is ``indexed`` at the end of the
+Pathway commit that added its embeddings to the index; queries from then on
+find it. ThrottledParser reports parse failures and documents without text.
+
+The upload service (upload_service.py, its own process) opens the same
+database and exposes the records:
+
+    GET /v1/uploads                 -> recent files, ?state=... filters
+    GET /v1/uploads/{id}            -> state, stage timestamps and stage timings
+    GET /v1/uploads/{id}/events     -> SSE stream of the file's state changes
+    GET /v1/uploads/events          -> SSE stream of all state changes
+    GET /v1/uploads/batches/{id}    -> state of every document extracted from one archive
+    GET /v1/uploads/batches/{id}/events -> SSE stream of the batch until no document is processing
+
+Key Features:
+- SQLite-backed state machine per file with a timestamp per stage
+- Stage timings and time to searchable per file
+- Push notifications over Server-Sent Events until a file is indexed or failed
+- Works for uploaded files and files copied into ./data directly
+- Shared by the indexer and upload service processes; changes written by one
+  are polled and pushed to the SSE subscribers of the other
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import pathway as pw
+from aiohttp import web
+from pathway.xpacks.llm.document_store import DocumentStore
+
+from answer_stream import format_sse
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("received", "parsed", "chunked", "embedded", "indexed")
+FINAL_STATES = ("indexed", "failed")
+STATES = STAGES + ("failed",)
+
+# Pipeline stages of the time-to-searchable breakdown: (name, timestamp column)
+BREAKDOWN = (
+    ("detect", "detected_at"),
+    ("parse", "parsed_at"),
+    ("split", "chunked_at"),
+    ("embed", "embedded_at"),
+    ("index", "indexed_at"),
+)
+CANARY_PREFIX = "pharmarag-canary-"
+SEARCHABLE_BUCKETS_MS = (
+    100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000, 600000, 1800000, 3600000
+)
+
+SSE_KEEPALIVE_S = 15.0
+EARLY_REPORTS = 1000  # Parser reports kept until the pipeline has seen the file
+PUBLISHED_MEMORY = 10000  # Last published change per record, so polled changes are pushed once
+FOLLOW_OVERLAP_S = 5.0  # Changes committed late by another process are still picked up
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    source TEXT NOT NULL,
+    state TEXT NOT NULL,
+    sha256 TEXT,
+    size INTEGER,
+    chunks INTEGER,
+    error TEXT,
+    received_at REAL NOT NULL,
+    parsed_at REAL,
+    chunked_at REAL,
+    embedded_at REAL,
+    indexed_at REAL,
+    detected_at REAL,
+    failed_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_path ON files (path, received_at);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+CREATE INDEX IF NOT EXISTS files_updated ON files (updated_at);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    archive TEXT NOT NULL,
+    skipped TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_files (
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    member TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    document_id TEXT,
+    file_id TEXT,
+    duplicate INTEGER NOT NULL,
+    PRIMARY KEY (batch_id, position)
+);
+"""
+
+
+class IngestionStatusTracker:
+    """
+    SQLite-backed ingestion state of every file.
+
+    Methods are blocking and thread-safe: the Pathway pipeline reports from
+    its own threads, the upload service reads through ``asyncio.to_thread``.
+    The indexer and the upload service open the same database file from
+    their own processes (WAL mode); ``publish_changes`` pushes the changes
+    made by the other process to this process's subscribers.
+
+    Args:
+        path: SQLite database file (":memory:" for a throwaway tracker)
+        retention_s: Seconds records are kept after their last change
+    """
+
+    def __init__(self, path: str = "ingestion_status.db", retention_s: float = 7 * 86400.0):
+        self.path = path
+        self.retention_s = retention_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        if "detected_at" not in columns:  # Databases created before the time-to-searchable breakdown
+            self._conn.execute("ALTER TABLE files ADD COLUMN detected_at REAL")
+        self.started_at = time.time()
+        self._subscribers: List[tuple] = []
+        self._early: OrderedDict = OrderedDict()
+        self._published: OrderedDict = OrderedDict()
+        self._transitions = REGISTRY.counter("ingestion_transitions_total", "Files entering an ingestion state")
+        self._searchable_ms = REGISTRY.histogram(
+            "time_to_searchable_ms", "Time from a file landing in ./data to its chunks being retrievable",
+            buckets=SEARCHABLE_BUCKETS_MS,
+        )
+        self._stage_ms = REGISTRY.histogram(
+            "ingestion_stage_ms", "Time spent per ingestion stage of indexed files", buckets=SEARCHABLE_BUCKETS_MS
+        )
+
+    # ------------------------------------------------------------------
+    # Pipeline and upload reports
+    # ------------------------------------------------------------------
+
+    def _latest(self, path: str) -> Optional[sqlite3.Row]:
+        # Pathway reports paths as given to the connector; uploads know theirs relative to ./data
+        return self._conn.execute(
+            "SELECT * FROM files WHERE path = ? ORDER BY received_at DESC, rowid DESC LIMIT 1",
+            (os.path.abspath(path),),
+        ).fetchone()
+
+    def _create(
+        self,
+        filename: str,
+        path: str,
+        source: str,
+        sha256: Optional[str],
+        size: Optional[int],
+        received_at: Optional[float] = None,
+    ) -> str:
+        file_id = uuid.uuid4().hex
+        now = time.time()
+        if filename.startswith(CANARY_PREFIX):
+            source = "canary"
+        self._conn.execute(
+            "INSERT INTO files (id, filename, path, source, state, sha256, size, received_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'received', ?, ?, ?, ?)",
+            (file_id, filename, os.path.abspath(path), source, sha256, size, received_at or now, now),
+        )
+        self._transitions.inc(state="received")
+        return file_id
+
+    def register_upload(
+        self, filename: str, path: str, size: Optional[int] = None, sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Record a file written by the upload endpoint; returns its record."""
+        with self._lock:
+            latest = self._latest(path)
+            if latest is not None and latest["state"] not in FINAL_STATES:
+                # The pipeline picked the file up before the upload handler got here
+                file_id = latest["id"]
+                self._conn.execute(
+                    "UPDATE files SET filename = ?, source = 'upload', size = COALESCE(?, size), "
+                    "sha256 = COALESCE(sha256, ?) WHERE id = ?",
+                    (filename, size, sha256, file_id),
+                )
+            else:
+                file_id = self._create(filename, path, "upload", sha256, size)
+        return self._publish(file_id)
+
+    def file_seen(
+        self, path: str, sha256: str, size: int, landed_at: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        The pipeline read a file from disk; starts tracking files that were not uploaded.
+
+        Args:
+            landed_at: When the file appeared in ./data (its mtime) for files that
+                were not uploaded; files older than the tracker count from its start
+
+        Returns the record, or None if the file is unchanged since it was last indexed.
+        """
+        now = time.time()
+        with self._lock:
+            latest = self._latest(path)
+            if latest is not None and latest["state"] not in FINAL_STATES:
+                file_id = latest["id"]
+                self._conn.execute(
+                    "UPDATE files SET sha256 = ?, size = ?, detected_at = COALESCE(detected_at, ?) WHERE id = ?",
+                    (sha256, size, now, file_id),
+                )
+            elif latest is not None and latest["sha256"] == sha256:
+                self._early.pop(sha256, None)
+                return None  # Same content read again (e.g. after a restart)
+            else:
+                received_at = min(max(landed_at or now, self.started_at), now)
+                file_id = self._create(os.path.basename(path), path, "watch", sha256, size, received_at)
+                self._conn.execute("UPDATE files SET detected_at = ? WHERE id = ?", (now, file_id))
+            self._apply_early(sha256)
+        return self._publish(file_id)
+
+    def _advance(
+        self, row: Optional[sqlite3.Row], stage: str, chunks: Optional[int] = None, at: Optional[float] = None
+    ) -> Optional[str]:
+        if stage not in STAGES:
+            raise ValueError(f"unknown stage {stage}; stages are {list(STAGES)}")
+        if row is None or row["state"] in FINAL_STATES:
+            return None
+        if row[f"{stage}_at"] is not None and chunks is None:
+            return None
+        now = time.time()
+        state = stage if STAGES.index(stage) > STAGES.index(row["state"]) else row["state"]
+        self._conn.execute(
+            f"UPDATE files SET state = ?, {stage}_at = COALESCE({stage}_at, ?), updated_at = ?, "
+            "chunks = CASE WHEN ? IS NULL THEN chunks ELSE COALESCE(chunks, 0) + ? END WHERE id = ?",
+            (state, at or now, now, chunks, chunks, row["id"]),
+        )
+        if state != row["state"]:
+            self._transitions.inc(state=state)
+            if state == "indexed":
+                self._observe_searchable(row["id"])
+        return row["id"]
+
+    def _observe_searchable(self, file_id: str) -> None:
+        row = dict(self._conn.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone())
+        for stage, duration_ms in stage_breakdown_ms(row).items():
+            self._stage_ms.observe(duration_ms, stage=stage, source=row["source"])
+        self._searchable_ms.observe(searchable_ms(row), source=row["source"])
+
+    def advance(self, path: str, stage: str, chunks: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Move the current record of ``path`` to ``stage``.
+
+        Stages only move forward and each stage keeps its first timestamp;
+        finished records are left alone. ``chunks`` adds to the file's chunk count.
+        """
+        with self._lock:
+            file_id = self._advance(self._latest(path), stage, chunks)
+        return self._publish(file_id) if file_id else None
+
+    def _unfinished_with(self, sha256: str) -> Optional[sqlite3.Row]:
+        return self._conn.execute(
+            "SELECT * FROM files WHERE sha256 = ? AND state NOT IN ('indexed', 'failed') "
+            "ORDER BY received_at DESC LIMIT 1",
+            (sha256,),
+        ).fetchone()
+
+    def _fail(self, row: sqlite3.Row, error: str, at: float) -> str:
+        self._conn.execute(
+            "UPDATE files SET state = 'failed', error = ?, failed_at = ?, updated_at = ? WHERE id = ?",
+            (error, at, time.time(), row["id"]),
+        )
+        self._transitions.inc(state="failed")
+        logger.warning(f"⚠️ Ingestion of {row['filename']} failed: {error}")
+        return row["id"]
+
+    def _remember_early(self, sha256: str, stage: str, error: Optional[str]) -> None:
+        # The parser can finish before the input subscription recorded the file's hash
+        self._early[sha256] = (stage, error, time.time())
+        while len(self._early) > EARLY_REPORTS:
+            self._early.popitem(last=False)
+
+    def _apply_early(self, sha256: str) -> None:
+        report = self._early.pop(sha256, None)
+        row = self._unfinished_with(sha256) if report else None
+        if row is None:
+            return
+        stage, error, at = report
+        if stage == "failed":
+            self._fail(row, error, at)
+        else:
+            self._advance(row, stage, at=at)
+
+    def advance_content(self, sha256: str, stage: str) -> Optional[Dict[str, Any]]:
+        """Move the unfinished record with this content to ``stage`` (parsers only see bytes)."""
+        with self._lock:
+            row = self._unfinished_with(sha256)
+            if row is None:
+                self._remember_early(sha256, stage, None)
+                return None
+            file_id = self._advance(row, stage)
+        return self._publish(file_id) if file_id else None
+
+    def fail_content(self, sha256: str, error: str) -> Optional[Dict[str, Any]]:
+        """Mark the unfinished record with this content as failed."""
+        with self._lock:
+            row = self._unfinished_with(sha256)
+            if row is None:
+                self._remember_early(sha256, "failed", error)
+                return None
+            file_id = self._fail(row, error, time.time())
+        return self._publish(file_id)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        return public_status(dict(row)) if row is not None else None
+
+    def latest(self, path: str) -> Optional[Dict[str, Any]]:
+        """Most recent record of a file, e.g. the document a duplicate upload resolves to."""
+        with self._lock:
+            row = self._latest(path)
+        return public_status(dict(row)) if row is not None else None
+
+    def list(self, state: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recently received files first."""
+        query, params = "SELECT * FROM files", []
+        if state is not None:
+            query, params = query + " WHERE state = ?", [state]
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY received_at DESC LIMIT ?", (*params, limit)).fetchall()
+        return [public_status(dict(row)) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of records per state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state").fetchall()
+        return {state: 0 for state in STATES} | {row[0]: row[1] for row in rows}
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete records (and batches) unchanged for ``retention_s``; returns the number of file records."""
+        cutoff = (now if now is not None else time.time()) - self.retention_s
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM batch_files WHERE batch_id IN (SELECT id FROM batches WHERE created_at < ?)", (cutoff,)
+            )
+            self._conn.execute("DELETE FROM batches WHERE created_at < ?", (cutoff,))
+            return self._conn.execute("DELETE FROM files WHERE updated_at < ?", (cutoff,)).rowcount
+
+    # ------------------------------------------------------------------
+    # Batches (extracted archives)
+    # ------------------------------------------------------------------
+
+    def register_batch(
+        self, archive: str, files: List[Dict[str, Any]], skipped: List[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """
+        Record the documents extracted from one archive as a batch.
+
+        Args:
+            archive: Archive file name
+            files: ArchiveExtractor entries (member, filename, path, size, sha256, duplicate);
+                new documents are registered as uploads, duplicates are linked to
+                the latest record of the existing document
+            skipped: Members that were not extracted, with the reason
+
+        Returns:
+            The ``batch_status`` of the new batch
+        """
+        batch_id = uuid.uuid4().hex
+        members = []
+        for position, entry in enumerate(files):
+            if entry["duplicate"]:
+                with self._lock:
+                    row = self._latest(entry["path"])
+                file_id = row["id"] if row is not None else None
+            else:
+                file_id = self.register_upload(entry["filename"], entry["path"], entry["size"], entry["sha256"])[
+                    "upload_id"
+                ]
+            members.append(
+                (batch_id, position, entry["member"], entry["filename"], entry["sha256"], file_id, entry["duplicate"])
+            )
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO batches (id, archive, skipped, created_at) VALUES (?, ?, ?, ?)",
+                (batch_id, archive, json.dumps(skipped), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO batch_files (batch_id, position, member, filename, document_id, file_id, duplicate) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                members,
+            )
+            self._conn.execute("COMMIT")
+        return self.batch_status(batch_id)
+
+    def batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """
+        State of every document of a batch.
+
+        ``state`` is ``processing`` until every document is indexed or failed,
+        then ``indexed``, ``failed`` or ``partial`` (some of each); ``empty`` if
+        nothing was extracted.
+        """
+        with self._lock:
+            batch = self._conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+            if batch is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT bf.member, bf.filename, bf.document_id, bf.file_id, bf.duplicate, f.state, f.error "
+                "FROM batch_files bf LEFT JOIN files f ON f.id = bf.file_id "
+                "WHERE bf.batch_id = ? ORDER BY bf.position",
+                (batch_id,),
+            ).fetchall()
+
+        files = []
+        for row in rows:
+            # A duplicate whose record has expired is a document that was indexed long ago
+            state = row["state"] or "indexed"
+            entry = {
+                "member": row["member"],
+                "filename": row["filename"],
+                "document_id": row["document_id"],
+                "upload_id": row["file_id"],
+                "duplicate": bool(row["duplicate"]),
+                "state": state,
+            }
+            if row["error"]:
+                entry["error"] = row["error"]
+            files.append(entry)
+
+        counts = Counter(entry["state"] for entry in files)
+        if not files:
+            state = "empty"
+        elif any(entry["state"] not in FINAL_STATES for entry in files):
+            state = "processing"
+        elif counts["failed"] == 0:
+            state = "indexed"
+        else:
+            state = "failed" if counts["failed"] == len(files) else "partial"
+        return {
+            "batch_id": batch_id,
+            "archive": batch["archive"],
+            "state": state,
+            "created_at": batch["created_at"],
+            "counts": {s: counts.get(s, 0) for s in STATES},
+            "duplicates": sum(entry["duplicate"] for entry in files),
+            "files": files,
+            "skipped": json.loads(batch["skipped"]),
+        }
+
+    # ------------------------------------------------------------------
+    # Push notifications
+    # ------------------------------------------------------------------
+
+    def subscribe(self) -> asyncio.Queue:
+        """Queue receiving every status change; call from the event loop that reads it."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    def _publish(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+            if row is None:
+                return None
+            self._published[file_id] = row["updated_at"]
+            self._published.move_to_end(file_id)
+            if len(self._published) > PUBLISHED_MEMORY:
+                self._published.popitem(last=False)
+            subscribers = list(self._subscribers)
+        status = public_status(dict(row))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, status)
+            except RuntimeError:
+                self.unsubscribe(queue)  # The subscriber's loop is closed
+        return status
+
+
+    def publish_changes(self, since: float) -> float:
+        """
+        Push records changed since ``since`` that this process has not published yet.
+
+        Picks up the state changes written to the database by another process,
+        e.g. the pipeline stages recorded by the indexer for the upload service.
+
+        Args:
+            since: Watermark returned by the previous call (0 for all records)
+
+        Returns:
+            The new watermark
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, updated_at FROM files WHERE updated_at > ? ORDER BY updated_at",
+                (since - FOLLOW_OVERLAP_S,),
+            ).fetchall()
+            changed = [row["id"] for row in rows if self._published.get(row["id"]) != row["updated_at"]]
+        for file_id in changed:
+            self._publish(file_id)
+        return max(since, rows[-1]["updated_at"]) if rows else since
+
+
+def _offer(queue: asyncio.Queue, status: Dict[str, Any]) -> None:
+    if not queue.full():
+        queue.put_nowait(status)
+
+
+def stage_breakdown_ms(row: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Time spent in each pipeline stage reached so far: ``detect`` (landing in
+    ./data until the pipeline read the file), ``parse``, ``split``, ``embed``
+    and ``index`` (insertion into the vector index).
+    """
+    breakdown = {}
+    previous = row["received_at"]
+    for stage, column in BREAKDOWN:
+        if row.get(column) is not None:
+            breakdown[stage] = round(max(row[column] - previous, 0.0) * 1000.0, 1)
+            previous = max(row[column], previous)
+    return breakdown
+
+
+def searchable_ms(row: Dict[str, Any]) -> Optional[float]:
+    """Time from landing in ./data until retrievable, None until indexed."""
+    if row["indexed_at"] is None:
+        return None
+    return round(max(row["indexed_at"] - row["received_at"], 0.0) * 1000.0, 1)
+
+
+def public_status(row: Dict[str, Any]) -> Dict[str, Any]:
+    """API view of a record: stage timestamps and the time spent in each stage."""
+    stages = {stage: row[f"{stage}_at"] for stage in STAGES}
+    view = {
+        "upload_id": row["id"],
+        "filename": row["filename"],
+        "path": row["path"],
+        "source": row["source"],
+        "state": row["state"],
+        "sha256": row["sha256"],
+        "size": row["size"],
+        "chunks": row["chunks"],
+        "stages": stages,
+        "detected_at": row["detected_at"],
+        "timings_ms": stage_breakdown_ms(row),
+        "time_to_searchable_ms": searchable_ms(row),
+    }
+    if row["state"] == "failed":
+        view["error"] = row["error"]
+        view["failed_at"] = row["failed_at"]
+    return view
+
+
+def _metadata_path(metadata: Any) -> Optional[str]:
+    value = metadata.value if isinstance(metadata, pw.Json) else metadata
+    return value.get("path") if isinstance(value, dict) else None
+
+
+class _StageWatcher:
+    """Collects the files of one pipeline table per Pathway commit and reports them at the commit's end."""
+
+    def __init__(self, tracker: IngestionStatusTracker, stages: Iterable[str], count_chunks: bool = False):
+        self.tracker = tracker
+        self.stages = tuple(stages)
+        self.count_chunks = count_chunks
+        self._pending: Counter = Counter()
+
+    def on_change(self, key, row: Dict[str, Any], time: int, is_addition: bool) -> None:
+        path = _metadata_path(row.get("metadata"))
+        if is_addition and path:
+            self._pending[path] += 1
+
+    def on_time_end(self, time: int) -> None:
+        pending, self._pending = self._pending, Counter()
+        for path, count in pending.items():
+            for stage in self.stages:
+                chunks = count if self.count_chunks and stage == self.stages[0] else None
+                try:
+                    self.tracker.advance(path, stage, chunks)
+                except Exception as e:
+                    logger.error(f"❌ Ingestion status update failed for {path}: {e}")
+
+
+class TrackedDocumentStore(DocumentStore):
+    """
+    DocumentStore that reports each file's progress to an IngestionStatusTracker.
+
+    Args:
+        status_tracker: Tracker receiving the stage changes (all other
+            arguments as for DocumentStore)
+    """
+
+    def __init__(self, *args, status_tracker: Optional[IngestionStatusTracker] = None, **kwargs):
+        self.status_tracker = status_tracker
+        super().__init__(*args, **kwargs)
+
+    def _embedded_table(self) -> Optional[pw.Table]:
+        """Chunks with their embeddings, as fed to the vector index (None if the index hides them)."""
+        inner = getattr(self._retriever, "inner_index", None)
+        column = getattr(inner, "_data_column", None)
+        return column.table if isinstance(column, pw.ColumnReference) else None
+
+    def build_pipeline(self):
+        super().build_pipeline()
+        tracker = self.status_tracker
+        if tracker is None:
+            return
+
+        def on_input(key, row, time, is_addition):
+            path = _metadata_path(row["metadata"])
+            if is_addition and path:
+                contents = row["text"]
+                metadata = row["metadata"].value
+                try:
+                    landed_at = os.stat(path).st_mtime  # Sub-second, unlike the connector's modified_at
+                except OSError:
+                    landed_at = metadata.get("modified_at")
+                tracker.file_seen(path, hashlib.sha256(contents).hexdigest(), len(contents), landed_at)
+
+        pw.io.subscribe(self.input_docs, on_change=on_input, name="ingestion_status_input")
+        for table, watcher, name in (
+            (self.parsed_docs, _StageWatcher(tracker, ["parsed"]), "parsed"),
+            (self.chunked_docs, _StageWatcher(tracker, ["chunked"], count_chunks=True), "chunked"),
+        ):
+            pw.io.subscribe(table, on_change=watcher.on_change, on_time_end=watcher.on_time_end,
+                            name=f"ingestion_status_{name}")
+
+        embedded = self._embedded_table()
+        # Without access to the embedded chunks, files count as indexed once chunked
+        watcher = _StageWatcher(tracker, ["embedded", "indexed"])
+        pw.io.subscribe(
+            embedded if embedded is not None else self.chunked_docs,
+            on_change=watcher.on_change,
+            on_time_end=watcher.on_time_end,
+            name="ingestion_status_indexed",
+        )
+
+
+class IngestionStatusAPI:
+    """
+    HTTP routes of the ingestion status (mounted on the upload service).
+
+    Args:
+        tracker: The IngestionStatusTracker of the pipeline
+        purge_interval_s: Interval of the expired-record cleanup
+        follow_interval_s: Poll interval for changes written by another process
+            (the indexer, when mounted on the upload service); None disables
+    """
+
+    def __init__(
+        self,
+        tracker: IngestionStatusTracker,
+        purge_interval_s: float = 3600.0,
+        follow_interval_s: Optional[float] = None,
+    ):
+        self.tracker = tracker
+        self.purge_interval_s = purge_interval_s
+        self.follow_interval_s = follow_interval_s
+        self._janitor: Optional[asyncio.Task] = None
+        self._follower: Optional[asyncio.Task] = None
+
+    async def list_handler(self, request: web.Request) -> web.Response:
+        state = request.query.get("state")
+        if state is not None and state not in STATES:
+            return web.json_response({"error": f"state must be one of {list(STATES)}"}, status=400)
+        try:
+            limit = min(max(int(request.query.get("limit", 100)), 1), 1000)
+        except ValueError:
+            return web.json_response({"error": "limit must be an integer"}, status=400)
+        files = await asyncio.to_thread(self.tracker.list, state, limit)
+        counts = await asyncio.to_thread(self.tracker.counts)
+        return web.json_response({"files": files, "counts": counts})
+
+    async def status_handler(self, request: web.Request) -> web.Response:
+        status = await asyncio.to_thread(self.tracker.get, request.match_info["upload_id"])
+        if status is None:
+            return web.json_response({"error": "Unknown upload"}, status=404)
+        return web.json_response(status)
+
+    async def events_handler(self, request: web.Request) -> web.StreamResponse:
+        """SSE ``status`` events; a single file's stream ends once it is indexed or failed."""
+        upload_id = request.match_info.get("upload_id")
+        queue = self.tracker.subscribe()
+        try:
+            current = None
+            if upload_id is not None:
+                current = await asyncio.to_thread(self.tracker.get, upload_id)
+                if current is None:
+                    return web.json_response({"error": "Unknown upload"}, status=404)
+
+            response = web.StreamResponse(
+                headers={
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no",
+                }
+            )
+            await response.prepare(request)
+            if current is not None:
+                await response.write(format_sse("status", current))
+                if current["state"] in FINAL_STATES:
+                    return response
+            while True:
+                try:
+                    status = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    await response.write(b": keep-alive\n\n")
+                    continue
+                if upload_id is not None and status["upload_id"] != upload_id:
+                    continue
+                await response.write(format_sse("status", status))
+                if upload_id is not None and status["state"] in FINAL_STATES:
+                    return response
+        finally:
+            self.tracker.unsubscribe(queue)
+
+    async def batch_handler(self, request: web.Request) -> web.Response:
+        status = await asyncio.to_thread(self.tracker.batch_status, request.match_info["batch_id"])
+        if status is None:
+            return web.json_response({"error": "Unknown batch"}, status=404)
+        return web.json_response(status)
+
+    async def batch_events_handler(self, request: web.Request) -> web.StreamResponse:
+        """SSE ``batch`` events whenever a document of the batch changes state; ends once none is processing."""
+        batch_id = request.match_info["batch_id"]
+        queue = self.tracker.subscribe()
+        try:
+            current = await asyncio.to_thread(self.tracker.batch_status, batch_id)
+            if current is None:
+                return web.json_response({"error": "Unknown batch"}, status=404)
+            members = {entry["upload_id"] for entry in current["files"]}
+
+            response = web.StreamResponse(
+                headers={
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no",
+                }
+            )
+            await response.prepare(request)
+            await response.write(format_sse("batch", current))
+            while current["state"] == "processing":
+                try:
+                    status = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    await response.write(b": keep-alive\n\n")
+                    continue
+                if status["upload_id"] not in members:
+                    continue
+                current = await asyncio.to_thread(self.tracker.batch_status, batch_id)
+                if current is None:  # Purged while streaming
+                    break
+                await response.write(format_sse("batch", current))
+            return response
+        finally:
+            self.tracker.unsubscribe(queue)
+
+    async def _purge_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.purge_interval_s)
+            try:
+                purged = await asyncio.to_thread(self.tracker.purge_expired)
+                if purged:
+                    logger.info(f"🧹 Purged {purged} ingestion status records")
+            except Exception as e:
+                logger.error(f"❌ Ingestion status cleanup failed: {e}")
+
+    async def _follow_loop(self) -> None:
+        since = time.time()
+        while True:
+            await asyncio.sleep(self.follow_interval_s)
+            try:
+                since = await asyncio.to_thread(self.tracker.publish_changes, since)
+            except Exception as e:
+                logger.error(f"❌ Reading ingestion status changes failed: {e}")
+
+    async def start(self, app: web.Application) -> None:
+        self._janitor = asyncio.create_task(self._purge_loop())
+        if self.follow_interval_s is not None:
+            self._follower = asyncio.create_task(self._follow_loop())
+
+    async def stop(self, app: web.Application) -> None:
+        for task in (self._janitor, self._follower):
+            if task is not None:
+                task.cancel()
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get("/v1/uploads", self.list_handler)
+        app.router.add_get("/v1/uploads/events", self.events_handler)
+        app.router.add_get("/v1/uploads/batches/{batch_id}", self.batch_handler)
+        app.router.add_get("/v1/uploads/batches/{batch_id}/events", self.batch_events_handler)
+        app.router.add_get("/v1/uploads/{upload_id}", self.status_handler)
+        app.router.add_get("/v1/uploads/{upload_id}/events", self.events_handler)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Ingestion Throttling and Backpressure
+
+Dropping hundreds of PDFs into ./data at once (through /v1/upload or rsync)
+makes the Pathway pipeline parse and embed them flat out, and query serving in
+the same process starves. ThrottledParser wraps the document parser of the
+DocumentStore so that new documents are admitted at a controlled pace:
+
+- at most ``max_concurrency`` documents are parsed at a time, in worker
+  threads so the event loop stays free
+- at most ``docs_per_minute`` documents start parsing (token bucket, ``burst``
+  back-to-back after idle time)
+- while an SLOGuard reports query latency objectives at risk, documents wait
+  (up to ``max_yield_s`` per document, so ingestion always makes progress)
+
+The parser runs on Pathway's fully asynchronous executor: a document waiting
+in the backlog does not hold back later batches, so queries keep flowing
+through the dataflow while ingestion yields to them. The DocumentStore awaits
+the parsed documents before chunking them.
+
+Documents waiting for their turn form the ingestion backlog, exported with
+the parse rate and the yield state on the indexer's /v1/metrics. Parsing
+fewer documents at a time also paces the chunk embeddings that follow, which
+additionally run in the ``ingestion`` lane (lanes.py).
+
+Key Features:
+- Configurable parse concurrency and rate limit for new documents
+- Automatic yielding while query latency percentiles exceed their targets
+- Backlog documents/bytes, in-progress, yield and parse time metrics
+- Wraps any Pathway parser (UnstructuredParser, Utf8Parser, ...)
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pathway as pw
+from pathway.xpacks.llm._utils import _coerce_sync
+
+from llm_governor import TokenBucket
+from metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+# Query latency objectives checked before a document is parsed
+DEFAULT_OBJECTIVES: List[Dict[str, Any]] = [
+    {"metric": "request_latency_ms", "labels": {"endpoint": "/v1/pw_ai_answer"}, "percentile": 95, "max_ms": 15000},
+    {"metric": "request_latency_ms", "labels": {"endpoint": "/v1/retrieve"}, "percentile": 95, "max_ms": 1000},
+    {"metric": "answer_stream_retrieval_ms", "percentile": 95, "max_ms": 2000},
+    {"metric": "embedding_batch_wait_ms", "labels": {"batcher": "query_embedding"}, "percentile": 95, "max_ms": 100},
+    {
+        "metric": "lane_wait_ms",
+        "labels": {"scheduler": "embedder", "lane": "interactive"},
+        "percentile": 95,
+        "max_ms": 250,
+    },
+]
+
+PARSE_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000)
+
+
+class SLOGuard:
+    """
+    Checks recent query latency percentiles against their objectives.
+
+    An objective only counts while its histogram receives observations: if
+    nothing was observed for ``stale_s`` seconds there is no query traffic to
+    protect and the objective is considered met.
+
+    Args:
+        objectives: [{"metric", "labels", "percentile", "max_ms"}]; defaults to
+            DEFAULT_OBJECTIVES
+        stale_s: Seconds without observations after which an objective is ignored
+        registry: Metrics registry holding the latency histograms
+    """
+
+    def __init__(
+        self,
+        objectives: Optional[List[Dict[str, Any]]] = None,
+        stale_s: float = 30.0,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.objectives = objectives if objectives is not None else DEFAULT_OBJECTIVES
+        self.stale_s = stale_s
+        self.registry = registry
+        self._last_seen: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def breaches(self) -> List[str]:
+        """Descriptions of the objectives currently missed."""
+        now = time.monotonic()
+        missed = []
+        for index, objective in enumerate(self.objectives):
+            histogram = self.registry.get(objective["metric"])
+            if histogram is None:
+                continue
+            labels = objective.get("labels") or {}
+            count = histogram.count(**labels)
+            with self._lock:
+                last_count, last_change = self._last_seen.get(index, (None, now))
+                if count != last_count:
+                    last_change = now
+                self._last_seen[index] = (count, last_change)
+            if count == 0 or now - last_change > self.stale_s:
+                continue
+            value = histogram.percentile(objective.get("percentile", 95), **labels)
+            if value is not None and value > objective["max_ms"]:
+                missed.append(
+                    f"{objective['metric']} p{objective.get('percentile', 95)} {value:.0f}ms > {objective['max_ms']}ms"
+                )
+        return missed
+
+    def at_risk(self) -> bool:
+        return bool(self.breaches())
+
+
+class IngestionThrottle:
+    """
+    Admission control for new documents: concurrency cap, rate limit and SLO yielding.
+
+    Args:
+        max_concurrency: Documents processed at the same time
+        docs_per_minute: Documents admitted per minute (None disables the rate limit)
+        burst: Documents admitted back-to-back after idle time
+        slo_guard: Optional SLOGuard; documents wait while it reports a breach
+        max_yield_s: Longest one document yields to queries before it proceeds
+        poll_interval_s: Interval of the slot and SLO checks while waiting
+        name: Label of the throttle's metrics
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        docs_per_minute: Optional[float] = 60.0,
+        burst: int = 5,
+        slo_guard: Optional[SLOGuard] = None,
+        max_yield_s: float = 300.0,
+        poll_interval_s: float = 0.5,
+        name: str = "parser",
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(docs_per_minute, burst) if docs_per_minute else None
+        self.slo_guard = slo_guard
+        self.max_yield_s = max_yield_s
+        self.poll_interval_s = poll_interval_s
+        self.name = name
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self._backlog = REGISTRY.gauge("ingestion_backlog_docs", "Documents waiting to be parsed")
+        self._backlog_bytes = REGISTRY.gauge("ingestion_backlog_bytes", "Bytes of documents waiting to be parsed")
+        self._in_progress = REGISTRY.gauge("ingestion_in_progress", "Documents being parsed")
+        self._yielding = REGISTRY.gauge("ingestion_yielding", "Documents holding back for query latency SLOs")
+        self._yields = REGISTRY.counter("ingestion_yields_total", "Documents that yielded to queries, by outcome")
+        self._wait_ms = REGISTRY.histogram(
+            "ingestion_wait_ms", "Time documents waited in the ingestion backlog", buckets=PARSE_BUCKETS_MS
+        )
+        self._parse_ms = REGISTRY.histogram("ingestion_parse_ms", "Parse time per document", buckets=PARSE_BUCKETS_MS)
+        self._docs = REGISTRY.counter("ingestion_docs_total", "Documents processed by outcome")
+
+    async def _yield_to_queries(self, deadline: float) -> None:
+        """Wait while query SLOs are at risk, at most until ``deadline`` (monotonic)."""
+        breaches = self.slo_guard.breaches()
+        if not breaches:
+            return
+        logger.info(f"⏸️ Ingestion yielding to queries: {'; '.join(breaches)}")
+        self._yielding.inc(throttle=self.name)
+        try:
+            while self.slo_guard.at_risk():
+                if time.monotonic() >= deadline:
+                    self._yields.inc(throttle=self.name, outcome="expired")
+                    logger.warning(f"⚠️ Query SLOs still at risk after {self.max_yield_s:.0f}s; ingesting anyway")
+                    return
+                await asyncio.sleep(self.poll_interval_s)
+            self._yields.inc(throttle=self.name, outcome="resumed")
+        finally:
+            self._yielding.dec(throttle=self.name)
+
+    async def acquire(self, size_bytes: int = 0) -> None:
+        """Wait in the backlog until the document may be processed; pair with ``release``."""
+        enqueued = time.perf_counter()
+        yield_deadline = time.monotonic() + self.max_yield_s
+        self._backlog.inc(throttle=self.name)
+        self._backlog_bytes.inc(size_bytes, throttle=self.name)
+        try:
+            while True:
+                if self.slo_guard is not None:
+                    await self._yield_to_queries(yield_deadline)
+                if self.bucket is not None:
+                    await self.bucket.acquire_async(float("inf"))
+                while not self._slots.acquire(blocking=False):
+                    await asyncio.sleep(self.poll_interval_s)
+                # Queries may have slowed down while this document waited for a slot
+                if self.slo_guard is None or time.monotonic() >= yield_deadline or not self.slo_guard.at_risk():
+                    break
+                self._slots.release()
+        finally:
+            self._backlog.dec(throttle=self.name)
+            self._backlog_bytes.dec(size_bytes, throttle=self.name)
+        self._wait_ms.observe((time.perf_counter() - enqueued) * 1000.0, throttle=self.name)
+        self._in_progress.inc(throttle=self.name)
+
+    def release(self) -> None:
+        self._in_progress.dec(throttle=self.name)
+        self._slots.release()
+
+    def record(self, outcome: str, parse_ms: float) -> None:
+        """Count one processed document (``parsed``, ``empty`` or ``error``) and its parse time."""
+        self._parse_ms.observe(parse_ms, throttle=self.name)
+        self._docs.inc(throttle=self.name, outcome=outcome)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Backlog and progress of the throttle."""
+        labels = {"throttle": self.name}
+        return {
+            "backlog_docs": int(self._backlog.value(**labels)),
+            "backlog_bytes": int(self._backlog_bytes.value(**labels)),
+            "in_progress": int(self._in_progress.value(**labels)),
+            "yielding": int(self._yielding.value(**labels)) > 0,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+def ingestion_snapshot(name: str = "parser") -> Dict[str, Any]:
+    """Backlog of the ingestion throttle ``name`` as read from the metrics registry."""
+    labels = {"throttle": name}
+    values = {}
+    for key, metric in (
+        ("backlog_docs", "ingestion_backlog_docs"),
+        ("backlog_bytes", "ingestion_backlog_bytes"),
+        ("in_progress", "ingestion_in_progress"),
+        ("yielding", "ingestion_yielding"),
+    ):
+        gauge = REGISTRY.get(metric)
+        values[key] = int(gauge.value(**labels)) if gauge is not None else 0
+    values["yielding"] = values["yielding"] > 0
+    return values
+
+
+class ThrottledParser(pw.UDF):
+    """
+    Document parser that admits new documents through an IngestionThrottle.
+
+    Runs on ``pw.udfs.fully_async_executor``, so its results are futures:
+    the DocumentStore resolves them with ``await_futures``, other callers
+    must do the same.
+
+    Args:
+        parser: The wrapped parser UDF (e.g. UnstructuredParser)
+        max_concurrency: Documents parsed at the same time
+        docs_per_minute: Documents started per minute (None disables the rate limit)
+        burst: Documents started back-to-back after idle time
+        slo_guard: Optional SLOGuard; parsing waits while query SLOs are at risk
+        max_yield_s: Longest one document yields to queries
+        poll_interval_s: Interval of the slot and SLO checks while waiting
+        status_tracker: Optional IngestionStatusTracker told when a document is
+            parsed, fails to parse or yields no text (ingestion_status.py)
+        cache_strategy: Pathway cache strategy of the UDF
+    """
+
+    def __init__(
+        self,
+        parser: pw.UDF,
+        max_concurrency: int = 2,
+        docs_per_minute: Optional[float] = 60.0,
+        burst: int = 5,
+        slo_guard: Optional[SLOGuard] = None,
+        max_yield_s: float = 300.0,
+        poll_interval_s: float = 0.5,
+        status_tracker: Optional[Any] = None,
+        cache_strategy: Optional[pw.udfs.CacheStrategy] = None,
+    ):
+        # Documents held back by the throttle must not block later batches (queries) of the dataflow
+        super().__init__(executor=pw.udfs.fully_async_executor(), cache_strategy=cache_strategy)
+        self.parser = parser
+        self.status_tracker = status_tracker
+        self.throttle = IngestionThrottle(
+            max_concurrency=max_concurrency,
+            docs_per_minute=docs_per_minute,
+            burst=burst,
+            slo_guard=slo_guard,
+            max_yield_s=max_yield_s,
+            poll_interval_s=poll_interval_s,
+            name="parser",
+        )
+        self._parse = _coerce_sync(parser.__wrapped__)
+
+    async def __wrapped__(self, contents: bytes, **kwargs) -> list[tuple[str, dict]]:
+        await self.throttle.acquire(len(contents))
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            # Parsing is CPU-bound; a worker thread keeps the event loop responsive
+            docs = await asyncio.to_thread(self._parse, contents, **kwargs)
+            outcome = "parsed" if docs else "empty"
+        except Exception as e:
+            await asyncio.to_thread(self._report, contents, f"Parsing failed: {e}")
+            raise
+        finally:
+            self.throttle.release()
+            self.throttle.record(outcome, (time.perf_counter() - started) * 1000.0)
+        if self.status_tracker is not None:
+            await asyncio.to_thread(self._report, contents, None if docs else "No text could be extracted")
+        return docs
+
+    def _report(self, contents: bytes, error: Optional[str]) -> None:
+        if self.status_tracker is None:
+            return
+        # Parsers only see the file's bytes; the tracker matches them by content hash
+        sha256 = hashlib.sha256(contents).hexdigest()
+        try:
+            if error is None:
+                self.status_tracker.advance_content(sha256, "parsed")
+            else:
+                self.status_tracker.fail_content(sha256, error)
+        except Exception as e:
+            logger.error(f"❌ Ingestion status update failed: {e}")
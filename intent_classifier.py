@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Local Intent Classifier for Query Routing
+
+Nearest-centroid classification over the MiniLM query embedding that
+retrieval computes anyway. Each intent is represented by the normalized mean
+embedding of a few seed queries; a query is assigned the intent with the
+highest cosine similarity. With the query-embedding cache of
+BatchedSentenceTransformerEmbedder the embedding is computed once and reused
+by retrieval, so classification adds a single small matrix-vector product.
+
+Intents and the pipeline the router sends them to:
+- ``status_lookup``: drug registry lookup, else a small retrieval + fast model
+- ``listing``: year-filtered retrieval ("all bans after 2023") with a larger k
+- ``document_summary``: per-document summary cache
+- ``chitchat``: canned reply, no retrieval and no LLM
+- ``analysis``: full RAG
+
+Key Features:
+- Seed examples per intent, overridable with a JSON file
+- Low-confidence or ambiguous queries fall back to the router's rules
+- Year-range metadata filters for listing queries
+- Classification time and intent counts on /v1/metrics
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pathway.xpacks.llm._utils import _coerce_sync
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+INTENTS = ("status_lookup", "listing", "document_summary", "chitchat", "analysis")
+
+DEFAULT_INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "status_lookup": [
+        "Is nimesulide banned in India?",
+        "is paracetamol + phenylephrine prohibited",
+        "status of chloramphenicol",
+        "Is alprazolam a schedule H1 drug?",
+        "can I sell codeine cough syrup",
+        "is this FDC allowed",
+        "nimesulide ban status",
+        "is aceclofenac approved",
+    ],
+    "listing": [
+        "list all bans after 2023",
+        "which fixed dose combinations were banned in 2024",
+        "all drugs prohibited since 2021",
+        "show every FDC banned before 2019",
+        "list of NSQ drugs in January 2025",
+        "what drugs were banned between 2018 and 2020",
+        "all schedule H1 drugs",
+        "which drugs were banned last year",
+    ],
+    "document_summary": [
+        "summarize the August 2024 gazette notification",
+        "give me a summary of cdsco_banned_02Jun2023",
+        "what does the delhi drugs department list contain",
+        "summary of the latest CDSCO notification",
+        "key points of the 2018 banned drugs list",
+        "overview of the NSQ alert for January 2025",
+        "what is in the 22 November 2021 notification",
+        "brief me on the 12 August 2024 ban order",
+    ],
+    "chitchat": [
+        "hello",
+        "hi there",
+        "thanks a lot",
+        "who are you",
+        "what can you do",
+        "good morning",
+        "thank you, that helps",
+        "how are you",
+    ],
+    "analysis": [
+        "compare the regulatory history of nimesulide and paracetamol combinations",
+        "explain why FDCs of cough syrups were banned",
+        "what are the implications of the 2024 ban for existing stock",
+        "analyse the compliance risk of listing this combination",
+        "how did the ban on 344 FDCs evolve in court",
+        "what obligations do manufacturers have after a section 26A notification",
+        "why was the ban on some FDCs withdrawn",
+        "assess whether this product listing is compliant with CDSCO rules",
+    ],
+}
+
+YEAR = r"((?:19|20)\d{2})"
+YEAR_RANGE_PATTERNS = [
+    (re.compile(rf"\bbetween\s+{YEAR}\s+(?:and|to|-)\s+{YEAR}", re.IGNORECASE), "between"),
+    (re.compile(rf"\b(?:after|post)\s+{YEAR}", re.IGNORECASE), "after"),
+    (re.compile(rf"\b(?:since|from)\s+{YEAR}", re.IGNORECASE), "since"),
+    (re.compile(rf"\b(?:before|until|till|prior to)\s+{YEAR}", re.IGNORECASE), "before"),
+    (re.compile(rf"\b(?:in|of|during)\s+(?:[a-z]+\s+)?{YEAR}", re.IGNORECASE), "in"),
+]
+FIRST_NOTIFICATION_YEAR = 2000
+
+
+def year_range(query: str, today: Optional[datetime] = None) -> Optional[Tuple[int, int]]:
+    """Inclusive (first, last) year range named in a query, if any."""
+    current = (today or datetime.now()).year
+    for pattern, kind in YEAR_RANGE_PATTERNS:
+        match = pattern.search(query)
+        if not match:
+            continue
+        year = int(match.group(1))
+        if kind == "between":
+            return tuple(sorted((year, int(match.group(2)))))
+        if kind == "after":
+            return year + 1, current
+        if kind == "since":
+            return year, current
+        if kind == "before":
+            return FIRST_NOTIFICATION_YEAR, year - 1
+        return year, year
+    if re.search(r"\blast year\b", query, re.IGNORECASE):
+        return current - 1, current - 1
+    if re.search(r"\bthis year\b", query, re.IGNORECASE):
+        return current, current
+    return None
+
+
+def year_filter(years: Tuple[int, int], base_filter: Optional[str] = None) -> Optional[str]:
+    """
+    JMESPath metadata filter matching documents whose path names a year in range.
+
+    CDSCO file names carry the notification date (cdsco_banned_02Aug2024.pdf).
+    """
+    first, last = years
+    if last < first:
+        return base_filter
+    clause = " || ".join(f"contains(path, `{year}`)" for year in range(first, last + 1))
+    return f"({base_filter}) && ({clause})" if base_filter else clause
+
+
+def embed_texts(embedder, texts: List[str]) -> List[np.ndarray]:
+    """Embed with a Pathway embedder outside the dataflow (batch or single-input)."""
+    if getattr(embedder, "max_batch_size", None) is not None:
+        return list(_coerce_sync(embedder.__wrapped__)(list(texts)))
+    wrapped = _coerce_sync(embedder.__wrapped__)
+    return [wrapped(text) for text in texts]
+
+
+class IntentClassifier:
+    """
+    Nearest-centroid intent classifier over query embeddings.
+
+    Args:
+        embedder: The $embedder of the index (query embeddings are shared with
+            retrieval through its query cache)
+        examples_path: Optional JSON file ``{intent: [example queries]}``
+            replacing the built-in seed examples
+        min_similarity: Below this cosine similarity the query is unclassified
+        min_margin: Minimum similarity gap between the best and second intent
+    """
+
+    def __init__(
+        self,
+        embedder,
+        examples_path: Optional[str] = None,
+        min_similarity: float = 0.35,
+        min_margin: float = 0.03,
+    ):
+        self.embedder = embedder
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.examples = DEFAULT_INTENT_EXAMPLES
+        if examples_path:
+            with open(examples_path, "r", encoding="utf-8") as f:
+                self.examples = json.load(f)
+        unknown = set(self.examples) - set(INTENTS)
+        if unknown:
+            raise ValueError(f"Unknown intents {sorted(unknown)}; expected a subset of {INTENTS}")
+
+        self.intents: List[str] = list(self.examples)
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._requests = REGISTRY.counter("intent_requests_total", "Classified queries per intent")
+        self._classify_ms = REGISTRY.histogram(
+            "intent_classify_ms",
+            "Intent classification time, query embedding included",
+            buckets=(0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+        )
+
+    @staticmethod
+    def _unit(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def fit(self) -> np.ndarray:
+        """Embed the seed examples and compute one unit centroid per intent."""
+        with self._lock:
+            if self._centroids is None:
+                centroids = []
+                for intent in self.intents:
+                    vectors = np.asarray(embed_texts(self.embedder, self.examples[intent]), dtype=np.float32)
+                    centroids.append(self._unit(self._unit(vectors).mean(axis=0)))
+                self._centroids = np.stack(centroids)
+                logger.info(f"🎯 Intent classifier ready: {len(self.intents)} intents")
+        return self._centroids
+
+    def classify_vector(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        """Nearest centroid for a query embedding; (None, score) when not confident."""
+        centroids = self._centroids if self._centroids is not None else self.fit()
+        scores = centroids @ self._unit(np.asarray(vector, dtype=np.float32))
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        second = float(scores[order[1]]) if len(order) > 1 else -1.0
+        if best < self.min_similarity or best - second < self.min_margin:
+            return None, best
+        return self.intents[order[0]], best
+
+    def classify(self, query: str) -> Tuple[Optional[str], float]:
+        """
+        Classify a query; the embedding comes from (and warms) the embedder's query cache.
+
+        ``intent_classify_ms`` covers the whole step the request waits for:
+        the embedding (batcher wait and forward pass, or a cache hit) and the
+        centroid comparison.
+        """
+        if self._centroids is None:
+            self.fit()
+        started = time.perf_counter()
+        vector = embed_texts(self.embedder, [query])[0]
+        intent, score = self.classify_vector(vector)
+        self._classify_ms.observe((time.perf_counter() - started) * 1000.0)
+        self._requests.inc(intent=intent or "unclassified")
+        return intent, score
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Job API for Long-Running Analyses
+
+Multi-document analyses can take longer than the 120 s synchronous timeout of
+the frontend and the proxies in front of it. Instead of holding an HTTP
+connection open for the whole analysis, clients submit a job, poll its status
+and fetch the result once it is ready:
+
+    POST   /v1/jobs                 {"kind": "answer", "payload": {"prompt": "..."}, "priority": "high"}
+                                    -> 202 {"job_id": "...", "status": "queued", ...}
+    GET    /v1/jobs/{id}            -> status, queue position and timings
+    GET    /v1/jobs/{id}/result     -> 200 with the result, 202 while queued or running,
+                                       409 if the job failed or was cancelled
+    DELETE /v1/jobs/{id}            -> cancels a queued or running job
+
+Jobs are kept in a local SQLite database, so queued work and results survive a
+restart; jobs that were running when the process stopped are queued again.
+A pool of asyncio workers on the streaming server's event loop claims jobs in
+priority order and runs them against the Pathway REST server (``answer`` ->
+/v1/pw_ai_answer, ``retrieve_batch`` -> /v1/retrieve_batch). Finished jobs and
+their results are deleted ``result_ttl_s`` after they finish.
+
+Key Features:
+- Persistent queue with atomic claims ordered by priority, then submission
+- Fixed worker pool; no HTTP connection or thread is held per waiting job
+- Cancellation of queued and running jobs
+- Per-job timeout, retry of interrupted jobs and a result TTL
+- Queue depth, wait and run times on /v1/metrics
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+PRIORITIES = {"low": -10, "normal": 0, "high": 10}
+MAX_PRIORITY = 100
+
+# Pathway endpoints the default job kinds are run against
+JOB_ENDPOINTS = {
+    "answer": "/v1/pw_ai_answer",
+    "retrieve_batch": "/v1/retrieve_batch",
+}
+
+# Defaults merged into job payloads: analyses run in the batch lane (lanes.py)
+JOB_PAYLOAD_DEFAULTS = {
+    "answer": {"lane": "batch"},
+}
+
+JOB_WAIT_BUCKETS_MS = (10, 100, 1000, 5000, 15000, 60000, 300000, 900000, 3600000)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expiry ON jobs (expires_at);
+"""
+
+
+class QueueFull(Exception):
+    """The queue holds ``max_queued`` jobs already."""
+
+
+def parse_priority(value: Any) -> int:
+    """
+    Integer priority of a submission (higher runs first).
+
+    Accepts "low", "normal", "high" or an integer in [-MAX_PRIORITY, MAX_PRIORITY].
+
+    Raises:
+        ValueError: Unknown name or out-of-range integer
+    """
+    if value is None:
+        return PRIORITIES["normal"]
+    if isinstance(value, str) and value in PRIORITIES:
+        return PRIORITIES[value]
+    if isinstance(value, bool) or not isinstance(value, int) or not -MAX_PRIORITY <= value <= MAX_PRIORITY:
+        raise ValueError(f"priority must be one of {list(PRIORITIES)} or an integer between "
+                         f"{-MAX_PRIORITY} and {MAX_PRIORITY}")
+    return value
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue.
+
+    All methods are blocking and thread-safe; call them through
+    ``asyncio.to_thread`` from the event loop.
+
+    Args:
+        path: SQLite database file (":memory:" for a throwaway queue)
+        result_ttl_s: Seconds a finished job and its result are kept
+        max_queued: Queued jobs beyond which submissions are rejected
+        max_attempts: Runs of a job interrupted by restarts before it fails
+    """
+
+    def __init__(
+        self,
+        path: str = "jobs.db",
+        result_ttl_s: float = 86400.0,
+        max_queued: int = 10000,
+        max_attempts: int = 3,
+    ):
+        self.path = path
+        self.result_ttl_s = result_ttl_s
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.recover()
+
+    def _job(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def recover(self) -> int:
+        """Queue the jobs that were running when the process stopped; returns their number."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'interrupted too often', finished_at = ?, "
+                "expires_at = ? WHERE status = 'running' AND attempts >= ?",
+                (now, now + self.result_ttl_s, self.max_attempts),
+            )
+            recovered = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+            ).rowcount
+        if recovered:
+            logger.info(f"♻️ Re-queued {recovered} interrupted jobs")
+        return recovered
+
+    def submit(self, kind: str, payload: Any, priority: int = 0) -> Dict[str, Any]:
+        """
+        Add a job.
+
+        Raises:
+            QueueFull: ``max_queued`` jobs are waiting already
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} jobs queued")
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, priority, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(payload), priority, time.time()),
+            )
+            return self._job(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job with its payload and result, or None if it is unknown or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)", (job_id, time.time())
+            ).fetchone()
+        return self._job(row)
+
+    def position(self, job: Dict[str, Any]) -> int:
+        """Number of queued jobs that will be claimed before a queued job."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (job["priority"], job["priority"], job["created_at"]),
+            ).fetchone()[0]
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically mark the next queued job (highest priority, oldest first) as running."""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' "
+                "ORDER BY priority DESC, created_at, rowid LIMIT 1) RETURNING *",
+                (time.time(),),
+            ).fetchone()
+        return self._job(row)
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (status, json.dumps(result) if result is not None else None, error, now,
+                 now + self.result_ttl_s, job_id),
+            ).rowcount == 1
+
+    def complete(self, job_id: str, result: Any) -> bool:
+        """Store the result of a running job; False if it was cancelled meanwhile."""
+        return self._finish(job_id, "succeeded", result=result)
+
+    def fail(self, job_id: str, error: str) -> bool:
+        """Mark a running job as failed; False if it was cancelled meanwhile."""
+        return self._finish(job_id, "failed", error=error)
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a queued or running job.
+
+        Returns:
+            The job's status afterwards ("cancelled", or the final status it
+            already had), or None if the job is unknown or expired
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, expires_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (now, now + self.result_ttl_s, job_id),
+            )
+            row = self._conn.execute(
+                "SELECT status FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)", (job_id, now)
+            ).fetchone()
+        return row["status"] if row is not None else None
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete finished jobs past their TTL; returns their number."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (now if now is not None else time.time(),),
+            ).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of stored jobs per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in JOB_STATUSES} | {row[0]: row[1] for row in rows}
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Status view of a job for the API (without payload and result)."""
+    view = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+    }
+    if job["error"] is not None:
+        view["error"] = job["error"]
+    return view
+
+
+Runner = Callable[[Any], Awaitable[Any]]
+
+
+class JobService:
+    """
+    Worker pool and HTTP routes of the job API.
+
+    Args:
+        queue: The JobQueue holding the jobs
+        workers: Jobs run concurrently
+        job_timeout_s: Run time after which a job fails
+        base_url: Pathway REST server the default job kinds are sent to
+        runners: Job kind -> async callable(payload) returning the result;
+            defaults to POSTing the payload to JOB_ENDPOINTS on ``base_url``
+        poll_interval_s: Idle workers look for new jobs at least this often
+        purge_interval_s: Interval of the expired-result cleanup
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        workers: int = 4,
+        job_timeout_s: float = 1800.0,
+        base_url: str = "http://127.0.0.1:8001",
+        runners: Optional[Dict[str, Runner]] = None,
+        poll_interval_s: float = 1.0,
+        purge_interval_s: float = 60.0,
+    ):
+        self.queue = queue
+        self.workers = workers
+        self.job_timeout_s = job_timeout_s
+        self.base_url = base_url
+        self.runners = runners if runners is not None else {
+            kind: self._http_runner(path, JOB_PAYLOAD_DEFAULTS.get(kind, {})) for kind, path in JOB_ENDPOINTS.items()
+        }
+        self.poll_interval_s = poll_interval_s
+        self.purge_interval_s = purge_interval_s
+
+        self._running: Dict[str, asyncio.Task] = {}
+        self._tasks: list = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self._jobs = REGISTRY.counter("jobs_total", "Finished jobs by kind and status")
+        self._depth = REGISTRY.gauge("job_queue_depth", "Stored jobs by status")
+        self._wait_ms = REGISTRY.histogram("job_wait_ms", "Time jobs spent queued", buckets=JOB_WAIT_BUCKETS_MS)
+        self._run_ms = REGISTRY.histogram("job_run_ms", "Run time of jobs", buckets=JOB_WAIT_BUCKETS_MS)
+
+    def _http_runner(self, path: str, defaults: Dict[str, Any]) -> Runner:
+        async def run(payload: Any) -> Any:
+            async with ClientSession(timeout=ClientTimeout(total=self.job_timeout_s)) as session:
+                async with session.post(self.base_url + path, json={**defaults, **payload}) as response:
+                    response.raise_for_status()
+                    return await response.json()
+
+        return run
+
+    async def _record_depth(self) -> None:
+        for status, count in (await asyncio.to_thread(self.queue.counts)).items():
+            self._depth.set(count, status=status)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        self._wait_ms.observe((job["started_at"] - job["created_at"]) * 1000.0, kind=job["kind"])
+        runner = self.runners.get(job["kind"])
+        if runner is None:
+            await asyncio.to_thread(self.queue.fail, job["id"], f"no runner for job kind {job['kind']!r}")
+            self._jobs.inc(kind=job["kind"], status="failed")
+            return
+        task = asyncio.create_task(asyncio.wait_for(runner(job["payload"]), self.job_timeout_s))
+        self._running[job["id"]] = task
+        status = "failed"
+        try:
+            result = await task
+            status = "succeeded" if await asyncio.to_thread(self.queue.complete, job["id"], result) else "cancelled"
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # The worker itself is being stopped; the job is re-queued on the next start
+            status = "cancelled"
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(self.queue.fail, job["id"], f"timed out after {self.job_timeout_s:.0f}s")
+        except Exception as e:
+            logger.warning(f"⚠️ Job {job['id']} ({job['kind']}) failed: {e}")
+            await asyncio.to_thread(self.queue.fail, job["id"], str(e) or type(e).__name__)
+        finally:
+            self._running.pop(job["id"], None)
+        self._jobs.inc(kind=job["kind"], status=status)
+        self._run_ms.observe((time.time() - job["started_at"]) * 1000.0, kind=job["kind"], status=status)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval_s)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._record_depth()
+            await self._run(job)
+            await self._record_depth()
+
+    async def _janitor(self) -> None:
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.queue.purge_expired)
+                if purged:
+                    logger.info(f"🧹 Purged {purged} expired jobs")
+                await self._record_depth()
+            except Exception as e:
+                logger.warning(f"⚠️ Job cleanup failed: {e}")
+            await asyncio.sleep(self.purge_interval_s)
+
+    async def start(self, app: Optional[web.Application] = None) -> None:
+        """Start the workers and the cleanup task on the running event loop."""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+        logger.info(f"🗂️ Job workers started ({self.workers} workers, queue {self.queue.path})")
+
+    async def stop(self, app: Optional[web.Application] = None) -> None:
+        """Stop the workers; running jobs are re-queued on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job and interrupt it if it is running; returns its status afterwards."""
+        status = await asyncio.to_thread(self.queue.cancel, job_id)
+        task = self._running.get(job_id)
+        if status == "cancelled" and task is not None:
+            task.cancel()
+        return status
+
+    async def submit_handler(self, request: web.Request) -> web.Response:
+        """POST /v1/jobs: queue a job and return its id (202)."""
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "Invalid JSON body"}, status=400)
+        if not isinstance(body, dict):
+            return web.json_response({"error": "body must be a JSON object"}, status=400)
+        kind = body.get("kind", "answer")
+        if kind not in self.runners:
+            return web.json_response({"error": f"kind must be one of {sorted(self.runners)}"}, status=400)
+        payload = body.get("payload")
+        if not isinstance(payload, dict):
+            return web.json_response({"error": "payload must be a JSON object"}, status=400)
+        try:
+            priority = parse_priority(body.get("priority"))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        try:
+            job = await asyncio.to_thread(self.queue.submit, kind, payload, priority)
+        except QueueFull as e:
+            return web.json_response({"error": f"Job queue full: {e}"}, status=429, headers={"Retry-After": "60"})
+        if self._wakeup is not None:
+            self._wakeup.set()
+        await self._record_depth()
+
+        location = f"/v1/jobs/{job['id']}"
+        view = public_job(job)
+        view["links"] = {"status": location, "result": f"{location}/result"}
+        return web.json_response(view, status=202, headers={"Location": location})
+
+    async def status_handler(self, request: web.Request) -> web.Response:
+        """GET /v1/jobs/{job_id}: status, queue position and timings."""
+        job = await asyncio.to_thread(self.queue.get, request.match_info["job_id"])
+        if job is None:
+            return web.json_response({"error": "Unknown or expired job"}, status=404)
+        view = public_job(job)
+        if job["status"] == "queued":
+            view["position"] = await asyncio.to_thread(self.queue.position, job)
+        return web.json_response(view)
+
+    async def result_handler(self, request: web.Request) -> web.Response:
+        """GET /v1/jobs/{job_id}/result: 200 with the result, 202 while pending, 409 if it has none."""
+        job = await asyncio.to_thread(self.queue.get, request.match_info["job_id"])
+        if job is None:
+            return web.json_response({"error": "Unknown or expired job"}, status=404)
+        view = public_job(job)
+        if job["status"] == "succeeded":
+            view["result"] = job["result"]
+            return web.json_response(view)
+        if job["status"] in FINAL_STATUSES:
+            return web.json_response(view, status=409)
+        return web.json_response(view, status=202, headers={"Retry-After": "5"})
+
+    async def cancel_handler(self, request: web.Request) -> web.Response:
+        """DELETE /v1/jobs/{job_id}: cancel a queued or running job."""
+        job_id = request.match_info["job_id"]
+        status = await self.cancel(job_id)
+        if status is None:
+            return web.json_response({"error": "Unknown or expired job"}, status=404)
+        if status != "cancelled":
+            return web.json_response({"job_id": job_id, "status": status, "error": "Job already finished"}, status=409)
+        return web.json_response({"job_id": job_id, "status": status})
+
+    def add_routes(self, app: web.Application) -> None:
+        """Register the job routes and start/stop the workers with the app."""
+        app.router.add_post("/v1/jobs", self.submit_handler)
+        app.router.add_get("/v1/jobs/{job_id}", self.status_handler)
+        app.router.add_get("/v1/jobs/{job_id}/result", self.result_handler)
+        app.router.add_delete("/v1/jobs/{job_id}", self.cancel_handler)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
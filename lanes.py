@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Priority Lanes for Shared Embedder and LLM Capacity
+
+Citizen and doctor searches share the embedder and the LLM provider with bulk
+work: catalog audits (/v1/retrieve_batch, /v1/jobs) and document ingestion.
+Without scheduling classes a backfill fills every slot and interactive p99
+explodes. A LaneScheduler puts every caller into one of three lanes with its
+own bounded queue and hands free slots to the waiting lanes in weighted-fair
+order (stride scheduling): with weights 8/2/1 interactive work gets 8 of every
+11 slots while all lanes are busy, and every slot while the others are idle.
+
+Lanes:
+- ``interactive``: /v1/pw_ai_answer, the streaming endpoint and single queries
+- ``batch``: /v1/jobs analyses and /v1/retrieve_batch chunks
+- ``ingestion``: embedding of newly parsed document chunks
+
+Key Features:
+- Separate bounded wait queue per lane; a full queue rejects instead of growing
+- Weighted-fair dispatch of a fixed number of slots, idle lanes accrue no credit
+- Optional per-lane in-flight cap so background lanes never hold every slot
+- Per-lane queue depth, in-flight, wait time and dispatch outcome metrics
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LANES = ("interactive", "batch", "ingestion")
+DEFAULT_LANE = "interactive"
+
+DEFAULT_LANE_SETTINGS: Dict[str, Dict] = {
+    "interactive": {"weight": 8, "max_queued": 256, "max_in_flight": None},
+    "batch": {"weight": 2, "max_queued": 1024, "max_in_flight": None},
+    "ingestion": {"weight": 1, "max_queued": 1024, "max_in_flight": None},
+}
+
+T = TypeVar("T")
+
+
+class LaneRejected(RuntimeError):
+    """The lane's queue is full or no slot became free in time."""
+
+
+def lane_or_default(lane: Optional[str]) -> str:
+    """The lane of a request: one of LANES, interactive if unset or unknown."""
+    return lane if lane in LANES else DEFAULT_LANE
+
+
+class _Waiter:
+    __slots__ = ("lane", "granted", "enqueued")
+
+    def __init__(self, lane: str):
+        self.lane = lane
+        self.granted = False
+        self.enqueued = time.perf_counter()
+
+
+class LaneScheduler:
+    """
+    Weighted-fair scheduler of ``slots`` concurrent uses of one resource.
+
+    Args:
+        slots: Concurrent holders (LLM requests in flight, embedding forward passes)
+        lanes: Lane name -> {"weight", "max_queued", "max_in_flight"}; missing
+            lanes and keys fall back to DEFAULT_LANE_SETTINGS
+        name: Label of the scheduler's metrics ("llm", "embedder")
+    """
+
+    def __init__(self, slots: int = 8, lanes: Optional[Dict[str, Dict]] = None, name: str = "llm"):
+        if slots < 1:
+            raise ValueError("slots must be at least 1")
+        self.slots = slots
+        self.name = name
+        unknown = set(lanes or {}) - set(LANES)
+        if unknown:
+            raise ValueError(f"unknown lanes {sorted(unknown)}; lanes are {list(LANES)}")
+        self.lanes: Dict[str, Dict] = {}
+        for lane in LANES:
+            settings = {**DEFAULT_LANE_SETTINGS[lane], **((lanes or {}).get(lane) or {})}
+            if settings["weight"] <= 0:
+                raise ValueError(f"weight of lane {lane} must be positive")
+            self.lanes[lane] = settings
+
+        self._cond = threading.Condition()
+        self._waiting: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self._in_flight: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._pass: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self._clock = 0.0
+
+        self._queued_gauge = REGISTRY.gauge("lane_queued", "Callers waiting per scheduler and lane")
+        self._in_flight_gauge = REGISTRY.gauge("lane_in_flight", "Slots held per scheduler and lane")
+        self._wait_ms = REGISTRY.histogram("lane_wait_ms", "Time callers waited for a slot, per lane")
+        self._dispatch = REGISTRY.counter("lane_dispatch_total", "Slot requests per lane by outcome")
+
+    def _free(self) -> int:
+        return self.slots - sum(self._in_flight.values())
+
+    def _eligible(self, lane: str) -> bool:
+        cap = self.lanes[lane]["max_in_flight"]
+        return cap is None or self._in_flight[lane] < cap
+
+    def _grant(self, lane: str) -> None:
+        self._in_flight[lane] += 1
+        # Stride scheduling: each slot advances the lane's pass by 1/weight
+        self._clock = max(self._clock, self._pass[lane])
+        self._pass[lane] = self._clock + 1.0 / self.lanes[lane]["weight"]
+
+    def _dispatch_waiters(self) -> None:
+        while self._free() > 0:
+            ready = [lane for lane in LANES if self._waiting[lane] and self._eligible(lane)]
+            if not ready:
+                return
+            lane = min(ready, key=lambda name: self._pass[name])
+            self._waiting[lane].popleft().granted = True
+            self._grant(lane)
+            self._cond.notify_all()
+
+    def _record(self) -> None:
+        for lane in LANES:
+            self._queued_gauge.set(len(self._waiting[lane]), scheduler=self.name, lane=lane)
+            self._in_flight_gauge.set(self._in_flight[lane], scheduler=self.name, lane=lane)
+
+    def acquire(self, lane: str, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a slot in ``lane``.
+
+        Returns:
+            True once a slot is held (release it with ``release(lane)``), False
+            if the lane's queue is full or no slot became free within ``timeout``
+        """
+        lane = lane_or_default(lane)
+        with self._cond:
+            nobody_waiting = not any(self._waiting.values())
+            if nobody_waiting and self._free() > 0 and self._eligible(lane):
+                self._grant(lane)
+                self._dispatch.inc(scheduler=self.name, lane=lane, outcome="immediate")
+                self._record()
+                return True
+            if len(self._waiting[lane]) >= self.lanes[lane]["max_queued"]:
+                self._dispatch.inc(scheduler=self.name, lane=lane, outcome="rejected")
+                return False
+
+            waiter = _Waiter(lane)
+            if not self._waiting[lane]:
+                # A lane returning from idle starts at the current clock, without saved-up credit
+                self._pass[lane] = max(self._pass[lane], self._clock)
+            self._waiting[lane].append(waiter)
+            self._dispatch_waiters()
+            self._record()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not waiter.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            if not waiter.granted:
+                self._waiting[lane].remove(waiter)
+                self._dispatch.inc(scheduler=self.name, lane=lane, outcome="timeout")
+                self._record()
+                return False
+            self._wait_ms.observe((time.perf_counter() - waiter.enqueued) * 1000.0, scheduler=self.name, lane=lane)
+            self._dispatch.inc(scheduler=self.name, lane=lane, outcome="queued")
+            self._record()
+            return True
+
+    def release(self, lane: str) -> None:
+        """Return a slot acquired in ``lane`` and hand it to the next waiting lane."""
+        lane = lane_or_default(lane)
+        with self._cond:
+            if self._in_flight[lane] <= 0:
+                raise RuntimeError(f"release of lane {lane} without a held slot")
+            self._in_flight[lane] -= 1
+            self._dispatch_waiters()
+            self._record()
+
+    @contextmanager
+    def slot(self, lane: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Hold a slot for the duration of the block.
+
+        Raises:
+            LaneRejected: The lane's queue is full or the timeout passed
+        """
+        lane = lane_or_default(lane)
+        if not self.acquire(lane, timeout):
+            raise LaneRejected(f"No {self.name} slot for lane {lane}")
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def run(self, lane: str, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+        """Call ``fn`` while holding a slot in ``lane``."""
+        with self.slot(lane, timeout):
+            return fn()
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Waiting and in-flight callers per lane."""
+        with self._cond:
+            return {lane: {"queued": len(self._waiting[lane]), "in_flight": self._in_flight[lane]} for lane in LANES}
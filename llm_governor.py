@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+LLM Concurrency Governor
+
+Under bursts OpenRouter answers with 429s and slow requests pile up until the
+frontend's 120-second timeout. The governor is the single gate every LLM call
+passes through (Pathway /v1/pw_ai_answer and the streaming endpoint alike).
+
+Key Features:
+- Max in-flight requests across the process
+- Token-bucket rate limiter matched to the provider quota
+- Jittered exponential retry on retryable errors (429, 5xx, timeouts, connection errors)
+- Circuit breaker that fails fast while the provider is degraded; callers then
+  answer from the retrieved documents only
+- In-flight, retry, rejection and breaker-state metrics
+- Optional lanes.LaneScheduler: in-flight slots are handed out weighted-fair
+  to interactive, batch and ingestion callers
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# LiteLLM / OpenAI / httpx exception class names that indicate a transient failure
+RETRYABLE_ERROR_NAMES = {
+    "RateLimitError",
+    "Timeout",
+    "APITimeoutError",
+    "TimeoutError",
+    "ReadTimeout",
+    "ConnectTimeout",
+    "APIConnectionError",
+    "ConnectionError",
+    "ServiceUnavailableError",
+    "InternalServerError",
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the provider while the breaker is open."""
+
+
+class GovernorTimeout(RuntimeError):
+    """No in-flight slot or rate-limit token became available in time."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an LLM error is transient and worth retrying."""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
+
+    Args:
+        rate_per_minute: Sustained requests per minute (the provider quota)
+        burst: Requests allowed back-to-back after an idle period
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token if available; otherwise return the seconds until one is."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed -> open after ``failure_threshold`` consecutive retryable failures;
+    open -> half-open after ``recovery_timeout_s``, letting one probe through;
+    half-open -> closed on success, back to open on failure. A probe that
+    ends without an answer about the provider's health (non-retryable error,
+    local timeout, disconnect) is released so the next call probes instead.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout_s = recovery_timeout_s
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._state_gauge = REGISTRY.gauge("llm_circuit_open", "1 while the LLM circuit breaker is open")
+
+    def admit(self) -> Optional[bool]:
+        """None if the call is rejected, True if it is the half-open probe, False otherwise."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout_s:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return None
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def release_probe(self) -> None:
+        """End a half-open probe that recorded neither success nor failure."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("✅ LLM circuit breaker closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+        self._state_gauge.set(0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"🚨 LLM circuit breaker opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+        if self.state == self.OPEN:
+            self._state_gauge.set(1)
+
+
+class LLMGovernor:
+    """
+    Gate for all LLM calls: concurrency cap, rate limit, retries and breaker.
+
+    Args:
+        max_in_flight: Maximum concurrent provider requests
+        rate_per_minute: Token-bucket refill rate (requests per minute)
+        burst: Token-bucket capacity
+        max_retries: Retries after the first attempt on retryable errors
+        base_delay_s: First backoff delay; doubles per retry with full jitter
+        max_delay_s: Upper bound of one backoff delay
+        failure_threshold: Consecutive retryable failures that open the breaker
+        recovery_timeout_s: Time the breaker stays open before probing
+        acquire_timeout_s: Longest a call waits for a slot or rate-limit token
+        lanes: Optional lanes.LaneScheduler; its slots replace ``max_in_flight``
+            and are dispatched per lane
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        rate_per_minute: float = 120,
+        burst: int = 10,
+        max_retries: int = 3,
+        base_delay_s: float = 1.0,
+        max_delay_s: float = 20.0,
+        failure_threshold: int = 5,
+        recovery_timeout_s: float = 30.0,
+        acquire_timeout_s: float = 30.0,
+        lanes=None,
+    ):
+        self.lanes = lanes
+        if lanes is not None:
+            max_in_flight = lanes.slots
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.acquire_timeout_s = acquire_timeout_s
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout_s)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+        self._in_flight = REGISTRY.gauge("llm_in_flight", "LLM requests currently in flight")
+        self._calls = REGISTRY.counter("llm_calls_total", "LLM call outcomes")
+        self._retries = REGISTRY.counter("llm_retries_total", "LLM retries after retryable errors")
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for retry ``attempt`` (0-based)."""
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * (2 ** attempt)))
+
+    def _check_breaker(self) -> bool:
+        """Raise CircuitOpenError unless admitted; returns whether the call is the half-open probe."""
+        probe = self.breaker.admit()
+        if probe is None:
+            self._calls.inc(outcome="circuit_open")
+            raise CircuitOpenError("LLM provider degraded; circuit breaker is open")
+        return probe
+
+    def _handle_error(self, error: Exception, attempt: int) -> float:
+        """Record a failed attempt; returns the backoff delay or re-raises.
+
+        Non-retryable errors (e.g. a 400 for a bad prompt) are not provider
+        failures and leave the breaker untouched.
+        """
+        if not is_retryable(error):
+            self._calls.inc(outcome="error")
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries or self.breaker.state == CircuitBreaker.OPEN:
+            self._calls.inc(outcome="exhausted")
+            raise error
+        self._retries.inc()
+        delay = self.backoff(attempt)
+        logger.warning(f"🔁 LLM call failed ({type(error).__name__}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def _acquire_slot(self, lane: str, timeout: float) -> bool:
+        if self.lanes is not None:
+            return self.lanes.acquire(lane, timeout)
+        return self._slots.acquire(timeout=timeout)
+
+    def _release_slot(self, lane: str) -> None:
+        if self.lanes is not None:
+            self.lanes.release(lane)
+        else:
+            self._slots.release()
+
+    async def _acquire_slot_async(self, lane: str, timeout: float) -> bool:
+        """_acquire_slot in a worker thread; a slot granted after the caller was cancelled is released."""
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._acquire_slot, lane, timeout))
+        try:
+            return await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The thread keeps waiting and may still get the slot: hand it back once it does
+            def release_late(done: asyncio.Future) -> None:
+                if not done.cancelled() and done.exception() is None and done.result():
+                    self._release_slot(lane)
+
+            acquiring.add_done_callback(release_late)
+            raise
+
+    def _record_success(self) -> None:
+        self.breaker.record_success()
+        self._calls.inc(outcome="success")
+
+    def call(self, fn: Callable[[], Any], deadline: Optional[float] = None, lane: str = "interactive") -> Any:
+        """
+        Run a blocking LLM call under the governor's policies.
+
+        Args:
+            fn: The provider call
+            deadline: Optional absolute time (epoch seconds) after which the call
+                is given up with GovernorTimeout; waits and retries that cannot
+                finish in time are skipped, and a miss does not count against
+                the circuit breaker
+            lane: Scheduling lane of the call (used with ``lanes``)
+        """
+        def wait_s(limit: float) -> float:
+            return limit if deadline is None else max(0.0, min(limit, deadline - time.time()))
+
+        probe = self._check_breaker()
+        try:
+            if not self._acquire_slot(lane, wait_s(self.acquire_timeout_s)):
+                self._calls.inc(outcome="rejected")
+                raise GovernorTimeout(f"No LLM slot free within {self.acquire_timeout_s}s or the request deadline")
+            self._in_flight.inc()
+            try:
+                attempt = 0
+                while True:
+                    if not self.bucket.acquire(wait_s(self.acquire_timeout_s)):
+                        self._calls.inc(outcome="rejected")
+                        raise GovernorTimeout(
+                            "LLM rate limit: no token within acquire timeout or the request deadline"
+                        )
+                    try:
+                        result = fn()
+                    except Exception as e:
+                        if deadline is not None and time.time() >= deadline:
+                            self._calls.inc(outcome="deadline")
+                            raise GovernorTimeout(f"LLM call missed the request deadline: {e}") from e
+                        delay = self._handle_error(e, attempt)
+                        if deadline is not None and time.time() + delay >= deadline:
+                            self._calls.inc(outcome="deadline")
+                            raise GovernorTimeout(f"No time left to retry before the request deadline: {e}") from e
+                        time.sleep(delay)
+                        attempt += 1
+                        probe = self._check_breaker() or probe
+                        continue
+                    self._record_success()
+                    return result
+            finally:
+                self._in_flight.dec()
+                self._release_slot(lane)
+        finally:
+            if probe:
+                self.breaker.release_probe()  # No-op once the probe recorded its outcome
+
+    async def stream(
+        self, source: Callable[[], AsyncIterator[Any]], lane: str = "interactive"
+    ) -> AsyncIterator[Any]:
+        """
+        Run a streaming LLM call under the governor's policies.
+
+        Retries only happen before the first chunk; once tokens have been sent
+        to the client a failure is propagated.
+        """
+        probe = self._check_breaker()
+        try:
+            if not await self._acquire_slot_async(lane, self.acquire_timeout_s):
+                self._calls.inc(outcome="rejected")
+                raise GovernorTimeout(f"No LLM slot free within {self.acquire_timeout_s}s")
+            self._in_flight.inc()
+            try:
+                attempt = 0
+                while True:
+                    if not await self.bucket.acquire_async(self.acquire_timeout_s):
+                        self._calls.inc(outcome="rejected")
+                        raise GovernorTimeout("LLM rate limit: no token within acquire timeout")
+                    started = False
+                    try:
+                        async for chunk in source():
+                            started = True
+                            yield chunk
+                    except Exception as e:
+                        if started:
+                            if is_retryable(e):  # As in _handle_error: only provider failures count
+                                self.breaker.record_failure()
+                            self._calls.inc(outcome="error")
+                            raise
+                        await asyncio.sleep(self._handle_error(e, attempt))
+                        attempt += 1
+                        probe = self._check_breaker() or probe
+                        continue
+                    self._record_success()
+                    return
+            finally:
+                self._in_flight.dec()
+                self._release_slot(lane)
+        finally:
+            if probe:
+                self.breaker.release_probe()  # Consumer disconnects (GeneratorExit) end up here too
+
+
+DEGRADED_NOTICE = (
+    "⚠️ The AI analysis service is temporarily degraded. Showing the most relevant "
+    "regulatory excerpts instead of a full compliance analysis:"
+)
+
+
+def retrieval_only_answer(
+    docs: List[dict], max_sources: int = 5, snippet_chars: int = 300, notice: str = DEGRADED_NOTICE
+) -> str:
+    """
+    Answer built from the retrieved chunks only (LLM unavailable or not needed).
+    """
+    if not docs:
+        return (
+            "⚠️ The analysis service is temporarily unavailable and no matching "
+            "regulatory documents were found. Please try again shortly."
+        )
+    lines = [notice, ""]
+    for i, doc in enumerate(docs[:max_sources], 1):
+        path = doc.get("metadata", {}).get("path", "unknown source")
+        text = " ".join(str(doc.get("text", "")).split())
+        if len(text) > snippet_chars:
+            text = text[:snippet_chars].rsplit(" ", 1)[0] + "…"
+        lines.append(f"{i}. **{path.split('/')[-1]}**: {text}")
+    return "\n".join(lines)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+End-to-End Load Test for the Pharmaceutical RAG Servers
+
+Drives /v1/pw_ai_answer, /v1/retrieve and the streaming answer endpoint at a
+fixed request rate (open loop) or a fixed number of concurrent clients (closed
+loop) and reports:
+- Throughput and error counts per endpoint
+- Client-side latency p50/p95/p99 per endpoint (plus TTFT for streaming)
+- Per-stage server latency: every /v1/metrics histogram that moved during the
+  run (query embedding batch wait/forward, rerank, LLM call, stream retrieval)
+
+Run against mock_openrouter.py to load-test without API keys or cost.
+
+Usage:
+    python load_test.py --rps 5 --duration 60 --mix answer=1
+    python load_test.py --concurrency 16 --duration 30 --mix retrieve=0.8,answer=0.2
+    python load_test.py --concurrency 8 --mix stream=1 --json load.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout
+
+from benchmark_embedders import BENCHMARK_QUERIES
+
+ENDPOINT_PATHS = {
+    "answer": "/v1/pw_ai_answer",
+    "retrieve": "/v1/retrieve",
+}
+
+
+@dataclass
+class RequestResult:
+    """Outcome of one load-test request."""
+
+    endpoint: str
+    ok: bool
+    status: int
+    latency_ms: float
+    error: Optional[str] = None
+    ttft_ms: Optional[float] = None
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse ``retrieve=0.8,answer=0.2`` into normalized endpoint weights."""
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in (*ENDPOINT_PATHS, "stream"):
+            raise ValueError(f"Unknown endpoint {name!r} in mix")
+        weights[name] = float(weight or 1.0)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Endpoint mix weights must be positive")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class LoadClient:
+    """
+    Sends single requests to the RAG servers and times them.
+
+    Args:
+        session: aiohttp session (carries the per-request timeout)
+        base_url: Pathway server (answer and retrieve endpoints)
+        stream_url: Streaming answer endpoint
+        k: Documents per retrieve request
+    """
+
+    def __init__(
+        self,
+        session: ClientSession,
+        base_url: str = "http://127.0.0.1:8001",
+        stream_url: str = "http://127.0.0.1:8003/v1/pw_ai_answer_stream",
+        k: int = 10,
+    ):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.stream_url = stream_url
+        self.k = k
+
+    def default_payload(self, endpoint: str, query: str) -> Dict:
+        return {"query": query, "k": self.k} if endpoint == "retrieve" else {"prompt": query}
+
+    async def send(self, endpoint: str, query: str, payload: Optional[Dict] = None) -> RequestResult:
+        """Send one request; ``payload`` overrides the default body built from ``query``."""
+        started = time.perf_counter()
+        ttft_ms = None
+        payload = payload or self.default_payload(endpoint, query)
+        try:
+            if endpoint == "stream":
+                status, ttft_ms, error = await self._stream(payload, started)
+            else:
+                async with self.session.post(self.base_url + ENDPOINT_PATHS[endpoint], json=payload) as response:
+                    await response.read()
+                    status = response.status
+                    error = None if status < 400 else f"HTTP {status}"
+        except asyncio.TimeoutError:
+            status, error = 0, "timeout"
+        except Exception as e:
+            status, error = 0, type(e).__name__
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        return RequestResult(endpoint, error is None, status, latency_ms, error, ttft_ms)
+
+    async def _stream(self, payload: Dict, started: float):
+        ttft_ms, event = None, None
+        async with self.session.post(self.stream_url, json=payload) as response:
+            if response.status >= 400:
+                await response.read()
+                return response.status, None, f"HTTP {response.status}"
+            async for raw in response.content:
+                line = raw.decode("utf-8").strip()
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                    if event == "token" and ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000.0
+                    if event == "error":
+                        return response.status, ttft_ms, "stream error"
+            return response.status, ttft_ms, None if event == "done" else "stream incomplete"
+
+
+async def run_closed_loop(
+    send: Callable[[], Awaitable[RequestResult]], concurrency: int, duration_s: float
+) -> List[RequestResult]:
+    """``concurrency`` clients each send their next request as soon as the last returns."""
+    deadline = time.monotonic() + duration_s
+    results: List[RequestResult] = []
+
+    async def client():
+        while time.monotonic() < deadline:
+            results.append(await send())
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+async def run_open_loop(
+    send: Callable[[], Awaitable[RequestResult]],
+    rps: float,
+    duration_s: float,
+    max_outstanding: int = 1000,
+    poisson: bool = False,
+) -> List[RequestResult]:
+    """
+    Start requests at a fixed rate regardless of how fast the server answers.
+
+    Arrivals that find ``max_outstanding`` requests pending are recorded as
+    ``client_saturated`` errors instead of being queued on the client.
+    """
+    results: List[RequestResult] = []
+    tasks = set()
+    start = time.monotonic()
+    next_at = start
+    while next_at < start + duration_s:
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        if len(tasks) >= max_outstanding:
+            results.append(RequestResult("client", False, 0, 0.0, "client_saturated"))
+        else:
+            task = asyncio.ensure_future(send())
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), results.append(t.result())))
+        next_at += random.expovariate(rps) if poisson else 1.0 / rps
+    if tasks:
+        await asyncio.gather(*tasks)
+    return results
+
+
+def summarize(results: List[RequestResult], elapsed_s: float) -> Dict[str, Dict]:
+    """Throughput, errors and latency percentiles per endpoint (and overall)."""
+    groups: Dict[str, List[RequestResult]] = {"all": results}
+    for result in results:
+        groups.setdefault(result.endpoint, []).append(result)
+
+    summary = {}
+    for name, group in groups.items():
+        latencies = [r.latency_ms for r in group if r.ok]
+        errors: Dict[str, int] = {}
+        for r in group:
+            if not r.ok:
+                errors[r.error or "unknown"] = errors.get(r.error or "unknown", 0) + 1
+        entry = {
+            "requests": len(group),
+            "ok": len(latencies),
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+            "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+        }
+        ttfts = [r.ttft_ms for r in group if r.ok and r.ttft_ms is not None]
+        if ttfts:
+            entry.update({
+                "ttft_p50_ms": percentile(ttfts, 50),
+                "ttft_p95_ms": percentile(ttfts, 95),
+                "ttft_p99_ms": percentile(ttfts, 99),
+            })
+        summary[name] = entry
+    return summary
+
+
+def stage_breakdown(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Server-side stage latencies from two /v1/metrics snapshots.
+
+    Counts and means are exact deltas over the run; percentiles come from the
+    histograms' recent window at the end of the run.
+    """
+    stages = {}
+    for name, metric in after.items():
+        if metric.get("type") != "histogram":
+            continue
+        previous = before.get(name, {}).get("values", {})
+        for labels, series in metric["values"].items():
+            old = previous.get(labels, {"count": 0, "sum": 0.0})
+            count = series["count"] - old["count"]
+            if count <= 0:
+                continue
+            key = f"{name}{{{labels}}}" if labels else name
+            stages[key] = {
+                "count": count,
+                "mean": round((series["sum"] - old["sum"]) / count, 2),
+                "p50": series["p50"],
+                "p95": series["p95"],
+                "p99": series["p99"],
+            }
+    return stages
+
+
+async def fetch_metrics(session: ClientSession, base_url: str) -> Dict[str, Dict]:
+    """Snapshot of /v1/metrics, or {} when the server does not expose it."""
+    try:
+        async with session.get(base_url.rstrip("/") + "/v1/metrics") as response:
+            if response.status == 200:
+                return await response.json()
+    except Exception:
+        pass
+    return {}
+
+
+async def run_load_test(args) -> Dict:
+    mix = parse_mix(args.mix)
+    queries = BENCHMARK_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    rng = random.Random(args.seed)
+
+    async with ClientSession(timeout=ClientTimeout(total=args.timeout)) as session:
+        client = LoadClient(session, args.url, args.stream_url, args.k)
+
+        def send() -> Awaitable[RequestResult]:
+            endpoint = rng.choices(list(mix), weights=list(mix.values()))[0]
+            return client.send(endpoint, rng.choice(queries))
+
+        before = await fetch_metrics(session, args.url)
+        started = time.monotonic()
+        if args.rps:
+            results = await run_open_loop(send, args.rps, args.duration, args.max_outstanding, args.poisson)
+        else:
+            results = await run_closed_loop(send, args.concurrency, args.duration)
+        elapsed = time.monotonic() - started
+        after = await fetch_metrics(session, args.url)
+
+    return {
+        "settings": {
+            "mode": f"open loop {args.rps} rps" if args.rps else f"closed loop x{args.concurrency}",
+            "duration_s": args.duration,
+            "mix": mix,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": summarize(results, elapsed),
+        "stages_ms": stage_breakdown(before, after),
+    }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:9.1f}" if value is not None else "        -"
+
+
+def print_report(report: Dict) -> None:
+    print(f"\n📊 Load test: {report['settings']['mode']}, {report['elapsed_s']}s")
+    print(f"{'endpoint':<10} {'reqs':>6} {'ok':>6} {'rps':>7} {'p50':>9} {'p95':>9} {'p99':>9}  errors")
+    for name, entry in report["endpoints"].items():
+        print(
+            f"{name:<10} {entry['requests']:>6} {entry['ok']:>6} {entry['throughput_rps']:>7} "
+            f"{_fmt(entry['p50_ms'])} {_fmt(entry['p95_ms'])} {_fmt(entry['p99_ms'])}  {entry['errors'] or ''}"
+        )
+        if "ttft_p50_ms" in entry:
+            print(f"{'  ttft':<10} {'':>6} {'':>6} {'':>7} "
+                  f"{_fmt(entry['ttft_p50_ms'])} {_fmt(entry['ttft_p95_ms'])} {_fmt(entry['ttft_p99_ms'])}")
+
+    if report["stages_ms"]:
+        print("\n🔬 Server stages (ms)")
+        print(f"{'stage':<60} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for name, stage in report["stages_ms"].items():
+            print(f"{name:<60} {stage['count']:>7} {_fmt(stage['mean'])} "
+                  f"{_fmt(stage['p50'])} {_fmt(stage['p95'])} {_fmt(stage['p99'])}")
+    else:
+        print("\nℹ️ No server stage metrics (is /v1/metrics exposed?)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the pharmaceutical RAG endpoints")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, help="Open loop: requests started per second")
+    mode.add_argument("--concurrency", type=int, default=4, help="Closed loop: concurrent clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--mix", default="answer=1", help="Endpoint weights, e.g. retrieve=0.8,answer=0.2,stream=0")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Pathway server base URL")
+    parser.add_argument("--stream-url", default="http://127.0.0.1:8003/v1/pw_ai_answer_stream")
+    parser.add_argument("--queries", help="File with one query per line (default: benchmark queries)")
+    parser.add_argument("--k", type=int, default=10, help="Documents per retrieve request")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-outstanding", type=int, default=1000, help="Open loop: pending request cap")
+    parser.add_argument("--poisson", action="store_true", help="Open loop: Poisson instead of uniform arrivals")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+In-Process Metrics Registry for the Pharmaceutical RAG System
+
+A small, dependency-free registry of counters, gauges and histograms shared by
+the performance components (query batching, caching, reranking, LLM calls).
+The enhanced server exposes a JSON snapshot of all metrics on /v1/metrics.
+
+Key Features:
+- Thread-safe counters, gauges and fixed-bucket histograms
+- Optional labels on every metric (e.g. model, tier, lane)
+- Recent-window percentiles on histograms for SLO checks
+- JSON snapshot and Prometheus text rendering
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Default latency buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _label_str(key: LabelKey) -> str:
+    return ",".join(f"{name}={value}" for name, value in key)
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Counter:
+    """Monotonically increasing value per label set."""
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {_label_str(key): value for key, value in self._values.items()}
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class _HistogramSeries:
+    def __init__(self, buckets: Tuple[float, ...], window: int):
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram per label set.
+
+    Besides cumulative bucket counts, the most recent ``window`` observations are
+    kept so that current p50/p95/p99 can be read without an external TSDB.
+    """
+
+    def __init__(self, name: str, help: str = "", buckets: Iterable[float] = LATENCY_BUCKETS_MS, window: int = 2048):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._series: Dict[LabelKey, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(self.buckets, self.window)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series.bucket_counts[i] += 1
+                    break
+            series.count += 1
+            series.sum += value
+            series.recent.append(value)
+
+    def percentile(self, q: float, **labels) -> Optional[float]:
+        """Percentile over the recent window of one label set."""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            values = sorted(series.recent) if series else []
+        return _percentile(values, q)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return series.count if series else 0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for key, series in self._series.items():
+                recent = sorted(series.recent)
+                result[_label_str(key)] = {
+                    "count": series.count,
+                    "sum": round(series.sum, 3),
+                    "buckets": {
+                        str(bound): count
+                        for bound, count in zip(self.buckets, series.bucket_counts)
+                    },
+                    "overflow": series.count - sum(series.bucket_counts),
+                    "p50": _percentile(recent, 50),
+                    "p95": _percentile(recent, 95),
+                    "p99": _percentile(recent, 99),
+                }
+            return result
+
+
+class MetricsRegistry:
+    """Get-or-create registry so components can share metrics by name."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, **kwargs)
+            elif not isinstance(metric, cls):
+                raise TypeError(f"Metric {name!r} already registered as {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help=help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help=help)
+
+    def histogram(self, name: str, help: str = "", buckets: Iterable[float] = LATENCY_BUCKETS_MS) -> Histogram:
+        return self._get_or_create(Histogram, name, help=help, buckets=buckets)
+
+    def get(self, name: str):
+        with self._lock:
+            return self._metrics.get(name)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """JSON-serialisable view of every registered metric."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {
+            name: {
+                "type": type(metric).__name__.lower(),
+                "help": metric.help,
+                "values": metric.snapshot(),
+            }
+            for name, metric in sorted(metrics.items())
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (counters, gauges, histograms)."""
+        lines: List[str] = []
+        for name, data in self.snapshot().items():
+            kind = data["type"]
+            lines.append(f"# HELP {name} {data['help']}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in data["values"].items():
+                label_pairs = [part.split("=", 1) for part in labels.split(",") if part]
+                if kind != "histogram":
+                    rendered = ",".join(f'{k}="{v}"' for k, v in label_pairs)
+                    lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in value["buckets"].items():
+                    cumulative += count
+                    rendered = ",".join([f'{k}="{v}"' for k, v in label_pairs] + [f'le="{bound}"'])
+                    lines.append(f"{name}_bucket{{{rendered}}} {cumulative}")
+                rendered = ",".join([f'{k}="{v}"' for k, v in label_pairs] + ['le="+Inf"'])
+                lines.append(f"{name}_bucket{{{rendered}}} {value['count']}")
+                base = ",".join(f'{k}="{v}"' for k, v in label_pairs)
+                suffix = f"{{{base}}}" if base else ""
+                lines.append(f"{name}_sum{suffix} {value['sum']}")
+                lines.append(f"{name}_count{suffix} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by all components
+REGISTRY = MetricsRegistry()
+
+
+def metrics_snapshot() -> Dict[str, Dict]:
+    """Handler for the /v1/metrics endpoint."""
+    return REGISTRY.snapshot()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Mock OpenRouter Server for Load Testing
+
+A local OpenAI-compatible chat completions stub that stands in for OpenRouter
+behind LiteLLM. Point OPENROUTER_API_BASE at it to run the RAG servers and the
+load generator without API keys, network access or cost.
+
+Key Features:
+- POST /chat/completions (also under /v1 and /api/v1), streaming and non-streaming
+- Configurable time-to-first-token distribution (fixed, uniform, lognormal)
+- Configurable output length and token rate
+- Error injection (429/5xx with Retry-After) and hung-request injection
+- Prompt caching: repeated ``cache_control`` prefixes are reported as cached tokens
+- Runtime reconfiguration and request statistics on /mock/config and /mock/stats
+
+Usage:
+    python mock_openrouter.py --port 8090 --latency-ms 800 --tokens-per-sec 60
+    python mock_openrouter.py --error-rate 0.1 --error-statuses 429 503
+    OPENROUTER_API_BASE=http://127.0.0.1:8090/api/v1 OPENROUTER_API_KEY=mock python app_openrouter_enhanced.py
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+# Canned answer in the shape of the government compliance template
+MOCK_ANSWER = (
+    "**Regulatory Status:** Based on the retrieved CDSCO notifications, the queried "
+    "fixed dose combination is listed under Section 26A of the Drugs and Cosmetics "
+    "Act 1940 as prohibited for manufacture, sale and distribution. **Category:** S1 "
+    "Banned. **Evidence:** Gazette notification GSR prohibition order. **Action:** "
+    "Do not procure or dispense; report existing stock to the State Drugs Controller."
+)
+
+
+@dataclass
+class MockConfig:
+    """
+    Behaviour of the mock provider.
+
+    Args:
+        latency_dist: Time-to-first-token distribution: fixed, uniform or lognormal
+        latency_ms: Fixed value, uniform centre or lognormal median of the TTFT
+        latency_spread: Uniform half-width as a fraction of latency_ms, or lognormal sigma
+        tokens_per_sec: Output token rate after the first token (0 = instant)
+        output_tokens: Completion length; capped by the request's max_tokens
+        error_rate: Fraction of requests answered with an injected error status
+        error_statuses: Statuses the injected errors are drawn from
+        retry_after_s: Retry-After header sent with injected 429s
+        timeout_rate: Fraction of requests that hang for hang_s before answering
+        hang_s: Duration of a hung request
+        seed: Random seed for reproducible runs
+    """
+
+    latency_dist: str = "lognormal"
+    latency_ms: float = 800.0
+    latency_spread: float = 0.5
+    tokens_per_sec: float = 60.0
+    output_tokens: int = 200
+    error_rate: float = 0.0
+    error_statuses: List[int] = field(default_factory=lambda: [429, 503])
+    retry_after_s: float = 1.0
+    timeout_rate: float = 0.0
+    hang_s: float = 600.0
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        if self.latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTRIBUTIONS}, got {self.latency_dist!r}")
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """Apply a partial update (e.g. the JSON body of POST /mock/config)."""
+        known = {f.name for f in fields(self)}
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(f"Unknown mock settings: {sorted(unknown)}")
+        replace(self, **values)  # Validate before touching the live config
+        for name, value in values.items():
+            setattr(self, name, value)
+
+
+def sample_latency_ms(config: MockConfig, rng: random.Random) -> float:
+    """Draw one time-to-first-token value from the configured distribution."""
+    if config.latency_dist == "fixed":
+        return config.latency_ms
+    if config.latency_dist == "uniform":
+        spread = config.latency_ms * config.latency_spread
+        return max(0.0, rng.uniform(config.latency_ms - spread, config.latency_ms + spread))
+    return rng.lognormvariate(0.0, config.latency_spread) * config.latency_ms
+
+
+def mock_tokens(count: int) -> List[str]:
+    """Word-level tokens of the canned answer, repeated to ``count`` tokens."""
+    words = MOCK_ANSWER.split(" ")
+    return [(words[i % len(words)] + " ") for i in range(max(0, count))]
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Text of a chat message with string or content-block content."""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(str(block.get("text", "")) for block in content if isinstance(block, dict))
+    return str(content)
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt token count (4 characters per token)."""
+    chars = sum(len(message_text(message)) for message in messages)
+    return max(1, chars // 4)
+
+
+def cacheable_prefix(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Messages up to and including the last one with a ``cache_control`` content block."""
+    end = 0
+    for i, message in enumerate(messages):
+        content = message.get("content")
+        if isinstance(content, list) and any(isinstance(block, dict) and "cache_control" in block for block in content):
+            end = i + 1
+    return messages[:end]
+
+
+class MockOpenRouterServer:
+    """
+    aiohttp application emulating the OpenRouter chat completions API.
+
+    Args:
+        config: Initial provider behaviour
+        host: Interface to bind
+        port: Port to listen on
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 8090):
+        self.config = config or MockConfig()
+        self.host = host
+        self.port = port
+        self.rng = random.Random(self.config.seed)
+        self.registry = MetricsRegistry()
+        self._requests = self.registry.counter("mock_requests_total", "Mock completions by outcome")
+        self._ttft_ms = self.registry.histogram("mock_ttft_ms", "Injected time to first token")
+        self._in_flight = self.registry.gauge("mock_in_flight", "Mock completions in progress")
+        self._cached_prefixes: set = set()
+
+    def _prompt_usage(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Prompt token usage; a cacheable prefix seen before counts as cached."""
+        usage: Dict[str, Any] = {"prompt_tokens": estimate_tokens(messages)}
+        prefix = cacheable_prefix(messages)
+        if prefix:
+            key = json.dumps(prefix, sort_keys=True)
+            tokens = estimate_tokens(prefix)
+            if key in self._cached_prefixes:
+                usage["prompt_tokens_details"] = {"cached_tokens": tokens}
+            else:
+                self._cached_prefixes.add(key)
+                usage["prompt_tokens_details"] = {"cached_tokens": 0, "cache_write_tokens": tokens}
+        return usage
+
+    def _error_response(self, status: int) -> web.Response:
+        headers = {"Retry-After": str(self.config.retry_after_s)} if status == 429 else None
+        body = {
+            "error": {
+                "message": f"Mock provider injected HTTP {status}",
+                "type": "rate_limit_error" if status == 429 else "server_error",
+                "code": status,
+            }
+        }
+        return web.json_response(body, status=status, headers=headers)
+
+    def _completion_base(self, model: str) -> Dict[str, Any]:
+        return {
+            "id": f"gen-mock-{uuid.uuid4().hex[:16]}",
+            "created": int(time.time()),
+            "model": model,
+            "provider": "mock",
+        }
+
+    async def completions_handler(self, request: web.Request) -> web.StreamResponse:
+        """POST /chat/completions"""
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": {"message": "Invalid JSON body", "code": 400}}, status=400)
+        messages = body.get("messages") or []
+        if not messages:
+            return web.json_response({"error": {"message": "messages is required", "code": 400}}, status=400)
+
+        config = self.config
+        if self.rng.random() < config.timeout_rate:
+            self._requests.inc(outcome="hang")
+            await asyncio.sleep(config.hang_s)
+        if self.rng.random() < config.error_rate:
+            status = self.rng.choice(config.error_statuses)
+            self._requests.inc(outcome=f"error_{status}")
+            return self._error_response(status)
+
+        model = body.get("model", "mock/model")
+        max_tokens = body.get("max_tokens") or config.output_tokens
+        tokens = mock_tokens(min(config.output_tokens, int(max_tokens)))
+        usage = self._prompt_usage(messages)
+        usage["completion_tokens"] = len(tokens)
+        usage["total_tokens"] = usage["prompt_tokens"] + len(tokens)
+        ttft_ms = sample_latency_ms(config, self.rng)
+        token_delay = 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+        self._ttft_ms.observe(ttft_ms)
+
+        self._in_flight.inc()
+        try:
+            if body.get("stream"):
+                response = await self._stream(request, model, tokens, usage, ttft_ms, token_delay)
+            else:
+                await asyncio.sleep((ttft_ms / 1000.0) + token_delay * max(0, len(tokens) - 1))
+                response = web.json_response({
+                    **self._completion_base(model),
+                    "object": "chat.completion",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+        finally:
+            self._in_flight.dec()
+        self._requests.inc(outcome="success")
+        return response
+
+    async def _stream(self, request, model, tokens, usage, ttft_ms, token_delay) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        base = {**self._completion_base(model), "object": "chat.completion.chunk"}
+
+        async def send(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> None:
+            chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        await asyncio.sleep(ttft_ms / 1000.0)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(token_delay)
+            await send({"role": "assistant", "content": token} if i == 0 else {"content": token})
+        await send({}, finish_reason="stop", usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def models_handler(self, request: web.Request) -> web.Response:
+        """GET /models"""
+        return web.json_response({"data": [{"id": "anthropic/claude-sonnet-4", "object": "model", "owned_by": "mock"}]})
+
+    async def config_handler(self, request: web.Request) -> web.Response:
+        """GET/POST /mock/config: read or partially update the provider behaviour."""
+        if request.method == "POST":
+            try:
+                self.config.update(await request.json())
+            except (ValueError, TypeError) as e:
+                return web.json_response({"error": str(e)}, status=400)
+            logger.info(f"🔧 Mock provider reconfigured: {asdict(self.config)}")
+        return web.json_response(asdict(self.config))
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        """GET /mock/stats"""
+        return web.json_response(self.registry.snapshot())
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        for prefix in ("", "/v1", "/api/v1"):
+            app.router.add_post(f"{prefix}/chat/completions", self.completions_handler)
+            app.router.add_get(f"{prefix}/models", self.models_handler)
+        app.router.add_route("*", "/mock/config", self.config_handler)
+        app.router.add_get("/mock/stats", self.stats_handler)
+        return app
+
+    def run(self) -> None:
+        logger.info(f"🧪 Mock OpenRouter on http://{self.host}:{self.port}/api/v1 ({asdict(self.config)})")
+        web.run_app(self.create_app(), host=self.host, port=self.port, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible OpenRouter stub for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="TTFT value / median")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="Uniform half-width fraction or lognormal sigma")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[429, 503])
+    parser.add_argument("--retry-after", type=float, default=1.0, dest="retry_after_s")
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-s", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    settings = {k: v for k, v in vars(args).items() if k not in ("host", "port")}
+    MockOpenRouterServer(MockConfig(**settings), host=args.host, port=args.port).run()
+
+
+if __name__ == "__main__":
+    main()
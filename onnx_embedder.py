@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Quantized ONNX Embedder for Pathway RAG System
+
+This module provides a drop-in alternative to Pathway's SentenceTransformerEmbedder
+that runs all-MiniLM-L6-v2 through ONNX Runtime with dynamic int8 quantization.
+On CPU hosts this gives noticeably higher embedding throughput than full-precision
+PyTorch while producing vectors compatible with the existing index.
+
+Key Features:
+- One-time export of the Hugging Face model to ONNX (cached under ./models/onnx)
+- Dynamic int8 weight quantization with onnxruntime.quantization
+- Same mean pooling + L2 normalization as the sentence-transformers pipeline
+- Batched inference through Pathway's max_batch_size mechanism
+
+Use benchmark_embedders.py to compare throughput and recall against the
+PyTorch embedder before switching $embedder in the YAML configuration.
+"""
+
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from pathway.xpacks.llm.embedders import BaseEmbedder
+
+logger = logging.getLogger(__name__)
+
+
+def mean_pool_normalize(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """
+    Mean-pool token embeddings over the attention mask and L2-normalize.
+
+    Mirrors the Pooling + Normalize modules of all-MiniLM-L6-v2 so the ONNX
+    vectors live in the same space as SentenceTransformer.encode output.
+
+    Args:
+        token_embeddings: (batch, sequence, hidden) last hidden state
+        attention_mask: (batch, sequence) mask of real tokens
+
+    Returns:
+        (batch, hidden) float32 unit vectors
+    """
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    pooled = summed / counts
+    norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return (pooled / norms).astype(np.float32)
+
+
+def export_onnx_model(model: str, onnx_dir: str = "models/onnx", quantize: bool = True) -> Path:
+    """
+    Export a Hugging Face encoder to ONNX and optionally quantize it to int8.
+
+    Exports are cached on disk, so only the first start pays the conversion cost.
+
+    Args:
+        model: Hugging Face model name or local path
+        onnx_dir: Directory where exported models are cached
+        quantize: Produce a dynamically quantized int8 model
+
+    Returns:
+        Path of the ONNX model to load
+    """
+    target_dir = Path(onnx_dir) / model.replace("/", "__")
+    target_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = target_dir / "model.onnx"
+    int8_path = target_dir / "model_int8.onnx"
+
+    if not fp32_path.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"📦 Exporting {model} to ONNX: {fp32_path}")
+        tokenizer = AutoTokenizer.from_pretrained(model)
+        hf_model = AutoModel.from_pretrained(model)
+        hf_model.eval()
+
+        dummy = tokenizer(["pharmaceutical compliance"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                hf_model,
+                tuple(dummy[name] for name in input_names),
+                str(fp32_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+
+    if not quantize:
+        return fp32_path
+
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"🗜️ Quantizing ONNX model to int8: {int8_path}")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+
+    return int8_path
+
+
+class OnnxInt8Embedder(BaseEmbedder):
+    """
+    Pathway embedder running a quantized ONNX export of a sentence-transformers model.
+
+    Args:
+        model: Hugging Face model name, same as SentenceTransformerEmbedder
+        onnx_dir: Cache directory for exported ONNX models
+        quantize: Use the int8 model (False runs the fp32 ONNX export)
+        batch_size: Maximum number of texts per forward pass
+        max_length: Maximum tokens per text (all-MiniLM-L6-v2 uses 256)
+        num_threads: ONNX Runtime intra-op threads, None lets ORT decide
+    """
+
+    def __init__(
+        self,
+        model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        *,
+        onnx_dir: str = "models/onnx",
+        quantize: bool = True,
+        batch_size: int = 256,
+        max_length: int = 256,
+        num_threads: Optional[int] = None,
+    ):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        super().__init__(max_batch_size=batch_size)
+        self.model_name = model
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model_path = export_onnx_model(model, onnx_dir, quantize)
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            str(self.model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {item.name for item in self.session.get_inputs()}
+        logger.info(f"⚡ ONNX embedder ready: {self.model_path.name} ({model})")
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feed = {
+            name: value.astype(np.int64)
+            for name, value in tokens.items()
+            if name in self._input_names
+        }
+        token_embeddings = self.session.run(None, feed)[0]
+        return mean_pool_normalize(token_embeddings, tokens["attention_mask"])
+
+    def __wrapped__(self, input: list[str], **kwargs) -> list[np.ndarray]:
+        """
+        Embed a batch of texts.
+
+        Args:
+            input: Texts to embed. A single string is also accepted, which is
+                how Pathway probes the embedding dimension.
+        """
+        if isinstance(input, str):
+            return self._embed_batch([input])[0]
+
+        vectors: List[np.ndarray] = []
+        for start in range(0, len(input), self.batch_size):
+            vectors.extend(self._embed_batch(list(input[start:start + self.batch_size])))
+        return vectors
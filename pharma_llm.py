@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Pharmaceutical LLM Chat Wrapper
+
+LiteLLMChat subclass used by the enhanced configuration. It adds request-level
+protections around the OpenRouter call while keeping the exact LiteLLMChat
+interface, so it is a drop-in replacement for $llm in the YAML configuration.
+
+Key Features:
+- Single-flight coalescing: identical in-flight LLM requests (same messages,
+  model, parameters and lane) share one OpenRouter call; requests with a
+  deadline are never coalesced, so none inherits another's deadline
+- Optional LLMGovernor: concurrency cap, rate limit, jittered retries and a
+  circuit breaker; when the provider is degraded the call returns None and the
+  question answerer falls back to a retrieval-only answer
+- Per-request deadlines: the remaining time becomes the provider timeout and
+  a call that cannot finish in time returns None (retrieval-only answer)
+- Coalesced-request counts, provider call latency and token usage (per model
+  tier, with cached and uncached prompt tokens) exported on /v1/metrics
+"""
+
+import logging
+import time
+from typing import Optional
+
+import pathway as pw
+from pathway.xpacks.llm._utils import _extract_value_inside_dict
+from pathway.xpacks.llm.llms import LiteLLMChat, _prepare_messages
+
+from llm_governor import CircuitOpenError, GovernorTimeout, LLMGovernor, is_retryable
+from metrics import REGISTRY
+from prompt_caching import prompt_cache_tokens
+from single_flight import FlightTimeout, SingleFlight, flight_key
+
+logger = logging.getLogger(__name__)
+
+
+class PharmaLiteLLMChat(LiteLLMChat):
+    """
+    LiteLLMChat with single-flight coalescing and an optional call governor.
+
+    Requests for the same question retrieve the same documents and therefore
+    build the same RAG prompt; while the first such call is in flight, the
+    others wait for its answer instead of calling OpenRouter again.
+
+    Args:
+        coalesce: Enable single-flight coalescing
+        governor: LLMGovernor applied to every provider call. Pathway's own
+            retry strategy is disabled when a governor is set, so retries are
+            not multiplied.
+        **kwargs: Passed to LiteLLMChat (model, capacity, retry_strategy, litellm kwargs)
+    """
+
+    def __init__(self, *, coalesce: bool = True, governor: Optional[LLMGovernor] = None, **kwargs):
+        if governor is not None:
+            kwargs.setdefault("retry_strategy", None)
+        super().__init__(**kwargs)
+        self.coalesce = coalesce
+        self.governor = governor
+        self.flight = SingleFlight("llm")
+        self._latency_ms = REGISTRY.histogram("llm_call_ms", "Provider call time including governor waits and retries")
+        self._tokens = REGISTRY.counter("llm_tokens_total", "Prompt and completion tokens reported by the provider")
+        self._cached_ratio = REGISTRY.histogram(
+            "llm_prompt_cached_ratio", "Share of each request's prompt tokens read from the provider cache",
+            buckets=(0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 1.0),
+        )
+
+    def record_usage(self, usage, tier: str) -> None:
+        """
+        Count the token usage of one response.
+
+        ``kind=prompt`` is the full prompt; it splits into ``prompt_cached``
+        (read from the provider's prompt cache) and ``prompt_uncached`` (billed
+        at the full input price, including ``prompt_cache_write`` tokens).
+        """
+        if usage is None:
+            return
+        prompt = getattr(usage, "prompt_tokens", None) or 0
+        completion = getattr(usage, "completion_tokens", None) or 0
+        cached, written = prompt_cache_tokens(usage)
+        self._tokens.inc(prompt, tier=tier, kind="prompt")
+        self._tokens.inc(completion, tier=tier, kind="completion")
+        self._tokens.inc(cached, tier=tier, kind="prompt_cached")
+        self._tokens.inc(max(0, prompt - cached), tier=tier, kind="prompt_uncached")
+        self._tokens.inc(written, tier=tier, kind="prompt_cache_write")
+        if prompt:
+            self._cached_ratio.observe(cached / prompt, tier=tier)
+        logger.debug(f"🧾 {tier}: {prompt} prompt tokens ({cached} cached, {written} cache write), {completion} completion")
+
+    def _complete(self, messages, tier: str, **kwargs) -> str | None:
+        """One litellm.completion call; records the token usage of the response."""
+        import litellm
+
+        kwargs = _extract_value_inside_dict({**self.kwargs, **kwargs})
+        kwargs.pop("verbose", None)
+        response = litellm.completion(messages=_prepare_messages(messages), **kwargs)
+        self.record_usage(getattr(response, "usage", None), tier)
+        return response.choices[0]["message"]["content"]
+
+    def _call_provider(
+        self, messages, tier: str = "default", deadline: float | None = None, lane: str = "interactive", **kwargs
+    ) -> str | None:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = self._governed_call(messages, tier, deadline, lane, **kwargs)
+            outcome = "success" if result is not None else "degraded"
+            return result
+        finally:
+            self._latency_ms.observe((time.perf_counter() - started) * 1000.0, outcome=outcome, tier=tier)
+
+    def _governed_call(
+        self, messages, tier: str, deadline: float | None = None, lane: str = "interactive", **kwargs
+    ) -> str | None:
+        def call():
+            if deadline is None:
+                return self._complete(messages, tier, **kwargs)
+            remaining_s = deadline - time.time()
+            if remaining_s <= 0:
+                raise GovernorTimeout("Request deadline passed before the LLM call")
+            return self._complete(messages, tier, **{**kwargs, "timeout": remaining_s})
+
+        if self.governor is None:
+            if deadline is None:
+                return call()
+            try:
+                return call()
+            except Exception as e:
+                if time.time() < deadline and not isinstance(e, GovernorTimeout):
+                    raise
+                logger.warning(f"⏱️ LLM call missed the request deadline: {e}")
+                return None
+        try:
+            return self.governor.call(call, deadline, lane)
+        except (CircuitOpenError, GovernorTimeout) as e:
+            logger.warning(f"⚡ LLM call skipped: {e}")
+            return None
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            logger.error(f"❌ LLM provider degraded, answering from retrieval only: {e}")
+            return None
+
+    def __wrapped__(
+        self,
+        messages: list[dict] | pw.Json,
+        tier: str = "default",
+        deadline: float | None = None,
+        lane: str = "interactive",
+        **kwargs,
+    ) -> str | None:
+        """
+        Args:
+            messages: Chat messages
+            tier: Model tier label for the latency and token metrics (QueryRouter)
+            deadline: Optional absolute time (epoch seconds) the answer is needed by;
+                None is returned if the provider cannot answer in time
+            lane: Scheduling lane of the call (lanes.LaneScheduler of the governor)
+            **kwargs: litellm overrides (model, max_tokens, ...)
+        """
+        if not self.coalesce or deadline is not None:
+            return self._call_provider(messages, tier, deadline, lane, **kwargs)
+
+        key = flight_key(
+            messages.value if isinstance(messages, pw.Json) else messages,
+            {**self.kwargs, **kwargs},
+            lane,
+        )
+        try:
+            return self.flight.do(key, lambda: self._call_provider(messages, tier, deadline, lane, **kwargs))
+        except FlightTimeout as e:
+            logger.warning(f"⏱️ Coalesced LLM call: {e}")
+            return None
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Provider Prompt Caching for the RAG Prompt
+
+The government compliance template is several thousand tokens of fixed
+instructions (objective, S1/S2 categories, output constraints) followed by a
+short per-query tail with ``{context}`` and ``{query}``. Sending the fixed part
+as its own system message lets the provider cache it: Anthropic and Gemini
+models behind OpenRouter cache content blocks marked with ``cache_control``,
+OpenAI and DeepSeek models cache identical prompt prefixes automatically.
+Cache reads are billed at a fraction of the input price and shorten the time
+to the first token.
+
+Key Features:
+- Template split at the first per-query placeholder, no template changes needed
+- ``cache_control`` markers only for models that support them
+- Cached and uncached prompt tokens read from the provider usage
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+PLACEHOLDERS = ("{context}", "{query}")
+
+# OpenRouter model prefixes that take explicit cache_control breakpoints
+CACHE_CONTROL_MODELS = ("anthropic/", "google/gemini")
+
+
+def split_prompt_template(template: str) -> Tuple[Optional[str], str]:
+    """
+    Split a RAG prompt template into its static prefix and per-query tail.
+
+    The tail starts at the line holding the first placeholder, so a sentence
+    leading into ``{context}`` stays with it.
+
+    Returns:
+        (static prefix or None if there is none, tail template)
+    """
+    positions = [template.find(placeholder) for placeholder in PLACEHOLDERS]
+    positions = [position for position in positions if position >= 0]
+    if not positions:
+        return None, template
+    start = template.rfind("\n", 0, min(positions)) + 1
+    static = template[:start].strip()
+    if not static:
+        return None, template
+    return static, template[start:].strip()
+
+
+def supports_cache_control(model: Optional[str], models: Sequence[str] = CACHE_CONTROL_MODELS) -> bool:
+    """Whether a (LiteLLM or OpenRouter) model id takes ``cache_control`` markers."""
+    if not model:
+        return False
+    model = model.removeprefix("openrouter/")
+    return any(model.startswith(prefix) for prefix in models)
+
+
+def chat_messages(
+    system_prompt: Optional[str],
+    user_prompt: str,
+    model: Optional[str] = None,
+    cache_control_models: Sequence[str] = CACHE_CONTROL_MODELS,
+) -> List[Dict]:
+    """
+    Chat messages for one RAG request.
+
+    Without a system prompt this is the single user message Pathway's
+    ``prompt_chat_single_qa`` builds.
+    """
+    messages: List[Dict] = []
+    if system_prompt:
+        if supports_cache_control(model, cache_control_models):
+            content = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+            messages.append({"role": "system", "content": content})
+        else:
+            messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+def _field(obj, name: str):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def prompt_cache_tokens(usage) -> Tuple[int, int]:
+    """
+    (cache read, cache write) prompt tokens of a provider usage object.
+
+    OpenRouter reports ``prompt_tokens_details.cached_tokens`` (and
+    ``cache_write_tokens``); LiteLLM's Anthropic provider reports
+    ``cache_read_input_tokens`` and ``cache_creation_input_tokens``. Both are
+    included in ``prompt_tokens``.
+    """
+    details = _field(usage, "prompt_tokens_details")
+    read = _field(details, "cached_tokens") or _field(usage, "cache_read_input_tokens") or 0
+    write = _field(details, "cache_write_tokens") or _field(usage, "cache_creation_input_tokens") or 0
+    return int(read), int(write)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Dynamic Micro-Batching of Query Embeddings
+
+Every /v1/pw_ai_answer and /v1/retrieve request embeds its query. Pathway already
+batches the rows of one commit window per endpoint, but queries arriving on
+different endpoints or on different Pathway worker threads still run as separate
+batch-size-1 forward passes competing for the same CPU cores. The batcher in this
+module collects concurrent query embeddings for up to ``max_wait_ms`` or
+``max_batch_size`` items and runs one batched forward pass.
+
+Key Features:
+- QueryEmbeddingBatcher: background thread that coalesces concurrent embed calls
+- Configurable max wait and max batch size
+- Duplicate texts within a batch are embedded once
+- Batch-size, queue-wait and forward-pass histograms in the metrics registry
+- BatchedSentenceTransformerEmbedder: drop-in SentenceTransformerEmbedder whose
+  query calls (few, query-length texts) go through the query cache and the
+  batcher while document chunks, however few, run directly
+- Optional lanes.LaneScheduler: forward passes of interactive queries, bulk
+  query batches and document ingestion are dispatched weighted-fair, with bulk
+  calls split into ``lane_chunk_size`` pieces so queries never wait for a whole
+  ingestion commit
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from pathway.xpacks.llm.embedders import SentenceTransformerEmbedder
+
+from metrics import REGISTRY, MetricsRegistry
+from query_cache import QueryEmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_STOP = object()
+
+
+class QueryEmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into batched forward passes.
+
+    Callers submit single texts and block on (or await) the returned Future. A
+    background thread takes the first waiting text, keeps collecting until either
+    ``max_batch_size`` texts are queued or ``max_wait_ms`` has passed, then calls
+    ``embed_fn`` once for the whole batch. Requests that arrive while a forward
+    pass is running are queued and form the next batch.
+
+    Args:
+        embed_fn: Embeds a list of texts, returning one vector per text
+        max_batch_size: Maximum texts per forward pass
+        max_wait_ms: Maximum time the first text of a batch waits for company
+        name: Label used for the batcher's metrics
+        registry: Metrics registry (process-wide registry by default)
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Sequence[np.ndarray]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "query_embedding",
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self._batch_size = registry.histogram(
+            "embedding_batch_size", "Texts per batched query-embedding forward pass", buckets=BATCH_SIZE_BUCKETS
+        )
+        self._wait_ms = registry.histogram(
+            "embedding_batch_wait_ms", "Time a query waited in the batcher before its forward pass"
+        )
+        self._forward_ms = registry.histogram(
+            "embedding_batch_forward_ms", "Duration of one batched query-embedding forward pass"
+        )
+        self._requests = registry.counter("embedding_batch_requests_total", "Texts submitted to the batcher")
+        self._batches = registry.counter("embedding_batches_total", "Batched forward passes run")
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._thread.start()
+                logger.info(
+                    f"📦 Query embedding batcher started "
+                    f"(max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms})"
+                )
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the Future resolves to its embedding vector."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        self._requests.inc(batcher=self.name)
+        return future
+
+    def embed(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """Submit several texts and wait for all of their vectors."""
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        """Stop the background thread after the queued texts are embedded."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _collect(self, first) -> tuple:
+        """Collect a batch starting with ``first``; returns (batch, stop_requested)."""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: list) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            self._wait_ms.observe((started - enqueued) * 1000.0, batcher=self.name)
+
+        unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = self.embed_fn(unique_texts)
+        except Exception as e:
+            logger.error(f"❌ Batched query embedding failed ({len(unique_texts)} texts): {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        self._forward_ms.observe((time.perf_counter() - started) * 1000.0, batcher=self.name)
+        self._batch_size.observe(len(unique_texts), batcher=self.name)
+        self._batches.inc(batcher=self.name)
+
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future, _ in batch:
+            future.set_result(by_text[text])
+
+
+class BatchedSentenceTransformerEmbedder(SentenceTransformerEmbedder):
+    """
+    SentenceTransformerEmbedder that caches and micro-batches query embeddings.
+
+    Calls with at most ``query_max_batch_size`` texts, none longer than
+    ``query_cache_max_chars`` (queries), are first looked up in a
+    QueryEmbeddingCache; misses go through a shared QueryEmbeddingBatcher. Other
+    calls (document chunks, even from a small ingestion commit, and large query
+    batches) are already batched by Pathway and run directly on the model.
+
+    With ``lanes`` every forward pass holds a slot of the scheduler: batched
+    queries in the ``interactive`` lane, bulk calls of query-length texts
+    (/v1/retrieve_batch chunks) in ``batch`` and bulk calls with longer texts
+    (document chunks) in ``ingestion``.
+
+    Args:
+        model: Sentence-transformers model name, as for SentenceTransformerEmbedder
+        query_max_batch_size: Maximum queries per batched forward pass
+        query_max_wait_ms: Maximum time a query waits for other queries
+        query_cache_size: Cached query embeddings (0 disables the cache)
+        query_cache_max_chars: Longer texts are document chunks: never cached or
+            micro-batched, and their calls run in the ingestion lane
+        lanes: Optional lanes.LaneScheduler shared by all forward passes
+        lane_chunk_size: Texts per forward pass of bulk calls when ``lanes`` is set
+        **kwargs: Passed to SentenceTransformerEmbedder (call_kwargs, device, batch_size, ...)
+    """
+
+    def __init__(
+        self,
+        model: str,
+        *,
+        query_max_batch_size: int = 32,
+        query_max_wait_ms: float = 5.0,
+        query_cache_size: int = 10000,
+        query_cache_max_chars: int = 500,
+        lanes=None,
+        lane_chunk_size: int = 64,
+        **kwargs,
+    ):
+        super().__init__(model, **kwargs)
+        self.query_max_batch_size = query_max_batch_size
+        self.query_cache_max_chars = query_cache_max_chars
+        self.lanes = lanes
+        self.lane_chunk_size = lane_chunk_size
+        self.batcher = QueryEmbeddingBatcher(
+            self._encode_batch,
+            max_batch_size=query_max_batch_size,
+            max_wait_ms=query_max_wait_ms,
+        )
+        self.cache = QueryEmbeddingCache(query_cache_size) if query_cache_size > 0 else None
+
+    def _encode(self, texts: List[str], lane: str) -> List[np.ndarray]:
+        if self.lanes is None:
+            return list(self.model.encode(texts, **self.kwargs))
+        vectors: List[np.ndarray] = []
+        for start in range(0, len(texts), self.lane_chunk_size):
+            chunk = texts[start:start + self.lane_chunk_size]
+            vectors.extend(self.lanes.run(lane, lambda: self.model.encode(chunk, **self.kwargs)))
+        return vectors
+
+    def _encode_batch(self, texts: List[str]) -> List[np.ndarray]:
+        return self._encode(texts, "interactive")
+
+    def is_query_length(self, texts: List[str]) -> bool:
+        """Whether every text is short enough to be a query rather than a document chunk."""
+        return all(len(text) <= self.query_cache_max_chars for text in texts)
+
+    def bulk_lane(self, texts: List[str]) -> str:
+        """Lane of a bulk embedding call: ``batch`` for query-length texts, ``ingestion`` otherwise."""
+        return "batch" if self.is_query_length(texts) else "ingestion"
+
+    def _embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        if self.cache is None:
+            return self.batcher.embed(texts)
+
+        vectors: List[Optional[np.ndarray]] = [self.cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.batcher.embed([texts[i] for i in missing])):
+                vectors[i] = vector
+                self.cache.put(texts[i], vector)
+        return vectors
+
+    def __wrapped__(self, input: list[str], **kwargs) -> list[np.ndarray]:
+        # Per-call encode options cannot be shared across a batch
+        if kwargs or isinstance(input, str):
+            return super().__wrapped__(input, **kwargs)
+        texts = list(input)
+        if len(texts) > self.query_max_batch_size or not self.is_query_length(texts):
+            if self.lanes is None:
+                return super().__wrapped__(input, **kwargs)
+            return self._encode(texts, self.bulk_lane(texts))
+        return self._embed_queries(texts)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Query-Embedding LRU Cache
+
+Popular drug queries ("Is nimesulide banned?") repeat all day. This cache keeps
+the embeddings of recently seen normalized query texts so repeats skip the
+MiniLM forward pass entirely.
+
+Key Features:
+- Bounded LRU of normalized query text -> embedding vector
+- Vectors stored in one contiguous float32 array with a text -> slot id map
+- Thread-safe lookups and inserts
+- Hit/miss counters and hit-rate gauge in the metrics registry
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from metrics import REGISTRY, MetricsRegistry
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize query text for cache lookup.
+
+    all-MiniLM-L6-v2 uses an uncased tokenizer that also ignores whitespace runs,
+    so case and spacing variants of a query produce the same embedding.
+    """
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings.
+
+    The vector matrix is allocated on the first insert, once the embedding
+    dimension is known: ``capacity * dim * 4`` bytes (15 MB for 10,000 MiniLM
+    vectors). Evicted slots are reused in place.
+
+    Args:
+        capacity: Maximum number of cached queries
+        name: Label used for the cache's metrics
+        registry: Metrics registry (process-wide registry by default)
+    """
+
+    def __init__(self, capacity: int = 10000, name: str = "query_embedding", registry: MetricsRegistry = REGISTRY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.name = name
+        self._vectors: Optional[np.ndarray] = None
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free: List[int] = []
+        self._next_slot = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+        self._requests = registry.counter("embedding_cache_requests_total", "Query-embedding cache lookups")
+        self._hit_rate = registry.gauge("embedding_cache_hit_rate", "Query-embedding cache hit rate since start")
+        self._size = registry.gauge("embedding_cache_entries", "Queries held in the embedding cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    @property
+    def hit_rate(self) -> float:
+        with self._lock:
+            total = self._hits + self._misses
+            return self._hits / total if total else 0.0
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Cached vector of the normalized text, or None."""
+        key = normalize_query(text)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                self._misses += 1
+                vector = None
+            else:
+                self._slots.move_to_end(key)
+                self._hits += 1
+                vector = self._vectors[slot].copy()
+            hit_rate = self._hits / (self._hits + self._misses)
+        self._requests.inc(cache=self.name, result="hit" if vector is not None else "miss")
+        self._hit_rate.set(hit_rate, cache=self.name)
+        return vector
+
+    def put(self, text: str, vector: np.ndarray) -> None:
+        """Insert or refresh a vector, evicting the least recently used entry if full."""
+        key = normalize_query(text)
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._vectors.shape[1]:
+                raise ValueError(
+                    f"Vector dimension {vector.shape[0]} does not match cache dimension {self._vectors.shape[1]}"
+                )
+
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._slots.move_to_end(key)
+            elif self._free:
+                slot = self._free.pop()
+            elif self._next_slot < self.capacity:
+                slot = self._next_slot
+                self._next_slot += 1
+            else:
+                _, slot = self._slots.popitem(last=False)
+
+            self._vectors[slot] = vector
+            self._slots[key] = slot
+            size = len(self._slots)
+        self._size.set(size, cache=self.name)
+
+    def discard(self, text: str) -> None:
+        """Drop one query from the cache."""
+        with self._lock:
+            slot = self._slots.pop(normalize_query(text), None)
+            if slot is not None:
+                self._free.append(slot)
+            size = len(self._slots)
+        self._size.set(size, cache=self.name)
+
+    def clear(self) -> None:
+        """Drop all cached vectors (e.g. after switching the embedding model)."""
+        with self._lock:
+            self._slots.clear()
+            self._free.clear()
+            self._next_slot = 0
+        self._size.set(0, cache=self.name)
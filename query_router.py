@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Query Router: model tiers for the Pharmaceutical RAG System
+
+Every query used to go to Claude Sonnet with a 1000-token budget, including
+one-line status lookups. The router classifies each query with local rules
+(optionally over a drug registry) and assigns it a model tier:
+
+- ``none``: no LLM call; greetings get a canned reply, document lookups a list
+  of the matching sources and registry hits the registry record
+- ``fast``: small fast model with a tight token budget for single-drug status
+  lookups ("Is nimesulide banned?")
+- ``summary``: cached per-document summary (summary_cache.DocumentSummaryCache)
+- ``full``: the configured analysis model (Claude Sonnet) for everything else
+
+With an ``intent_classifier`` (intent_classifier.IntentClassifier) the route
+also selects the retrieval plan: chit-chat and registry hits skip retrieval,
+status lookups retrieve a few chunks, listings ("all bans after 2023") a
+year-filtered larger set, and everything unclassified falls back to the rules.
+
+Key Features:
+- Sub-millisecond regex rules, no model or network call
+- Optional registry of drug / FDC names (drug_registry.DrugRegistry) to
+  recognise single-drug lookups and answer them directly
+- Optional embedding intent classifier choosing k and metadata filters
+- Requests that name an explicit model keep it (``full`` tier, model unchanged)
+- Per-tier request, latency and token metrics on /v1/metrics for tuning
+"""
+
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from drug_registry import DrugRegistry
+from intent_classifier import year_filter, year_range
+from llm_governor import retrieval_only_answer
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("none", "fast", "summary", "full")
+
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|thanks|thank you|ok|okay|good (morning|afternoon|evening)|who are you|help)\b[\s!.?]*$",
+    re.IGNORECASE,
+)
+DOCUMENT_LOOKUP_PATTERN = re.compile(
+    r"^\s*(show|find|list|open|get|give me)\b.*\b(notifications?|gazettes?|documents?|pdfs?|files?|sources?|circulars?)\b",
+    re.IGNORECASE,
+)
+STATUS_PATTERN = re.compile(
+    r"\b(banned?|prohibited|prohibition|allowed|approved|legal|status|scheduled?|h1|nsq|withdrawn|restricted)\b",
+    re.IGNORECASE,
+)
+# Markers of questions that need reasoning over several documents
+COMPLEX_PATTERN = re.compile(
+    r"\b(compare|comparison|difference|explain|why|how|analy[sz]e|analysis|impact|implications?|history|"
+    r"timeline|summar(y|ise|ize)|all|every|list of|since|between|versus|vs)\b",
+    re.IGNORECASE,
+)
+
+GREETING_ANSWER = (
+    "Hello! I answer questions about the regulatory status of drugs and fixed dose "
+    "combinations in India, e.g. \"Is nimesulide banned in India?\" or \"Which FDCs "
+    "were prohibited in August 2024?\""
+)
+SOURCES_NOTICE = "📄 Matching regulatory documents:"
+
+
+class QueryRouter:
+    """
+    Rule-based assignment of queries to model tiers.
+
+    Args:
+        fast_model: Model of the ``fast`` tier (OpenRouter model id)
+        fast_max_tokens: Output budget of the ``fast`` tier
+        full_model: Model of the ``full`` tier; None keeps the LLM's configured model
+        full_max_tokens: Output budget of the ``full`` tier; None keeps the LLM's setting
+        enable_none_tier: Answer greetings and document lookups without an LLM call
+        max_fast_words: Longer queries always go to the ``full`` tier
+        registry_path: Optional drug / FDC registry (.txt names or .csv with
+            status); when set, a status lookup is only ``fast`` if it names at
+            most one registry entry, and entries with a status are answered
+            from the registry
+        intent_classifier: Optional IntentClassifier selecting the retrieval plan
+        status_k: Chunks retrieved for status lookups
+        listing_k: Chunks retrieved (and kept after reranking) for listings
+        summary_k: Chunks retrieved to find and summarise a document
+    """
+
+    def __init__(
+        self,
+        fast_model: str = "anthropic/claude-3.5-haiku",
+        fast_max_tokens: int = 400,
+        full_model: Optional[str] = None,
+        full_max_tokens: Optional[int] = None,
+        enable_none_tier: bool = True,
+        max_fast_words: int = 12,
+        registry_path: Optional[str] = None,
+        intent_classifier=None,
+        status_k: int = 5,
+        listing_k: int = 25,
+        summary_k: int = 10,
+    ):
+        self.fast_model = fast_model
+        self.fast_max_tokens = fast_max_tokens
+        self.full_model = full_model
+        self.full_max_tokens = full_max_tokens
+        self.enable_none_tier = enable_none_tier
+        self.max_fast_words = max_fast_words
+        self.intent_classifier = intent_classifier
+        self.status_k = status_k
+        self.listing_k = listing_k
+        self.summary_k = summary_k
+        self.registry: Optional[DrugRegistry] = DrugRegistry(registry_path) if registry_path else None
+
+        self._requests = REGISTRY.counter("router_requests_total", "Routed queries by tier and rule")
+        self._latency_ms = REGISTRY.histogram("router_tier_latency_ms", "Answer latency per model tier")
+
+    def registry_matches(self, query: str) -> List[str]:
+        return self.registry.match(query) if self.registry is not None else []
+
+    def classify(self, query: str) -> Tuple[str, str]:
+        """Return (tier, rule) for a query."""
+        text = " ".join(query.split())
+        if self.enable_none_tier:
+            if GREETING_PATTERN.match(text):
+                return "none", "greeting"
+            if DOCUMENT_LOOKUP_PATTERN.match(text) and not COMPLEX_PATTERN.search(text):
+                return "none", "document_lookup"
+
+        if len(text.split()) > self.max_fast_words:
+            return "full", "long_query"
+        if COMPLEX_PATTERN.search(text):
+            return "full", "complex"
+
+        names = self.registry_matches(text)
+        if self.registry:
+            if len(names) > 1:
+                return "full", "multiple_drugs"
+            if names and (STATUS_PATTERN.search(text) or len(text.split()) <= 4):
+                return "fast", "registry_lookup"
+            return "full", "default"
+        if STATUS_PATTERN.search(text):
+            return "fast", "status_lookup"
+        return "full", "default"
+
+    def classify_intent(self, query: str) -> Tuple[Optional[str], str, str]:
+        """
+        Return (intent, tier, rule), using the intent classifier when configured.
+
+        Unclassified queries and the ``analysis`` intent use the rules of
+        classify() with no intent.
+        """
+        intent = None
+        if self.intent_classifier is not None:
+            intent, _ = self.intent_classifier.classify(query)
+        if intent == "chitchat" and self.enable_none_tier:
+            return intent, "none", "chitchat"
+        if intent == "status_lookup":
+            return intent, "fast", "status_lookup"
+        if intent == "listing":
+            return intent, "full", "listing"
+        if intent == "document_summary":
+            return intent, "summary", "document_summary"
+        return None, *self.classify(query)
+
+    def route(
+        self,
+        query: str,
+        requested_model: Optional[str],
+        default_model: Optional[str],
+        default_max_tokens: Optional[int] = None,
+        filters: Optional[str] = None,
+        default_k: Optional[int] = None,
+    ) -> Dict:
+        """
+        Tier, model, output budget and retrieval plan for one request.
+
+        A request whose model differs from the server default asked for that
+        model explicitly and is not downgraded.
+
+        Returns:
+            Route with ``tier``, ``rule``, ``intent``, ``model``, ``max_tokens``,
+            ``retrieve`` (False: answered without retrieval), ``k``,
+            ``metadata_filter``, ``top_n`` (chunks kept after reranking, None
+            for the reranker's default) and ``started``
+        """
+        intent, record = None, None
+        k, metadata_filter, top_n = default_k, filters, None
+        if requested_model and requested_model != default_model:
+            tier, rule = "full", "explicit_model"
+            model = requested_model
+        else:
+            intent, tier, rule = self.classify_intent(query)
+            if rule in ("status_lookup", "registry_lookup") and self.registry:
+                names = self.registry_matches(query)
+                record = self.registry.status_record(names[0]) if len(names) == 1 else None
+                if record is not None and self.enable_none_tier:
+                    tier, rule = "none", "registry"
+            if intent == "status_lookup":
+                k = self.status_k
+            elif intent == "listing":
+                k = top_n = self.listing_k
+                years = year_range(query)
+                if years is not None:
+                    metadata_filter = year_filter(years, filters)
+            elif intent == "document_summary":
+                k = top_n = self.summary_k
+            model = None if tier == "none" else (self.fast_model if tier == "fast" else self.full_model or default_model)
+
+        if tier == "fast":
+            max_tokens = self.fast_max_tokens
+        else:
+            max_tokens = self.full_max_tokens or default_max_tokens
+        self._requests.inc(tier=tier, rule=rule)
+        return {
+            "tier": tier,
+            "rule": rule,
+            "intent": intent,
+            "model": model,
+            "max_tokens": max_tokens,
+            "retrieve": rule not in ("greeting", "chitchat", "registry"),
+            "k": k,
+            "metadata_filter": metadata_filter,
+            "top_n": top_n,
+            "record": record,
+            "started": time.time(),
+        }
+
+    def local_answer(self, route: Dict, docs: List[dict]) -> str:
+        """Answer of the ``none`` tier."""
+        if route.get("rule") in ("greeting", "chitchat"):
+            return GREETING_ANSWER
+        if route.get("rule") == "registry":
+            return DrugRegistry.answer(route["record"])
+        if not docs:
+            return "No matching regulatory documents were found."
+        return retrieval_only_answer(docs, notice=SOURCES_NOTICE)
+
+    def observe(self, route: Dict) -> None:
+        """Record the end-to-end latency of a routed request."""
+        self._latency_ms.observe((time.time() - route["started"]) * 1000.0, tier=route["tier"])
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Replay Load Test: production-shaped traffic from a query log
+
+Replays a JSONL query log against a running server, keeping the recorded
+inter-arrival times (scaled by --speed), and compares two runs so a
+performance change can be quantified before deploying it.
+
+Key Features:
+- Reads the frontend query log (QUERY_LOG_PATH) or any JSONL file with a
+  ``prompt``/``query`` field and an optional ``ts`` (epoch seconds or ISO 8601)
+- 1x / Nx replay speed (0 = as fast as the concurrency limit allows)
+- Concurrency limit; requests delayed by it are reported as schedule lag
+- Per-endpoint latency percentiles and distribution, per-stage server latency
+  and cache-hit rates from /v1/metrics deltas
+- ``compare`` prints latency, error-rate and cache-hit changes between two runs
+
+Log line examples:
+    {"ts": 1760870000.12, "endpoint": "answer", "prompt": "Is nimesulide banned?"}
+    {"ts": "2025-10-19T10:15:02", "endpoint": "retrieve", "query": "FDC ban", "k": 5}
+
+Usage:
+    python replay_load_test.py run logs/queries.jsonl --speed 2 --concurrency 8 --json before.json
+    python replay_load_test.py run logs/queries.jsonl --speed 2 --concurrency 8 --json after.json
+    python replay_load_test.py compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import ClientSession, ClientTimeout
+
+from load_test import ENDPOINT_PATHS, LoadClient, RequestResult, fetch_metrics, percentile, stage_breakdown, summarize
+from metrics import LATENCY_BUCKETS_MS
+
+ENDPOINT_ALIASES = {
+    "/v1/pw_ai_answer": "answer",
+    "/v1/retrieve": "retrieve",
+    "/v1/pw_ai_answer_stream": "stream",
+    "/api/search": "answer",
+    "/api/search/stream": "stream",
+}
+
+# Counter label values that mark a cache hit / miss (single-flight followers count as hits)
+HIT_LABELS = {("result", "hit"): True, ("result", "miss"): False, ("role", "follower"): True, ("role", "leader"): False}
+
+
+@dataclass
+class ReplayEntry:
+    """One logged request, ``offset_s`` after the first one."""
+
+    offset_s: float
+    endpoint: str
+    query: str
+    payload: Dict = field(default_factory=dict)
+
+
+def _timestamp(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def load_query_log(path: str, default_endpoint: str = "answer", default_gap_s: float = 1.0) -> List[ReplayEntry]:
+    """
+    Parse a JSONL query log into replay entries.
+
+    Lines without a prompt/query are skipped; lines without a timestamp are
+    placed ``default_gap_s`` after the previous entry.
+    """
+    entries: List[ReplayEntry] = []
+    first_ts, last_offset, skipped = None, -default_gap_s, 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            query = record.get("prompt") or record.get("query") or record.get("question")
+            if not query:
+                skipped += 1
+                continue
+            endpoint = ENDPOINT_ALIASES.get(record.get("endpoint"), record.get("endpoint") or default_endpoint)
+            if endpoint not in (*ENDPOINT_PATHS, "stream"):
+                skipped += 1
+                continue
+
+            ts = _timestamp(record.get("ts"))
+            if ts is None:
+                offset = last_offset + default_gap_s
+            else:
+                first_ts = ts if first_ts is None else first_ts
+                offset = ts - first_ts
+            last_offset = offset
+
+            if endpoint == "retrieve":
+                payload = {"query": query, "k": record.get("k", 10)}
+                if record.get("metadata_filter"):
+                    payload["metadata_filter"] = record["metadata_filter"]
+            else:
+                payload = {"prompt": query}
+                for key in ("filters", "model"):
+                    if record.get(key):
+                        payload[key] = record[key]
+            entries.append(ReplayEntry(offset, endpoint, query, payload))
+
+    if skipped:
+        print(f"⚠️ Skipped {skipped} log lines without a usable query or endpoint")
+    entries.sort(key=lambda entry: entry.offset_s)
+    return entries
+
+
+async def replay(
+    entries: List[ReplayEntry], client: LoadClient, speed: float = 1.0, concurrency: int = 8
+) -> Tuple[List[RequestResult], List[float]]:
+    """
+    Send every entry at its recorded offset divided by ``speed``.
+
+    Returns the results and each request's schedule lag in milliseconds (time
+    spent waiting for a concurrency slot after its due time).
+    """
+    slots = asyncio.Semaphore(concurrency)
+    start = time.monotonic()
+
+    async def fire(entry: ReplayEntry) -> Tuple[RequestResult, float]:
+        due = start + (entry.offset_s / speed if speed > 0 else 0.0)
+        await asyncio.sleep(max(0.0, due - time.monotonic()))
+        async with slots:
+            lag_ms = max(0.0, time.monotonic() - due) * 1000.0
+            return await client.send(entry.endpoint, entry.query, entry.payload), lag_ms
+
+    outcomes = await asyncio.gather(*(fire(entry) for entry in entries))
+    return [result for result, _ in outcomes], [lag for _, lag in outcomes]
+
+
+def cache_hit_rates(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Hit/miss counts and hit rate over the run for every cache-like counter."""
+    rates: Dict[str, Dict] = {}
+    for name, metric in after.items():
+        if metric.get("type") != "counter":
+            continue
+        previous = before.get(name, {}).get("values", {})
+        for labels, value in metric["values"].items():
+            pairs = [tuple(part.split("=", 1)) for part in labels.split(",") if part]
+            hit = next((HIT_LABELS[pair] for pair in pairs if pair in HIT_LABELS), None)
+            if hit is None:
+                continue
+            rest = ",".join("=".join(pair) for pair in pairs if pair not in HIT_LABELS)
+            entry = rates.setdefault(f"{name}{{{rest}}}" if rest else name, {"hits": 0, "misses": 0})
+            entry["hits" if hit else "misses"] += int(value - previous.get(labels, 0))
+    for entry in rates.values():
+        total = entry["hits"] + entry["misses"]
+        entry["hit_rate"] = round(entry["hits"] / total, 4) if total else None
+    return {key: entry for key, entry in rates.items() if entry["hit_rate"] is not None}
+
+
+def latency_distribution(latencies: List[float]) -> Dict[str, float]:
+    """Share of requests per latency bucket (keyed by bucket upper bound in ms)."""
+    counts: Dict[str, int] = {}
+    for value in latencies:
+        index = bisect.bisect_left(LATENCY_BUCKETS_MS, value)
+        bound = str(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else "+Inf"
+        counts[bound] = counts.get(bound, 0) + 1
+    return {bound: round(count / len(latencies), 4) for bound, count in counts.items()}
+
+
+def ks_statistic(a: List[float], b: List[float]) -> Optional[float]:
+    """Two-sample Kolmogorov-Smirnov distance between latency samples (0 = same shape, 1 = disjoint)."""
+    if not a or not b:
+        return None
+    a, b = sorted(a), sorted(b)
+    i = j = 0
+    distance = 0.0
+    while i < len(a) and j < len(b):
+        value = min(a[i], b[j])
+        while i < len(a) and a[i] <= value:
+            i += 1
+        while j < len(b) and b[j] <= value:
+            j += 1
+        distance = max(distance, abs(i / len(a) - j / len(b)))
+    return round(distance, 4)
+
+
+async def run_replay(args) -> Dict:
+    entries = load_query_log(args.log, args.default_endpoint, args.default_gap)
+    if args.limit:
+        entries = entries[: args.limit]
+    if not entries:
+        raise SystemExit("❌ No replayable entries in the query log")
+    span = entries[-1].offset_s
+    print(f"🔁 Replaying {len(entries)} requests spanning {span:.0f}s at {args.speed}x, concurrency {args.concurrency}")
+
+    async with ClientSession(timeout=ClientTimeout(total=args.timeout)) as session:
+        client = LoadClient(session, args.url, args.stream_url)
+        before = await fetch_metrics(session, args.url)
+        started = time.monotonic()
+        results, lags = await replay(entries, client, args.speed, args.concurrency)
+        elapsed = time.monotonic() - started
+        after = await fetch_metrics(session, args.url)
+
+    latencies: Dict[str, List[float]] = {}
+    for result in results:
+        if result.ok:
+            latencies.setdefault(result.endpoint, []).append(round(result.latency_ms, 1))
+    return {
+        "settings": {
+            "log": args.log,
+            "label": args.label or args.log,
+            "requests": len(entries),
+            "speed": args.speed,
+            "concurrency": args.concurrency,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": summarize(results, elapsed),
+        "schedule_lag_ms": {"p50": percentile(lags, 50), "p95": percentile(lags, 95), "max": max(lags)},
+        "stages_ms": stage_breakdown(before, after),
+        "cache": cache_hit_rates(before, after),
+        "latencies_ms": latencies,
+    }
+
+
+def _pct_change(base: Optional[float], new: Optional[float]) -> Optional[float]:
+    if base is None or new is None or base == 0:
+        return None
+    return round((new - base) / base * 100.0, 1)
+
+
+def compare_runs(baseline: Dict, candidate: Dict) -> Dict:
+    """Latency, error-rate and cache-hit differences of ``candidate`` against ``baseline``."""
+    endpoints = {}
+    for name in sorted(set(baseline["endpoints"]) | set(candidate["endpoints"])):
+        base, new = baseline["endpoints"].get(name), candidate["endpoints"].get(name)
+        if not base or not new:
+            continue
+        entry = {}
+        for stat in ("mean_ms", "p50_ms", "p95_ms", "p99_ms"):
+            entry[stat] = {"baseline": base[stat], "candidate": new[stat], "change_pct": _pct_change(base[stat], new[stat])}
+        entry["error_rate"] = {
+            "baseline": round(1 - base["ok"] / base["requests"], 4) if base["requests"] else None,
+            "candidate": round(1 - new["ok"] / new["requests"], 4) if new["requests"] else None,
+        }
+        base_lat = baseline.get("latencies_ms", {}).get(name, [])
+        new_lat = candidate.get("latencies_ms", {}).get(name, [])
+        if name != "all":
+            entry["ks_distance"] = ks_statistic(base_lat, new_lat)
+            entry["distribution"] = {
+                "baseline": latency_distribution(base_lat),
+                "candidate": latency_distribution(new_lat),
+            }
+        endpoints[name] = entry
+
+    cache = {}
+    for name in sorted(set(baseline.get("cache", {})) | set(candidate.get("cache", {}))):
+        base_rate = baseline.get("cache", {}).get(name, {}).get("hit_rate")
+        new_rate = candidate.get("cache", {}).get(name, {}).get("hit_rate")
+        cache[name] = {"baseline": base_rate, "candidate": new_rate}
+
+    return {
+        "baseline": baseline["settings"].get("label"),
+        "candidate": candidate["settings"].get("label"),
+        "endpoints": endpoints,
+        "cache_hit_rate": cache,
+    }
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_comparison(comparison: Dict) -> None:
+    print(f"\n⚖️  {comparison['baseline']}  →  {comparison['candidate']}")
+    print(f"{'endpoint':<10} {'stat':<8} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for name, entry in comparison["endpoints"].items():
+        for stat in ("mean_ms", "p50_ms", "p95_ms", "p99_ms"):
+            row = entry[stat]
+            change = "-" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+            print(f"{name:<10} {stat[:-3]:<8} {_fmt(row['baseline']):>10} {_fmt(row['candidate']):>10} {change:>8}")
+        errors = entry["error_rate"]
+        print(f"{name:<10} {'errors':<8} {errors['baseline']!s:>10} {errors['candidate']!s:>10}")
+        if entry.get("ks_distance") is not None:
+            print(f"{name:<10} {'KS':<8} {entry['ks_distance']:>21}")
+
+    if comparison["cache_hit_rate"]:
+        print("\n💾 Cache hit rate")
+        for name, rates in comparison["cache_hit_rate"].items():
+            print(f"{name:<60} {rates['baseline']!s:>8} → {rates['candidate']!s:<8}")
+
+
+def print_run(report: Dict) -> None:
+    print(f"\n📊 Replay finished in {report['elapsed_s']}s "
+          f"(schedule lag p95 {_fmt(report['schedule_lag_ms']['p95'])}ms)")
+    for name, entry in report["endpoints"].items():
+        print(f"   {name:<10} {entry['ok']}/{entry['requests']} ok  p50 {_fmt(entry['p50_ms'])}  "
+              f"p95 {_fmt(entry['p95_ms'])}  p99 {_fmt(entry['p99_ms'])} ms  {entry['errors'] or ''}")
+    for name, entry in report["cache"].items():
+        print(f"   💾 {name}: hit rate {entry['hit_rate']:.1%} ({entry['hits']}/{entry['hits'] + entry['misses']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query log against the RAG server and compare runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Replay a JSONL query log")
+    run.add_argument("log", help="JSONL query log")
+    run.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier (0 = no pacing)")
+    run.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    run.add_argument("--url", default="http://127.0.0.1:8001", help="Pathway server base URL")
+    run.add_argument("--stream-url", default="http://127.0.0.1:8003/v1/pw_ai_answer_stream")
+    run.add_argument("--default-endpoint", default="answer", choices=[*ENDPOINT_PATHS, "stream"])
+    run.add_argument("--default-gap", type=float, default=1.0, help="Seconds between entries without ts")
+    run.add_argument("--limit", type=int, help="Replay only the first N entries")
+    run.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    run.add_argument("--label", help="Name of this run in comparisons")
+    run.add_argument("--json", help="Write the run report to this JSON file")
+
+    compare = commands.add_parser("compare", help="Compare two run reports")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--json", help="Write the comparison to this JSON file")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        result = asyncio.run(run_replay(args))
+        print_run(result)
+    else:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.candidate, "r", encoding="utf-8") as f:
+            candidate = json.load(f)
+        result = compare_runs(baseline, candidate)
+        print_comparison(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Budgeted Cross-Encoder Reranker for Pathway RAG System
+
+This module adds an optional rerank stage between DocumentStore retrieval and
+the LLM prompt. The MiniLM bi-encoder is cheap but imprecise on pharmaceutical
+names (e.g. "Nimesulide + Paracetamol" vs "Nimesulide"), so a small CPU
+cross-encoder rescores a wider candidate pool down to the final k.
+
+Key Features:
+- Dynamically quantized (int8) cross-encoder running on CPU
+- Batched scoring of the whole candidate pool in one forward pass per batch
+- Per-request millisecond budget: reranking is skipped when it would not fit
+- Score cache keyed by (query hash, chunk id) so repeated queries are free
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pathway as pw
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+def _as_doc(doc: Any) -> Dict[str, Any]:
+    """Unwrap a retrieved document (pw.Json, dict or plain text) into a dict."""
+    if isinstance(doc, pw.Json):
+        doc = doc.value
+    if isinstance(doc, str):
+        return {"text": doc}
+    return dict(doc) if doc else {}
+
+
+def query_hash(query: str) -> str:
+    """Stable short hash of a query used as the first half of the cache key."""
+    return hashlib.sha1(query.strip().lower().encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id(doc: Dict[str, Any]) -> str:
+    """
+    Stable identifier of a retrieved chunk.
+
+    Chunks carry no id of their own, so the source path and chunk text are
+    hashed together. The same chunk re-indexed from the same file keeps its id.
+    """
+    metadata = doc.get("metadata") or {}
+    path = metadata.get("path", "") if isinstance(metadata, dict) else ""
+    payload = f"{path}\0{doc.get('text', '')}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class BudgetedCrossEncoderReranker(pw.UDF):
+    """
+    Cross-encoder reranker with a per-request latency budget and a score cache.
+
+    Use it as the ``reranker`` of ``PharmaRAGQuestionAnswerer``: retrieval fetches
+    ``search_topk`` candidates (e.g. 30) and this reranker rescores them so that
+    only the best ``rerank_topk`` (e.g. 10) reach the prompt.
+
+    When scoring the uncached candidates of a request is predicted to exceed
+    ``budget_ms`` (or actually runs over it), the request falls back to the
+    original retrieval order by returning ``-dist`` as the score.
+
+    Args:
+        model_name: Cross-encoder model from the sentence_transformers hub
+        budget_ms: Per-request reranking budget in milliseconds
+        batch_size: Number of (query, chunk) pairs per forward pass
+        quantize: Apply dynamic int8 quantization to the Linear layers
+        cache_size: Maximum number of cached (query hash, chunk id) scores
+        max_length: Maximum token length of a (query, chunk) pair
+        device: Torch device, CPU by default
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        *,
+        budget_ms: float = 150.0,
+        batch_size: int = 32,
+        quantize: bool = True,
+        cache_size: int = 50000,
+        max_length: int = 512,
+        device: str = "cpu",
+    ):
+        # Whole candidate pools arrive in one call so they can be scored together
+        super().__init__(max_batch_size=1024)
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.quantize = quantize
+        self.cache_size = cache_size
+        self.max_length = max_length
+        self.device = device
+
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Exponentially weighted cost of scoring one pair, learned online
+        self._ms_per_pair: Optional[float] = None
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "reranked": 0,
+            "skipped_budget": 0,
+            "aborted_budget": 0,
+            "cache_hits": 0,
+            "scored_pairs": 0,
+        }
+        self._latency_ms = REGISTRY.histogram("rerank_ms", "Cross-encoder scoring time per request")
+
+    def _load_model(self):
+        """Load (and optionally quantize) the cross-encoder on first use."""
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                model = CrossEncoder(
+                    self.model_name, device=self.device, max_length=self.max_length
+                )
+                if self.quantize:
+                    import torch
+
+                    model.model = torch.quantization.quantize_dynamic(
+                        model.model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                logger.info(
+                    f"🔁 Cross-encoder reranker loaded: {self.model_name} "
+                    f"(int8={self.quantize})"
+                )
+                self._model = model
+        return self._model
+
+    def _predict(self, pairs: List[List[str]]) -> List[float]:
+        """Score a batch of [query, chunk] pairs with the cross-encoder."""
+        model = self._model if self._model is not None else self._load_model()
+        scores = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return [float(s) for s in scores]
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key: Tuple[str, str], score: float) -> None:
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        # Pathway may call the UDF from several threads at once
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _observe_cost(self, pairs: int, elapsed_ms: float) -> None:
+        per_pair = elapsed_ms / max(pairs, 1)
+        with self._stats_lock:
+            if self._ms_per_pair is None:
+                self._ms_per_pair = per_pair
+            else:
+                self._ms_per_pair = 0.8 * self._ms_per_pair + 0.2 * per_pair
+
+    def rerank_request(
+        self, query: str, docs: List[Dict[str, Any]], budget_ms: Optional[float] = None
+    ) -> Tuple[List[float], bool]:
+        """
+        Score all candidates of a single request.
+
+        Args:
+            query: User query
+            docs: Retrieved candidate chunks (dicts with 'text', 'metadata', 'dist')
+            budget_ms: Override of the default per-request budget
+
+        Returns:
+            (scores, reranked) where ``reranked`` is False when the budget forced
+            a fallback to the retrieval order.
+        """
+        budget = self.budget_ms if budget_ms is None else budget_ms
+        fallback = [-float(doc.get("dist", 0.0)) for doc in docs]
+        self._count("requests")
+
+        if budget <= 0:
+            self._count("skipped_budget")
+            return fallback, False
+
+        qhash = query_hash(query)
+        keys = [(qhash, chunk_id(doc)) for doc in docs]
+        scores: List[Optional[float]] = [self._cache_get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self._count("cache_hits", len(docs) - len(missing))
+
+        # Skip up-front when the learned per-pair cost says we cannot make it
+        ms_per_pair = self._ms_per_pair
+        if missing and ms_per_pair is not None:
+            predicted_ms = len(missing) * ms_per_pair
+            if predicted_ms > budget:
+                self._count("skipped_budget")
+                logger.info(
+                    f"⏱️ Rerank skipped: predicted {predicted_ms:.0f}ms > budget {budget:.0f}ms"
+                )
+                return fallback, False
+
+        start = time.perf_counter()
+        for offset in range(0, len(missing), self.batch_size):
+            batch = missing[offset:offset + self.batch_size]
+            batch_start = time.perf_counter()
+            batch_scores = self._predict([[query, docs[i].get("text", "")] for i in batch])
+            self._observe_cost(len(batch), (time.perf_counter() - batch_start) * 1000)
+            self._count("scored_pairs", len(batch))
+
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+                self._cache_put(keys[i], score)
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms > budget and offset + self.batch_size < len(missing):
+                # Partial cross-encoder scores cannot be mixed with distances,
+                # so abandon this request; what was scored stays cached.
+                self._count("aborted_budget")
+                self._latency_ms.observe(elapsed_ms, outcome="aborted")
+                logger.info(f"⏱️ Rerank aborted after {elapsed_ms:.0f}ms (budget {budget:.0f}ms)")
+                return fallback, False
+
+        self._count("reranked")
+        self._latency_ms.observe((time.perf_counter() - start) * 1000, outcome="reranked")
+        return [float(score) for score in scores], True
+
+    def __wrapped__(self, docs: list, queries: list[str], **kwargs) -> list[float]:
+        """
+        Batched entry point called by Pathway.
+
+        Rows of several requests may arrive in one call, so they are grouped by
+        ``request_id`` (the retrieval row the candidates came from) and each
+        request is reranked under its own budget. Without request ids, rows are
+        grouped by query text.
+        """
+        budgets = kwargs.get("budget_ms")
+        request_ids = kwargs.get("request_id")
+        groups: Dict[Any, List[int]] = {}
+        for i, query in enumerate(queries):
+            key = (str(request_ids[i]), query) if request_ids is not None else query
+            groups.setdefault(key, []).append(i)
+
+        results: List[float] = [0.0] * len(queries)
+        for indices in groups.values():
+            group_docs = [_as_doc(docs[i]) for i in indices]
+            budget = None
+            if budgets is not None and budgets[indices[0]] is not None:
+                budget = float(budgets[indices[0]])
+            scores, _ = self.rerank_request(queries[indices[0]], group_docs, budget)
+            for i, score in zip(indices, scores):
+                results[i] = score
+        return results
+
+    def __call__(
+        self, doc: pw.ColumnExpression, query: pw.ColumnExpression, **kwargs
+    ) -> pw.ColumnExpression:
+        """
+        Scores the retrieved doc (full JSON, so 'dist' is available) against the query.
+
+        Pass ``request_id`` so that requests with the same question keep separate budgets.
+        """
+        return super().__call__(doc, query, **kwargs)
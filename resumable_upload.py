@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Resumable, Parallel Document Uploads (tus-style)
+
+``POST /v1/upload`` is single-shot: when a mobile connection drops half way
+through a large gazette bundle, the upload starts again from zero. This module
+adds a resumable protocol modelled on tus 1.0 (creation, termination) to the
+upload server:
+
+    POST   /v1/upload/resumable          Upload-Length, Upload-Metadata: filename <base64>
+                                         -> 201, Location, Upload-Part-Size
+    HEAD   /v1/upload/resumable/{id}     -> Upload-Offset, Upload-Part-Offsets
+    PATCH  /v1/upload/resumable/{id}     Upload-Offset, application/offset+octet-stream
+                                         -> 204 Upload-Offset, or 200 with the upload result
+    GET    /v1/upload/resumable/{id}     -> JSON progress and, once complete, the result
+    DELETE /v1/upload/resumable/{id}     -> 204, upload abandoned
+
+The file is divided into parts of ``Upload-Part-Size`` bytes. Each part is an
+independent tus stream: a PATCH must start at the part's next offset, so parts
+can be sent in parallel and each resumes where its connection broke. A plain
+tus client that sends everything from ``Upload-Offset`` works unchanged; its
+PATCH runs on into the following parts while they are empty.
+
+The SHA-256 is computed while the bytes arrive whenever they extend the
+contiguous prefix; parts that arrive ahead of it are hashed from disk once the
+prefix reaches them. A complete upload is handed to ``on_complete`` (by
+default UploadStore.adopt: renamed into ./data atomically, or answered as a
+duplicate).
+
+Key Features:
+- Resume after broken connections, per part, across server restarts (``.info`` sidecars)
+- Parallel part upload, incremental hashing without rereading sequential uploads
+- Same atomic rename and duplicate handling as single-shot uploads
+- Abandoned uploads expire after ``expire_s``
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+from metrics import REGISTRY
+from upload_store import CHUNK_SIZE, UploadRejected, UploadStore, safe_filename
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = "1.0.0"
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MIN_PART_SIZE = 256 * 1024
+MAX_PART_SIZE = 64 * 1024 * 1024
+OFFSET_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+def parse_metadata(header: str) -> Dict[str, str]:
+    """``Upload-Metadata: filename bmFtZS5wZGY=,filetype ...`` -> {"filename": "name.pdf", ...}"""
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in header.split(","))):
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode("utf-8") if value else ""
+        except ValueError:
+            raise UploadRejected(f"Upload-Metadata value of {key} is not base64") from None
+    return metadata
+
+
+class _Upload:
+    """State of one resumable upload; ``received`` counts the bytes of each part from its start."""
+
+    def __init__(
+        self,
+        upload_id: str,
+        filename: str,
+        length: int,
+        part_size: int,
+        path: Path,
+        received: Optional[List[int]] = None,
+        created_at: Optional[float] = None,
+        result: Optional[Dict[str, Any]] = None,
+    ):
+        self.id = upload_id
+        self.filename = filename
+        self.length = length
+        self.part_size = part_size
+        self.path = path
+        self.parts = -(-length // part_size)
+        self.received = received or [0] * self.parts
+        self.created_at = created_at or time.time()
+        self.updated_at = time.time()
+        self.result = result
+        self.writers: set = set()  # Parts with a PATCH in flight
+        self.completing = result is not None
+        self.digest = hashlib.sha256()
+        self.hashed = 0
+        self.hash_lock = asyncio.Lock()
+
+    def part_start(self, part: int) -> int:
+        return part * self.part_size
+
+    def part_end(self, part: int) -> int:
+        return min((part + 1) * self.part_size, self.length)
+
+    def next_offsets(self) -> List[int]:
+        return [self.part_start(i) + self.received[i] for i in range(self.parts)]
+
+    def offset(self) -> int:
+        """End of the contiguous prefix (the tus ``Upload-Offset``)."""
+        for i in range(self.parts):
+            if self.part_start(i) + self.received[i] < self.part_end(i):
+                return self.part_start(i) + self.received[i]
+        return self.length
+
+    def complete(self) -> bool:
+        return self.offset() == self.length
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Tus-Resumable": TUS_VERSION,
+            "Upload-Offset": str(self.offset()),
+            "Upload-Length": str(self.length),
+            "Upload-Part-Size": str(self.part_size),
+            "Upload-Part-Offsets": ",".join(str(offset) for offset in self.next_offsets()),
+            "Cache-Control": "no-store",
+        }
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "length": self.length,
+            "part_size": self.part_size,
+            "received": self.received,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "result": self.result,
+        }
+
+
+class ResumableUploadAPI:
+    """
+    tus-style resumable upload routes (mounted on the upload server).
+
+    Args:
+        store: UploadStore that moves complete files into ./data
+        on_complete: Async callback ``(tmp_path, filename, sha256, size) -> response body``
+            that consumes the complete file (the upload server commits documents
+            and extracts archives); default: ``store.adopt``
+        part_size: Default part size; clients may ask for another with ``Upload-Part-Size``
+        expire_s: Seconds after which an unfinished or collected upload is deleted
+        allowed_extensions: File extensions accepted at creation (None: any)
+        base_path: Route prefix
+    """
+
+    def __init__(
+        self,
+        store: UploadStore,
+        on_complete: Optional[Callable[[str, str, str, int], Awaitable[Dict[str, Any]]]] = None,
+        part_size: int = DEFAULT_PART_SIZE,
+        expire_s: float = 86400.0,
+        allowed_extensions: Optional[Iterable[str]] = None,
+        base_path: str = "/v1/upload/resumable",
+    ):
+        self.store = store
+        self.on_complete = on_complete
+        self.part_size = part_size
+        self.expire_s = expire_s
+        self.allowed_extensions = set(allowed_extensions) if allowed_extensions else None
+        self.base_path = base_path.rstrip("/")
+        self.dir = store.tmp_dir / "resumable"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._uploads: Dict[str, _Upload] = {}
+        self._janitor: Optional[asyncio.Task] = None
+
+        self._outcomes = REGISTRY.counter(
+            "resumable_uploads_total", "Resumable uploads by outcome (created, completed, terminated, expired)"
+        )
+        self._bytes = REGISTRY.counter("upload_bytes_total", "Bytes received by the upload endpoint")
+        self._restore()
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def _restore(self) -> None:
+        """Reload uploads interrupted by a restart; their hash is rebuilt from disk."""
+        for info_path in self.dir.glob("*.info"):
+            try:
+                info = json.loads(info_path.read_text())
+                upload = _Upload(
+                    info["id"], info["filename"], info["length"], info["part_size"],
+                    self.dir / f"{info['id']}.part", info["received"], info["created_at"], info.get("result"),
+                )
+                upload.updated_at = info["updated_at"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable upload state {info_path.name}: {e}")
+                continue
+            if upload.result is None and not upload.path.exists():
+                info_path.unlink(missing_ok=True)
+                continue
+            self._uploads[upload.id] = upload
+        if self._uploads:
+            logger.info(f"📦 Restored {len(self._uploads)} resumable uploads")
+
+    def _save_info(self, upload: _Upload) -> None:
+        info_path = self.dir / f"{upload.id}.info"
+        tmp_path = info_path.with_suffix(".info.tmp")
+        tmp_path.write_text(json.dumps(upload.info()))
+        os.replace(tmp_path, info_path)
+
+    def _delete(self, upload: _Upload) -> None:
+        self._uploads.pop(upload.id, None)
+        upload.path.unlink(missing_ok=True)
+        (self.dir / f"{upload.id}.info").unlink(missing_ok=True)
+
+    def _get(self, request: web.Request) -> _Upload:
+        upload = self._uploads.get(request.match_info["upload_id"])
+        if upload is None:
+            raise web.HTTPNotFound(
+                text=json.dumps({"error": "Unknown or expired upload"}), content_type="application/json"
+            )
+        return upload
+
+    @staticmethod
+    def _hash_from_disk(upload: _Upload, end: int) -> None:
+        with open(upload.path, "rb") as f:
+            f.seek(upload.hashed)
+            while upload.hashed < end:
+                block = f.read(min(1 << 20, end - upload.hashed))
+                if not block:
+                    raise OSError(f"{upload.path} is shorter than its received bytes")
+                upload.digest.update(block)
+                upload.hashed += len(block)
+
+    async def _catch_up(self, upload: _Upload) -> None:
+        """Hash parts that arrived ahead of the contiguous prefix."""
+        async with upload.hash_lock:
+            end = upload.offset()
+            if end > upload.hashed:
+                await asyncio.to_thread(self._hash_from_disk, upload, end)
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+
+    async def options_handler(self, request: web.Request) -> web.Response:
+        return web.Response(status=204, headers={
+            "Tus-Resumable": TUS_VERSION,
+            "Tus-Version": TUS_VERSION,
+            "Tus-Extension": "creation,termination,expiration",
+            "Tus-Max-Size": str(self.store.max_bytes),
+            "Upload-Part-Size": str(self.part_size),
+        })
+
+    async def create_handler(self, request: web.Request) -> web.Response:
+        try:
+            length = int(request.headers.get("Upload-Length", ""))
+        except ValueError:
+            return web.json_response({"error": "Upload-Length header required"}, status=400)
+        if length <= 0:
+            return web.json_response({"error": "Upload-Length must be positive"}, status=400)
+        if length > self.store.max_bytes:
+            return web.json_response(
+                {"error": f"File exceeds the upload limit of {self.store.max_bytes} bytes"}, status=413
+            )
+        try:
+            filename = safe_filename(parse_metadata(request.headers.get("Upload-Metadata", "")).get("filename"))
+            part_size = int(request.headers.get("Upload-Part-Size", self.part_size))
+        except (UploadRejected, ValueError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        extension = Path(filename).suffix.lower()
+        if self.allowed_extensions is not None and extension not in self.allowed_extensions:
+            return web.json_response(
+                {"error": f"File type {extension} not supported. Allowed: {sorted(self.allowed_extensions)}"},
+                status=400,
+            )
+
+        upload_id = uuid.uuid4().hex
+        part_size = min(max(part_size, MIN_PART_SIZE), MAX_PART_SIZE)
+        upload = _Upload(upload_id, filename, length, part_size, self.dir / f"{upload_id}.part")
+
+        def allocate():
+            with open(upload.path, "wb") as f:
+                f.truncate(length)
+            self._save_info(upload)
+
+        await asyncio.to_thread(allocate)
+        self._uploads[upload_id] = upload
+        self._outcomes.inc(outcome="created")
+        location = f"{self.base_path}/{upload_id}"
+        logger.info(f"📦 Resumable upload {upload_id}: {filename} ({length} bytes, {upload.parts} parts)")
+        return web.json_response(
+            {"id": upload_id, "location": location, "part_size": part_size, "parts": upload.parts},
+            status=201,
+            headers={**upload.headers(), "Location": location},
+        )
+
+    async def head_handler(self, request: web.Request) -> web.Response:
+        return web.Response(status=200, headers=self._get(request).headers())
+
+    async def status_handler(self, request: web.Request) -> web.Response:
+        upload = self._get(request)
+        info = upload.info()
+        info.update(offset=upload.offset(), next_offsets=upload.next_offsets(), complete=upload.complete())
+        return web.json_response(info, headers=upload.headers())
+
+    async def delete_handler(self, request: web.Request) -> web.Response:
+        upload = self._get(request)
+        if upload.writers or (upload.completing and upload.result is None):
+            return web.json_response({"error": "Upload is being written"}, status=409)
+        await asyncio.to_thread(self._delete, upload)
+        self._outcomes.inc(outcome="terminated")
+        return web.Response(status=204, headers={"Tus-Resumable": TUS_VERSION})
+
+    async def patch_handler(self, request: web.Request) -> web.Response:
+        """Append to the part that starts or continues at ``Upload-Offset``."""
+        upload = self._get(request)
+        if request.content_type != OFFSET_CONTENT_TYPE:
+            return web.json_response({"error": f"Content-Type must be {OFFSET_CONTENT_TYPE}"}, status=415)
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+        except ValueError:
+            return web.json_response({"error": "Upload-Offset header required"}, status=400)
+
+        if upload.result is not None:  # Retried final PATCH whose response was lost
+            status = 422 if "error" in upload.result else 200
+            return web.json_response(upload.result, status=status, headers=upload.headers())
+        part = offset // upload.part_size if 0 <= offset < upload.length else None
+        if part is None or offset != upload.next_offsets()[part] or part in upload.writers:
+            return web.json_response(
+                {"error": "Upload-Offset does not match a resumable part", "offset": upload.offset(),
+                 "next_offsets": upload.next_offsets()},
+                status=409,
+                headers=upload.headers(),
+            )
+
+        upload.writers.add(part)
+        position = offset
+        fd = await asyncio.to_thread(os.open, upload.path, os.O_WRONLY)
+        try:
+            async for chunk in request.content.iter_chunked(CHUNK_SIZE):
+                while chunk and part is not None:
+                    piece, chunk = chunk[: upload.part_end(part) - position], chunk[upload.part_end(part) - position:]
+                    await asyncio.to_thread(os.pwrite, fd, piece, position)
+                    if position == upload.hashed and not upload.hash_lock.locked():
+                        upload.digest.update(piece)
+                        upload.hashed += len(piece)
+                    position += len(piece)
+                    upload.received[part] += len(piece)
+                    self._bytes.inc(len(piece))
+                    if position == upload.part_end(part):
+                        # Run on into the next part only while nobody else has started it
+                        upload.writers.discard(part)
+                        following = part + 1
+                        if following < upload.parts and upload.received[following] == 0 \
+                                and following not in upload.writers:
+                            upload.writers.add(following)
+                            part = following
+                        else:
+                            part = None  # The rest of the body is already here or being sent
+        finally:
+            if part is not None:
+                upload.writers.discard(part)
+            await asyncio.to_thread(os.close, fd)
+            upload.updated_at = time.time()
+            await asyncio.to_thread(self._save_info, upload)
+
+        await self._catch_up(upload)
+        if not upload.complete() or upload.completing:
+            return web.Response(status=204, headers=upload.headers())
+
+        upload.completing = True
+        try:
+            result = await self._finish(upload)
+        except ValueError as e:
+            # The content was rejected (e.g. an unreadable archive); final, the file is gone
+            upload.result = {"error": str(e)}
+            await asyncio.to_thread(self._save_info, upload)
+            return web.json_response(upload.result, status=422, headers=upload.headers())
+        except Exception:
+            upload.completing = False
+            raise
+        return web.json_response(result, headers=upload.headers())
+
+    async def _finish(self, upload: _Upload) -> Dict[str, Any]:
+        await self._catch_up(upload)
+        finish = self.on_complete or self.store.adopt
+        upload.result = await finish(str(upload.path), upload.filename, upload.digest.hexdigest(), upload.length)
+        await asyncio.to_thread(self._save_info, upload)
+        self._outcomes.inc(outcome="completed")
+        logger.info(f"✅ Resumable upload {upload.id} complete: {upload.filename}")
+        return upload.result
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete uploads unchanged for ``expire_s``; returns their number."""
+        cutoff = (now if now is not None else time.time()) - self.expire_s
+        expired = [
+            upload for upload in list(self._uploads.values())
+            if upload.updated_at < cutoff and not upload.writers
+            and (upload.result is not None or not upload.completing)
+        ]
+        for upload in expired:
+            self._delete(upload)
+            if upload.result is None:
+                self._outcomes.inc(outcome="expired")
+        return len(expired)
+
+    async def _purge_loop(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.expire_s, 3600.0))
+            try:
+                purged = await asyncio.to_thread(self.purge_expired)
+                if purged:
+                    logger.info(f"🧹 Removed {purged} expired resumable uploads")
+            except Exception as e:
+                logger.error(f"❌ Resumable upload cleanup failed: {e}")
+
+    async def start(self, app: web.Application) -> None:
+        self._janitor = asyncio.create_task(self._purge_loop())
+
+    async def stop(self, app: web.Application) -> None:
+        if self._janitor is not None:
+            self._janitor.cancel()
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_route("OPTIONS", self.base_path, self.options_handler)
+        app.router.add_post(self.base_path, self.create_handler)
+        item = f"{self.base_path}/{{upload_id}}"
+        app.router.add_route("HEAD", item, self.head_handler)
+        app.router.add_get(item, self.status_handler, allow_head=False)
+        app.router.add_patch(item, self.patch_handler)
+        app.router.add_delete(item, self.delete_handler)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
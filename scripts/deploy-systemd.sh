@@ -19,8 +19,10 @@ sudo useradd -r -s /bin/false -d /opt/pharma-rag pharma-rag 2>/dev/null || echo
 
 # Create application directory
 echo "📁 Setting up application directory..."
-sudo mkdir -p /opt/pharma-rag/{data,logs,cache}
+sudo mkdir -p /opt/pharma-rag/{data,logs,cache,.uploads_tmp}
 sudo cp -r . /opt/pharma-rag/
+# Ingestion status database shared by the main and upload services (both run with a read-only root)
+sudo touch /opt/pharma-rag/ingestion_status.db{,-wal,-shm}
 sudo chown -R pharma-rag:pharma-rag /opt/pharma-rag
 
 # Install Python and dependencies
@@ -23,7 +23,7 @@ if [ -f "logs/rag.pid" ]; then
 fi
 
 # Fallback: kill by process name
-pkill -f "upload_server.py" 2>/dev/null && echo "✅ Upload server processes killed"
+pkill -f "upload_service.py" 2>/dev/null && echo "✅ Upload service processes killed"
 pkill -f "app_openrouter.py" 2>/dev/null && echo "✅ RAG server processes killed"
 
 echo "🔚 All services stopped"
\ No newline at end of file
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Single-Flight Request Coalescing
+
+When a drug hits the news, dozens of users ask the same question within
+seconds. Single-flight groups let concurrent callers with the same key attach
+to the one in-flight computation instead of starting their own: the first
+caller (leader) runs it, every other caller (follower) receives its result.
+
+Key Features:
+- SingleFlight.do(): coalescing for blocking calls (Pathway UDF worker threads),
+  followers wait at most ``follower_timeout_s``
+- SingleFlight.do_async(): coalescing for coroutines (aiohttp handlers)
+- StreamFlight: followers replay and then follow the shared token stream
+- Shared async work runs in its own task: one caller's cancellation or
+  disconnect never reaches the others
+- Leader/follower counts per group in the metrics registry
+- Nothing is cached: once the computation finishes the key is released
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from metrics import REGISTRY, MetricsRegistry
+
+
+def flight_key(*parts: Any) -> str:
+    """Stable hash of JSON-serialisable request parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FlightTimeout(TimeoutError):
+    """A follower gave up waiting for the leader's result."""
+
+
+class _AsyncCall:
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+
+    Args:
+        name: Label used for the group's metrics
+        registry: Metrics registry (process-wide registry by default)
+        follower_timeout_s: Longest a follower of :meth:`do` waits for the leader
+    """
+
+    def __init__(self, name: str, registry: MetricsRegistry = REGISTRY, follower_timeout_s: float = 300.0):
+        self.name = name
+        self.follower_timeout_s = follower_timeout_s
+        self._calls: Dict[str, Future] = {}
+        self._async_calls: Dict[str, _AsyncCall] = {}
+        self._lock = threading.Lock()
+        self._requests = registry.counter(
+            "single_flight_requests_total", "Requests entering a single-flight group by role"
+        )
+        self._in_flight = registry.gauge("single_flight_in_flight", "Distinct computations currently in flight")
+
+    @property
+    def coalesced(self) -> int:
+        """Requests served by another request's computation."""
+        return int(self._requests.value(flight=self.name, role="follower"))
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run ``fn`` unless a call with ``key`` is in flight; then wait for its result.
+
+        Raises:
+            FlightTimeout: A follower waited ``timeout`` (default ``follower_timeout_s``) for the leader
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self._in_flight.set(len(self._calls), flight=self.name)
+        self._requests.inc(flight=self.name, role="leader" if leader else "follower")
+
+        if not leader:
+            try:
+                return future.result(self.follower_timeout_s if timeout is None else timeout)
+            except FutureTimeoutError:
+                self._requests.inc(flight=self.name, role="timeout")
+                raise FlightTimeout(f"Coalesced call of {self.name} did not finish in time") from None
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                self._in_flight.set(len(self._calls), flight=self.name)
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Coroutine variant of :meth:`do` for callers on one event loop.
+
+        The computation runs in its own task, so a caller that is cancelled
+        (e.g. its client disconnected) does not cancel it for the others. It is
+        cancelled only once no caller waits for it any more.
+        """
+        call = self._async_calls.get(key)
+        if call is None:
+            self._requests.inc(flight=self.name, role="leader")
+            call = self._async_calls[key] = _AsyncCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+        else:
+            self._requests.inc(flight=self.name, role="follower")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._release(key, call)  # Nobody will see the result; later callers start afresh
+                call.task.cancel()
+
+    def _release(self, key: str, call: _AsyncCall) -> None:
+        if self._async_calls.get(key) is call:
+            del self._async_calls[key]
+
+    def _finished(self, key: str, call: _AsyncCall) -> None:
+        self._release(key, call)
+        if not call.task.cancelled():
+            call.task.exception()  # Mark retrieved when no caller is waiting
+
+
+class _Broadcast:
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.task: Optional["asyncio.Future"] = None
+        self.readers = 0
+
+
+class StreamFlight:
+    """
+    Coalesces concurrent async streams that share a key.
+
+    The source stream is consumed by a task of its own; every caller (the
+    first one included) replays the chunks produced so far and then receives
+    new chunks as they arrive. A caller that stops reading (disconnect,
+    cancellation) leaves the others unaffected; the source is closed once no
+    caller reads it any more.
+
+    Args:
+        name: Label used for the group's metrics
+        registry: Metrics registry (process-wide registry by default)
+    """
+
+    def __init__(self, name: str, registry: MetricsRegistry = REGISTRY):
+        self.name = name
+        self._streams: Dict[str, _Broadcast] = {}
+        self._requests = registry.counter(
+            "single_flight_requests_total", "Requests entering a single-flight group by role"
+        )
+
+    @property
+    def coalesced(self) -> int:
+        return int(self._requests.value(flight=self.name, role="follower"))
+
+    async def stream(self, key: str, source: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self._requests.inc(flight=self.name, role="leader")
+            broadcast = self._streams[key] = _Broadcast()
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, source))
+        else:
+            self._requests.inc(flight=self.name, role="follower")
+
+        broadcast.readers += 1
+        position = 0
+        try:
+            while True:
+                async with broadcast.changed:
+                    await broadcast.changed.wait_for(
+                        lambda: position < len(broadcast.chunks) or broadcast.done
+                    )
+                    pending = broadcast.chunks[position:]
+                    finished, error = broadcast.done, broadcast.error
+                for chunk in pending:
+                    yield chunk
+                position += len(pending)
+                if finished and position >= len(broadcast.chunks):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            broadcast.readers -= 1
+            if broadcast.readers == 0 and not broadcast.task.done():
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+                broadcast.task.cancel()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, source) -> None:
+        chunks = source()
+        try:
+            async for chunk in chunks:
+                async with broadcast.changed:
+                    broadcast.chunks.append(chunk)
+                    broadcast.changed.notify_all()
+        except asyncio.CancelledError:
+            broadcast.error = RuntimeError("Coalesced stream was abandoned by all its readers")
+            raise
+        except Exception as e:
+            broadcast.error = e  # Raised to every reader
+        finally:
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Structured JSON Answers for Machine Consumers
+
+Integrations only need the regulatory status of one drug or FDC, not the
+free-text compliance analysis. A request to /v1/pw_ai_answer with
+``"response_format": "json"`` is answered with one object of a fixed schema:
+
+    {"banned": true, "components": ["Nimesulide", "Paracetamol"],
+     "notification_no": "GSR 578(E)", "date": "2024-08-12",
+     "source": "cdsco_banned_12Aug2024.pdf", "confidence": 0.9}
+
+The model gets a short extraction prompt instead of the long compliance
+template, a tight output budget and temperature 0; providers with structured
+outputs also receive the JSON schema. Every model answer is validated (and
+dates normalised) server-side before it is returned.
+
+Key Features:
+- Fixed schema with server-side validation; invalid model output is never returned
+- Output capped to ``max_tokens`` (200 by default instead of 1000)
+- Registry hits answered from the drug registry without an LLM call
+- Valid, invalid and registry answer counts on /v1/metrics
+"""
+
+import json
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ANSWER_FIELDS = ("banned", "components", "notification_no", "date", "source", "confidence")
+
+ANSWER_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "banned": {"type": ["boolean", "null"]},
+        "components": {"type": "array", "items": {"type": "string"}},
+        "notification_no": {"type": ["string", "null"]},
+        "date": {"type": ["string", "null"], "description": "Notification date, YYYY-MM-DD"},
+        "source": {"type": ["string", "null"], "description": "Document the status was taken from"},
+        "confidence": {"type": "number", "description": "Between 0 and 1"},
+    },
+    "required": list(ANSWER_FIELDS),
+    "additionalProperties": False,
+}
+
+STRUCTURED_SYSTEM_PROMPT = """You extract the regulatory status of a drug or fixed dose combination (FDC) in India from CDSCO notifications and gazette documents.
+
+Reply with one JSON object and nothing else, with exactly these keys:
+- "banned": true if the documents prohibit the queried drug or exactly this combination, false if they approve it or withdraw its prohibition, null if the documents do not say
+- "components": the active ingredients of the queried drug or FDC, as written in the documents
+- "notification_no": the gazette notification number (e.g. "GSR 578(E)"), or null
+- "date": the notification date as YYYY-MM-DD, or null
+- "source": the path of the document the status was taken from, or null
+- "confidence": a number between 0 and 1
+
+An FDC ban applies only to products with exactly those components, not to the individual drugs."""
+
+STRUCTURED_USER_TEMPLATE = "Documents: {context}\n\nQuery: {query}"
+
+# OpenRouter model prefixes that accept a JSON schema response_format
+SCHEMA_OUTPUT_MODELS = ("openai/", "google/gemini")
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%Y", "%d %B %Y", "%d %b %Y", "%B %d, %Y")
+
+BANNED_STATUS = re.compile(r"\b(banned|prohibited|prohibition|suspended)\b", re.IGNORECASE)
+RELEASED_STATUS = re.compile(r"\b(withdrawn|revoked|lifted|approved|allowed)\b", re.IGNORECASE)
+
+
+def empty_answer() -> Dict[str, Any]:
+    """Schema-conforming answer without any finding."""
+    return {"banned": None, "components": [], "notification_no": None, "date": None, "source": None, "confidence": 0.0}
+
+
+def normalize_date(value: Optional[str]) -> Optional[str]:
+    """ISO date of a notification date in one of the common CDSCO formats."""
+    if value is None or not value.strip():
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"date {value!r} is not a recognised date")
+
+
+def _optional_str(answer: Dict[str, Any], field: str) -> Optional[str]:
+    value = answer[field]
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} must be a string or null")
+    if value is None:
+        return None
+    return value.strip() or None
+
+
+def parse_answer(text: str) -> Dict[str, Any]:
+    """
+    Parse and validate a model answer against ANSWER_SCHEMA.
+
+    Code fences around the object are tolerated, unknown keys are dropped.
+
+    Raises:
+        ValueError: The text is not a JSON object of the schema
+    """
+    text = text.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        answer = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"not valid JSON: {e}") from e
+    if not isinstance(answer, dict):
+        raise ValueError("not a JSON object")
+    missing = [field for field in ANSWER_FIELDS if field not in answer]
+    if missing:
+        raise ValueError(f"missing keys {missing}")
+
+    if answer["banned"] is not None and not isinstance(answer["banned"], bool):
+        raise ValueError("banned must be a boolean or null")
+    components = answer["components"]
+    if not isinstance(components, list) or not all(isinstance(component, str) for component in components):
+        raise ValueError("components must be a list of strings")
+    confidence = answer["confidence"]
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+        raise ValueError("confidence must be a number between 0 and 1")
+    return {
+        "banned": answer["banned"],
+        "components": [component.strip() for component in components if component.strip()],
+        "notification_no": _optional_str(answer, "notification_no"),
+        "date": normalize_date(_optional_str(answer, "date")),
+        "source": _optional_str(answer, "source"),
+        "confidence": float(confidence),
+    }
+
+
+def registry_answer(record: Dict[str, str]) -> Dict[str, Any]:
+    """Structured answer of a drug registry record (drug_registry.DrugRegistry)."""
+    status = record.get("status") or ""
+    banned = None
+    if RELEASED_STATUS.search(status):
+        banned = False
+    elif BANNED_STATUS.search(status):
+        banned = True
+    try:
+        date = normalize_date(record.get("date"))
+    except ValueError:
+        date = None
+    return {
+        "banned": banned,
+        "components": [component.strip() for component in record["name"].split("+") if component.strip()],
+        "notification_no": record.get("notification") or None,
+        "date": date,
+        "source": record.get("source") or None,
+        "confidence": 1.0 if banned is not None else 0.5,
+    }
+
+
+class StructuredAnswerFormat:
+    """
+    Settings of the ``"response_format": "json"`` answer mode.
+
+    Args:
+        max_tokens: Output cap of structured answers
+        temperature: Sampling temperature of structured answers
+        schema_models: OpenRouter model prefixes that get ANSWER_SCHEMA as a
+            ``json_schema`` response_format (the others rely on the prompt and
+            server-side validation)
+    """
+
+    def __init__(
+        self, max_tokens: int = 200, temperature: float = 0.0, schema_models: Optional[Sequence[str]] = None
+    ):
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.schema_models = tuple(schema_models if schema_models is not None else SCHEMA_OUTPUT_MODELS)
+        self._answers = REGISTRY.counter("structured_answers_total", "Structured JSON answers by result")
+
+    def apply(self, route: Dict) -> Dict:
+        """Mark a route (query_router.QueryRouter.route) as structured and cap its output."""
+        route = {**route, "format": "json"}
+        if route["max_tokens"] is None or route["max_tokens"] > self.max_tokens:
+            route["max_tokens"] = self.max_tokens
+        return route
+
+    def response_format(self, model: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Provider ``response_format`` for a model, or None if it only gets the prompt."""
+        name = (model or "").removeprefix("openrouter/")
+        if not any(name.startswith(prefix) for prefix in self.schema_models):
+            return None
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "drug_status", "strict": True, "schema": ANSWER_SCHEMA},
+        }
+
+    def user_prompt(self, context: str, query: str) -> str:
+        """Per-query part of the extraction prompt."""
+        return STRUCTURED_USER_TEMPLATE.format(context=context, query=query)
+
+    def validate(self, text: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Validated answer of the model, or None if there is none or it violates the schema."""
+        if text is None:
+            self._answers.inc(result="unavailable")
+            return None
+        try:
+            answer = parse_answer(text)
+        except ValueError as e:
+            logger.warning(f"⚠️ Structured answer rejected: {e}")
+            self._answers.inc(result="invalid")
+            return None
+        self._answers.inc(result="valid")
+        return answer
+
+    def local(self, route: Dict) -> Dict[str, Any]:
+        """Structured answer of a route answered without the LLM."""
+        if route.get("rule") == "registry":
+            self._answers.inc(result="registry")
+            return registry_answer(route["record"])
+        return empty_answer()
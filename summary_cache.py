@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Per-Document Summary Cache
+
+"Summarize the August 2024 gazette notification" asked by ten users should
+cost one LLM call, not ten. Summary-intent queries are answered with a
+query-independent summary of the best matching document, generated once and
+cached until the document changes.
+
+Key Features:
+- Bounded LRU keyed by (document path, modified_at): re-ingested files are
+  summarised again
+- Summary prompt built from the document's own chunks, fetched with a fixed
+  summary query restricted to its path (document_query), never from the
+  chunks one user's question happened to retrieve; small output budget
+- Hit/miss counter compatible with the replay load tester's cache report
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Summarize the following Indian drug regulatory document for a compliance "
+    "officer. List the notification number and date, the drugs or fixed dose "
+    "combinations affected and the action taken (ban, restriction, withdrawal, "
+    "schedule change). Use short bullet points and only facts from the text.\n\n"
+    "Document: {path}\n\n{text}"
+)
+
+# Fixed retrieval query ranking a document's chunks for its summary
+SUMMARY_QUERY = "notification number and date, drugs and fixed dose combinations affected, action taken"
+
+
+def document_key(doc: dict) -> Tuple[str, str]:
+    """(path, modified_at) of a retrieved chunk."""
+    metadata = doc.get("metadata", {}) if isinstance(doc, dict) else {}
+    return metadata.get("path", ""), str(metadata.get("modified_at", ""))
+
+
+class DocumentSummaryCache:
+    """
+    LRU cache of LLM summaries of whole documents.
+
+    Args:
+        capacity: Maximum number of cached summaries
+        max_chunks: Chunks of the document included in the summary prompt
+        document_k: Chunks fetched per document by :meth:`document_query`
+        max_tokens: Output budget of a summary
+        registry: Metrics registry (process-wide registry by default)
+    """
+
+    def __init__(
+        self,
+        capacity: int = 500,
+        max_chunks: int = 8,
+        document_k: int = 50,
+        max_tokens: int = 500,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.max_chunks = max_chunks
+        self.document_k = document_k
+        self.max_tokens = max_tokens
+        self._summaries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._requests = registry.counter("document_summary_requests_total", "Document summary cache lookups")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._summaries)
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+        self._requests.inc(result="hit" if summary is not None else "miss")
+        return summary
+
+    def put(self, key: Tuple[str, str], summary: str) -> None:
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.capacity:
+                self._summaries.popitem(last=False)
+
+    def document_query(self, docs: List[dict]) -> Dict[str, object]:
+        """
+        Retrieval request (query, metadata_filter, k) for the chunks of the top document.
+
+        The query is the same for every user question, so the summary does not
+        depend on which question first missed the cache.
+        """
+        path = document_key(docs[0])[0] if docs else ""
+        return {"query": SUMMARY_QUERY, "metadata_filter": f"path == `{json.dumps(path)}`", "k": self.document_k}
+
+    def messages(self, path: str, document_chunks: List[dict]) -> List[Dict[str, str]]:
+        """Summary prompt over the chunks of one document."""
+        chunks = [doc.get("text", "") for doc in document_chunks if document_key(doc)[0] == path][: self.max_chunks]
+        content = SUMMARY_PROMPT.format(path=path or "unknown source", text="\n\n".join(chunks))
+        return [{"role": "user", "content": content}]
+
+    def summarize(
+        self,
+        docs: List[dict],
+        document_chunks: List[dict],
+        llm_call: Callable[[List[Dict[str, str]]], Optional[str]],
+    ) -> Optional[str]:
+        """
+        Summary answer for the best matching document.
+
+        Args:
+            docs: Chunks retrieved for the question, best first; the top one names the document
+            document_chunks: The document's chunks, retrieved with :meth:`document_query`
+            llm_call: Called with the summary messages on a cache miss
+
+        Returns:
+            The answer, or None when nothing was retrieved or the LLM failed
+            (the caller then degrades to a retrieval-only answer)
+        """
+        if not docs:
+            return None
+        key = document_key(docs[0])
+        summary = self.get(key)
+        if summary is None:
+            summary = llm_call(self.messages(key[0], document_chunks)) if document_chunks else None
+            if not summary:
+                return None
+            self.put(key, summary)
+            logger.info(f"📝 Cached summary of {key[0]}")
+        return f"**Summary of {key[0] or 'the best matching document'}**\n\n{summary}"
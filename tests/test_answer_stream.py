@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Streaming Answer Endpoint Test Suite
+
+PURPOSE:
+Validates the server-sent event stream of /v1/pw_ai_answer_stream with a fake
+retriever and a fake token stream, without Pathway running or an LLM call.
+
+WHAT IT TESTS:
+1. Event Stream:
+   - context event lists the retrieved sources
+   - token events arrive in order and concatenate to the answer
+   - done event carries the full response and TTFT
+
+2. Prompt Construction:
+   - Same context processor and RAG template as /v1/pw_ai_answer
+   - Reranker reorders candidates and keeps rerank_topk
+
+3. Errors:
+   - Missing prompt returns 400
+   - LLM failure is reported as an error event
+   - Open circuit breaker streams a retrieval-only answer
+
+4. Routing:
+   - QueryRouter tiers pick the model and skip the LLM for greetings
+
+WHEN TO RUN:
+- After changing answer_stream.py or the question answerer configuration
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway and aiohttp installed (no running server, no API key)
+"""
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp.test_utils import TestClient, TestServer
+from pathway.xpacks.llm.prompts import RAGPromptTemplate
+from pathway.xpacks.llm.question_answering import SimpleContextProcessor
+
+from answer_stream import StreamingAnswerServer
+
+DOCS = [
+    {"text": "short", "metadata": {"path": "data/a.pdf"}, "dist": 0.1},
+    {"text": "much longer chunk", "metadata": {"path": "data/b.pdf"}, "dist": 0.2},
+]
+
+
+class LengthReranker:
+    """Scores documents by text length."""
+
+    def __wrapped__(self, docs, queries):
+        return [float(len(doc["text"])) for doc in docs]
+
+
+def make_qa(reranker=None, rerank_topk=None):
+    return SimpleNamespace(
+        search_topk=5,
+        reranker=reranker,
+        rerank_topk=rerank_topk,
+        llm=SimpleNamespace(kwargs={"model": "fake"}),
+        docs_to_context_transformer=SimpleContextProcessor().as_udf(),
+        prompt_udf=RAGPromptTemplate(template="Context: {context}\nQuery: {query}").as_udf(),
+    )
+
+
+class FakeStreamServer(StreamingAnswerServer):
+    def __init__(self, qa, tokens=("Nimesulide ", "is ", "banned."), fail=False, error=None):
+        super().__init__(qa)
+        self.tokens = tokens
+        self.fail = fail
+        self.error = error
+        self.prompts = []
+        self.calls = []
+
+    async def retrieve(self, session, prompt, filters, k=None):
+        return list(DOCS)
+
+    async def stream_llm(self, rag_prompt, model, max_tokens=None, tier="default"):
+        self.prompts.append(rag_prompt)
+        self.calls.append((model, max_tokens))
+        if self.fail:
+            raise self.error or RuntimeError("OpenRouter unavailable")
+        for token in self.tokens:
+            yield token
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def post_stream(server, payload):
+    async with TestClient(TestServer(server.create_app())) as client:
+        response = await client.post("/v1/pw_ai_answer_stream", json=payload)
+        return response.status, response.headers.get("Content-Type", ""), await response.text()
+
+
+def test_stream_emits_context_tokens_done():
+    """Tokens are streamed in order followed by a done event"""
+    print("📡 Testing SSE stream...")
+    server = FakeStreamServer(make_qa())
+    status, content_type, body = asyncio.run(post_stream(server, {"prompt": "Is nimesulide banned?"}))
+
+    assert status == 200 and content_type.startswith("text/event-stream")
+    events = parse_events(body)
+    assert events[0] == ("context", {"sources": ["data/a.pdf", "data/b.pdf"], "retrieval_ms": events[0][1]["retrieval_ms"]})
+    assert [data["text"] for name, data in events if name == "token"] == ["Nimesulide ", "is ", "banned."]
+    name, done = events[-1]
+    assert name == "done" and done["response"] == "Nimesulide is banned."
+    assert done["ttft_ms"] is not None and done["ttft_ms"] <= done["total_ms"]
+    print(f"✅ {len(events)} events, TTFT {done['ttft_ms']} ms")
+
+
+def test_prompt_uses_rag_template_and_reranker():
+    """Context is built from reranked, truncated documents"""
+    server = FakeStreamServer(make_qa(LengthReranker(), rerank_topk=1))
+    asyncio.run(post_stream(server, {"prompt": "q"}))
+
+    assert server.prompts == ['Context: {"text": "much longer chunk", "path": "data/b.pdf"}\nQuery: q']
+
+
+def test_missing_prompt_rejected():
+    """Empty prompt returns 400 before streaming starts"""
+    status, _, _ = asyncio.run(post_stream(FakeStreamServer(make_qa()), {"prompt": " "}))
+    assert status == 400
+
+
+def test_llm_failure_reported_as_event():
+    """LLM errors end the stream with an error event"""
+    print("⚠️ Testing error event...")
+    server = FakeStreamServer(make_qa(), fail=True)
+    _, _, body = asyncio.run(post_stream(server, {"prompt": "q"}))
+    name, data = parse_events(body)[-1]
+    assert name == "error" and "OpenRouter unavailable" in data["error"]
+    print("✅ Error surfaced to the client")
+
+
+def test_open_breaker_streams_retrieval_only_answer():
+    """Degraded provider yields an answer built from the sources"""
+    from llm_governor import CircuitOpenError
+
+    server = FakeStreamServer(make_qa(), fail=True, error=CircuitOpenError("open"))
+    _, _, body = asyncio.run(post_stream(server, {"prompt": "q"}))
+    name, done = parse_events(body)[-1]
+    assert name == "done" and done["degraded"] is True
+    assert "a.pdf" in done["response"]
+
+
+def test_router_tiers():
+    """Routed streams use the tier's model and skip the LLM for the none tier"""
+    print("🧭 Testing routed streams...")
+    from query_router import QueryRouter
+
+    qa = make_qa()
+    qa.llm = SimpleNamespace(kwargs={"model": "sonnet", "max_tokens": 1000}, model="sonnet")
+    qa.router = QueryRouter(fast_model="haiku", fast_max_tokens=300)
+    server = FakeStreamServer(qa)
+
+    _, _, body = asyncio.run(post_stream(server, {"prompt": "Is nimesulide banned?"}))
+    assert parse_events(body)[-1][1]["tier"] == "fast" and server.calls == [("haiku", 300)]
+
+    _, _, body = asyncio.run(post_stream(server, {"prompt": "hello"}))
+    name, done = parse_events(body)[-1]
+    assert done["tier"] == "none" and done["response"].startswith("Hello!")
+    assert len(server.calls) == 1  # No LLM call for the greeting
+
+
+if __name__ == "__main__":
+    print("🧬 Streaming Answer Tests")
+    print("=" * 50)
+    test_stream_emits_context_tokens_done()
+    test_prompt_uses_rag_template_and_reranker()
+    test_missing_prompt_rejected()
+    test_llm_failure_reported_as_event()
+    test_open_breaker_streams_retrieval_only_answer()
+    test_router_tiers()
+    print("\n✅ All streaming answer tests passed")
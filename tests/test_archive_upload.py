@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Archive Upload Test Suite
+
+PURPOSE:
+Validates bulk uploads of ZIP/TAR archives: parallel extraction into ./data,
+content-hash deduplication and one batch-status handle for all documents.
+
+WHAT IT TESTS:
+1. ArchiveExtractor:
+   - ZIP and TAR.GZ members land in ./data through UploadStore
+   - Same-named members of different folders keep their folder in the name
+   - Duplicates within the archive and of existing documents are not rewritten
+   - Unsupported, hidden and nested-archive members are skipped with a reason
+   - Member count and size limits reject ZIP and TAR archives alike, leaving no files
+   - Non-archives rejected
+
+2. Batch status:
+   - /v1/upload of a ZIP registers one batch with the ingestion tracker
+   - /v1/uploads/batches/{id} and its SSE stream follow the batch until indexed
+
+WHEN TO RUN:
+- After changing archive_upload.py, upload_store.py, the batch routes of
+  ingestion_status.py or the upload handler of upload_service.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp and aiofiles (no running server)
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_upload import ArchiveError, ArchiveExtractor, is_archive
+from upload_store import UploadStore
+
+DOCS = {
+    "2024/ban.pdf": b"%PDF Nimesulide is banned",
+    "2025/ban.pdf": b"%PDF Codeine is restricted",
+    "copy/ban-again.pdf": b"%PDF Nimesulide is banned",  # Same bytes as 2024/ban.pdf
+    "notice.txt": b"Schedule H drugs need a prescription",
+    "scan.png": b"\x89PNG",
+    "__MACOSX/2024/._ban.pdf": b"resource fork",
+    "inner.zip": b"PK",
+}
+
+
+def make_zip(path: str, docs=DOCS) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("2024/", b"")
+        for name, contents in docs.items():
+            archive.writestr(name, contents)
+
+
+def make_tar(path: str, docs=DOCS) -> None:
+    with tarfile.open(path, "w:gz") as archive:
+        for name, contents in docs.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            archive.addfile(info, io.BytesIO(contents))
+
+
+def check_batch(batch, data):
+    by_member = {entry["member"]: entry for entry in batch["files"]}
+    assert list(by_member) == ["2024/ban.pdf", "2025/ban.pdf", "copy/ban-again.pdf", "notice.txt"]
+    assert by_member["2024/ban.pdf"]["filename"] == "ban.pdf"
+    assert by_member["2025/ban.pdf"]["filename"] == "2025_ban.pdf"  # Name taken: folder kept
+    assert by_member["copy/ban-again.pdf"]["duplicate"]
+    assert by_member["copy/ban-again.pdf"]["document_id"] == by_member["2024/ban.pdf"]["document_id"]
+    reasons = {entry["member"]: entry["reason"] for entry in batch["skipped"]}
+    assert reasons == {
+        "scan.png": "unsupported type .png",
+        "__MACOSX/2024/._ban.pdf": "hidden file",
+        "inner.zip": "nested archive",
+    }
+    assert sorted(os.listdir(data)) == ["2025_ban.pdf", "ban.pdf", "notice.txt"]
+
+
+def test_zip_and_tar_extraction():
+    """Both formats extract supported members once, in archive order"""
+    print("🗜️ Testing ZIP and TAR.GZ extraction...")
+    assert is_archive("bundle.ZIP") and is_archive("bundle.tar.gz") and not is_archive("ban.pdf")
+    for name, make in (("bundle.zip", make_zip), ("bundle.tar.gz", make_tar)):
+        with tempfile.TemporaryDirectory() as tmp:
+            data = os.path.join(tmp, "data")
+            store = UploadStore(data)
+            extractor = ArchiveExtractor(store, allowed_extensions={".pdf", ".txt"}, max_workers=3)
+            archive = os.path.join(tmp, name)
+            make(archive)
+
+            batch = extractor.extract(archive, name)
+            check_batch(batch, data)
+            with open(os.path.join(data, "2025_ban.pdf"), "rb") as f:
+                assert f.read() == DOCS["2025/ban.pdf"]
+
+            again = extractor.extract(archive, name)  # Same archive uploaded twice
+            assert all(entry["duplicate"] for entry in again["files"])
+            assert os.listdir(store.tmp_dir) == []
+        print(f"   ✅ {name}: 3 documents, 1 duplicate, 3 skipped")
+
+
+def test_limits_and_non_archives():
+    """Archive bombs and files that are not archives are rejected"""
+    print("🛡️ Testing extraction limits...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UploadStore(os.path.join(tmp, "data"))
+        docs = {f"notice-{i}.txt": f"notice {i}".encode() for i in range(5)}
+        zip_path, tar_path = os.path.join(tmp, "many.zip"), os.path.join(tmp, "many.tgz")
+        make_zip(zip_path, docs)
+        make_tar(tar_path, docs)
+
+        limited = ArchiveExtractor(store, max_members=3)
+        try:
+            limited.extract(zip_path, "many.zip")
+            raise AssertionError("member limit ignored")
+        except ArchiveError as e:
+            assert "limit is 3" in str(e)
+        try:
+            limited.extract(tar_path, "many.tgz")  # Streamed: the limit is hit after three members
+            raise AssertionError("member limit ignored")
+        except ArchiveError as e:
+            assert "limit is 3" in str(e)
+
+        for path, name in ((zip_path, "many.zip"), (tar_path, "many.tgz")):
+            try:
+                ArchiveExtractor(store, max_total_bytes=10).extract(path, name)
+                raise AssertionError("size limit ignored")
+            except ArchiveError as e:
+                assert "expands to" in str(e)
+        # Rejected archives leave neither documents nor temporary files behind
+        assert os.listdir(store.data_dir) == []
+        assert os.listdir(store.tmp_dir) == []
+
+        not_archive = os.path.join(tmp, "fake.zip")
+        with open(not_archive, "wb") as f:
+            f.write(b"%PDF not an archive")
+        try:
+            limited.extract(not_archive, "fake.zip")
+            raise AssertionError("non-archive accepted")
+        except ArchiveError:
+            pass
+    print("   ✅ Limits enforced")
+
+
+def test_archive_upload_batch_status():
+    """A ZIP upload returns one batch handle that follows its documents until indexed"""
+    print("📡 Testing archive upload and batch status...")
+    from aiohttp import FormData
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from ingestion_status import IngestionStatusTracker
+    from upload_service import UploadService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            tracker = IngestionStatusTracker(":memory:")
+            app = UploadService("data", tracker)
+            make_zip("bundle.zip")
+            with open("bundle.zip", "rb") as f:
+                archive = f.read()
+
+            async def scenario():
+                async with TestClient(TestServer(app.create_app())) as client:
+                    form = FormData()
+                    form.add_field("file", archive, filename="bundle.zip", content_type="application/zip")
+                    response = await client.post("/v1/upload", data=form)
+                    assert response.status == 200
+                    body = await response.json()
+                    assert body["state"] == "processing" and len(body["skipped"]) == 3
+                    files = body["files"]
+                    assert [entry["duplicate"] for entry in files] == [False, False, True, False]
+                    assert files[2]["upload_id"] == files[0]["upload_id"]  # Duplicate linked to the original
+
+                    status = await client.get(body["status_url"])
+                    assert (await status.json())["counts"]["received"] == 4
+                    assert (await client.get("/v1/uploads/batches/unknown")).status == 404
+
+                    events = await client.get(body["events_url"])
+
+                    def pipeline():
+                        for name in ("ban.pdf", "2025_ban.pdf", "notice.txt"):
+                            for stage in ("parsed", "chunked", "embedded", "indexed"):
+                                tracker.advance(os.path.join("data", name), stage)
+
+                    threading.Thread(target=pipeline).start()
+                    states = []
+                    async for line in events.content:
+                        if line.startswith(b"data: "):
+                            states.append(json.loads(line[6:])["state"])
+                    assert states[0] == "processing" and states[-1] == "indexed"
+                    final = await (await client.get(body["status_url"])).json()
+                    assert final["counts"]["indexed"] == 4 and final["duplicates"] == 1
+
+                    form = FormData()
+                    form.add_field("file", b"%PDF not an archive", filename="fake.zip")
+                    assert (await client.post("/v1/upload", data=form)).status == 400
+
+            asyncio.run(scenario())
+        finally:
+            os.chdir(cwd)
+    print("   ✅ Batch followed until indexed")
+
+
+if __name__ == "__main__":
+    print("🧬 Archive Upload Tests")
+    print("=" * 50)
+    test_zip_and_tar_extraction()
+    test_limits_and_non_archives()
+    test_archive_upload_batch_status()
+    print("\n✅ All archive upload tests passed")
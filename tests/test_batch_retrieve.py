@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Batch Retrieval Test Suite
+
+PURPOSE:
+Validates /v1/retrieve_batch: many queries per request, embedded in one
+batch, with per-item k, filters and similarity thresholds, and the NDJSON
+stream of the streaming server.
+
+WHAT IT TESTS:
+1. Request items:
+   - Strings and objects, batch-level defaults and per-item overrides
+   - Invalid items and invalid requests
+   - Similarity thresholds
+
+2. Pathway endpoint:
+   - Results in input order over a USearch index
+   - All queries of a commit embedded in one call
+
+3. NDJSON stream:
+   - Chunking, input order and global indices
+   - Failed chunks answered with error lines, bad requests with 400
+
+WHEN TO RUN:
+- After changing batch_retrieve.py or the streaming server
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway and aiohttp (no model download, no running server)
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_retrieve import BatchRetriever, RetrieveBatchSchema, apply_threshold, parse_items
+
+DEFAULTS = {"k": 5, "metadata_filter": None, "filepath_globpattern": None, "min_similarity": None}
+
+
+def test_parse_items():
+    """Items get batch defaults, per-item overrides and validation errors"""
+    print("📦 Testing batch items...")
+    items = parse_items(
+        ["nimesulide", {"query": "codeine", "k": 2, "min_similarity": 0.4}, {"query": " "}, {"query": "x", "k": 500}],
+        DEFAULTS, max_items=10, max_k=100,
+    )
+    assert [item["index"] for item in items] == [0, 1, 2, 3]
+    assert (items[0]["query"], items[0]["k"], items[0]["error"]) == ("nimesulide", 5, None)
+    assert (items[1]["k"], items[1]["min_similarity"]) == (2, 0.4)
+    assert items[2]["error"] == "query must be a non-empty string"
+    assert items[3]["error"].startswith("k must be")
+
+    assert parse_items([], DEFAULTS, 10, 100) == [{"index": -1, "error": "queries must be a non-empty list"}]
+    assert parse_items(["q"] * 11, DEFAULTS, 10, 100)[0]["index"] == -1
+
+    docs = [{"text": "a", "dist": 0.1}, {"text": "b", "dist": 0.7}]
+    assert apply_threshold(docs, 0.5) == docs[:1] and apply_threshold(docs, None) == docs
+
+
+def test_pathway_batch_endpoint():
+    """The Pathway transformer answers every batch in input order with one embedding call"""
+    print("🔍 Testing batched retrieval over the index...")
+    import pathway as pw
+    from pathway.stdlib.indexing import USearchMetricKind, UsearchKnnFactory
+    from pathway.xpacks.llm.document_store import DocumentStore
+    from pathway.xpacks.llm.embedders import BaseEmbedder
+
+    calls = []
+
+    class LetterEmbedder(BaseEmbedder):
+        def __init__(self):
+            super().__init__(max_batch_size=1000)
+
+        def __wrapped__(self, input: list[str], **kwargs) -> list[np.ndarray]:
+            if isinstance(input, str):
+                return np.ones(3)
+            calls.append(len(input))
+            return [np.array([text.count(c) + 0.1 for c in "npc"]) for text in input]
+
+    class DocumentSchema(pw.Schema):
+        data: bytes
+        _metadata: pw.Json
+
+    docs = pw.debug.table_from_rows(DocumentSchema, [
+        (b"nnnn", pw.Json({"path": "data/n.pdf"})),
+        (b"pppp", pw.Json({"path": "data/p.pdf"})),
+        (b"cccc", pw.Json({"path": "data/c.pdf"})),
+    ])
+    store = DocumentStore(
+        docs, retriever_factory=UsearchKnnFactory(embedder=LetterEmbedder(), reserved_space=10, metric=USearchMetricKind.COS)
+    )
+    requests = pw.debug.table_from_rows(RetrieveBatchSchema, [
+        (pw.Json(["n", {"query": "p", "k": 1}, {"query": ""}, {"query": "n", "metadata_filter": "contains(path, `c.pdf`)"}]),
+         2, None, None, None),
+        (pw.Json([]), None, None, None, None),
+        (pw.Json(["pp"]), 3, None, None, 0.5),
+    ])
+    results = pw.debug.table_to_pandas(BatchRetriever(store).retrieve_batch(requests))["result"]
+    by_size = sorted((result.value for result in results), key=lambda value: len(value) if isinstance(value, list) else 0)
+
+    assert by_size[0] == {"error": "queries must be a non-empty list"}
+    single, batch = by_size[1], by_size[2]
+    assert [doc["text"] for doc in single[0]["results"]] == ["pppp"]  # min_similarity drops the rest
+    assert [entry["index"] for entry in batch] == [0, 1, 2, 3]
+    assert [doc["text"] for doc in batch[0]["results"]] == ["nnnn", "pppp"]
+    assert [doc["text"] for doc in batch[1]["results"]] == ["pppp"]
+    assert batch[2] == {"index": 2, "error": "query must be a non-empty string"}
+    assert [doc["metadata"]["path"] for doc in batch[3]["results"]] == ["data/c.pdf"]
+    assert calls[-1] == 4  # All valid queries of the commit in one embedding call
+    print(f"   ✅ Embedding calls: {calls}")
+
+
+def test_ndjson_stream():
+    """The streaming endpoint chunks large batches and keeps input order"""
+    print("🌊 Testing NDJSON stream...")
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from answer_stream import StreamingAnswerServer
+
+    chunks = []
+
+    async def fake_pathway(request):
+        body = await request.json()
+        chunks.append(body["queries"])
+        if "boom" in body["queries"]:
+            return web.json_response({"error": "boom"}, status=500)
+        await asyncio.sleep(0.05 if "slow" in body["queries"] else 0)
+        return web.json_response([
+            {"index": i, "results": [{"text": query, "k": body["k"]}]} for i, query in enumerate(body["queries"])
+        ])
+
+    async def scenario():
+        pathway_app = web.Application()
+        pathway_app.router.add_post("/v1/retrieve_batch", fake_pathway)
+        async with TestServer(pathway_app) as pathway_server:
+            retriever = BatchRetriever(None, max_items=2, chunk_size=2, concurrency=2)
+            stream_server = StreamingAnswerServer(
+                None, batch_retriever=retriever, retrieve_batch_url=str(pathway_server.make_url("/v1/retrieve_batch"))
+            )
+            async with TestClient(TestServer(stream_server.create_app())) as client:
+                response = await client.post(
+                    "/v1/retrieve_batch", json={"queries": ["slow", "a", "b", "boom", "c"], "k": 3}
+                )
+                body = await response.text()
+                bad = await client.post("/v1/retrieve_batch", json={"queries": []})
+                return response, body, bad.status
+
+    response, body, bad_status = asyncio.run(scenario())
+    assert response.headers["Content-Type"] == "application/x-ndjson" and bad_status == 400
+    lines = [json.loads(line) for line in body.strip().split("\n")]
+    assert [line["index"] for line in lines] == [0, 1, 2, 3, 4]
+    assert [line["results"][0]["text"] for line in lines if "results" in line] == ["slow", "a", "c"]
+    assert lines[0]["results"][0]["k"] == 3
+    assert "error" in lines[2] and "error" in lines[3]  # The failed chunk ["b", "boom"]
+    assert sorted(len(chunk) for chunk in chunks) == [1, 2, 2]
+    print("   ✅ 5 queries in 3 chunks, in input order")
+
+
+if __name__ == "__main__":
+    print("🧬 Batch Retrieval Tests")
+    print("=" * 50)
+    test_parse_items()
+    test_pathway_batch_endpoint()
+    test_ndjson_stream()
+    print("\n✅ All batch retrieval tests passed")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Deadline-Aware Degradation Test Suite
+
+PURPOSE:
+Validates how a client deadline on /v1/pw_ai_answer is turned into cheaper
+answer plans, and that LLM calls give up (instead of retrying) once the
+deadline has passed.
+
+WHAT IT TESTS:
+1. DeadlinePolicy:
+   - Degradations in order as the budget shrinks: skip_rerank, shrink_k,
+     fast_model, cap_tokens, retrieval_only
+   - Requests without a deadline and none-tier routes are unchanged
+   - Explicitly requested models are kept
+   - Reranking cost and threshold follow the reranker's budget_ms
+   - The budget counts from the request's arrival
+
+2. LLM calls:
+   - The remaining time becomes the litellm timeout
+   - Governor retries stop at the deadline without tripping the breaker
+   - PharmaLiteLLMChat returns None (retrieval-only answer) after the deadline
+
+WHEN TO RUN:
+- After changing deadline.py, llm_governor.py, pharma_llm.py or the deadline settings
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway with the LLM xpack installed (no API key, no running server)
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deadline import DeadlinePolicy
+from llm_governor import CircuitBreaker, GovernorTimeout, LLMGovernor
+from metrics import REGISTRY
+
+
+def full_route(**overrides):
+    route = {
+        "tier": "full", "rule": "default", "model": "sonnet", "max_tokens": 1000,
+        "k": 30, "top_n": None, "started": time.time(),
+    }
+    route.update(overrides)
+    return route
+
+
+def test_degradations_follow_budget():
+    """Tighter budgets apply more degradations"""
+    print("⏱️ Testing deadline plans...")
+    policy = DeadlinePolicy(fast_model="haiku")
+
+    relaxed = policy.apply(full_route(), 60000, rerank_topk=10)
+    assert relaxed["degradations"] == [] and relaxed["model"] == "sonnet" and relaxed["k"] == 30
+
+    medium = policy.apply(full_route(), 14000, rerank_topk=10)
+    assert medium["degradations"] == ["skip_rerank", "fast_model"]
+    assert medium["skip_rerank"] and medium["k"] == 10 and medium["model"] == "haiku"
+
+    tight = policy.apply(full_route(), 6000, rerank_topk=10)
+    assert tight["degradations"] == ["skip_rerank", "shrink_k", "fast_model", "cap_tokens"]
+    assert tight["k"] == 4 and 0 < tight["max_tokens"] < 1000
+
+    hopeless = policy.apply(full_route(), 1500, rerank_topk=10)
+    assert hopeless["retrieval_only"] and hopeless["degradations"][-1] == "retrieval_only"
+
+    assert abs(tight["deadline"] - (tight["started"] + 5.75)) < 1e-6  # 250ms margin
+    assert REGISTRY.get("deadline_degradations_total").value(degradation="shrink_k") >= 1
+    print(f"   ✅ 6s budget: {', '.join(tight['degradations'])} ({tight['max_tokens']} tokens)")
+
+
+def test_unchanged_routes():
+    """No deadline, none tier and explicit models are left alone"""
+    policy = DeadlinePolicy(fast_model="haiku")
+
+    route = policy.apply(full_route(), None, rerank_topk=10)
+    assert route["deadline"] is None and route["degradations"] == [] and route["k"] == 30
+
+    greeting = policy.apply(full_route(tier="none", rule="greeting", model=None), 1000)
+    assert greeting["degradations"] == [] and not greeting["retrieval_only"]
+
+    explicit = policy.apply(full_route(rule="explicit_model", model="gpt-4o"), 12000)
+    assert explicit["model"] == "gpt-4o" and "fast_model" not in explicit["degradations"]
+
+    # Listing routes keep their larger top_n unless k shrinks
+    listing = policy.apply(full_route(k=25, top_n=25), 7000)
+    assert (listing["k"], listing["top_n"]) == (4, 4)
+
+
+def test_rerank_budget_and_arrival():
+    """A 150 ms reranker budget keeps reranking for short deadlines; the clock starts at arrival"""
+    policy = DeadlinePolicy(fast_model="haiku")
+    budgeted = policy.apply(full_route(), 6000, rerank_topk=10, rerank_budget_ms=150)
+    assert not budgeted["skip_rerank"] and "skip_rerank" not in budgeted["degradations"]
+    both = [policy.apply(full_route(), 20000, 10, budget)["max_tokens"] for budget in (None, 150)]
+    assert both[0] + 40 < both[1]  # 1.5 s instead of 150 ms subtracted for reranking
+    assert policy.apply(full_route(), 1400, rerank_topk=10, rerank_budget_ms=150)["skip_rerank"]
+    assert DeadlinePolicy(skip_rerank_below_ms=9000).apply(full_route(), 6000, 10, 150)["skip_rerank"]
+
+    from enhanced_rag import PharmaRAGQuestionAnswerer
+
+    payload = {"prompt": "q", "received_at": 0.0}
+    PharmaRAGQuestionAnswerer.stamp_arrival(payload, {})
+    assert abs(payload["received_at"] - time.time()) < 1.0
+    qa = SimpleNamespace(
+        llm=SimpleNamespace(model="sonnet", kwargs={}), router=None, search_topk=6, reranker=None,
+        rerank_topk=None, deadline_policy=policy, structured=None,
+    )
+    arrived = time.time() - 2.0  # Waited two seconds before planning
+    route = PharmaRAGQuestionAnswerer.plan(qa, "q", None, deadline_ms=6000, received_at=arrived)
+    assert abs(route["deadline"] - (arrived + 5.75)) < 1e-6
+
+
+def test_governor_stops_retrying_at_deadline():
+    """Retryable failures past the deadline end the call without opening the breaker"""
+    print("🛑 Testing governor deadline...")
+    governor = LLMGovernor(rate_per_minute=60000, burst=100, base_delay_s=0.5, max_delay_s=0.5, failure_threshold=2)
+    calls = []
+
+    def slow_failure():
+        calls.append(time.time())
+        time.sleep(0.05)
+        raise TimeoutError("provider timeout")
+
+    started = time.time()
+    try:
+        governor.call(slow_failure, deadline=started + 0.03)
+        raise AssertionError("deadline ignored")
+    except GovernorTimeout:
+        pass
+    assert len(calls) == 1 and time.time() - started < 0.5
+    assert governor.breaker.state == CircuitBreaker.CLOSED
+    print("   ✅ No retry after the deadline")
+
+
+def test_llm_deadline_timeout_and_fallback():
+    """The remaining time is the provider timeout; a passed deadline skips the call"""
+    import litellm
+    from pharma_llm import PharmaLiteLLMChat
+
+    seen = []
+
+    def fake_completion(messages, **kwargs):
+        seen.append(kwargs)
+        return SimpleNamespace(choices=[{"message": {"content": "banned"}}], usage=None)
+
+    original = litellm.completion
+    litellm.completion = fake_completion
+    try:
+        llm = PharmaLiteLLMChat(model="openrouter/test", coalesce=False, governor=LLMGovernor())
+        messages = [{"role": "user", "content": "q"}]
+        assert llm.__wrapped__(messages, deadline=time.time() + 5) == "banned"
+        assert 4 < seen[0]["timeout"] <= 5 and "deadline" not in seen[0]
+
+        assert llm.__wrapped__(messages, deadline=time.time() - 1) is None
+        assert len(seen) == 1
+
+        ungoverned = PharmaLiteLLMChat(model="openrouter/test", coalesce=False)
+        assert ungoverned.__wrapped__(messages, deadline=time.time() - 1) is None
+        assert ungoverned.__wrapped__(messages) == "banned" and "timeout" not in seen[-1]
+    finally:
+        litellm.completion = original
+
+
+if __name__ == "__main__":
+    print("🧬 Deadline Degradation Tests")
+    print("=" * 50)
+    test_degradations_follow_budget()
+    test_unchanged_routes()
+    test_rerank_budget_and_arrival()
+    test_governor_stops_retrying_at_deadline()
+    test_llm_deadline_timeout_and_fallback()
+    print("\n✅ All deadline tests passed")
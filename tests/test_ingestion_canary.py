@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Ingestion Canary Test Suite
+
+PURPOSE:
+Validates the synthetic probe that measures how long a new document takes to
+become retrievable.
+
+WHAT IT TESTS:
+1. A canary found by /v1/retrieve records its time to searchable
+2. A canary never found counts as a timeout
+3. Canary files are removed after each probe and after interrupted runs
+
+WHEN TO RUN:
+- After changing ingestion_canary.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp (no running server; /v1/retrieve is simulated)
+"""
+
+import asyncio
+import glob
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion_canary import IngestionCanary
+from metrics import REGISTRY
+
+
+def fake_index(data_dir: str, delay_s: float):
+    """aiohttp app answering /v1/retrieve with canary files older than delay_s"""
+    from aiohttp import web
+
+    requests = []
+
+    async def retrieve(request):
+        body = await request.json()
+        requests.append(body)
+        docs = []
+        for path in glob.glob(os.path.join(data_dir, "*")):
+            if time.time() - os.path.getmtime(path) >= delay_s:
+                with open(path, encoding="utf-8") as f:
+                    docs.append({"text": f.read(), "metadata": {"path": path}, "dist": 0.1})
+        return web.json_response(docs[: body["k"]])
+
+    app = web.Application()
+    app.router.add_post("/v1/retrieve", retrieve)
+    return app, requests
+
+
+def run_probe(delay_s: float, timeout_s: float):
+    from aiohttp.test_utils import TestServer
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        app, requests = fake_index(data_dir, delay_s)
+
+        async def scenario():
+            async with TestServer(app) as server:
+                canary = IngestionCanary(
+                    data_dir=data_dir,
+                    retrieve_url=str(server.make_url("/v1/retrieve")),
+                    timeout_s=timeout_s,
+                    probe_interval_s=0.02,
+                )
+                return await canary.probe_once()
+
+        result = asyncio.run(scenario())
+        assert os.listdir(data_dir) == []  # The canary leaves no file behind
+    return result, requests
+
+
+def test_canary_found():
+    """A canary that becomes retrievable records its time to searchable"""
+    print("🐤 Testing canary probe...")
+    probes = REGISTRY.counter("ingestion_canary_total")
+    found_before = probes.value(outcome="found")
+
+    result, requests = run_probe(delay_s=0.15, timeout_s=5)
+    assert result["outcome"] == "found" and result["searchable_ms"] >= 150
+    assert len(requests) > 1 and requests[0]["filepath_globpattern"].endswith(f"{result['token']}.txt")
+    assert probes.value(outcome="found") == found_before + 1
+    assert REGISTRY.gauge("ingestion_canary_last_ms").value() == result["searchable_ms"]
+    print(f"   ✅ Searchable after {result['searchable_ms']:.0f}ms")
+
+
+def test_canary_timeout_and_leftovers():
+    """Canaries never found time out; files of interrupted runs are removed"""
+    result, _ = run_probe(delay_s=60, timeout_s=0.1)
+    assert result["outcome"] == "timeout" and result["searchable_ms"] is None
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        canary = IngestionCanary(data_dir=data_dir)
+        canary._write("interrupted")
+        open(os.path.join(data_dir, "cdsco_banned.pdf"), "wb").close()
+        assert canary.remove_leftovers() == 1
+        assert os.listdir(data_dir) == ["cdsco_banned.pdf"]
+
+
+if __name__ == "__main__":
+    print("🧬 Ingestion Canary Tests")
+    print("=" * 50)
+    test_canary_found()
+    test_canary_timeout_and_leftovers()
+    print("\n✅ All ingestion canary tests passed")
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Ingestion Status Test Suite
+
+PURPOSE:
+Validates the per-file ingestion state machine that tells clients when an
+uploaded document becomes searchable.
+
+WHAT IT TESTS:
+1. IngestionStatusTracker:
+   - received -> parsed -> chunked -> embedded -> indexed, stage timings
+   - Uploads and files the pipeline found on its own share one record
+   - Failures, re-reads of unchanged files and record retention
+   - Time-to-searchable and per-stage histograms of indexed files
+
+2. Pipeline and API:
+   - TrackedDocumentStore reports every stage of a real Pathway run
+   - Parse failures are reported by ThrottledParser
+   - /v1/uploads routes and the SSE stream of a file until it is indexed
+
+WHEN TO RUN:
+- After changing ingestion_status.py, ingestion_throttle.py or the upload server
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway and aiohttp (no model download, no unstructured, no running server)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pathway as pw
+
+from ingestion_status import IngestionStatusAPI, IngestionStatusTracker, TrackedDocumentStore
+from ingestion_throttle import ThrottledParser
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_state_machine():
+    """Stages move forward only and keep their first timestamp"""
+    print("🗂️ Testing ingestion state machine...")
+    tracker = IngestionStatusTracker(":memory:", retention_s=60)
+    record = tracker.register_upload("ban.pdf", "data/ban.pdf", 120)
+    assert record["state"] == "received" and record["source"] == "upload"
+
+    seen = tracker.file_seen("data/ban.pdf", sha(b"pdf"), 120)  # Same record, now with its hash
+    assert seen["upload_id"] == record["upload_id"] and seen["sha256"] == sha(b"pdf")
+    assert tracker.advance_content(sha(b"pdf"), "parsed")["state"] == "parsed"
+    assert tracker.advance("data/ban.pdf", "chunked", chunks=3)["chunks"] == 3
+    assert tracker.advance("data/ban.pdf", "parsed") is None  # Stages never move back
+    tracker.advance("data/ban.pdf", "embedded")
+    indexed = tracker.advance(os.path.abspath("data/ban.pdf"), "indexed")
+    assert indexed["upload_id"] == record["upload_id"] and indexed["state"] == "indexed"
+    assert list(indexed["timings_ms"]) == ["detect", "parse", "split", "embed", "index"]
+    assert indexed["time_to_searchable_ms"] >= 0
+    assert tracker.advance("data/ban.pdf", "chunked", chunks=1) is None  # Finished records stay as they are
+
+    assert tracker.file_seen("data/ban.pdf", sha(b"pdf"), 120) is None  # Unchanged file read again
+    copied = tracker.file_seen("data/rsync.txt", sha(b"txt"), 3)
+    assert copied["source"] == "watch" and copied["filename"] == "rsync.txt"
+    failed = tracker.fail_content(sha(b"txt"), "Parsing failed: broken")
+    assert failed["state"] == "failed" and failed["error"] == "Parsing failed: broken"
+    assert tracker.advance_content(sha(b"early"), "parsed") is None  # Parser was faster than the input report
+    assert tracker.file_seen("data/early.txt", sha(b"early"), 5)["state"] == "parsed"
+
+    updated = tracker.file_seen("data/ban.pdf", sha(b"pdf v2"), 130)  # New version: new record
+    assert updated["upload_id"] != record["upload_id"]
+    assert tracker.counts() == {
+        "received": 1, "parsed": 1, "chunked": 0, "embedded": 0, "indexed": 1, "failed": 1
+    }
+    assert [f["filename"] for f in tracker.list(state="failed")] == ["rsync.txt"]
+    assert tracker.purge_expired(now=updated["stages"]["received"] + 61) == 4
+    print("   ✅ Stages, failures and new versions tracked")
+
+
+def test_time_to_searchable_metrics():
+    """Indexed files feed the time-to-searchable and per-stage histograms"""
+    from metrics import REGISTRY
+
+    tracker = IngestionStatusTracker(":memory:")
+    searchable = REGISTRY.histogram("time_to_searchable_ms")
+    stages = REGISTRY.histogram("ingestion_stage_ms")
+    before = searchable.count(source="canary"), stages.count(stage="detect", source="canary")
+
+    seen = tracker.file_seen("data/pharmarag-canary-1.txt", sha(b"canary"), 6, landed_at=tracker.started_at)
+    assert seen["source"] == "canary" and seen["detected_at"] >= seen["stages"]["received"]
+    for stage in ("parsed", "chunked", "embedded"):
+        tracker.advance("data/pharmarag-canary-1.txt", stage)
+    assert searchable.count(source="canary") == before[0]  # Observed once searchable only
+    indexed = tracker.advance("data/pharmarag-canary-1.txt", "indexed")
+
+    assert searchable.count(source="canary") == before[0] + 1
+    assert stages.count(stage="detect", source="canary") == before[1] + 1
+    assert stages.count(stage="index", source="canary") >= 1
+    # Stages are rounded separately; they add up to the total within rounding
+    assert abs(sum(indexed["timings_ms"].values()) - indexed["time_to_searchable_ms"]) <= 0.5
+
+    old = tracker.file_seen("data/old.pdf", sha(b"old"), 3, landed_at=0)  # Present before the tracker started
+    assert old["stages"]["received"] >= tracker.started_at
+
+
+class FlakyParser(pw.UDF):
+    """UTF-8 parser that fails on corrupt files"""
+
+    def __wrapped__(self, contents: bytes, **kwargs) -> list[tuple[str, dict]]:
+        if contents.startswith(b"%corrupt"):
+            raise ValueError("unreadable document")
+        return [(contents.decode(), {})]
+
+
+@pw.udf
+def fake_embedder(text: str) -> np.ndarray:
+    return np.array([len(text), 1.0, 1.0])
+
+
+def test_pipeline_reports_stages():
+    """A Pathway run moves uploaded and copied files to indexed, or failed"""
+    print("🏭 Testing stage reports from the Pathway pipeline...")
+    from pathway.internals.parse_graph import G
+    from pathway.stdlib.indexing import BruteForceKnnFactory
+
+    G.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker = IngestionStatusTracker(os.path.join(tmp, "status.db"))
+        data = os.path.join(tmp, "data")
+        os.makedirs(data)
+        files = {
+            "ban.txt": b"Nimesulide is banned. Codeine is restricted.",
+            "rsync.txt": b"Schedule H drugs need a prescription.",
+            "bad.pdf": b"%corrupt",
+        }
+        for name, contents in files.items():
+            with open(os.path.join(data, name), "wb") as f:
+                f.write(contents)
+        upload = tracker.register_upload("ban.txt", os.path.join(data, "ban.txt"), len(files["ban.txt"]))
+
+        TrackedDocumentStore(
+            pw.io.fs.read(data, format="binary", mode="static", with_metadata=True),
+            retriever_factory=BruteForceKnnFactory(embedder=fake_embedder, dimensions=3),
+            parser=ThrottledParser(FlakyParser(), docs_per_minute=None, status_tracker=tracker),
+            status_tracker=tracker,
+        )
+        pw.run(monitoring_level=pw.MonitoringLevel.NONE, terminate_on_error=False)
+
+        records = {record["filename"]: record for record in tracker.list()}
+        assert records["ban.txt"]["upload_id"] == upload["upload_id"]
+        for name in ("ban.txt", "rsync.txt"):
+            assert records[name]["state"] == "indexed" and records[name]["chunks"] == 1
+            assert all(records[name]["stages"][stage] is not None for stage in records[name]["stages"])
+        assert records["rsync.txt"]["source"] == "watch"
+        assert records["bad.pdf"]["state"] == "failed" and "unreadable" in records["bad.pdf"]["error"]
+    G.clear()
+    print("   ✅ Indexed and failed files reported")
+
+
+def test_status_api_and_events():
+    """Clients poll /v1/uploads and follow a file over SSE until it is indexed"""
+    print("📡 Testing /v1/uploads routes and SSE...")
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    tracker = IngestionStatusTracker(":memory:")
+    record = tracker.register_upload("ban.pdf", "data/ban.pdf", 10)
+
+    async def scenario():
+        app = web.Application()
+        IngestionStatusAPI(tracker).add_routes(app)
+        async with TestClient(TestServer(app)) as client:
+            status = await client.get(f"/v1/uploads/{record['upload_id']}")
+            assert status.status == 200 and (await status.json())["state"] == "received"
+            assert (await client.get("/v1/uploads/unknown")).status == 404
+            assert (await client.get("/v1/uploads?state=done")).status == 400
+
+            events = await client.get(f"/v1/uploads/{record['upload_id']}/events")
+            assert events.headers["Content-Type"] == "text/event-stream"
+
+            def pipeline():
+                for stage in ("parsed", "chunked", "embedded", "indexed"):
+                    tracker.advance("data/ban.pdf", stage)
+
+            threading.Thread(target=pipeline).start()  # Reports arrive from Pathway's threads
+            states = []
+            async for line in events.content:
+                if line.startswith(b"data: "):
+                    states.append(json.loads(line[6:])["state"])
+            assert states[0] == "received" and states[-1] == "indexed"
+
+            listing = await (await client.get("/v1/uploads?state=indexed")).json()
+            assert [f["upload_id"] for f in listing["files"]] == [record["upload_id"]]
+            assert listing["counts"]["indexed"] == 1
+
+    asyncio.run(scenario())
+    print("   ✅ Status polled and pushed until indexed")
+
+
+if __name__ == "__main__":
+    print("🧬 Ingestion Status Tests")
+    print("=" * 50)
+    test_state_machine()
+    test_time_to_searchable_metrics()
+    test_pipeline_reports_stages()
+    test_status_api_and_events()
+    print("\n✅ All ingestion status tests passed")
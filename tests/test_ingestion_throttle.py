@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Ingestion Throttle Test Suite
+
+PURPOSE:
+Validates the backpressure that keeps bulk document drops from starving query
+serving: parse concurrency, the rate limit, the backlog metrics and yielding
+while query latency objectives are at risk.
+
+WHAT IT TESTS:
+1. SLOGuard:
+   - Objectives are missed only above their percentile target
+   - Objectives without recent observations are ignored
+
+2. IngestionThrottle / ThrottledParser:
+   - At most max_concurrency documents are parsed at a time
+   - Waiting documents show up as backlog
+   - Documents hold back while the guard reports a breach, at most max_yield_s
+   - The wrapped parser works inside a Pathway pipeline
+   - A document yielding to queries does not hold back later rows of the dataflow
+
+WHEN TO RUN:
+- After changing ingestion_throttle.py or the parser section of the YAML configs
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway (no model download, no unstructured, no running server)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pathway as pw
+
+from ingestion_throttle import IngestionThrottle, SLOGuard, ThrottledParser, ingestion_snapshot
+from metrics import MetricsRegistry
+
+
+class FakeParser(pw.UDF):
+    """Slow parser that records how many documents it parses at the same time"""
+
+    def __init__(self, delay_s: float = 0.05):
+        super().__init__()
+        self.delay_s = delay_s
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __wrapped__(self, contents: bytes, **kwargs) -> list[tuple[str, dict]]:
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay_s)
+        with self._lock:
+            self.active -= 1
+        return [(contents.decode(), {"parser": "fake"})]
+
+
+def test_slo_guard():
+    """Only fresh objectives above their target count as breaches"""
+    print("🎯 Testing SLO guard...")
+    registry = MetricsRegistry()
+    latency = registry.histogram("answer_stream_retrieval_ms")
+    guard = SLOGuard(
+        objectives=[{"metric": "answer_stream_retrieval_ms", "percentile": 95, "max_ms": 500}],
+        stale_s=0.2,
+        registry=registry,
+    )
+    assert not guard.at_risk()  # No traffic yet
+
+    for _ in range(20):
+        latency.observe(100)
+    assert not guard.at_risk()
+    for _ in range(5):
+        latency.observe(3000)
+    assert guard.breaches() == ["answer_stream_retrieval_ms p95 3000ms > 500ms"]
+
+    time.sleep(0.3)  # No new queries: nothing left to protect
+    assert not guard.at_risk()
+    latency.observe(3000)
+    assert guard.at_risk()
+    print("   ✅ Breaches reported only while queries are slow")
+
+
+def test_concurrency_and_backlog():
+    """Bulk drops are parsed max_concurrency at a time and wait as backlog"""
+    print("📚 Testing parse concurrency and backlog...")
+    inner = FakeParser(delay_s=0.2)
+    parser = ThrottledParser(inner, max_concurrency=2, docs_per_minute=None, poll_interval_s=0.005)
+    backlog = []
+
+    async def scenario():
+        tasks = [asyncio.create_task(parser.__wrapped__(f"doc {i}".encode())) for i in range(8)]
+        await asyncio.sleep(0.02)
+        backlog.append(ingestion_snapshot())
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(scenario())
+    assert [docs[0][0] for docs in results] == [f"doc {i}" for i in range(8)]
+    assert inner.peak == 2
+    assert backlog[0]["backlog_docs"] == 6 and backlog[0]["in_progress"] == 2
+    assert backlog[0]["backlog_bytes"] == 6 * len(b"doc 0")
+    assert ingestion_snapshot()["backlog_docs"] == 0 and ingestion_snapshot()["in_progress"] == 0
+    print(f"   ✅ Peak concurrency {inner.peak}, backlog {backlog[0]['backlog_docs']}")
+
+
+def test_rate_limit_and_yielding():
+    """Documents start at the configured rate and hold back while queries are slow"""
+    print("⏸️ Testing rate limit and SLO yielding...")
+
+    async def admit(throttle, count):
+        for _ in range(count):
+            await throttle.acquire()
+            throttle.release()
+
+    limited = IngestionThrottle(max_concurrency=4, docs_per_minute=600, burst=2, name="test_rate")
+    started = time.monotonic()
+    asyncio.run(admit(limited, 4))  # Two from the burst, then one per 100ms
+    assert 0.15 <= time.monotonic() - started < 1.0
+
+    class Guard:
+        slow_until = time.monotonic() + 0.2
+
+        def breaches(self):
+            return ["query latency"] if time.monotonic() < self.slow_until else []
+
+        def at_risk(self):
+            return bool(self.breaches())
+
+    guard = Guard()
+    throttle = IngestionThrottle(
+        docs_per_minute=None, slo_guard=guard, poll_interval_s=0.01, max_yield_s=5, name="test_yield"
+    )
+    started = time.monotonic()
+    asyncio.run(admit(throttle, 1))
+    assert time.monotonic() - started >= 0.15  # Waited until queries recovered
+
+    guard.slow_until = time.monotonic() + 60
+    throttle.max_yield_s = 0.05
+    started = time.monotonic()
+    asyncio.run(admit(throttle, 1))  # Queries stay slow: ingestion proceeds after max_yield_s
+    assert time.monotonic() - started < 1.0
+
+    from metrics import REGISTRY
+
+    yields = REGISTRY.counter("ingestion_yields_total")
+    assert yields.value(throttle="test_yield", outcome="resumed") == 1
+    assert yields.value(throttle="test_yield", outcome="expired") == 1
+    print("   ✅ Rate limited, yielded and resumed")
+
+
+def test_parser_in_pipeline():
+    """The throttled parser parses documents inside a Pathway table"""
+    parser = ThrottledParser(pw.xpacks.llm.parsers.Utf8Parser(), max_concurrency=1, docs_per_minute=None)
+    docs = pw.debug.table_from_rows(pw.schema_from_types(data=bytes), [(b"Nimesulide is banned",), (b"Codeine",)])
+    parsed = docs.select(parts=parser(pw.this.data)).await_futures()
+    texts = sorted(parts[0][0] for parts in pw.debug.table_to_pandas(parsed)["parts"])
+    assert texts == ["Codeine", "Nimesulide is banned"]
+
+
+def test_yielding_does_not_block_queries():
+    """Rows committed after a yielding document pass through the dataflow without waiting for it"""
+    print("🚦 Testing that a yielding document leaves the query path free...")
+
+    class Guard:
+        slow_until = time.monotonic() + 1.5
+
+        def breaches(self):
+            return ["query latency"] if time.monotonic() < self.slow_until else []
+
+        def at_risk(self):
+            return bool(self.breaches())
+
+    class Documents(pw.io.python.ConnectorSubject):
+        def run(self):
+            self.next(data=b"Nimesulide is banned")
+
+    class Queries(pw.io.python.ConnectorSubject):
+        def run(self):
+            time.sleep(0.3)
+            self.next(query="nimesulide")
+
+    parser = ThrottledParser(
+        pw.xpacks.llm.parsers.Utf8Parser(), docs_per_minute=None, slo_guard=Guard(), poll_interval_s=0.01
+    )
+    docs = pw.io.python.read(Documents(), schema=pw.schema_from_types(data=bytes), autocommit_duration_ms=20)
+    queries = pw.io.python.read(Queries(), schema=pw.schema_from_types(query=str), autocommit_duration_ms=20)
+    parsed = docs.select(parts=parser(pw.this.data)).await_futures()
+
+    started = time.monotonic()
+    seen = {}
+
+    def arrival(name):
+        return lambda **kwargs: seen.setdefault(name, time.monotonic() - started)
+
+    pw.io.subscribe(parsed, arrival("doc"))
+    pw.io.subscribe(queries, arrival("query"))
+    pw.run(monitoring_level=pw.MonitoringLevel.NONE)
+
+    assert seen["doc"] >= 1.0  # The document held back while queries were slow
+    assert seen["query"] < 1.0  # ... and the query committed after it was not held back with it
+    print(f"   ✅ Query out after {seen['query']:.2f}s, document parsed after {seen['doc']:.2f}s")
+
+
+if __name__ == "__main__":
+    print("🧬 Ingestion Throttle Tests")
+    print("=" * 50)
+    test_slo_guard()
+    test_concurrency_and_backlog()
+    test_rate_limit_and_yielding()
+    test_parser_in_pipeline()
+    test_yielding_does_not_block_queries()
+    print("\n✅ All ingestion throttle tests passed")
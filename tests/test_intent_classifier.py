@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Intent Classifier Test Suite
+
+PURPOSE:
+Validates the local intent classifier and the per-intent pipelines chosen by
+the query router: registry lookups, year-filtered listings, cached document
+summaries and chit-chat.
+
+WHAT IT TESTS:
+1. Classification:
+   - Nearest-centroid intents over a bag-of-words test embedder
+   - Unconfident queries stay unclassified
+   - Classification cost well under a millisecond
+
+2. Routing:
+   - Year ranges and JMESPath filters for listing queries
+   - Registry hits answered without retrieval
+   - Retrieval k, filters and tiers per intent
+
+3. Document summary cache:
+   - One LLM call per (document, modified_at), hit/miss metrics
+
+WHEN TO RUN:
+- After changing intent_classifier.py, drug_registry.py, summary_cache.py or query_router.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway with the LLM xpack installed (no model download, no running server)
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drug_registry import DrugRegistry
+from intent_classifier import IntentClassifier, year_filter, year_range
+from metrics import REGISTRY
+from query_router import GREETING_ANSWER, QueryRouter
+from summary_cache import DocumentSummaryCache
+
+VOCAB = ["banned", "status", "list", "all", "after", "summary", "summarize", "hello", "thanks", "explain", "why"]
+
+EXAMPLES = {
+    "status_lookup": ["is nimesulide banned", "status of paracetamol"],
+    "listing": ["list all banned", "all banned after 2020"],
+    "document_summary": ["summary of the notification", "summarize the gazette"],
+    "chitchat": ["hello", "thanks"],
+    "analysis": ["explain why banned", "why explain"],
+}
+
+
+class BagOfWordsEmbedder:
+    """Counts vocabulary words; stands in for MiniLM."""
+
+    max_batch_size = None
+
+    def __init__(self):
+        self.calls = 0
+
+    def __wrapped__(self, text: str) -> np.ndarray:
+        self.calls += 1
+        words = re.findall(r"\w+", text.lower())
+        return np.array([words.count(word) for word in VOCAB] + [0.01], dtype=np.float32)
+
+
+def make_classifier(**kwargs):
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(EXAMPLES, f)
+    try:
+        return IntentClassifier(BagOfWordsEmbedder(), examples_path=f.name, **kwargs)
+    finally:
+        os.unlink(f.name)
+
+
+def test_nearest_centroid_classification():
+    """Queries get the intent of the closest centroid, fast"""
+    print("🎯 Testing intent classification...")
+    classifier = make_classifier()
+    expected = {
+        "Is nimesulide banned?": "status_lookup",
+        "list all banned drugs after 2023": "listing",
+        "summarize the August notification": "document_summary",
+        "hello!": "chitchat",
+        "explain why": "analysis",
+        "pharmacovigilance": None,  # No known words: unclassified
+    }
+    for query, intent in expected.items():
+        assert classifier.classify(query)[0] == intent, (query, classifier.classify(query))
+
+    vector = classifier.embedder.__wrapped__("is it banned")
+    rounds = 1000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        classifier.classify_vector(vector)
+    per_query_ms = (time.perf_counter() - started) * 1000 / rounds
+    print(f"   ⏱️ {per_query_ms * 1000:.1f}µs per classification")
+    assert per_query_ms < 0.5
+    assert REGISTRY.get("intent_requests_total").value(intent="chitchat") >= 1
+    assert REGISTRY.get("intent_classify_ms").count() >= 6
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"weather": ["sunny"]}, f)
+    try:
+        IntentClassifier(BagOfWordsEmbedder(), examples_path=f.name)
+        raise AssertionError("unknown intent accepted")
+    except ValueError:
+        pass
+    finally:
+        os.unlink(f.name)
+
+
+def test_year_ranges_and_filters():
+    """Listing queries become path filters over the named years"""
+    today = datetime(2025, 6, 1)
+    assert year_range("list all bans after 2023", today) == (2024, 2025)
+    assert year_range("FDCs banned since 2024", today) == (2024, 2025)
+    assert year_range("drugs banned between 2020 and 2018", today) == (2018, 2020)
+    assert year_range("bans before 2002", today) == (2000, 2001)
+    assert year_range("NSQ drugs in January 2025", today) == (2025, 2025)
+    assert year_range("which drugs were banned last year", today) == (2024, 2024)
+    assert year_range("all banned FDCs", today) is None
+
+    assert year_filter((2024, 2025)) == "contains(path, `2024`) || contains(path, `2025`)"
+    assert year_filter((2024, 2024), "contains(path, `cdsco`)") == "(contains(path, `cdsco`)) && (contains(path, `2024`))"
+
+
+def test_registry_status_answered_directly():
+    """A registry hit with a status skips retrieval and the LLM"""
+    print("💊 Testing registry lookups...")
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+        f.write("name,status,notification,date,source\n")
+        f.write("Nimesulide,banned for children below 12 years,GSR 82(E),2011-02-10,cdsco_banned_01Jan2018.pdf\n")
+        f.write("Paracetamol,,,,\n")
+    try:
+        registry = DrugRegistry(f.name)
+        router = QueryRouter(registry_path=f.name)
+    finally:
+        os.unlink(f.name)
+
+    assert len(registry) == 2 and registry.status_record("paracetamol") is None
+    route = router.route("Is nimesulide banned?", None, "sonnet", 1000)
+    assert (route["tier"], route["rule"], route["retrieve"]) == ("none", "registry", False)
+    answer = router.local_answer(route, [])
+    assert "banned for children below 12 years" in answer and "GSR 82(E) dated 2011-02-10" in answer
+
+    # No status recorded: regular fast-tier lookup with retrieval
+    route = router.route("Is paracetamol banned?", None, "sonnet", 1000)
+    assert (route["tier"], route["rule"], route["retrieve"]) == ("fast", "registry_lookup", True)
+    print("   ✅ Registry answer without retrieval")
+
+
+def test_intent_routes():
+    """Each intent gets its retrieval plan and tier"""
+    print("🧭 Testing intent routes...")
+    router = QueryRouter(intent_classifier=make_classifier(), status_k=4, listing_k=30, summary_k=12)
+
+    listing = router.route("list all banned after 2023", None, "sonnet", 1000, None, 10)
+    assert (listing["tier"], listing["intent"], listing["k"], listing["top_n"]) == ("full", "listing", 30, 30)
+    assert "contains(path, `2024`)" in listing["metadata_filter"]
+
+    status = router.route("is nimesulide banned", None, "sonnet", 1000, "contains(path, `cdsco`)", 10)
+    assert (status["tier"], status["k"], status["metadata_filter"]) == ("fast", 4, "contains(path, `cdsco`)")
+
+    summary = router.route("summarize the notification", None, "sonnet", 1000, None, 10)
+    assert (summary["tier"], summary["k"], summary["model"]) == ("summary", 12, "sonnet")
+
+    chitchat = router.route("thanks", None, "sonnet", 1000, None, 10)
+    assert (chitchat["tier"], chitchat["retrieve"]) == ("none", False)
+    assert router.local_answer(chitchat, []) == GREETING_ANSWER
+
+    fallback = router.route("explain why", None, "sonnet", 1000, None, 10)
+    assert (fallback["intent"], fallback["rule"], fallback["k"]) == (None, "complex", 10)
+    print("   ✅ Intent routes ok")
+
+
+def test_document_summary_cache():
+    """Summaries are generated once per document version"""
+    print("📝 Testing document summary cache...")
+    calls = []
+
+    def llm_call(messages):
+        calls.append(messages[0]["content"])
+        return "- GSR 578(E): 156 FDCs prohibited"
+
+    docs = [
+        {"text": "chunk 1", "metadata": {"path": "data/cdsco_banned_12Aug2024.pdf", "modified_at": 1}},
+        {"text": "other", "metadata": {"path": "data/delhi.pdf", "modified_at": 1}},
+        {"text": "chunk 2", "metadata": {"path": "data/cdsco_banned_12Aug2024.pdf", "modified_at": 1}},
+    ]
+    cache = DocumentSummaryCache(capacity=2)
+    requests = REGISTRY.counter("document_summary_requests_total")
+    hits = requests.value(result="hit")
+
+    document = docs[::2] + [{"text": "chunk 3", "metadata": docs[0]["metadata"]}]
+    request = cache.document_query(docs)
+    assert request["metadata_filter"] == 'path == `"data/cdsco_banned_12Aug2024.pdf"`'
+
+    first = cache.summarize(docs[:2], document + docs[1:2], llm_call)
+    assert cache.summarize(list(reversed(docs[::2])), document, llm_call) == first
+    assert len(calls) == 1 and "chunk 1\n\nchunk 2\n\nchunk 3" in calls[0] and "other" not in calls[0]
+    assert first.startswith("**Summary of data/cdsco_banned_12Aug2024.pdf**")
+    assert requests.value(result="hit") - hits == 1
+
+    updated = [{**docs[0], "metadata": {**docs[0]["metadata"], "modified_at": 2}}]
+    cache.summarize(updated, updated, llm_call)
+    assert len(calls) == 2  # Re-ingested document is summarised again
+
+    assert cache.summarize([], [], llm_call) is None
+    assert cache.summarize(docs[1:2], docs[1:2], lambda messages: None) is None and len(cache) == 2
+    print("   ✅ One LLM call per document version")
+
+
+if __name__ == "__main__":
+    print("🧬 Intent Classifier Tests")
+    print("=" * 50)
+    test_nearest_centroid_classification()
+    test_year_ranges_and_filters()
+    test_registry_status_answered_directly()
+    test_intent_routes()
+    test_document_summary_cache()
+    print("\n✅ All intent classifier tests passed")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Job Queue Test Suite
+
+PURPOSE:
+Validates the asynchronous job API: the persistent SQLite queue, the worker
+pool on the streaming server and the submit/poll/result/cancel routes.
+
+WHAT IT TESTS:
+1. Queue:
+   - Claims in priority order, then submission order
+   - Jobs survive reopening the database; running jobs are re-queued
+   - Cancellation, result TTL and the queue size limit
+
+2. Worker pool and HTTP routes:
+   - Submit (202), poll, result (202 while pending, 200 when done)
+   - Failed and timed-out jobs, cancellation of running jobs
+   - Validation errors (400) and unknown jobs (404)
+
+WHEN TO RUN:
+- After changing job_queue.py or the /v1/jobs routes of the streaming server
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp (no running server)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import JobQueue, JobService, QueueFull, parse_priority
+
+
+def test_claim_order_and_persistence():
+    """Higher priorities run first; queued and running jobs survive a restart"""
+    print("🗂️ Testing job queue order and persistence...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.db")
+        queue = JobQueue(path)
+        low = queue.submit("answer", {"prompt": "a"}, parse_priority("low"))
+        first = queue.submit("answer", {"prompt": "b"})
+        second = queue.submit("answer", {"prompt": "c"})
+        high = queue.submit("answer", {"prompt": "d"}, parse_priority("high"))
+        assert queue.position(low) == 3 and queue.position(high) == 0
+
+        assert queue.claim()["id"] == high["id"]
+        assert queue.claim()["payload"] == {"prompt": "b"}
+
+        reopened = JobQueue(path)  # "Restart": the running job goes back to the queue
+        assert reopened.counts()["queued"] == 4 and reopened.counts()["running"] == 0
+        order = [reopened.claim()["id"] for _ in range(4)]
+        assert order == [high["id"], first["id"], second["id"], low["id"]]
+        assert reopened.claim() is None
+        assert reopened.get(high["id"])["attempts"] == 2
+
+    for bad in ("urgent", 1000, True, 1.5):
+        try:
+            parse_priority(bad)
+            raise AssertionError(f"accepted priority {bad!r}")
+        except ValueError:
+            pass
+    print("   ✅ Priority order kept across a restart")
+
+
+def test_cancel_ttl_and_limits():
+    """Cancelled and finished jobs expire after the TTL; full queues reject submissions"""
+    queue = JobQueue(":memory:", result_ttl_s=60, max_queued=2)
+    queued = queue.submit("answer", {"prompt": "a"})
+    running = queue.submit("answer", {"prompt": "b"})
+    try:
+        queue.submit("answer", {"prompt": "c"})
+        raise AssertionError("queue accepted a job beyond max_queued")
+    except QueueFull:
+        pass
+
+    assert queue.cancel(queued["id"]) == "cancelled" and queue.claim()["id"] == running["id"]
+    assert queue.complete(running["id"], {"response": "banned"})
+    assert queue.get(running["id"])["result"] == {"response": "banned"}
+    assert queue.cancel(running["id"]) == "succeeded"
+    assert not queue.fail(running["id"], "late")  # Only running jobs can finish
+    assert queue.cancel("unknown") is None
+
+    finished_at = queue.get(running["id"])["finished_at"]
+    assert queue.purge_expired(now=finished_at + 30) == 0
+    assert queue.purge_expired(now=finished_at + 61) == 2
+    assert queue.get(running["id"]) is None
+
+
+def test_job_api():
+    """Jobs run on the worker pool and are polled over HTTP"""
+    print("🌐 Testing /v1/jobs routes...")
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from answer_stream import StreamingAnswerServer
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def answer(payload):
+            if payload["prompt"] == "fail":
+                raise RuntimeError("provider down")
+            if payload["prompt"] in ("slow", "hang"):
+                await gate.wait()
+            return {"response": payload["prompt"].upper()}
+
+        service = JobService(
+            JobQueue(":memory:"), workers=2, job_timeout_s=1.0, runners={"answer": answer}, poll_interval_s=0.05
+        )
+        server = StreamingAnswerServer(None, job_service=service)
+        async with TestClient(TestServer(server.create_app())) as client:
+            async def submit(prompt, **extra):
+                response = await client.post("/v1/jobs", json={"payload": {"prompt": prompt}, **extra})
+                return response.status, await response.json()
+
+            async def wait_until(job_id, status):
+                for _ in range(100):
+                    body = await (await client.get(f"/v1/jobs/{job_id}")).json()
+                    if body["status"] == status:
+                        return body
+                    await asyncio.sleep(0.02)
+                raise AssertionError(f"job {job_id} never reached {status}: {body}")
+
+            status, slow = await submit("slow")
+            assert status == 202 and slow["links"]["result"] == f"/v1/jobs/{slow['job_id']}/result"
+            await wait_until(slow["job_id"], "running")
+            pending = await client.get(f"/v1/jobs/{slow['job_id']}/result")
+            assert pending.status == 202
+
+            _, hang = await submit("hang", priority="high")
+            await wait_until(hang["job_id"], "running")
+            cancelled = await client.delete(f"/v1/jobs/{hang['job_id']}")
+            assert (await cancelled.json())["status"] == "cancelled"
+            assert (await client.get(f"/v1/jobs/{hang['job_id']}/result")).status == 409
+
+            gate.set()
+            await wait_until(slow["job_id"], "succeeded")
+            result = await client.get(f"/v1/jobs/{slow['job_id']}/result")
+            assert result.status == 200 and (await result.json())["result"] == {"response": "SLOW"}
+            assert (await client.delete(f"/v1/jobs/{slow['job_id']}")).status == 409
+
+            _, failed = await submit("fail")
+            assert (await wait_until(failed["job_id"], "failed"))["error"] == "provider down"
+
+            gate.clear()
+            _, timed_out = await submit("hang")
+            assert "timed out" in (await wait_until(timed_out["job_id"], "failed"))["error"]
+
+            assert (await submit("x", kind="summarize"))[0] == 400
+            assert (await submit("x", priority="urgent"))[0] == 400
+            assert (await client.post("/v1/jobs", json={"payload": "x"})).status == 400
+            assert (await client.get("/v1/jobs/unknown")).status == 404
+
+    asyncio.run(scenario())
+    print("   ✅ Submit, poll, result, cancel, failure and timeout")
+
+
+if __name__ == "__main__":
+    print("🧬 Job Queue Tests")
+    print("=" * 50)
+    test_claim_order_and_persistence()
+    test_cancel_ttl_and_limits()
+    test_job_api()
+    print("\n✅ All job queue tests passed")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Priority Lanes Test Suite
+
+PURPOSE:
+Validates the scheduling classes that keep interactive queries fast while
+batch audits and document ingestion share the embedder and the LLM.
+
+WHAT IT TESTS:
+1. LaneScheduler:
+   - Weighted-fair dispatch when all lanes wait
+   - Bounded per-lane queues, timeouts and per-lane in-flight caps
+   - Idle lanes do not accumulate credit
+
+2. Integration:
+   - LLMGovernor calls hold a slot of their lane
+   - Bulk embedding calls are split and put in the batch or ingestion lane
+   - Job analyses are sent to /v1/pw_ai_answer in the batch lane
+
+WHEN TO RUN:
+- After changing lanes.py, llm_governor.py, query_batcher.py or job_queue.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway and aiohttp (no model download, no API key, no running server)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lanes import LaneRejected, LaneScheduler
+from metrics import REGISTRY
+
+
+def grant_order(scheduler, waiters):
+    """Lanes in the order their waiters got the single slot (all queued behind a held slot)."""
+    order, lock = [], threading.Lock()
+    assert scheduler.acquire("interactive")
+
+    def wait(lane):
+        assert scheduler.acquire(lane, timeout=5)
+        with lock:
+            order.append(lane)
+        scheduler.release(lane)
+
+    threads = []
+    for lane in waiters:
+        thread = threading.Thread(target=wait, args=(lane,))
+        thread.start()
+        threads.append(thread)
+        while sum(lanes["queued"] for lanes in scheduler.snapshot().values()) < len(threads):
+            time.sleep(0.001)
+    scheduler.release("interactive")
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def test_weighted_fair_dispatch():
+    """With weights 8/2/1 interactive waiters get most slots, but nobody starves"""
+    print("🚦 Testing weighted-fair lane dispatch...")
+    scheduler = LaneScheduler(slots=1, name="test_fair")
+    order = grant_order(scheduler, ["ingestion"] * 4 + ["batch"] * 8 + ["interactive"] * 16)
+    first = order[:11]
+    assert first.count("interactive") == 8 and first.count("batch") == 2 and first.count("ingestion") == 1
+    assert len(order) == 28 and order[-1] != "interactive"  # Leftover background work runs last
+    print(f"   ✅ First 11 slots: {first}")
+
+    waits = REGISTRY.histogram("lane_wait_ms")
+    assert waits.count(scheduler="test_fair", lane="ingestion") == 4
+
+
+def test_idle_lane_gets_no_credit():
+    """A lane that was idle does not jump the queue with saved-up credit"""
+    scheduler = LaneScheduler(slots=1, name="test_idle")
+    grant_order(scheduler, ["interactive"] * 20)  # Only interactive work for a while
+    order = grant_order(scheduler, ["batch"] * 4 + ["interactive"] * 8)
+    assert order[:5].count("interactive") >= 3
+
+
+def test_bounded_queues_caps_and_timeouts():
+    """Full queues reject, waits time out and capped lanes leave slots to others"""
+    scheduler = LaneScheduler(
+        slots=2, name="test_bounds", lanes={"batch": {"max_in_flight": 1, "max_queued": 1}}
+    )
+    assert scheduler.acquire("batch")
+    assert not scheduler.acquire("batch", timeout=0.05)  # Capped at one in flight
+    assert scheduler.acquire("interactive", timeout=0.05)  # The second slot stays usable
+
+    holder = threading.Thread(target=scheduler.acquire, args=("batch", 5))
+    holder.start()
+    while scheduler.snapshot()["batch"]["queued"] < 1:
+        time.sleep(0.001)
+    assert not scheduler.acquire("batch", timeout=1)  # Queue of one is full: rejected at once
+    scheduler.release("batch")
+    holder.join()
+    assert scheduler.snapshot()["batch"] == {"queued": 0, "in_flight": 1}
+
+    try:
+        with scheduler.slot("ingestion", timeout=0.01):
+            raise AssertionError("slot granted although all slots are held")
+    except LaneRejected:
+        pass
+    outcomes = REGISTRY.counter("lane_dispatch_total")
+    assert outcomes.value(scheduler="test_bounds", lane="batch", outcome="rejected") == 1
+    assert outcomes.value(scheduler="test_bounds", lane="ingestion", outcome="timeout") == 1
+
+    for bad in ({"urgent": {}}, {"batch": {"weight": 0}}):
+        try:
+            LaneScheduler(lanes=bad)
+            raise AssertionError(f"accepted lanes {bad}")
+        except ValueError:
+            pass
+
+
+def test_governor_and_embedder_lanes():
+    """Governed LLM calls and bulk embeddings hold slots of their lane"""
+    print("🧮 Testing governor and embedder lanes...")
+    from llm_governor import LLMGovernor
+    from query_batcher import BatchedSentenceTransformerEmbedder, QueryEmbeddingBatcher
+
+    lanes = LaneScheduler(slots=2, name="test_llm")
+    governor = LLMGovernor(max_in_flight=8, rate_per_minute=6000, burst=100, lanes=lanes)
+    assert governor.max_in_flight == 2
+    seen = []
+    assert governor.call(lambda: seen.append(lanes.snapshot()["batch"]["in_flight"]) or "ok", lane="batch") == "ok"
+    assert seen == [1] and lanes.snapshot()["batch"]["in_flight"] == 0
+
+    calls = []
+
+    class FakeModel:
+        def encode(self, texts, **kwargs):
+            calls.append((len(texts), dict(embedder_lanes.snapshot())))
+            return [np.ones(3) for _ in texts]
+
+    embedder_lanes = LaneScheduler(slots=1, name="test_embedder")
+    embedder = BatchedSentenceTransformerEmbedder.__new__(BatchedSentenceTransformerEmbedder)
+    embedder.model, embedder.kwargs = FakeModel(), {}
+    embedder.query_max_batch_size = 4
+    embedder.query_cache_max_chars = 50
+    embedder.lanes, embedder.lane_chunk_size = embedder_lanes, 10
+    embedder.batcher = QueryEmbeddingBatcher(embedder._encode_batch, max_wait_ms=0)
+    embedder.cache = None
+
+    assert len(embedder.__wrapped__(["chunk " * 20] * 25)) == 25
+    assert [size for size, _ in calls] == [10, 10, 5]
+    assert all(snapshot["ingestion"]["in_flight"] == 1 for _, snapshot in calls)
+    calls.clear()
+    embedder.__wrapped__(["nimesulide"] * 6)
+    assert calls[0][1]["batch"]["in_flight"] == 1
+    calls.clear()
+    embedder.__wrapped__(["is codeine banned?"])
+    assert calls[0][1]["interactive"]["in_flight"] == 1
+    calls.clear()
+    embedder.__wrapped__(["chunk " * 20])  # A one-chunk document is still ingestion
+    assert calls[0][1]["ingestion"]["in_flight"] == 1
+    embedder.batcher.close()
+    print("   ✅ Bulk calls split per lane")
+
+
+def test_jobs_run_in_batch_lane():
+    """The default answer runner of the job API asks for the batch lane"""
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    from job_queue import JobQueue, JobService
+
+    bodies = []
+
+    async def fake_answer(request):
+        bodies.append(await request.json())
+        return web.json_response({"response": "ok"})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/v1/pw_ai_answer", fake_answer)
+        async with TestServer(app) as server:
+            service = JobService(JobQueue(":memory:"), base_url=str(server.make_url("")).rstrip("/"))
+            return await service.runners["answer"]({"prompt": "audit"})
+
+    assert asyncio.run(scenario()) == {"response": "ok"}
+    assert bodies == [{"lane": "batch", "prompt": "audit"}]
+
+
+if __name__ == "__main__":
+    print("🧬 Priority Lane Tests")
+    print("=" * 50)
+    test_weighted_fair_dispatch()
+    test_idle_lane_gets_no_credit()
+    test_bounded_queues_caps_and_timeouts()
+    test_governor_and_embedder_lanes()
+    test_jobs_run_in_batch_lane()
+    print("\n✅ All priority lane tests passed")
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+LLM Governor Test Suite
+
+PURPOSE:
+Validates the call layer in front of OpenRouter: concurrency cap, token-bucket
+rate limiting, jittered retries, the circuit breaker and the retrieval-only
+fallback, using fake provider calls.
+
+WHAT IT TESTS:
+1. Limits:
+   - No more than max_in_flight concurrent calls
+   - Token bucket enforces the configured rate after the burst
+   - A stream cancelled while waiting for a slot does not keep the slot
+
+2. Retries:
+   - Retryable errors (429/5xx) are retried, others are not
+   - Backoff delays are jittered and capped
+
+3. Circuit Breaker:
+   - Opens after consecutive failures and fails fast
+   - Half-open probe closes it again on success
+   - A probe ending in a 400, a governor timeout, a deadline miss or a
+     stream disconnect is released instead of leaving the breaker stuck
+   - PharmaLiteLLMChat returns None while open; the fallback answer lists sources
+   - Streaming calls retry only before the first token
+   - Mid-stream errors open the breaker only when they are provider failures
+
+WHEN TO RUN:
+- After changing llm_governor.py, pharma_llm.py or the governor settings in the YAML
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway with the LLM xpack installed (no API key, no running server)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_governor import (
+    CircuitBreaker,
+    CircuitOpenError,
+    GovernorTimeout,
+    LLMGovernor,
+    TokenBucket,
+    is_retryable,
+    retrieval_only_answer,
+)
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def fast_governor(**kwargs):
+    settings = dict(rate_per_minute=60000, burst=100, base_delay_s=0.001, max_delay_s=0.005)
+    settings.update(kwargs)
+    return LLMGovernor(**settings)
+
+
+def test_max_in_flight():
+    """Concurrent calls never exceed max_in_flight"""
+    print("🚦 Testing concurrency cap...")
+    governor = fast_governor(max_in_flight=2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=governor.call, args=(call,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    print("✅ Peak concurrency 2")
+
+
+def test_cancelled_stream_returns_its_slot():
+    """A stream cancelled in the slot queue hands back the slot its worker thread gets later"""
+    governor = fast_governor(max_in_flight=1, acquire_timeout_s=5.0)
+
+    async def tokens():
+        yield "a"
+
+    async def main():
+        assert governor._slots.acquire(timeout=0)  # Another call holds the only slot
+        waiting = asyncio.ensure_future(governor.stream(tokens).__anext__())
+        await asyncio.sleep(0.1)
+        waiting.cancel()  # Client disconnected while queued
+        try:
+            await waiting
+        except asyncio.CancelledError:
+            pass
+        governor._slots.release()
+        await asyncio.sleep(0.2)  # The worker thread takes the slot and releases it again
+        return [token async for token in governor.stream(tokens)]
+
+    assert asyncio.run(main()) == ["a"]
+    assert governor._slots.acquire(timeout=0.5)
+
+
+def test_token_bucket_rate():
+    """After the burst, tokens arrive at the configured rate"""
+    bucket = TokenBucket(rate_per_minute=600, burst=2)  # 10 per second
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == 0.0
+    wait = bucket.try_acquire()
+    assert 0.05 < wait <= 0.1
+    assert bucket.acquire(timeout=1.0)
+
+
+def test_retryable_errors_are_retried():
+    """429 is retried until success; 400 fails immediately"""
+    print("🔁 Testing retries...")
+    governor = fast_governor(max_retries=3)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ProviderError(429)
+        return "answer"
+
+    assert governor.call(flaky) == "answer"
+    assert len(attempts) == 3
+
+    bad_request = []
+
+    def invalid():
+        bad_request.append(1)
+        raise ProviderError(400)
+
+    try:
+        governor.call(invalid)
+        assert False, "400 must not be retried"
+    except ProviderError:
+        pass
+    assert len(bad_request) == 1
+    assert is_retryable(ProviderError(503)) and not is_retryable(ValueError("x"))
+    print("✅ 429 retried, 400 not")
+
+
+def test_backoff_is_jittered_and_capped():
+    """Full jitter stays within [0, min(max, base * 2^attempt)]"""
+    governor = LLMGovernor(base_delay_s=1.0, max_delay_s=5.0)
+    delays = [governor.backoff(10) for _ in range(50)]
+    assert all(0 <= delay <= 5.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_breaker_opens_and_recovers():
+    """Consecutive failures open the breaker; a successful probe closes it"""
+    print("🔌 Testing circuit breaker...")
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout_s=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()          # half-open probe
+    assert not breaker.allow()      # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    print("✅ Breaker opened and closed")
+
+
+def test_open_breaker_fails_fast():
+    """While open, calls are rejected without reaching the provider"""
+    governor = fast_governor(failure_threshold=1, max_retries=0, recovery_timeout_s=60)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ProviderError(503)
+
+    for _ in range(3):
+        try:
+            governor.call(failing)
+        except (ProviderError, CircuitOpenError):
+            pass
+    assert len(calls) == 1
+
+
+def half_open_governor(**kwargs):
+    """Governor whose breaker was opened by one 429 and is ready to probe."""
+    governor = fast_governor(failure_threshold=1, max_retries=0, recovery_timeout_s=0.01, **kwargs)
+    try:
+        governor.call(lambda: (_ for _ in ()).throw(ProviderError(429)))
+    except ProviderError:
+        pass
+    assert governor.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.02)
+    return governor
+
+
+def assert_probe_released(governor):
+    assert governor.call(lambda: "ok") == "ok", "the next call should be let through as the probe"
+    assert governor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_released_on_non_retryable_error():
+    """A 400 probe is not a provider failure and does not leave the breaker half-open"""
+    print("🧪 Testing half-open probe release...")
+    governor = half_open_governor()
+    try:
+        governor.call(lambda: (_ for _ in ()).throw(ProviderError(400)))
+    except ProviderError:
+        pass
+    assert governor.breaker.state == CircuitBreaker.HALF_OPEN
+    assert_probe_released(governor)
+    print("✅ Probe released after a 400")
+
+
+def test_probe_released_on_governor_timeout():
+    """A probe that cannot get an in-flight slot releases the probe"""
+    governor = half_open_governor(max_in_flight=1, acquire_timeout_s=0.01)
+    governor._slots.acquire()
+    try:
+        governor.call(lambda: "never")
+        raise AssertionError("expected GovernorTimeout")
+    except GovernorTimeout:
+        pass
+    governor._slots.release()
+    assert_probe_released(governor)
+
+
+def test_probe_released_on_deadline_miss():
+    """A probe that misses the request deadline does not hold the breaker half-open"""
+    governor = half_open_governor()
+
+    def slow():
+        time.sleep(0.05)
+        raise ProviderError(503)
+
+    try:
+        governor.call(slow, deadline=time.time() + 0.01)
+        raise AssertionError("expected GovernorTimeout")
+    except GovernorTimeout:
+        pass
+    assert_probe_released(governor)
+
+
+def test_probe_released_on_stream_disconnect():
+    """A streaming probe whose consumer goes away releases the probe"""
+    governor = half_open_governor()
+
+    async def tokens():
+        for token in ["a", "b", "c"]:
+            yield token
+
+    async def main():
+        stream = governor.stream(tokens)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()  # Client disconnected (GeneratorExit inside the governor)
+
+    asyncio.run(main())
+    assert_probe_released(governor)
+
+
+def test_llm_returns_none_when_degraded():
+    """PharmaLiteLLMChat answers None while the provider is degraded"""
+    print("🩹 Testing retrieval-only fallback...")
+    import litellm
+    from pharma_llm import PharmaLiteLLMChat
+
+    def overloaded(messages, **kwargs):
+        raise ProviderError(529)
+
+    original = litellm.completion
+    litellm.completion = overloaded
+    try:
+        llm = PharmaLiteLLMChat(model="openrouter/test", governor=fast_governor(failure_threshold=2, max_retries=1))
+        assert llm.__wrapped__([{"role": "user", "content": "q"}]) is None
+        assert llm.governor.breaker.state == CircuitBreaker.OPEN
+        assert llm.__wrapped__([{"role": "user", "content": "q2"}]) is None
+    finally:
+        litellm.completion = original
+
+    answer = retrieval_only_answer([{"text": "Nimesulide banned " * 50, "metadata": {"path": "data/gsr.pdf"}}])
+    assert "gsr.pdf" in answer and "temporarily degraded" in answer
+    print("✅ Degraded answer built from retrieved documents")
+
+
+def test_stream_retries_before_first_token_only():
+    """A stream failing before its first token is retried"""
+    governor = fast_governor(max_retries=2)
+    attempts = []
+
+    async def tokens():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ProviderError(429)
+        for token in ["a", "b"]:
+            yield token
+
+    async def main():
+        return [token async for token in governor.stream(tokens)]
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert len(attempts) == 2
+
+
+def test_mid_stream_errors_and_the_breaker():
+    """Only retryable errors after the first token count against the breaker"""
+    governor = fast_governor(failure_threshold=1)
+
+    def failing(error):
+        async def tokens():
+            yield "a"
+            raise error
+        return tokens
+
+    async def consume(error):
+        try:
+            async for _ in governor.stream(failing(error)):
+                pass
+            raise AssertionError("expected the stream to fail")
+        except type(error):
+            pass
+
+    asyncio.run(consume(ValueError("unparseable chunk")))
+    asyncio.run(consume(ProviderError(400)))
+    assert governor.breaker.state == CircuitBreaker.CLOSED
+    asyncio.run(consume(ProviderError(502)))
+    assert governor.breaker.state == CircuitBreaker.OPEN
+
+
+if __name__ == "__main__":
+    print("🧬 LLM Governor Tests")
+    print("=" * 50)
+    test_max_in_flight()
+    test_cancelled_stream_returns_its_slot()
+    test_token_bucket_rate()
+    test_retryable_errors_are_retried()
+    test_backoff_is_jittered_and_capped()
+    test_breaker_opens_and_recovers()
+    test_open_breaker_fails_fast()
+    test_probe_released_on_non_retryable_error()
+    test_probe_released_on_governor_timeout()
+    test_probe_released_on_deadline_miss()
+    test_probe_released_on_stream_disconnect()
+    test_llm_returns_none_when_degraded()
+    test_stream_retries_before_first_token_only()
+    test_mid_stream_errors_and_the_breaker()
+    print("\n✅ All LLM governor tests passed")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Mock OpenRouter and Load-Test Harness Test Suite
+
+PURPOSE:
+Validates the local OpenAI-compatible provider stub and the load generator's
+reporting so load tests can run without API keys or network access.
+
+WHAT IT TESTS:
+1. MockOpenRouterServer:
+   - Non-streaming completion shape and usage accounting
+   - Streaming chunks terminated by [DONE]
+   - Error injection with Retry-After, and runtime reconfiguration
+   - LiteLLM talks to the stub through an OpenRouter model name
+
+2. Latency sampling:
+   - Fixed, uniform and lognormal distributions
+
+3. load_test.py:
+   - Endpoint mix parsing, per-endpoint summary and stage breakdown deltas
+
+WHEN TO RUN:
+- After changing mock_openrouter.py or load_test.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp and litellm (no API key, no running server)
+"""
+
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from load_test import RequestResult, parse_mix, stage_breakdown, summarize
+from mock_openrouter import MockConfig, MockOpenRouterServer, sample_latency_ms
+
+MESSAGES = [{"role": "user", "content": "Is nimesulide banned in India?"}]
+
+
+def fast_server(**overrides):
+    settings = {"latency_dist": "fixed", "latency_ms": 1.0, "tokens_per_sec": 0, "output_tokens": 12, "seed": 7}
+    settings.update(overrides)
+    return MockOpenRouterServer(MockConfig(**settings))
+
+
+async def post(server, payload, path="/api/v1/chat/completions"):
+    async with TestClient(TestServer(server.create_app())) as client:
+        response = await client.post(path, json=payload)
+        return response.status, dict(response.headers), await response.text()
+
+
+def test_completion_shape():
+    """Non-streaming responses follow the OpenAI chat completion schema"""
+    print("🧪 Testing completion response...")
+    status, _, body = asyncio.run(post(fast_server(), {"model": "anthropic/claude-sonnet-4", "messages": MESSAGES}))
+    data = json.loads(body)
+
+    assert status == 200 and data["object"] == "chat.completion"
+    assert data["choices"][0]["message"]["content"].startswith("**Regulatory Status:**")
+    assert data["usage"]["completion_tokens"] == 12
+    assert data["usage"]["total_tokens"] == data["usage"]["prompt_tokens"] + 12
+    print("   ✅ Completion shape ok")
+
+
+def test_streaming_chunks():
+    """Streaming sends one chunk per token, a final usage chunk and [DONE]"""
+    payload = {"model": "m", "messages": MESSAGES, "stream": True, "max_tokens": 5}
+    status, headers, body = asyncio.run(post(fast_server(), payload, path="/v1/chat/completions"))
+    events = [line[6:] for line in body.splitlines() if line.startswith("data: ")]
+
+    assert status == 200 and headers["Content-Type"].startswith("text/event-stream")
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert len(chunks) == 6  # 5 tokens (capped by max_tokens) + finish chunk
+    assert chunks[0]["choices"][0]["delta"]["role"] == "assistant"
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop" and chunks[-1]["usage"]["completion_tokens"] == 5
+
+
+def test_error_injection_and_reconfiguration():
+    """Injected 429s carry Retry-After; POST /mock/config switches them off"""
+    print("⚠️ Testing error injection...")
+    server = fast_server(error_rate=1.0, error_statuses=[429], retry_after_s=2)
+
+    async def scenario():
+        async with TestClient(TestServer(server.create_app())) as client:
+            first = await client.post("/chat/completions", json={"messages": MESSAGES})
+            bad = await client.post("/mock/config", json={"latency_dist": "gamma"})
+            update = await client.post("/mock/config", json={"error_rate": 0.0})
+            second = await client.post("/chat/completions", json={"messages": MESSAGES})
+            stats = await (await client.get("/mock/stats")).json()
+            return first, bad.status, update.status, second.status, stats
+
+    first, bad_status, update_status, second_status, stats = asyncio.run(scenario())
+    assert first.status == 429 and first.headers["Retry-After"] == "2"
+    assert bad_status == 400 and update_status == 200 and second_status == 200
+    outcomes = stats["mock_requests_total"]["values"]
+    assert outcomes == {"outcome=error_429": 1.0, "outcome=success": 1.0}
+    print("   ✅ Error injection ok")
+
+
+def test_litellm_against_mock():
+    """LiteLLM's OpenRouter provider works unchanged against the stub"""
+    import litellm
+
+    server = fast_server()
+
+    async def scenario():
+        async with TestServer(server.create_app()) as test_server:
+            return await litellm.acompletion(
+                model="openrouter/anthropic/claude-sonnet-4",
+                messages=MESSAGES,
+                api_base=str(test_server.make_url("/api/v1")),
+                api_key="mock",
+            )
+
+    response = asyncio.run(scenario())
+    assert "CDSCO notifications" in response.choices[0].message.content
+
+
+def test_latency_distributions():
+    """Sampled TTFTs follow the configured distribution"""
+    rng = random.Random(1)
+    assert sample_latency_ms(MockConfig(latency_dist="fixed", latency_ms=250), rng) == 250
+
+    uniform = [sample_latency_ms(MockConfig(latency_dist="uniform", latency_ms=100, latency_spread=0.2), rng)
+               for _ in range(500)]
+    assert 80 <= min(uniform) and max(uniform) <= 120
+
+    lognormal = [sample_latency_ms(MockConfig(latency_ms=800, latency_spread=0.5), rng) for _ in range(4000)]
+    assert 720 < statistics.median(lognormal) < 880
+    assert max(lognormal) > 2 * 800  # long tail
+
+
+def test_load_test_reporting():
+    """Mix parsing, per-endpoint percentiles and metrics snapshot deltas"""
+    print("📊 Testing load-test report...")
+    assert parse_mix("retrieve=3,answer=1") == {"retrieve": 0.75, "answer": 0.25}
+
+    results = [RequestResult("answer", True, 200, float(ms)) for ms in range(1, 101)]
+    results.append(RequestResult("answer", False, 0, 5.0, "timeout"))
+    summary = summarize(results, elapsed_s=10.0)
+    answer = summary["answer"]
+    assert answer["requests"] == 101 and answer["ok"] == 100 and answer["errors"] == {"timeout": 1}
+    assert answer["throughput_rps"] == 10.0
+    assert (answer["p50_ms"], answer["p95_ms"], answer["p99_ms"]) == (50.0, 95.0, 99.0)
+
+    series = lambda count, total: {"count": count, "sum": total, "p50": 1, "p95": 2, "p99": 3}  # noqa: E731
+    before = {"llm_call_ms": {"type": "histogram", "values": {"outcome=success": series(2, 100.0)}}}
+    after = {
+        "llm_call_ms": {"type": "histogram", "values": {"outcome=success": series(6, 500.0)}},
+        "rerank_ms": {"type": "histogram", "values": {"outcome=reranked": series(0, 0.0)}},
+        "llm_calls_total": {"type": "counter", "values": {"outcome=success": 6}},
+    }
+    stages = stage_breakdown(before, after)
+    assert stages == {"llm_call_ms{outcome=success}": {"count": 4, "mean": 100.0, "p50": 1, "p95": 2, "p99": 3}}
+    print("   ✅ Load-test report ok")
+
+
+if __name__ == "__main__":
+    print("🧬 Mock OpenRouter Tests")
+    print("=" * 50)
+    test_completion_shape()
+    test_streaming_chunks()
+    test_error_injection_and_reconfiguration()
+    test_litellm_against_mock()
+    test_latency_distributions()
+    test_load_test_reporting()
+    print("\n✅ All mock OpenRouter tests passed")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+ONNX Embedder Pooling and Benchmark Helpers Test Suite
+
+PURPOSE:
+Validates the pieces of the quantized ONNX embedder that must match the
+sentence-transformers pipeline exactly, and the recall math used by
+benchmark_embedders.py, without exporting a model.
+
+WHAT IT TESTS:
+1. Mean pooling ignores padding tokens
+2. Output vectors are L2-normalized float32
+3. recall@k computation of the benchmark
+
+WHEN TO RUN:
+- After changing onnx_embedder.py or benchmark_embedders.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- numpy and Pathway installed (no model download)
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from onnx_embedder import mean_pool_normalize
+from benchmark_embedders import recall_at_k, top_k
+
+
+def test_mean_pooling_ignores_padding():
+    """Padded positions must not shift the pooled vector"""
+    print("🧮 Testing mean pooling...")
+    tokens = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    pooled = mean_pool_normalize(tokens, mask)
+
+    assert pooled.dtype == np.float32
+    assert np.allclose(pooled, [[1.0, 0.0]])
+    print("✅ Padding ignored")
+
+
+def test_vectors_are_unit_length():
+    """Output matches the Normalize module of all-MiniLM-L6-v2"""
+    rng = np.random.default_rng(0)
+    pooled = mean_pool_normalize(rng.normal(size=(4, 5, 8)), np.ones((4, 5)))
+    assert np.allclose(np.linalg.norm(pooled, axis=1), 1.0, atol=1e-5)
+
+
+def test_recall_at_k():
+    """Identical backends give recall 1.0, disjoint neighbours give 0.0"""
+    print("📊 Testing recall@k...")
+    corpus = np.eye(4, dtype=np.float32)
+    queries = np.array([[1.0, 0.1, 0.0, 0.0]], dtype=np.float32)
+    reference = top_k(corpus, queries, 2)
+
+    assert recall_at_k(reference, reference) == 1.0
+    assert recall_at_k(np.array([[0, 1]]), np.array([[2, 3]])) == 0.0
+    assert recall_at_k(np.array([[0, 1]]), np.array([[1, 3]])) == 0.5
+    print("✅ Recall computed correctly")
+
+
+if __name__ == "__main__":
+    print("🧬 ONNX Embedder Tests")
+    print("=" * 50)
+    test_mean_pooling_ignores_padding()
+    test_vectors_are_unit_length()
+    test_recall_at_k()
+    print("\n✅ All ONNX embedder tests passed")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Prompt Caching Test Suite
+
+PURPOSE:
+Validates that the static part of the RAG prompt template is sent as a
+separately cacheable system message and that cached versus uncached prompt
+tokens are accounted per request.
+
+WHAT IT TESTS:
+1. Prompt split:
+   - The enhanced YAML template splits before its {context} line
+   - Templates without a static prefix are left unchanged
+   - cache_control markers only for Anthropic/Gemini models
+
+2. Token accounting:
+   - PharmaLiteLLMChat counts prompt_cached, prompt_uncached and cache writes
+   - The mock provider reports a repeated cacheable prefix as cached, and
+     LiteLLM passes the cached tokens through
+
+WHEN TO RUN:
+- After changing prompt_caching.py, pharma_llm.py, mock_openrouter.py or $prompt_template
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway with the LLM xpack installed (no API key, no running server)
+"""
+
+import asyncio
+import os
+import re
+import sys
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from metrics import REGISTRY
+from prompt_caching import chat_messages, prompt_cache_tokens, split_prompt_template, supports_cache_control
+
+
+def enhanced_prompt_template() -> str:
+    """The $prompt_template block of app_openrouter_enhanced.yaml."""
+    with open(os.path.join(ROOT, "app_openrouter_enhanced.yaml"), "r", encoding="utf-8") as f:
+        yaml_text = f.read()
+    block = re.search(r"^\$prompt_template: \|\n((?:  .*\n|\s*\n)+)", yaml_text, re.MULTILINE).group(1)
+    return "\n".join(line[2:] for line in block.splitlines())
+
+
+def test_template_split():
+    """Fixed instructions become the system prompt, the placeholder tail the user prompt"""
+    print("✂️ Testing prompt template split...")
+    system, user = split_prompt_template(enhanced_prompt_template())
+    assert system.startswith("<OBJECTIVE_AND_PERSONA>") and "{context}" not in system
+    assert user.startswith("Based on the provided regulatory documents and files: {context}")
+    assert user.endswith("Analysis:") and "{query}" in user
+    assert len(system) > 20 * len(user)
+    print(f"   ✅ {len(system)} static characters, {len(user)} per query")
+
+    assert split_prompt_template("Context: {context}\nQuery: {query}") == (None, "Context: {context}\nQuery: {query}")
+    assert split_prompt_template("Rules.\n\nQ: {query} C: {context}") == ("Rules.", "Q: {query} C: {context}")
+
+
+def test_cache_control_markers():
+    """Only models with explicit prompt caching get cache_control blocks"""
+    assert supports_cache_control("openrouter/anthropic/claude-sonnet-4")
+    assert supports_cache_control("google/gemini-2.5-flash")
+    assert not supports_cache_control("openai/gpt-4o") and not supports_cache_control(None)
+
+    cached = chat_messages("Rules.", "Query: q", "anthropic/claude-3.5-haiku")
+    assert cached[0] == {
+        "role": "system",
+        "content": [{"type": "text", "text": "Rules.", "cache_control": {"type": "ephemeral"}}],
+    }
+    assert cached[1] == {"role": "user", "content": "Query: q"}
+    assert chat_messages("Rules.", "Query: q", "openai/gpt-4o")[0] == {"role": "system", "content": "Rules."}
+    assert chat_messages(None, "Query: q", "anthropic/claude-sonnet-4") == [{"role": "user", "content": "Query: q"}]
+
+
+def test_cached_token_accounting():
+    """Cache reads and writes are split out of the prompt tokens"""
+    print("🧾 Testing cached token accounting...")
+    import litellm
+    from pharma_llm import PharmaLiteLLMChat
+
+    assert prompt_cache_tokens(SimpleNamespace(prompt_tokens_details=SimpleNamespace(cached_tokens=900))) == (900, 0)
+    assert prompt_cache_tokens(SimpleNamespace(cache_read_input_tokens=0, cache_creation_input_tokens=800)) == (0, 800)
+    assert prompt_cache_tokens({"prompt_tokens": 5}) == (0, 0)
+
+    usages = [
+        SimpleNamespace(prompt_tokens=1000, completion_tokens=20,
+                        prompt_tokens_details={"cached_tokens": 0, "cache_write_tokens": 900}),
+        SimpleNamespace(prompt_tokens=1000, completion_tokens=20, prompt_tokens_details={"cached_tokens": 900}),
+    ]
+
+    def fake_completion(messages, **kwargs):
+        return SimpleNamespace(choices=[{"message": {"content": "banned"}}], usage=usages.pop(0))
+
+    tokens = REGISTRY.counter("llm_tokens_total")
+    before = {kind: tokens.value(tier="cachetest", kind=kind)
+              for kind in ("prompt", "prompt_cached", "prompt_uncached", "prompt_cache_write")}
+    original = litellm.completion
+    litellm.completion = fake_completion
+    try:
+        llm = PharmaLiteLLMChat(model="openrouter/anthropic/claude-sonnet-4", coalesce=False)
+        messages = chat_messages("Rules.", "Query: q", llm.model)
+        assert llm.__wrapped__(messages, tier="cachetest") == "banned"
+        assert llm.__wrapped__(messages, tier="cachetest") == "banned"
+    finally:
+        litellm.completion = original
+
+    delta = {kind: tokens.value(tier="cachetest", kind=kind) - value for kind, value in before.items()}
+    assert delta == {"prompt": 2000, "prompt_cached": 900, "prompt_uncached": 1100, "prompt_cache_write": 900}
+    assert REGISTRY.get("llm_prompt_cached_ratio").count(tier="cachetest") == 2
+    print("   ✅ 900 of 2000 prompt tokens cached")
+
+
+def test_mock_provider_reports_cached_prefix():
+    """The mock provider caches cache_control prefixes and LiteLLM exposes the cached tokens"""
+    import litellm
+    from aiohttp.test_utils import TestServer
+
+    from mock_openrouter import MockConfig, MockOpenRouterServer
+
+    server = MockOpenRouterServer(MockConfig(latency_dist="fixed", latency_ms=0, tokens_per_sec=0, output_tokens=5))
+    messages = chat_messages("Rules. " * 200, "Query: is nimesulide banned?", "anthropic/claude-sonnet-4")
+
+    async def scenario():
+        async with TestServer(server.create_app()) as test_server:
+            responses = []
+            for _ in range(2):
+                responses.append(await litellm.acompletion(
+                    model="openrouter/anthropic/claude-sonnet-4",
+                    messages=messages,
+                    api_base=str(test_server.make_url("/api/v1")),
+                    api_key="mock",
+                ))
+            return responses
+
+    first, second = asyncio.run(scenario())
+    assert prompt_cache_tokens(first.usage)[0] == 0
+    cached, _ = prompt_cache_tokens(second.usage)
+    assert cached == 350 and second.usage.prompt_tokens > cached
+
+
+if __name__ == "__main__":
+    print("🧬 Prompt Caching Tests")
+    print("=" * 50)
+    test_template_split()
+    test_cache_control_markers()
+    test_cached_token_accounting()
+    test_mock_provider_reports_cached_prefix()
+    print("\n✅ All prompt caching tests passed")
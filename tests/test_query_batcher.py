@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Query Embedding Batcher and Metrics Test Suite
+
+PURPOSE:
+Validates that concurrent query embeddings are coalesced into batched forward
+passes and that batch sizes are recorded in the metrics registry, using a fake
+embedding function instead of a sentence-transformers model.
+
+WHAT IT TESTS:
+1. Batching:
+   - Concurrent submissions share one forward pass
+   - max_batch_size caps the forward pass size
+   - Duplicate texts are embedded once
+   - Embedding errors reach every waiting caller
+
+2. Metrics:
+   - Batch-size histogram counts and percentiles
+   - JSON snapshot and Prometheus rendering
+
+WHEN TO RUN:
+- After changing query_batcher.py or metrics.py
+- After tuning query_max_batch_size / query_max_wait_ms in the YAML
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- numpy and Pathway installed (no model download, no running server)
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry
+from query_batcher import QueryEmbeddingBatcher
+
+
+class FakeEmbedder:
+    """Records every forward pass; vector is [len(text)]."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [np.array([float(len(text))]) for text in texts]
+
+
+def test_concurrent_queries_share_forward_pass():
+    """Queries submitted within the wait window run as one batch"""
+    print("📦 Testing micro-batching...")
+    fake = FakeEmbedder()
+    batcher = QueryEmbeddingBatcher(fake, max_batch_size=16, max_wait_ms=200, registry=MetricsRegistry())
+
+    futures = [batcher.submit("q" * i) for i in range(1, 6)]
+    vectors = [future.result(timeout=5) for future in futures]
+    batcher.close()
+
+    assert [float(v[0]) for v in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert len(fake.calls) == 1 and len(fake.calls[0]) == 5
+    print("✅ 5 queries embedded in 1 forward pass")
+
+
+def test_max_batch_size_caps_batches():
+    """No forward pass exceeds max_batch_size"""
+    fake = FakeEmbedder()
+    batcher = QueryEmbeddingBatcher(fake, max_batch_size=4, max_wait_ms=200, registry=MetricsRegistry())
+
+    vectors = batcher.embed([f"query {i}" for i in range(10)])
+    batcher.close()
+
+    assert len(vectors) == 10
+    assert max(len(call) for call in fake.calls) <= 4
+    assert sum(len(call) for call in fake.calls) == 10
+
+
+def test_duplicate_texts_embedded_once():
+    """Identical concurrent queries share one embedding"""
+    fake = FakeEmbedder()
+    batcher = QueryEmbeddingBatcher(fake, max_batch_size=8, max_wait_ms=200, registry=MetricsRegistry())
+
+    vectors = batcher.embed(["nimesulide", "nimesulide", "paracetamol"])
+    batcher.close()
+
+    assert fake.calls == [["nimesulide", "paracetamol"]]
+    assert float(vectors[0][0]) == float(vectors[1][0]) == 10.0
+
+
+def test_errors_reach_all_callers():
+    """A failing forward pass fails every future of the batch"""
+
+    def failing(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = QueryEmbeddingBatcher(failing, max_batch_size=8, max_wait_ms=50, registry=MetricsRegistry())
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    for future in futures:
+        assert isinstance(future.exception(timeout=5), RuntimeError)
+    batcher.close()
+
+
+def test_threads_are_coalesced_and_histogram_recorded():
+    """Queries from several threads are batched and batch sizes recorded"""
+    print("📊 Testing batch-size histogram...")
+    registry = MetricsRegistry()
+    fake = FakeEmbedder()
+    batcher = QueryEmbeddingBatcher(fake, max_batch_size=32, max_wait_ms=100, registry=registry)
+
+    start = threading.Barrier(8)
+    results = {}
+
+    def worker(i):
+        start.wait()
+        results[i] = batcher.embed([f"query from thread {i}"])[0]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert len(results) == 8
+    assert len(fake.calls) < 8
+
+    histogram = registry.get("embedding_batch_size")
+    assert histogram.count(batcher="query_embedding") == len(fake.calls)
+    assert histogram.percentile(100, batcher="query_embedding") == max(len(call) for call in fake.calls)
+
+    snapshot = registry.snapshot()
+    assert snapshot["embedding_batch_requests_total"]["values"]["batcher=query_embedding"] == 8
+    assert "embedding_batch_size_bucket" in registry.render_prometheus()
+    print(f"✅ 8 threads served by {len(fake.calls)} forward pass(es)")
+
+
+if __name__ == "__main__":
+    print("🧬 Query Embedding Batcher Tests")
+    print("=" * 50)
+    test_concurrent_queries_share_forward_pass()
+    test_max_batch_size_caps_batches()
+    test_duplicate_texts_embedded_once()
+    test_errors_reach_all_callers()
+    test_threads_are_coalesced_and_histogram_recorded()
+    print("\n✅ All query batcher tests passed")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Query-Embedding LRU Cache Test Suite
+
+PURPOSE:
+Validates the bounded query-embedding cache placed in front of the embedder's
+query path, and its integration with the batched embedder, using fake vectors.
+
+WHAT IT TESTS:
+1. Cache Behaviour:
+   - Case and whitespace variants of a query share one entry
+   - Least recently used entries are evicted at capacity
+   - Vectors live in one contiguous float32 array
+
+2. Embedder Integration:
+   - Repeated queries skip the forward pass
+   - Long texts (document chunks) are never cached or micro-batched, even in small calls
+   - Hit rate is exported as a metric
+
+WHEN TO RUN:
+- After changing query_cache.py or query_batcher.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- numpy and Pathway installed (no model download, no running server)
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import REGISTRY, MetricsRegistry
+from query_batcher import BatchedSentenceTransformerEmbedder, QueryEmbeddingBatcher
+from query_cache import QueryEmbeddingCache, normalize_query
+
+
+def make_embedder(calls, cache_size=100):
+    """BatchedSentenceTransformerEmbedder without loading a model."""
+
+    def encode(texts):
+        calls.append(list(texts))
+        return [np.full(4, float(len(text)), dtype=np.float32) for text in texts]
+
+    embedder = BatchedSentenceTransformerEmbedder.__new__(BatchedSentenceTransformerEmbedder)
+    embedder.model, embedder.kwargs, embedder.lanes = SimpleNamespace(encode=lambda texts: encode(texts)), {}, None
+    embedder.query_max_batch_size = 32
+    embedder.query_cache_max_chars = 50
+    embedder.batcher = QueryEmbeddingBatcher(encode, max_wait_ms=0, registry=MetricsRegistry())
+    embedder.cache = QueryEmbeddingCache(cache_size, name="test_embedder")
+    return embedder
+
+
+def test_normalized_variants_share_entry():
+    """'Nimesulide  banned?' and 'nimesulide banned?' hit the same entry"""
+    print("🔤 Testing query normalization...")
+    cache = QueryEmbeddingCache(10, registry=MetricsRegistry())
+    cache.put("Nimesulide  banned?", np.ones(4))
+
+    assert normalize_query("  Nimesulide\tBANNED? ") == "nimesulide banned?"
+    assert np.allclose(cache.get("nimesulide banned?"), 1.0)
+    assert len(cache) == 1
+    print("✅ Variants normalized")
+
+
+def test_lru_eviction_and_contiguous_storage():
+    """Oldest unused entry is evicted; storage is one float32 matrix"""
+    print("♻️ Testing LRU eviction...")
+    cache = QueryEmbeddingCache(2, registry=MetricsRegistry())
+    cache.put("a", np.full(3, 1.0))
+    cache.put("b", np.full(3, 2.0))
+    cache.get("a")
+    cache.put("c", np.full(3, 3.0))
+
+    assert cache.get("b") is None
+    assert float(cache.get("a")[0]) == 1.0
+    assert float(cache.get("c")[0]) == 3.0
+    assert cache._vectors.shape == (2, 3) and cache._vectors.dtype == np.float32
+    assert cache._vectors.flags["C_CONTIGUOUS"]
+    print("✅ LRU bounded at capacity")
+
+
+def test_returned_vectors_are_copies():
+    """Callers cannot corrupt cached vectors"""
+    cache = QueryEmbeddingCache(2, registry=MetricsRegistry())
+    cache.put("a", np.zeros(2))
+    cache.get("a")[:] = 9.0
+    assert np.allclose(cache.get("a"), 0.0)
+
+
+def test_repeated_queries_skip_forward_pass():
+    """Second identical query is served from the cache"""
+    print("💾 Testing embedder integration...")
+    calls = []
+    embedder = make_embedder(calls)
+
+    first = embedder.__wrapped__(["Is nimesulide banned?"])
+    second = embedder.__wrapped__(["is nimesulide  banned?", "paracetamol"])
+
+    assert calls == [["Is nimesulide banned?"], ["paracetamol"]]
+    assert np.allclose(first[0], second[0])
+    assert embedder.cache.hit_rate == 1 / 3
+    assert REGISTRY.get("embedding_cache_hit_rate").value(cache="test_embedder") == 1 / 3
+    print("✅ Cache hit skipped MiniLM")
+
+
+def test_long_texts_not_cached():
+    """Chunk-sized texts bypass the cache and the query batcher, even in small calls"""
+    calls = []
+    embedder = make_embedder(calls)
+    chunk = "drug " * 40
+    batches = embedder.batcher._batch_size.count(batcher=embedder.batcher.name)
+    embedder.__wrapped__([chunk])
+    embedder.__wrapped__([chunk, "short chunk"])
+
+    assert len(calls) == 2
+    assert len(embedder.cache) == 0
+    assert embedder.batcher._batch_size.count(batcher=embedder.batcher.name) == batches
+
+
+if __name__ == "__main__":
+    print("🧬 Query-Embedding Cache Tests")
+    print("=" * 50)
+    test_normalized_variants_share_entry()
+    test_lru_eviction_and_contiguous_storage()
+    test_returned_vectors_are_copies()
+    test_repeated_queries_skip_forward_pass()
+    test_long_texts_not_cached()
+    print("\n✅ All query cache tests passed")
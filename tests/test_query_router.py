@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Query Router Test Suite
+
+PURPOSE:
+Validates the assignment of queries to model tiers (no LLM, fast model,
+full analysis model) and the per-tier metrics used to tune the routing.
+
+WHAT IT TESTS:
+1. Rules:
+   - Greetings and document lookups need no LLM
+   - Single-drug status lookups go to the fast tier
+   - Long, comparative or analytical questions go to the full tier
+   - Registry names: one drug is a lookup, several drugs need analysis
+
+2. Routes:
+   - Tier model and max_tokens, explicit request models are kept
+   - none-tier answers are built from the sources
+
+3. Metrics:
+   - Routed requests per tier and rule
+   - PharmaLiteLLMChat token usage per tier
+
+WHEN TO RUN:
+- After changing query_router.py, the routing rules or pharma_llm.py
+
+EXPECTED OUTCOME:
+- All assertions pass; classification well under a millisecond
+
+DEPENDENCIES:
+- Pathway with the LLM xpack installed (no API key, no running server)
+"""
+
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import REGISTRY
+from query_router import GREETING_ANSWER, QueryRouter
+
+
+def test_rule_tiers():
+    """Queries are assigned the expected tier"""
+    print("🧭 Testing routing rules...")
+    router = QueryRouter()
+    expected = {
+        "hello!": ("none", "greeting"),
+        "Show the gazette notifications on nimesulide": ("none", "document_lookup"),
+        "Is nimesulide banned in India?": ("fast", "status_lookup"),
+        "Schedule H1 status of alprazolam": ("fast", "status_lookup"),
+        "Compare the 2018 and 2024 FDC ban lists": ("full", "complex"),
+        "Explain why nimesulide is banned for children": ("full", "complex"),
+        "What does the notification say about the manufacturer obligations for existing stock in detail": (
+            "full", "long_query"),
+        "pharmacovigilance guidance": ("full", "default"),
+    }
+    for query, tier in expected.items():
+        assert router.classify(query) == tier, (query, router.classify(query))
+
+    assert QueryRouter(enable_none_tier=False).classify("hello")[0] != "none"
+    print("   ✅ Rules ok")
+
+
+def test_registry_rules():
+    """Registry names distinguish single-drug lookups from multi-drug analysis"""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("# CDSCO registry\nNimesulide\nNimesulide + Paracetamol\nChloramphenicol\n")
+    try:
+        router = QueryRouter(registry_path=f.name)
+    finally:
+        os.unlink(f.name)
+
+    assert router.registry_matches("Is nimesulide + paracetamol banned?") == ["nimesulide + paracetamol"]
+    assert router.classify("Is nimesulide + paracetamol banned?") == ("fast", "registry_lookup")
+    assert router.classify("chloramphenicol") == ("fast", "registry_lookup")
+    assert router.classify("nimesulide or chloramphenicol banned?") == ("full", "multiple_drugs")
+    assert router.classify("Is aspirin banned?") == ("full", "default")  # Unknown drug: full analysis
+
+
+def test_routes_and_local_answers():
+    """Routes carry the tier model and budget; none-tier answers list sources"""
+    router = QueryRouter(fast_model="haiku", fast_max_tokens=300)
+    fast = router.route("Is nimesulide banned?", "sonnet", "sonnet", 1000)
+    assert (fast["tier"], fast["model"], fast["max_tokens"]) == ("fast", "haiku", 300)
+
+    full = router.route("Explain the FDC ban history", None, "sonnet", 1000)
+    assert (full["tier"], full["model"], full["max_tokens"]) == ("full", "sonnet", 1000)
+
+    explicit = router.route("Is nimesulide banned?", "gpt-4o", "sonnet", 1000)
+    assert (explicit["tier"], explicit["rule"], explicit["model"]) == ("full", "explicit_model", "gpt-4o")
+
+    docs = [{"text": "Nimesulide banned for children", "metadata": {"path": "data/gsr_1182.pdf"}}]
+    lookup = router.route("find the notification on nimesulide", None, "sonnet")
+    assert "gsr_1182.pdf" in router.local_answer(lookup, docs)
+    assert router.local_answer(router.route("thanks", None, "sonnet"), docs) == GREETING_ANSWER
+
+    router.observe(fast)
+    counts = REGISTRY.get("router_requests_total")
+    assert counts.value(tier="fast", rule="status_lookup") >= 1
+    assert REGISTRY.get("router_tier_latency_ms").count(tier="fast") >= 1
+
+
+def test_classification_is_fast():
+    """Classification costs well under a millisecond"""
+    router = QueryRouter()
+    queries = ["Is nimesulide banned in India?", "Compare 2018 and 2024 bans", "hello"] * 1000
+    started = time.perf_counter()
+    for query in queries:
+        router.classify(query)
+    per_query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    print(f"   ⏱️ {per_query_ms * 1000:.1f}µs per query")
+    assert per_query_ms < 0.5
+
+
+def test_llm_token_metrics_per_tier():
+    """Provider token usage is counted per tier"""
+    print("🔢 Testing token metrics...")
+    import litellm
+    from pharma_llm import PharmaLiteLLMChat
+
+    seen = {}
+
+    def fake_completion(messages, **kwargs):
+        seen.update(kwargs)
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+        return SimpleNamespace(choices=[{"message": {"content": "banned"}}], usage=usage)
+
+    tokens = REGISTRY.counter("llm_tokens_total")
+    before = tokens.value(tier="fast", kind="prompt")
+    original = litellm.completion
+    litellm.completion = fake_completion
+    try:
+        llm = PharmaLiteLLMChat(model="openrouter/sonnet", max_tokens=1000, coalesce=False)
+        answer = llm.__wrapped__([{"role": "user", "content": "q"}], tier="fast", model="openrouter/haiku", max_tokens=300)
+    finally:
+        litellm.completion = original
+
+    assert answer == "banned"
+    assert seen["model"] == "openrouter/haiku" and seen["max_tokens"] == 300 and "tier" not in seen
+    assert tokens.value(tier="fast", kind="prompt") - before == 120
+    assert tokens.value(tier="fast", kind="completion") >= 30
+    print("   ✅ Token usage recorded per tier")
+
+
+if __name__ == "__main__":
+    print("🧬 Query Router Tests")
+    print("=" * 50)
+    test_rule_tiers()
+    test_registry_rules()
+    test_routes_and_local_answers()
+    test_classification_is_fast()
+    test_llm_token_metrics_per_tier()
+    print("\n✅ All query router tests passed")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Replay Load Test Suite
+
+PURPOSE:
+Validates query-log parsing, paced replay with a concurrency limit and the
+run comparison of replay_load_test.py against a local stub server.
+
+WHAT IT TESTS:
+1. Query log parsing:
+   - Epoch and ISO timestamps become offsets; missing timestamps use the gap
+   - Endpoint aliases, request payloads and skipped lines
+
+2. Replay:
+   - Recorded inter-arrival times are scaled by the speed factor
+   - The concurrency limit holds and delayed requests show schedule lag
+
+3. Comparison:
+   - Cache-hit rates from counter deltas, KS distance, percentile changes
+
+WHEN TO RUN:
+- After changing replay_load_test.py, load_test.py or the frontend query log
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp (no running server)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from load_test import LoadClient, summarize
+from replay_load_test import ReplayEntry, cache_hit_rates, compare_runs, ks_statistic, load_query_log, replay
+
+
+def write_log(lines):
+    handle = tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8")
+    for line in lines:
+        handle.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+    handle.close()
+    return handle.name
+
+
+def test_load_query_log():
+    """Timestamps, aliases and payloads are parsed; unusable lines skipped"""
+    print("📜 Testing query log parsing...")
+    path = write_log([
+        {"ts": 1000.0, "endpoint": "/api/search", "prompt": "Is nimesulide banned?"},
+        {"ts": "1970-01-01T00:16:42+00:00", "endpoint": "retrieve", "query": "FDC ban", "k": 5},
+        {"prompt": "no timestamp", "endpoint": "stream", "filters": "contains(path, `2024`)"},
+        {"title": "not a query"},
+        {"ts": 1004.0, "endpoint": "upload", "prompt": "unsupported endpoint"},
+        "",
+    ])
+    try:
+        entries = load_query_log(path, default_gap_s=0.5)
+    finally:
+        os.unlink(path)
+
+    assert [(e.offset_s, e.endpoint) for e in entries] == [(0.0, "answer"), (2.0, "retrieve"), (2.5, "stream")]
+    assert entries[1].payload == {"query": "FDC ban", "k": 5}
+    assert entries[2].payload == {"prompt": "no timestamp", "filters": "contains(path, `2024`)"}
+    print("   ✅ Parsed 3 entries, skipped 2")
+
+
+def test_replay_pacing_and_concurrency_limit():
+    """Offsets are divided by speed and in-flight requests never exceed the limit"""
+    print("🔁 Testing paced replay...")
+    state = {"active": 0, "peak": 0, "arrivals": []}
+
+    async def answer(request):
+        state["arrivals"].append(time.monotonic())
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.1)
+        state["active"] -= 1
+        return web.json_response({"response": "ok"})
+
+    app = web.Application()
+    app.router.add_post("/v1/pw_ai_answer", answer)
+    entries = [ReplayEntry(0.0, "answer", "q1"), ReplayEntry(0.4, "answer", "q2")]
+    entries += [ReplayEntry(1.0, "answer", f"burst {i}") for i in range(4)]
+
+    async def scenario():
+        async with TestServer(app) as server, ClientSession() as session:
+            client = LoadClient(session, str(server.make_url("")))
+            started = time.monotonic()
+            results, lags = await replay(entries, client, speed=2.0, concurrency=2)
+            return started, results, lags
+
+    started, results, lags = asyncio.run(scenario())
+    arrivals = [t - started for t in state["arrivals"]]
+
+    assert all(result.ok for result in results) and state["peak"] == 2
+    assert 0.15 < arrivals[1] < 0.35  # 0.4s offset at 2x speed
+    assert arrivals[-1] >= 0.6  # burst at 0.5s queues behind the limit
+    assert max(lags) >= 80 and min(lags) < 50
+    print(f"   ✅ Peak concurrency {state['peak']}, max schedule lag {max(lags):.0f}ms")
+
+
+def test_cache_hit_rates():
+    """Hit/miss and follower/leader counters become per-cache hit rates"""
+    before = {"embedding_cache_requests_total": {"type": "counter", "values": {"cache=query,result=hit": 10}}}
+    after = {
+        "embedding_cache_requests_total": {"type": "counter", "values": {
+            "cache=query,result=hit": 40, "cache=query,result=miss": 10,
+        }},
+        "single_flight_requests_total": {"type": "counter", "values": {
+            "flight=llm,role=follower": 1, "flight=llm,role=leader": 3,
+        }},
+        "embedding_batches_total": {"type": "counter", "values": {"batcher=query": 7}},
+    }
+    assert cache_hit_rates(before, after) == {
+        "embedding_cache_requests_total{cache=query}": {"hits": 30, "misses": 10, "hit_rate": 0.75},
+        "single_flight_requests_total{flight=llm}": {"hits": 1, "misses": 3, "hit_rate": 0.25},
+    }
+
+
+def test_compare_runs():
+    """Percentile changes, KS distance and cache-rate pairs between two runs"""
+    print("⚖️ Testing run comparison...")
+    from load_test import RequestResult
+
+    def run(label, latencies, hit_rate):
+        results = [RequestResult("answer", True, 200, ms) for ms in latencies]
+        return {
+            "settings": {"label": label},
+            "endpoints": summarize(results, 10.0),
+            "latencies_ms": {"answer": latencies},
+            "cache": {"embedding_cache_requests_total{cache=query}": {"hit_rate": hit_rate}},
+        }
+
+    baseline = run("before", [100.0] * 50 + [400.0] * 50, 0.5)
+    candidate = run("after", [50.0] * 50 + [200.0] * 50, 0.8)
+    comparison = compare_runs(baseline, candidate)
+
+    answer = comparison["endpoints"]["answer"]
+    assert answer["p95_ms"] == {"baseline": 400.0, "candidate": 200.0, "change_pct": -50.0}
+    assert answer["error_rate"] == {"baseline": 0.0, "candidate": 0.0}
+    assert answer["ks_distance"] == 0.5
+    assert answer["distribution"]["baseline"] == {"100": 0.5, "500": 0.5}
+    assert comparison["cache_hit_rate"]["embedding_cache_requests_total{cache=query}"] == {
+        "baseline": 0.5, "candidate": 0.8,
+    }
+    assert ks_statistic([1.0, 2.0], [1.0, 2.0]) == 0.0 and ks_statistic([1.0], [5.0]) == 1.0
+    print("   ✅ Comparison ok")
+
+
+if __name__ == "__main__":
+    print("🧬 Replay Load Test Tests")
+    print("=" * 50)
+    test_load_query_log()
+    test_replay_pacing_and_concurrency_limit()
+    test_cache_hit_rates()
+    test_compare_runs()
+    print("\n✅ All replay load test tests passed")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Budgeted Cross-Encoder Reranker Test Suite
+
+PURPOSE:
+Validates the rerank stage that sits between DocumentStore retrieval and the
+LLM prompt, without downloading a cross-encoder model.
+
+WHAT IT TESTS:
+1. Reranking:
+   - Candidates are rescored and returned in cross-encoder order
+   - Batched requests are grouped per query, or per request id when given
+   - Stats stay exact under concurrent calls
+
+2. Latency Budget:
+   - Zero budget skips reranking and keeps the retrieval order
+   - Predicted cost above the budget skips reranking up-front
+
+3. Score Cache:
+   - Repeated (query, chunk) pairs are served from the cache
+   - Cache stays bounded by cache_size
+
+WHEN TO RUN:
+- After changing reranker.py or the reranker settings in the YAML
+- Before deploying a new cross-encoder model
+
+EXPECTED OUTCOME:
+- All assertions pass with a deterministic fake scorer
+
+DEPENDENCIES:
+- Pathway installed (no model download, no running server)
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reranker import BudgetedCrossEncoderReranker
+
+
+class FakeReranker(BudgetedCrossEncoderReranker):
+    """Scores a pair by chunk length so results are predictable."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.predicted_pairs = 0
+
+    def _predict(self, pairs):
+        self.predicted_pairs += len(pairs)
+        return [float(len(doc)) for _, doc in pairs]
+
+
+def make_docs():
+    return [
+        {"text": "a", "metadata": {"path": "data/x.pdf"}, "dist": 0.1},
+        {"text": "ccc", "metadata": {"path": "data/x.pdf"}, "dist": 0.2},
+        {"text": "bb", "metadata": {"path": "data/y.pdf"}, "dist": 0.3},
+    ]
+
+
+def test_rerank_orders_by_cross_encoder_score():
+    """Reranked scores follow the cross-encoder, not the retrieval distance"""
+    print("🔁 Testing cross-encoder rescoring...")
+    reranker = FakeReranker(budget_ms=1000)
+    scores, reranked = reranker.rerank_request("nimesulide", make_docs())
+
+    assert reranked
+    assert scores == [1.0, 3.0, 2.0]
+    print("✅ Candidates rescored")
+
+
+def test_zero_budget_keeps_retrieval_order():
+    """A zero budget skips reranking and returns -dist scores"""
+    print("⏱️ Testing budget skip...")
+    reranker = FakeReranker(budget_ms=0)
+    scores, reranked = reranker.rerank_request("nimesulide", make_docs())
+
+    assert not reranked
+    assert scores == [-0.1, -0.2, -0.3]
+    assert reranker.predicted_pairs == 0
+    assert reranker.stats["skipped_budget"] == 1
+    print("✅ Retrieval order preserved")
+
+
+def test_predicted_cost_over_budget_skips():
+    """Learned per-pair cost is used to skip before scoring"""
+    print("⏱️ Testing predicted-cost skip...")
+    reranker = FakeReranker(budget_ms=10)
+    reranker._ms_per_pair = 50.0
+    scores, reranked = reranker.rerank_request("nimesulide", make_docs())
+
+    assert not reranked
+    assert reranker.predicted_pairs == 0
+    print("✅ Skipped without scoring")
+
+
+def test_scores_are_cached_per_query_and_chunk():
+    """Second identical request is served from the cache"""
+    print("💾 Testing score cache...")
+    reranker = FakeReranker(budget_ms=1000)
+    reranker.rerank_request("nimesulide", make_docs())
+    reranker.rerank_request("Nimesulide ", make_docs())
+
+    assert reranker.predicted_pairs == 3
+    assert reranker.stats["cache_hits"] == 3
+
+    reranker.rerank_request("paracetamol", make_docs())
+    assert reranker.predicted_pairs == 6
+    print("✅ Cache keyed by (query hash, chunk id)")
+
+
+def test_cache_is_bounded():
+    """Cache evicts least recently used scores"""
+    reranker = FakeReranker(budget_ms=1000, cache_size=2)
+    reranker.rerank_request("nimesulide", make_docs())
+    assert len(reranker._cache) == 2
+
+
+def test_batched_call_groups_rows_by_query():
+    """Pathway batch entry point reranks each query group separately"""
+    print("📦 Testing batched entry point...")
+    reranker = FakeReranker(budget_ms=1000)
+    docs = make_docs() + make_docs()[:1]
+    queries = ["q1", "q1", "q1", "q2"]
+    scores = reranker.__wrapped__(docs, queries)
+
+    assert scores == [1.0, 3.0, 2.0, 1.0]
+    assert reranker.stats["requests"] == 2
+    print("✅ Rows grouped per query")
+
+
+def test_same_question_requests_keep_separate_budgets():
+    """Two requests with the same question in one batch are budgeted separately"""
+    print("🧮 Testing per-request budgets...")
+    reranker = FakeReranker(budget_ms=1000)
+    budgets = []
+    original = reranker.rerank_request
+
+    def recording(query, docs, budget_ms=None):
+        budgets.append((len(docs), budget_ms))
+        return original(query, docs, budget_ms)
+
+    reranker.rerank_request = recording
+    docs = make_docs() + make_docs()[:2]
+    scores = reranker.__wrapped__(
+        docs, ["q"] * 5, request_id=["r1", "r1", "r1", "r2", "r2"], budget_ms=[500, 500, 500, 0, 0]
+    )
+
+    assert budgets == [(3, 500.0), (2, 0.0)]
+    assert scores[:3] == [1.0, 3.0, 2.0] and scores[3:] == [-0.1, -0.2]  # r2 had no budget: retrieval order
+    assert reranker.stats["requests"] == 2 and reranker.stats["skipped_budget"] == 1
+    print("✅ Each request reranked under its own budget")
+
+
+def test_stats_are_thread_safe():
+    """Concurrent Pathway calls do not lose stat updates"""
+    reranker = FakeReranker(budget_ms=1000)
+
+    def work():
+        for _ in range(200):
+            reranker.rerank_request("nimesulide", make_docs())
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert reranker.stats["requests"] == 1600 and reranker.stats["reranked"] == 1600
+
+
+if __name__ == "__main__":
+    print("🧬 Budgeted Cross-Encoder Reranker Tests")
+    print("=" * 50)
+    test_rerank_orders_by_cross_encoder_score()
+    test_zero_budget_keeps_retrieval_order()
+    test_predicted_cost_over_budget_skips()
+    test_scores_are_cached_per_query_and_chunk()
+    test_cache_is_bounded()
+    test_batched_call_groups_rows_by_query()
+    test_same_question_requests_keep_separate_budgets()
+    test_stats_are_thread_safe()
+    print("\n✅ All reranker tests passed")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Resumable Upload Test Suite
+
+PURPOSE:
+Validates the tus-style resumable upload protocol that lets large gazette
+bundles survive broken connections and upload in parallel parts.
+
+WHAT IT TESTS:
+1. ResumableUploadAPI:
+   - A plain tus client uploads a whole file with one PATCH
+   - Parts sent in parallel and out of order, hashed correctly
+   - Broken PATCHes resume from HEAD's part offsets; wrong offsets get 409
+   - Uploads survive a server restart and expire when abandoned
+   - Complete uploads go through UploadStore (atomic rename, duplicates)
+
+2. Flask relay:
+   - /api/uploads/resumable streams parts through to the upload server
+
+WHEN TO RUN:
+- After changing resumable_upload.py, upload_store.py or the upload routes of frontend/app.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp, aiofiles, Flask and requests (no running server)
+"""
+
+import asyncio
+import base64
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from resumable_upload import MIN_PART_SIZE, ResumableUploadAPI
+from upload_store import UploadStore
+
+PART = MIN_PART_SIZE
+CONTENT = os.urandom(PART * 2 + 1000)  # Three parts, the last one short
+SHA = hashlib.sha256(CONTENT).hexdigest()
+BASE = "/v1/upload/resumable"
+
+
+def metadata(filename: str) -> str:
+    return "filename " + base64.b64encode(filename.encode()).decode()
+
+
+def make_app(store: UploadStore, **kwargs):
+    api = ResumableUploadAPI(store, part_size=PART, allowed_extensions={".pdf"}, **kwargs)
+    app = web.Application()
+    api.add_routes(app)
+    return api, app
+
+
+async def create(client, filename="gazette.pdf", length=len(CONTENT)):
+    response = await client.post(BASE, headers={"Upload-Length": str(length), "Upload-Metadata": metadata(filename)})
+    return response.status, await response.json(), response.headers
+
+
+async def patch(client, upload_id, offset, data):
+    return await client.patch(
+        f"{BASE}/{upload_id}",
+        data=data,
+        headers={"Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"},
+    )
+
+
+def test_sequential_tus_upload():
+    """One PATCH from offset 0 runs through all parts and stores the file"""
+    print("📦 Testing a plain tus upload...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UploadStore(os.path.join(tmp, "data"))
+
+        async def scenario():
+            api, app = make_app(store)
+            async with TestClient(TestServer(app)) as client:
+                assert (await create(client, "notes.exe"))[0] == 400
+                assert (await create(client, length=store.max_bytes + 1))[0] == 413
+                status, session, headers = await create(client)
+                assert status == 201 and session["parts"] == 3
+                assert headers["Location"] == f"{BASE}/{session['id']}"
+
+                response = await patch(client, session["id"], 0, CONTENT)
+                assert response.status == 200 and response.headers["Upload-Offset"] == str(len(CONTENT))
+                result = await response.json()
+                assert result["document_id"] == SHA and result["filename"] == "gazette.pdf"
+                assert not result["duplicate"]
+
+                retried = await patch(client, session["id"], len(CONTENT), b"")  # Lost response, retried
+                assert retried.status == 200 and (await retried.json())["document_id"] == SHA
+
+                status, again, _ = await create(client, "gazette (copy).pdf")
+                duplicate = await (await patch(client, again["id"], 0, CONTENT)).json()
+                assert duplicate["duplicate"] and duplicate["filename"] == "gazette.pdf"
+
+        asyncio.run(scenario())
+        with open(os.path.join(tmp, "data", "gazette.pdf"), "rb") as f:
+            assert f.read() == CONTENT
+        assert os.listdir(os.path.join(tmp, "data")) == ["gazette.pdf"]
+    print("   ✅ Stored once, duplicate answered from the existing document")
+
+
+def test_parallel_parts_resume_and_restart():
+    """Parts arrive in parallel, out of order, broken and across a restart"""
+    print("🔀 Testing parallel, interrupted and restarted uploads...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UploadStore(os.path.join(tmp, "data"))
+        parts = [CONTENT[i:i + PART] for i in range(0, len(CONTENT), PART)]
+
+        async def first_server():
+            api, app = make_app(store)
+            async with TestClient(TestServer(app)) as client:
+                _, session, _ = await create(client)
+                upload_id = session["id"]
+                # Last and middle part in parallel; the middle one breaks off half way
+                responses = await asyncio.gather(
+                    patch(client, upload_id, 2 * PART, parts[2]),
+                    patch(client, upload_id, PART, parts[1][: PART // 2]),
+                )
+                assert [r.status for r in responses] == [204, 204]
+                head = await client.head(f"{BASE}/{upload_id}")
+                assert head.headers["Upload-Offset"] == "0"  # Nothing contiguous yet
+                offsets = [int(o) for o in head.headers["Upload-Part-Offsets"].split(",")]
+                assert offsets == [0, PART + PART // 2, len(CONTENT)]
+                conflict = await patch(client, upload_id, PART, parts[1])  # Stale offset
+                assert conflict.status == 409
+                return upload_id
+
+        upload_id = asyncio.run(first_server())
+
+        async def restarted_server():
+            api, app = make_app(store)  # Restores the upload from its .info sidecar
+            async with TestClient(TestServer(app)) as client:
+                progress = await (await client.get(f"{BASE}/{upload_id}")).json()
+                assert progress["next_offsets"] == [0, PART + PART // 2, len(CONTENT)]
+                resumed = await patch(client, upload_id, PART + PART // 2, parts[1][PART // 2:])
+                assert resumed.status == 204
+                final = await patch(client, upload_id, 0, parts[0])
+                assert final.status == 200
+                return await final.json()
+
+        result = asyncio.run(restarted_server())
+        assert result["sha256"] == SHA  # Parts ahead of the prefix were hashed from disk
+        with open(os.path.join(tmp, "data", "gazette.pdf"), "rb") as f:
+            assert f.read() == CONTENT
+    print("   ✅ Parallel parts resumed after interruption and restart")
+
+
+def test_expiry_and_termination():
+    """Abandoned uploads are deleted by DELETE or after expire_s"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UploadStore(os.path.join(tmp, "data"))
+
+        async def scenario():
+            api, app = make_app(store, expire_s=60)
+            async with TestClient(TestServer(app)) as client:
+                _, kept, _ = await create(client)
+                _, cancelled, _ = await create(client)
+                await patch(client, kept["id"], 0, CONTENT[:1000])
+                assert (await client.delete(f"{BASE}/{cancelled['id']}")).status == 204
+                assert (await client.head(f"{BASE}/{cancelled['id']}")).status == 404
+                assert api.purge_expired() == 0
+                assert api.purge_expired(now=api._uploads[kept["id"]].updated_at + 61) == 1
+                assert (await client.get(f"{BASE}/{kept['id']}")).status == 404
+
+        asyncio.run(scenario())
+        assert os.listdir(store.tmp_dir / "resumable") == []
+
+
+def test_flask_relay_streams_parts():
+    """The frontend relays creation, HEAD and PATCH to the upload server"""
+    print("🌐 Testing the Flask resumable upload relay...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UploadStore(os.path.join(tmp, "data"))
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        runner_box = {}
+
+        async def serve():
+            api, app = make_app(store)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            runner_box["runner"] = runner
+            runner_box["port"] = runner.addresses[0][1]
+            started.set()
+
+        thread = threading.Thread(target=lambda: (loop.run_until_complete(serve()), loop.run_forever()), daemon=True)
+        thread.start()
+        started.wait(10)
+
+        os.makedirs(os.path.join(tmp, "frontend"))
+        cwd = os.getcwd()
+        os.chdir(os.path.join(tmp, "frontend"))  # The frontend creates ../data on import
+        try:
+            path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "app.py")
+            spec = importlib.util.spec_from_file_location("pharmasafe_frontend", path)
+            frontend = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(frontend)
+        finally:
+            os.chdir(cwd)
+        frontend.RESUMABLE_UPLOAD_URL = f"http://127.0.0.1:{runner_box['port']}{BASE}"
+        client = frontend.app.test_client()
+
+        created = client.post("/pharmai/api/uploads/resumable", headers={
+            "Tus-Resumable": "1.0.0", "Upload-Length": str(len(CONTENT)), "Upload-Metadata": metadata("g.pdf"),
+        })
+        assert created.status_code == 201
+        upload_id = created.get_json()["id"]
+        assert created.headers["Location"] == f"/pharmai/api/uploads/resumable/{upload_id}"
+
+        url = f"/api/uploads/resumable/{upload_id}"
+        for offset in range(0, len(CONTENT), PART):
+            response = client.patch(url, data=CONTENT[offset:offset + PART], headers={
+                "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream",
+            })
+        assert response.status_code == 200 and response.get_json()["document_id"] == SHA
+        assert client.head(url).headers["Upload-Offset"] == str(len(CONTENT))
+
+        asyncio.run_coroutine_threadsafe(runner_box["runner"].cleanup(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(10)
+        with open(os.path.join(tmp, "data", "g.pdf"), "rb") as f:
+            assert f.read() == CONTENT
+    print("   ✅ Parts relayed and stored")
+
+
+if __name__ == "__main__":
+    print("🧬 Resumable Upload Tests")
+    print("=" * 50)
+    test_sequential_tus_upload()
+    test_parallel_parts_resume_and_restart()
+    test_expiry_and_termination()
+    test_flask_relay_streams_parts()
+    print("\n✅ All resumable upload tests passed")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Single-Flight Coalescing Test Suite
+
+PURPOSE:
+Validates that concurrent identical requests share one computation, for the
+blocking LLM path (Pathway UDF threads) and the async streaming path, without
+calling OpenRouter.
+
+WHAT IT TESTS:
+1. SingleFlight:
+   - Concurrent calls with one key run the function once
+   - Errors reach every waiting caller
+   - Different keys are not coalesced
+   - Coroutine variant coalesces on one event loop
+   - A cancelled leader does not cancel its followers; the last caller leaving does
+   - Followers of a blocking call give up after their timeout
+
+2. StreamFlight:
+   - Followers replay earlier tokens and receive later ones
+   - A leader that stops reading leaves followers with the whole stream
+
+3. PharmaLiteLLMChat:
+   - Identical prompts share one LiteLLM call; coalesced count is exported
+   - Requests with a deadline or another lane are not coalesced
+
+WHEN TO RUN:
+- After changing single_flight.py, pharma_llm.py or answer_stream.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Pathway with the LLM xpack installed (no API key, no running server)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry
+from single_flight import SingleFlight, StreamFlight, flight_key
+
+
+def run_concurrently(count, target):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_computation():
+    """10 identical questions -> 1 computation, 9 coalesced"""
+    print("🛬 Testing single-flight coalescing...")
+    flight = SingleFlight("test", registry=MetricsRegistry())
+    calls = []
+
+    def slow_answer():
+        calls.append(1)
+        time.sleep(0.2)
+        return "Nimesulide is banned for children below 12 years."
+
+    results = run_concurrently(10, lambda i: flight.do("nimesulide", slow_answer))
+    assert len(calls) == 1
+    assert set(results) == {"Nimesulide is banned for children below 12 years."}
+    assert flight.coalesced == 9
+    print("✅ 1 computation served 10 requests")
+
+
+def test_errors_reach_followers():
+    """A failing leader fails every coalesced caller"""
+    flight = SingleFlight("test", registry=MetricsRegistry())
+
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError("OpenRouter 503")
+
+    results = run_concurrently(4, lambda i: flight.do("q", failing))
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_different_keys_not_coalesced_and_key_released():
+    """Distinct questions run separately; finished keys are not cached"""
+    flight = SingleFlight("test", registry=MetricsRegistry())
+    calls = []
+    run_concurrently(3, lambda i: flight.do(flight_key("q", i), lambda: calls.append(i)))
+    flight.do(flight_key("q", 0), lambda: calls.append("again"))
+    assert len(calls) == 4
+
+
+def test_async_coalescing():
+    """Coroutine variant shares one awaited computation"""
+    flight = SingleFlight("test", registry=MetricsRegistry())
+    calls = []
+
+    async def retrieve():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ["doc"]
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", retrieve) for _ in range(5)))
+
+    assert asyncio.run(main()) == [["doc"]] * 5
+    assert len(calls) == 1
+
+
+def test_cancelled_leader_keeps_followers():
+    """A disconnecting leader neither cancels nor fails the followers' shared work"""
+    print("🔌 Testing leader cancellation...")
+    flight = SingleFlight("test", registry=MetricsRegistry())
+    finished = []
+
+    async def retrieve():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+        return ["doc"]
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("k", retrieve))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do_async("k", retrieve))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == ["doc"]
+        assert leader.cancelled()
+
+        alone = asyncio.ensure_future(flight.do_async("k2", retrieve))
+        await asyncio.sleep(0.01)
+        alone.cancel()
+        await asyncio.sleep(0.15)
+        return dict(flight._async_calls)
+
+    assert asyncio.run(main()) == {}
+    assert finished == [1], "work without waiters should be cancelled"
+    print("✅ Follower served after the leader disconnected")
+
+
+def test_follower_timeout():
+    """A follower of a stuck blocking call raises TimeoutError instead of waiting forever"""
+    flight = SingleFlight("test", registry=MetricsRegistry(), follower_timeout_s=0.05)
+    release = threading.Event()
+    results = []
+
+    def slow():
+        release.wait(5)
+        return "late"
+
+    leader = threading.Thread(target=lambda: flight.do("k", slow))
+    leader.start()
+    time.sleep(0.02)
+    try:
+        flight.do("k", slow)
+        raise AssertionError("follower should time out")
+    except TimeoutError:
+        pass
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", slow, timeout=5)))
+    follower.start()
+    time.sleep(0.02)
+    release.set()
+    leader.join()
+    follower.join()
+    assert results == ["late"]
+
+
+def test_stream_followers_replay_tokens():
+    """A follower joining mid-stream still receives every token"""
+    print("📡 Testing stream coalescing...")
+    flight = StreamFlight("test", registry=MetricsRegistry())
+    produced = []
+
+    async def tokens():
+        for token in ["Nime", "sulide ", "is ", "banned"]:
+            produced.append(token)
+            await asyncio.sleep(0.02)
+            yield token
+
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return "".join([token async for token in flight.stream("k", tokens)])
+
+    async def main():
+        return await asyncio.gather(consume(0), consume(0.03), consume(0.05))
+
+    assert asyncio.run(main()) == ["Nimesulide is banned"] * 3
+    assert len(produced) == 4
+    assert flight.coalesced == 2
+    print("✅ 3 streams served by 1 LLM stream")
+
+
+def test_stream_survives_leader_disconnect():
+    """Closing the first consumer's stream mid-way does not abandon the followers"""
+    flight = StreamFlight("test", registry=MetricsRegistry())
+    closed = []
+
+    async def tokens():
+        try:
+            for token in ["Nime", "sulide ", "is ", "banned"]:
+                await asyncio.sleep(0.02)
+                yield token
+        finally:
+            closed.append(1)
+
+    async def leader():
+        chunks = flight.stream("k", tokens)
+        first = await chunks.__anext__()
+        await chunks.aclose()  # Client disconnected after the first token
+        return first
+
+    async def follower():
+        await asyncio.sleep(0.01)
+        return "".join([token async for token in flight.stream("k", tokens)])
+
+    async def main():
+        return await asyncio.gather(leader(), follower())
+
+    assert asyncio.run(main()) == ["Nime", "Nimesulide is banned"]
+    assert closed == [1]
+
+
+def test_llm_wrapper_coalesces_identical_prompts():
+    """PharmaLiteLLMChat sends identical concurrent prompts once"""
+    print("🤖 Testing LLM wrapper...")
+    import litellm
+    from pharma_llm import PharmaLiteLLMChat
+
+    calls = []
+
+    def fake_completion(messages, **kwargs):
+        calls.append(messages)
+        time.sleep(0.2)
+        return SimpleNamespace(choices=[{"message": {"content": "answer"}}], usage=None)
+
+    original = litellm.completion
+    litellm.completion = fake_completion
+    try:
+        llm = PharmaLiteLLMChat(model="openrouter/test")
+        messages = [{"role": "user", "content": "Is nimesulide banned?"}]
+        results = run_concurrently(5, lambda i: llm.__wrapped__(messages))
+        llm.__wrapped__([{"role": "user", "content": "other"}])
+        coalesced = llm.flight.coalesced
+        # Own deadline or another lane: each request makes its own call
+        run_concurrently(3, lambda i: llm.__wrapped__(messages, deadline=time.time() + 5 if i else None))
+        run_concurrently(2, lambda i: llm.__wrapped__(messages, lane="batch" if i else "interactive"))
+    finally:
+        litellm.completion = original
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 2 + 3 + 2
+    assert coalesced >= 4 and llm.flight.coalesced == coalesced
+    print("✅ Identical prompts coalesced")
+
+
+if __name__ == "__main__":
+    print("🧬 Single-Flight Coalescing Tests")
+    print("=" * 50)
+    test_concurrent_calls_share_one_computation()
+    test_errors_reach_followers()
+    test_different_keys_not_coalesced_and_key_released()
+    test_async_coalescing()
+    test_cancelled_leader_keeps_followers()
+    test_follower_timeout()
+    test_stream_followers_replay_tokens()
+    test_stream_survives_leader_disconnect()
+    test_llm_wrapper_coalesces_identical_prompts()
+    print("\n✅ All single-flight tests passed")
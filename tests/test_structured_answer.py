@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Structured Answer Test Suite
+
+PURPOSE:
+Validates the ``"response_format": "json"`` answer mode for machine
+consumers: the fixed answer schema, server-side validation of model output
+and the tight output budget of structured routes.
+
+WHAT IT TESTS:
+1. Validation:
+   - Well-formed answers pass, code fences and extra keys are tolerated
+   - Wrong types, missing keys and free text are rejected
+   - Notification dates are normalised to YYYY-MM-DD
+
+2. Answer plans:
+   - Structured routes are capped to max_tokens
+   - JSON schema response_format only for models that support it
+   - Registry records become structured answers without an LLM call
+
+WHEN TO RUN:
+- After changing structured_answer.py or the structured settings in the YAML
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- Python standard library only (no API key, no running server)
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import REGISTRY
+from structured_answer import ANSWER_FIELDS, StructuredAnswerFormat, empty_answer, parse_answer, registry_answer
+
+VALID = {
+    "banned": True,
+    "components": ["Nimesulide ", "Paracetamol"],
+    "notification_no": "GSR 578(E)",
+    "date": "12.08.2024",
+    "source": "data/cdsco_banned_12Aug2024.pdf",
+    "confidence": 0.9,
+}
+
+
+def test_valid_answers_are_normalised():
+    """Schema answers pass validation with normalised dates and components"""
+    print("🧾 Testing structured answer validation...")
+    answer = parse_answer("```json\n" + json.dumps({**VALID, "reasoning": "ignored"}) + "\n```")
+    assert tuple(answer) == ANSWER_FIELDS
+    assert answer["date"] == "2024-08-12" and answer["components"] == ["Nimesulide", "Paracetamol"]
+    assert parse_answer(json.dumps({**VALID, "banned": None, "date": "", "notification_no": None}))["date"] is None
+    assert parse_answer(json.dumps({**VALID, "date": "12 August 2024"}))["date"] == "2024-08-12"
+    assert tuple(empty_answer()) == ANSWER_FIELDS
+    print("   ✅ Valid answers accepted")
+
+
+def test_invalid_answers_are_rejected():
+    """Anything outside the schema raises ValueError"""
+    invalid = [
+        "Nimesulide is banned under GSR 578(E).",
+        json.dumps([VALID]),
+        json.dumps({key: value for key, value in VALID.items() if key != "source"}),
+        json.dumps({**VALID, "banned": "yes"}),
+        json.dumps({**VALID, "components": "Nimesulide"}),
+        json.dumps({**VALID, "confidence": 1.5}),
+        json.dumps({**VALID, "confidence": True}),
+        json.dumps({**VALID, "date": "sometime in 2024"}),
+    ]
+    for text in invalid:
+        try:
+            parse_answer(text)
+            raise AssertionError(f"accepted: {text}")
+        except ValueError:
+            pass
+
+    structured = StructuredAnswerFormat()
+    answers = REGISTRY.counter("structured_answers_total")
+    before = answers.value(result="invalid")
+    assert structured.validate(invalid[0]) is None and structured.validate(None) is None
+    assert structured.validate(json.dumps(VALID))["banned"] is True
+    assert answers.value(result="invalid") - before == 1
+
+
+def test_structured_routes():
+    """Structured routes are capped; schema output only where supported"""
+    structured = StructuredAnswerFormat(max_tokens=150)
+    route = structured.apply({"tier": "full", "model": "sonnet", "max_tokens": 1000})
+    assert route["format"] == "json" and route["max_tokens"] == 150
+    assert structured.apply({"tier": "fast", "model": "haiku", "max_tokens": 100})["max_tokens"] == 100
+
+    schema_format = structured.response_format("openrouter/openai/gpt-4o-mini")
+    assert schema_format["type"] == "json_schema" and schema_format["json_schema"]["strict"]
+    assert set(schema_format["json_schema"]["schema"]["required"]) == set(ANSWER_FIELDS)
+    assert structured.response_format("anthropic/claude-sonnet-4") is None
+    assert "{context}" not in structured.user_prompt("chunks", "is nimesulide banned")
+
+
+def test_registry_answers():
+    """Registry hits map to structured answers"""
+    banned = registry_answer({
+        "name": "Nimesulide + Paracetamol", "status": "banned for children below 12 years",
+        "notification": "GSR 82(E)", "date": "2011-02-10", "source": "cdsco_banned_01Jan2018.pdf",
+    })
+    assert banned == {
+        "banned": True, "components": ["Nimesulide", "Paracetamol"], "notification_no": "GSR 82(E)",
+        "date": "2011-02-10", "source": "cdsco_banned_01Jan2018.pdf", "confidence": 1.0,
+    }
+    released = registry_answer({"name": "Aceclofenac", "status": "ban withdrawn", "date": "n/a"})
+    assert released["banned"] is False and released["date"] is None and released["source"] is None
+
+    structured = StructuredAnswerFormat()
+    assert structured.local({"rule": "greeting"}) == empty_answer()
+    assert structured.local({"rule": "registry", "record": {"name": "X", "status": "prohibited"}})["banned"] is True
+    print("   ✅ Registry answers structured")
+
+
+if __name__ == "__main__":
+    print("🧬 Structured Answer Tests")
+    print("=" * 50)
+    test_valid_answers_are_normalised()
+    test_invalid_answers_are_rejected()
+    test_structured_routes()
+    test_registry_answers()
+    print("\n✅ All structured answer tests passed")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Upload Service Test Suite
+
+PURPOSE:
+Validates the upload service running out of process from the Pathway
+indexer: the shared status database, child-process supervision and the
+separate upload load test.
+
+WHAT IT TESTS:
+1. Cross-process ingestion status:
+   - Stages recorded by another process's tracker reach /v1/uploads SSE streams
+   - Changes are pushed once, not again when polled
+   - /v1/health reports liveness and the data directory
+
+2. UploadServiceSupervisor:
+   - Starts upload_service.py as a child that answers /v1/health
+   - Restarts a killed child and an unresponsive one
+
+3. Upload load test:
+   - Single-shot and resumable uploads, duplicates and the report
+
+WHEN TO RUN:
+- After changing upload_service.py, upload_load_test.py or the
+  cross-process parts of ingestion_status.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp and aiofiles (no running server; the supervisor test spawns upload_service.py)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient, TestServer
+
+from ingestion_status import IngestionStatusTracker
+from metrics import REGISTRY
+from upload_load_test import parse_size, parse_upload_mix, run_upload_load_test
+from upload_service import UploadService, UploadServiceSupervisor
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout_s: float = 60.0) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_status_changes_from_the_indexer_process():
+    """Stages written to the shared database by the indexer are pushed to SSE subscribers"""
+    print("🔗 Testing the status database shared with the indexer...")
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "ingestion_status.db")
+        service = UploadService(os.path.join(tmp, "data"), IngestionStatusTracker(database), follow_interval_s=0.02)
+        indexer = IngestionStatusTracker(database)  # The pipeline's tracker in the other process
+
+        async def scenario():
+            async with TestClient(TestServer(service.create_app())) as client:
+                health = await client.get("/v1/health")
+                body = await health.json()
+                assert health.status == 200 and body["pid"] == os.getpid() and body["data_directory_writable"]
+
+                form = FormData()
+                form.add_field("file", b"Nimesulide is banned", filename="ban.txt", content_type="text/plain")
+                upload = await (await client.post("/v1/upload", data=form)).json()
+                assert upload["state"] == "received" and upload["ingestion_states"]["received"] == 1
+
+                events = await client.get(upload["events_url"])
+
+                def pipeline():
+                    for stage in ("parsed", "chunked", "embedded", "indexed"):
+                        time.sleep(0.2)
+                        indexer.advance(upload["path"], stage)
+
+                threading.Thread(target=pipeline).start()
+                states = []
+                async for line in events.content:
+                    if line.startswith(b"data: "):
+                        states.append(json.loads(line[6:])["state"])
+                assert states == ["received", "parsed", "chunked", "embedded", "indexed"]
+                assert (await client.get("/v1/metrics")).status == 200
+
+        asyncio.run(scenario())
+        assert service.ingestion_status.publish_changes(0.0) > 0  # Everything already pushed: watermark only
+    print("   ✅ Indexer stages streamed across processes, each once")
+
+
+def test_supervisor_restarts_the_child():
+    """A killed or unresponsive upload service is started again"""
+    print("🩺 Testing upload service supervision...")
+    restarts = REGISTRY.counter("upload_service_restarts_total")
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        supervisor = UploadServiceSupervisor(
+            ["--port", str(port), "--host", "127.0.0.1", "--data-dir", os.path.join(tmp, "data"),
+             "--status-db", os.path.join(tmp, "ingestion_status.db")],
+            health_url=f"http://127.0.0.1:{port}/v1/health",
+            check_interval_s=0.2,
+            failure_threshold=2,
+            startup_grace_s=60.0,
+        )
+        exited = restarts.value(reason="exited")
+        supervisor.start()
+        try:
+            assert wait_for(supervisor.probe), "upload service did not become healthy"
+            first = supervisor.process.pid
+            os.kill(first, signal.SIGKILL)
+            assert wait_for(lambda: supervisor.process.pid != first and supervisor.probe())
+            assert restarts.value(reason="exited") == exited + 1
+        finally:
+            supervisor.stop()
+        assert supervisor.process.poll() is not None and not supervisor.probe()
+
+    hung = UploadServiceSupervisor(
+        command=[sys.executable, "-c", "import time; time.sleep(60)"],
+        health_url=f"http://127.0.0.1:{free_port()}/v1/health",
+        check_interval_s=0.05,
+        failure_threshold=2,
+        startup_grace_s=0.0,
+    )
+    unresponsive = restarts.value(reason="unresponsive")
+    hung.start()
+    try:
+        assert wait_for(lambda: restarts.value(reason="unresponsive") > unresponsive, 10.0)
+    finally:
+        hung.stop()
+    print("   ✅ Killed and unresponsive children restarted")
+
+
+def test_upload_load_test():
+    """The upload load test drives both upload kinds and counts duplicates"""
+    print("📦 Testing the upload load test...")
+    assert parse_size("64KB") == 65536 and parse_size("1.5MB") == 1572864 and parse_size("100") == 100
+    assert parse_upload_mix("upload=3,resumable") == {"upload": 0.75, "resumable": 0.25}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, "data")
+        service = UploadService(data, IngestionStatusTracker(":memory:"))
+
+        async def scenario():
+            server = TestServer(service.create_app())
+            await server.start_server()
+            try:
+                args = argparse.Namespace(
+                    mix="upload=1,resumable=1", size="64KB", duplicates=0.3, parallel_parts=3, seed=7,
+                    url=str(server.make_url("")), rps=None, concurrency=3, duration=1.0, max_outstanding=10,
+                    probe_rps=0.0, query_url="http://127.0.0.1:1", timeout=30.0,
+                )
+                return await run_upload_load_test(args)
+            finally:
+                await server.close()
+
+        report = asyncio.run(scenario())
+        uploads = report["endpoints"]["all"]
+        assert uploads["requests"] > 0 and uploads["ok"] == uploads["requests"]
+        assert set(report["endpoints"]) == {"all", "upload", "resumable"}
+        assert 0 < report["duplicate_uploads"] < uploads["ok"]
+        assert len(os.listdir(data)) == uploads["ok"] - report["duplicate_uploads"]
+        assert report["throughput_mb_s"] > 0 and report["query_probe"] is None
+    print(f"   ✅ {uploads['ok']} uploads, {report['duplicate_uploads']} duplicates, {report['throughput_mb_s']} MB/s")
+
+
+if __name__ == "__main__":
+    print("🧬 Upload Service Tests")
+    print("=" * 50)
+    test_status_changes_from_the_indexer_process()
+    test_supervisor_restarts_the_child()
+    test_upload_load_test()
+    print("\n✅ All upload service tests passed")
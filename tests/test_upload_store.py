@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Upload Store Test Suite
+
+PURPOSE:
+Validates that uploads reach ./data only as complete files and that identical
+re-uploads are answered from the existing document instead of being reparsed.
+
+WHAT IT TESTS:
+1. UploadStore:
+   - Partial uploads stay outside the data directory until complete
+   - Identical content under any name is a duplicate; nothing is written
+   - A new version of an existing name replaces it atomically
+   - Unsafe names are stripped, oversized uploads rejected and cleaned up
+
+2. Upload endpoint:
+   - /v1/upload reports duplicates with the existing document and status record
+
+WHEN TO RUN:
+- After changing upload_store.py or the upload handler of upload_service.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- aiohttp and aiofiles (no running server)
+"""
+
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upload_store import UploadRejected, UploadStore, UploadTooLarge
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        await asyncio.sleep(0)
+        yield part
+
+
+def test_atomic_writes_and_duplicates():
+    """Complete files are renamed into place; identical bytes are never written twice"""
+    print("📥 Testing atomic, content-hashed uploads...")
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, "data")
+        store = UploadStore(data)
+        assert store.tmp_dir == (store.data_dir.resolve().parent / ".uploads_tmp")
+
+        async def watched_upload():
+            async def observing():
+                yield b"%PDF-1.7 Nimesulide "
+                assert os.listdir(data) == []  # Watcher sees nothing while the upload streams
+                yield b"is banned"
+
+            return await store.save("ban.pdf", observing())
+
+        stored = asyncio.run(watched_upload())
+        content = b"%PDF-1.7 Nimesulide is banned"
+        assert stored["document_id"] == hashlib.sha256(content).hexdigest()
+        assert not stored["duplicate"] and not stored["replaced"]
+        with open(os.path.join(data, "ban.pdf"), "rb") as f:
+            assert f.read() == content
+
+        mtime = os.stat(os.path.join(data, "ban.pdf")).st_mtime_ns
+        again = asyncio.run(store.save("copy of ban.pdf", chunks(content)))
+        assert again["duplicate"] and again["filename"] == "ban.pdf"
+        assert again["document_id"] == stored["document_id"]
+        assert os.listdir(data) == ["ban.pdf"]
+        assert os.stat(os.path.join(data, "ban.pdf")).st_mtime_ns == mtime  # Not touched, not reparsed
+
+        updated = asyncio.run(store.save("ban.pdf", chunks(b"%PDF-1.7 v2")))
+        assert updated["replaced"] and updated["document_id"] != stored["document_id"]
+        back = asyncio.run(store.save("ban.pdf", chunks(content)))  # Old version is no longer in ./data
+        assert not back["duplicate"] and back["replaced"]
+        assert os.listdir(store.tmp_dir) == []
+    print("   ✅ Partial files hidden, duplicates answered from the existing document")
+
+
+def test_rejected_uploads():
+    """Unsafe names are stripped; empty names and oversized files are rejected"""
+    print("🛡️ Testing upload validation...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UploadStore(os.path.join(tmp, "data"), tmp_dir=os.path.join(tmp, "partial"), max_bytes=10)
+        stored = asyncio.run(store.save("../../etc/notice.txt", chunks(b"ok")))
+        assert stored["path"] == os.path.join(tmp, "data", "notice.txt")
+
+        for name, parts, error in ((None, [b"x"], UploadRejected), ("big.txt", [b"12345", b"678901"], UploadTooLarge)):
+            try:
+                asyncio.run(store.save(name, chunks(*parts)))
+                raise AssertionError(f"{name} accepted")
+            except error:
+                pass
+        assert os.listdir(os.path.join(tmp, "partial")) == []  # Aborted upload cleaned up
+        assert sorted(os.listdir(os.path.join(tmp, "data"))) == ["notice.txt"]
+
+        open(os.path.join(tmp, "partial", "upload-crashed.part"), "wb").close()
+        assert store.cleanup() == 1
+    print("   ✅ Unsafe names stripped, oversized uploads rejected")
+
+
+def test_upload_endpoint_duplicates():
+    """/v1/upload answers a repeated upload with the existing document and status"""
+    print("🌐 Testing duplicate uploads through /v1/upload...")
+    from aiohttp import FormData
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from ingestion_status import IngestionStatusTracker
+    from upload_service import UploadService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            app = UploadService("data", IngestionStatusTracker(":memory:"))
+
+            async def upload(client, name):
+                form = FormData()
+                form.add_field("file", b"Codeine is restricted", filename=name, content_type="text/plain")
+                response = await client.post("/v1/upload", data=form)
+                assert response.status == 200
+                return await response.json()
+
+            async def scenario():
+                async with TestClient(TestServer(app.create_app())) as client:
+                    first = await upload(client, "codeine.txt")
+                    second = await upload(client, "codeine (1).txt")
+                    return first, second
+
+            first, second = asyncio.run(scenario())
+            assert not first["duplicate"] and first["state"] == "received"
+            assert second["duplicate"] and second["upload_id"] == first["upload_id"]
+            assert second["document_id"] == first["document_id"] and second["filename"] == "codeine.txt"
+            assert os.listdir("data") == ["codeine.txt"]
+            assert app.ingestion_status.get(first["upload_id"])["sha256"] == first["document_id"]
+        finally:
+            os.chdir(cwd)
+    print("   ✅ Duplicate upload resolved to the first upload")
+
+
+if __name__ == "__main__":
+    print("🧬 Upload Store Tests")
+    print("=" * 50)
+    test_atomic_writes_and_duplicates()
+    test_rejected_uploads()
+    test_upload_endpoint_duplicates()
+    print("\n✅ All upload store tests passed")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Vector Compression Test Suite
+
+PURPOSE:
+Validates the fp16 / int8 / PCA codecs, the PCA-reduced retriever factory and
+the full-precision rescoring stage on synthetic vectors, without a model.
+
+WHAT IT TESTS:
+1. Codecs:
+   - Round-trip error of fp16 and int8 is small
+   - Bytes per vector for every method
+   - PCA keeps the dominant directions and can be saved/loaded
+
+2. Serving Integration:
+   - Factory reports the reduced dimension and rejects fp16/int8
+   - Rescorer orders candidates by full-precision cosine
+
+3. Report:
+   - Recall of compressed search with and without rescoring
+
+WHEN TO RUN:
+- After changing vector_compression.py or compression_report.py
+
+EXPECTED OUTCOME:
+- All assertions pass
+
+DEPENDENCIES:
+- numpy and Pathway installed (no model download, no running server)
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pathway.xpacks.llm.embedders import BaseEmbedder
+
+from compression_report import evaluate, top_k
+from vector_compression import CompressedUsearchKnnFactory, FullPrecisionRescorer, VectorCompressor
+
+
+class FakeEmbedder(BaseEmbedder):
+    """Deterministic 8-dim vectors derived from the text."""
+
+    def __init__(self):
+        super().__init__(max_batch_size=64)
+        self.calls = 0
+
+    def __wrapped__(self, input, **kwargs):
+        self.calls += 1
+        texts = [input] if isinstance(input, str) else input
+        return [np.array([len(t), t.count("a"), t.count("e"), 1, 0, 0, 0, 0], dtype=np.float32) for t in texts]
+
+
+def test_scalar_codecs_round_trip():
+    """fp16 and int8 decode close to the original vectors"""
+    print("🔢 Testing scalar quantization...")
+    vectors = np.random.default_rng(0).normal(size=(20, 384)).astype(np.float32)
+    for method, tolerance in (("fp16", 1e-2), ("int8", 5e-2)):
+        codec = VectorCompressor(method)
+        decoded = codec.decode(codec.encode(vectors))
+        assert np.abs(decoded - vectors).max() < tolerance * np.abs(vectors).max()
+    print("✅ fp16/int8 round trip within tolerance")
+
+
+def test_bytes_per_vector():
+    """Memory accounting for a 384-dim MiniLM vector"""
+    assert VectorCompressor("none").bytes_per_vector(384) == 1536
+    assert VectorCompressor("fp16").bytes_per_vector(384) == 768
+    assert VectorCompressor("int8").bytes_per_vector(384) == 388
+    assert VectorCompressor("pca", 128).bytes_per_vector(384) == 512
+
+
+def test_pca_fit_save_load():
+    """PCA recovers low-rank data and persists its basis"""
+    print("📐 Testing PCA...")
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(200, 4)) @ rng.normal(size=(4, 32))
+    codec = VectorCompressor("pca", 4).fit(vectors)
+    reduced = codec.encode(vectors)
+    assert reduced.shape == (200, 4)
+
+    reconstructed = reduced @ codec.components + codec.mean
+    assert np.allclose(reconstructed, vectors, atol=1e-3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pca.npz")
+        codec.save(path)
+        loaded = VectorCompressor("pca", 4).load(path)
+        assert np.allclose(loaded.encode(vectors), reduced)
+    print("✅ PCA basis fitted and reloaded")
+
+
+def test_factory_reduces_dimensions():
+    """compression: pca makes the index store reduced vectors"""
+    print("🏭 Testing retriever factory...")
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pca_3.npz")
+        VectorCompressor("pca", 3).fit(rng.normal(size=(50, 8))).save(path)
+        factory = CompressedUsearchKnnFactory(
+            embedder=FakeEmbedder(), compression="pca", pca_dimensions=3, pca_path=path
+        )
+    assert factory.dimensions == 3
+    assert len(factory.embedder.__wrapped__(["abc", "de"])[1]) == 3
+
+    for method in ("fp16", "int8"):
+        try:
+            CompressedUsearchKnnFactory(dimensions=8, compression=method)
+            assert False, "native index cannot store scalar-quantized vectors"
+        except ValueError:
+            pass
+    print("✅ Factory serves PCA vectors")
+
+
+def test_rescorer_uses_full_precision():
+    """Candidates are scored by cosine of full-precision embeddings"""
+    embedder = FakeEmbedder()
+    rescorer = FullPrecisionRescorer(embedder, cache_size=10)
+    docs = [{"text": "aaaa", "metadata": {"path": "x"}}, {"text": "eeee", "metadata": {"path": "y"}}]
+    scores = rescorer.__wrapped__(docs, ["aaaa", "aaaa"])
+    assert scores[0] > scores[1]
+
+    calls = embedder.calls
+    rescorer.__wrapped__(docs, ["eeee", "eeee"])
+    assert embedder.calls == calls + 1  # only the new query, documents cached
+
+
+def test_report_recall():
+    """Lossless setting has recall 1.0; rescoring never hurts"""
+    print("📊 Testing report recall...")
+    rng = np.random.default_rng(3)
+    corpus = rng.normal(size=(300, 64)).astype(np.float32)
+    queries = rng.normal(size=(10, 64)).astype(np.float32)
+    reference = top_k(corpus, queries, 10)
+
+    exact = evaluate(VectorCompressor("none"), corpus, queries, reference, 10, 4)
+    assert exact["recall@10"] == 1.0
+
+    reduced = evaluate(VectorCompressor("pca", 16), corpus, queries, reference, 10, 4)
+    assert reduced["bytes_per_chunk"] == 64
+    assert reduced["recall@10_rescored"] >= reduced["recall@10"]
+    print(f"✅ PCA-16 recall {reduced['recall@10']} -> {reduced['recall@10_rescored']} rescored")
+
+
+if __name__ == "__main__":
+    print("🧬 Vector Compression Tests")
+    print("=" * 50)
+    test_scalar_codecs_round_trip()
+    test_bytes_per_vector()
+    test_pca_fit_save_load()
+    test_factory_reduces_dimensions()
+    test_rescorer_uses_full_precision()
+    test_report_recall()
+    print("\n✅ All vector compression tests passed")
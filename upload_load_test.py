@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Upload Load Test for the Upload Service
+
+Drives /v1/upload and the resumable upload endpoint of upload_service.py with
+synthetic documents, separately from the query load test (load_test.py), and
+optionally probes query latency on the Pathway server during the run to show
+how much the upload traffic still affects query serving. Reports:
+- Uploads per second, MB/s and latency p50/p95/p99 per upload kind
+- Duplicates answered from existing documents
+- Upload service metrics that moved during the run (/v1/metrics deltas)
+- Retrieve latency of the query probe, if enabled
+
+Every upload is a unique text document unless --duplicates sets the share of
+repeated content. Uploaded documents land in ./data and get indexed: run it
+against a staging deployment.
+
+Usage:
+    python upload_load_test.py --concurrency 8 --duration 30 --size 256KB
+    python upload_load_test.py --rps 4 --mix upload=0.5,resumable=0.5 --size 20MB --probe-rps 2
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+import uuid
+from typing import Awaitable, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, FormData
+
+from benchmark_embedders import BENCHMARK_QUERIES
+from load_test import (
+    LoadClient,
+    RequestResult,
+    fetch_metrics,
+    print_report,
+    run_closed_loop,
+    run_open_loop,
+    stage_breakdown,
+    summarize,
+)
+
+UPLOAD_KINDS = ("upload", "resumable")
+SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(spec: str) -> int:
+    """Parse ``256KB`` / ``20MB`` / ``1000`` into bytes."""
+    text = spec.strip().upper()
+    number = text.rstrip("KMGB")
+    unit = text[len(number):]
+    if unit not in SIZE_UNITS or not number:
+        raise ValueError(f"Invalid size {spec!r}; use e.g. 512KB or 20MB")
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def parse_upload_mix(spec: str) -> Dict[str, float]:
+    """Parse ``upload=0.5,resumable=0.5`` into normalized weights."""
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in UPLOAD_KINDS:
+            raise ValueError(f"Unknown upload kind {name!r} in mix; use {list(UPLOAD_KINDS)}")
+        weights[name] = float(weight or 1.0)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Upload mix weights must be positive")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def make_document(size: int, rng: random.Random, seed: Optional[int] = None) -> bytes:
+    """Text document of ``size`` bytes; the same ``seed`` gives the same content."""
+    source = random.Random(seed) if seed is not None else rng
+    words = ("nimesulide", "codeine", "schedule", "gazette", "notification", "CDSCO", "banned", "FDC")
+    header = f"Load test notification {source.getrandbits(64):016x}\n".encode()
+    body = " ".join(source.choice(words) for _ in range(size // 8 + 1)).encode()
+    return (header + body)[:size]
+
+
+class UploadLoadClient:
+    """
+    Uploads single documents to the upload service and times them.
+
+    Args:
+        session: aiohttp session (carries the per-request timeout)
+        base_url: Upload service base URL
+        parallel_parts: Parts of one resumable upload sent at the same time
+    """
+
+    def __init__(self, session: ClientSession, base_url: str = "http://127.0.0.1:8001", parallel_parts: int = 3):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.parallel_parts = parallel_parts
+        self.duplicates = 0
+        self.bytes_sent = 0
+
+    async def send(self, kind: str, filename: str, content: bytes) -> RequestResult:
+        """Upload one document; the result counts as ok once the service has stored or deduplicated it."""
+        started = time.perf_counter()
+        try:
+            if kind == "resumable":
+                status, body = await self._resumable(filename, content)
+            else:
+                status, body = await self._single(filename, content)
+            error = None if status < 400 and body is not None else f"HTTP {status}"
+        except asyncio.TimeoutError:
+            status, body, error = 0, None, "timeout"
+        except Exception as e:
+            status, body, error = 0, None, type(e).__name__
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        if error is None:
+            self.bytes_sent += len(content)
+            self.duplicates += bool(body.get("duplicate"))
+        return RequestResult(kind, error is None, status, latency_ms, error)
+
+    async def _single(self, filename: str, content: bytes):
+        form = FormData()
+        form.add_field("file", content, filename=filename, content_type="text/plain")
+        async with self.session.post(self.base_url + "/v1/upload", data=form) as response:
+            body = await response.json() if response.status < 400 else None
+            return response.status, body
+
+    async def _resumable(self, filename: str, content: bytes):
+        base = self.base_url + "/v1/upload/resumable"
+        headers = {
+            "Tus-Resumable": "1.0.0",
+            "Upload-Length": str(len(content)),
+            "Upload-Metadata": "filename " + base64.b64encode(filename.encode()).decode(),
+        }
+        async with self.session.post(base, headers=headers) as response:
+            if response.status != 201:
+                return response.status, None
+            session = await response.json()
+
+        slots = asyncio.Semaphore(self.parallel_parts)
+        part_size = session["part_size"]
+
+        async def send_part(offset: int):
+            async with slots:
+                async with self.session.patch(
+                    f"{base}/{session['id']}",
+                    data=content[offset:offset + part_size],
+                    headers={"Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"},
+                ) as response:
+                    return response.status, await response.json() if response.status == 200 else None
+
+        responses = await asyncio.gather(*(send_part(offset) for offset in range(0, len(content), part_size)))
+        failed = [status for status, _ in responses if status not in (200, 204)]
+        if failed:
+            return failed[0], None
+        completed = [body for status, body in responses if status == 200]
+        return (200, completed[0]) if completed else (204, None)
+
+
+async def run_upload_load_test(args) -> Dict:
+    mix = parse_upload_mix(args.mix)
+    size = parse_size(args.size)
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    counter = iter(range(1_000_000_000))
+
+    async with ClientSession(timeout=ClientTimeout(total=args.timeout)) as session:
+        client = UploadLoadClient(session, args.url, args.parallel_parts)
+
+        def send() -> Awaitable[RequestResult]:
+            kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+            number = next(counter)
+            repeated = rng.random() < args.duplicates
+            content = make_document(size, rng, seed=0 if repeated else None)
+            return client.send(kind, f"loadtest-{run_id}-{number}.txt", content)
+
+        async def generate() -> List[RequestResult]:
+            if args.rps:
+                return await run_open_loop(send, args.rps, args.duration, args.max_outstanding)
+            return await run_closed_loop(send, args.concurrency, args.duration)
+
+        async def probe() -> List[RequestResult]:
+            if not args.probe_rps:
+                return []
+            queries = LoadClient(session, args.query_url)
+            return await run_open_loop(
+                lambda: queries.send("retrieve", rng.choice(BENCHMARK_QUERIES)), args.probe_rps, args.duration
+            )
+
+        before = await fetch_metrics(session, args.url)
+        started = time.monotonic()
+        results, probe_results = await asyncio.gather(generate(), probe())
+        elapsed = time.monotonic() - started
+        after = await fetch_metrics(session, args.url)
+
+    mode = f"open loop {args.rps} uploads/s" if args.rps else f"closed loop x{args.concurrency}"
+    return {
+        "settings": {
+            "mode": f"{mode}, {args.size} documents",
+            "duration_s": args.duration,
+            "mix": mix,
+            "size_bytes": size,
+            "duplicates": args.duplicates,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": summarize(results, elapsed),
+        "throughput_mb_s": round(client.bytes_sent / elapsed / 1024 ** 2, 2) if elapsed > 0 else 0.0,
+        "duplicate_uploads": client.duplicates,
+        "stages_ms": stage_breakdown(before, after),
+        "query_probe": summarize(probe_results, elapsed).get("retrieve") if probe_results else None,
+    }
+
+
+def print_upload_report(report: Dict) -> None:
+    print_report(report)
+    print(f"\n📦 {report['throughput_mb_s']} MB/s uploaded, {report['duplicate_uploads']} duplicates")
+    probe = report["query_probe"]
+    if probe:
+        print(f"🔍 Query probe during uploads: {probe['ok']}/{probe['requests']} ok, "
+              f"p50 {probe['p50_ms']} ms, p95 {probe['p95_ms']} ms, p99 {probe['p99_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the upload service")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, help="Open loop: uploads started per second")
+    mode.add_argument("--concurrency", type=int, default=4, help="Closed loop: concurrent uploaders")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--mix", default="upload=1", help="Upload kind weights, e.g. upload=0.5,resumable=0.5")
+    parser.add_argument("--size", default="256KB", help="Document size, e.g. 64KB or 20MB")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="Share of uploads repeating one document")
+    parser.add_argument("--parallel-parts", type=int, default=3, help="Parts in flight per resumable upload")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Upload service base URL")
+    parser.add_argument("--probe-rps", type=float, default=0.0, help="Retrieve queries per second during the run")
+    parser.add_argument("--query-url", default="http://127.0.0.1:8000", help="Pathway server base URL for the probe")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-upload timeout in seconds")
+    parser.add_argument("--max-outstanding", type=int, default=100, help="Open loop: pending upload cap")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_upload_load_test(args))
+    print_upload_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
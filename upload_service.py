@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Upload Service: document uploads in their own process
+
+The upload server used to run as a daemon thread of app_openrouter_upload.py,
+so multipart parsing, hashing, archive extraction and JSON responses of large
+uploads competed for the GIL with the Pathway engine, the embedder and
+QASummaryRestServer. It now runs as a separate process that shares nothing
+with the indexer but the data directory and the ingestion status database:
+
+    upload_service.py :8001 --atomic rename--> ./data --watched by--> indexer :8000
+              \\___________ ingestion_status.db (SQLite, WAL) ___________/
+
+- Complete documents are renamed into ./data (UploadStore); the indexer's
+  filesystem connector picks them up, exactly like files copied in by rsync
+- The upload service registers uploads and batches in the status database,
+  the indexer records the pipeline stages; changes made by the indexer are
+  polled and pushed to /v1/uploads SSE subscribers
+- A process manager keeps the service alive: supervisord or systemd
+  (``Type=notify``, the event loop feeds the systemd watchdog), or
+  UploadServiceSupervisor when app_openrouter_upload.py is started directly,
+  which restarts the child when it exits or its /v1/health stops answering
+
+Key Features:
+- /v1/upload, resumable uploads, archive batches and /v1/uploads status routes
+- /v1/health liveness (event loop answering, data directory writable)
+- /v1/metrics of the upload process (upload, archive and resumable counters)
+- Child-process supervision with restart backoff, systemd readiness and watchdog
+
+Usage:
+    python upload_service.py --port 8001 --data-dir ./data --status-db ingestion_status.db
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from aiohttp import web
+
+from archive_upload import ARCHIVE_EXTENSIONS, ArchiveError, ArchiveExtractor, is_archive
+from ingestion_status import IngestionStatusAPI, IngestionStatusTracker
+from metrics import REGISTRY, metrics_snapshot
+from resumable_upload import ResumableUploadAPI
+from upload_store import UploadRejected, UploadStore, UploadTooLarge, part_chunks
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = {'.pdf', '.txt', '.doc', '.docx'}
+DEFAULT_PORT = 8001
+
+
+def sd_notify(message: str) -> bool:
+    """Send a systemd notification (READY=1, WATCHDOG=1, ...); False when not run by systemd."""
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):  # Abstract namespace socket
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(message.encode())
+        return True
+    except OSError as e:
+        logger.warning(f"⚠️ systemd notification failed: {e}")
+        return False
+
+
+class UploadService:
+    """
+    Upload, resumable upload and ingestion status endpoints of the data directory.
+
+    Args:
+        data_dir: Directory watched by the indexer
+        ingestion_status: Tracker on the status database the indexer writes (None disables status routes)
+        allowed_extensions: Document types accepted (archives of them are accepted as well)
+        follow_interval_s: Poll interval for pipeline stages recorded by the indexer process
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "./data",
+        ingestion_status: Optional[IngestionStatusTracker] = None,
+        allowed_extensions: Iterable[str] = ALLOWED_EXTENSIONS,
+        follow_interval_s: float = 1.0,
+    ):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.allowed_extensions = set(allowed_extensions)
+        self.upload_store = UploadStore(str(self.data_dir))
+        self.archive_extractor = ArchiveExtractor(self.upload_store, allowed_extensions=self.allowed_extensions)
+        self.ingestion_status = ingestion_status
+        self.follow_interval_s = follow_interval_s
+        self.started_at = time.time()
+        self._watchdog: Optional[asyncio.Task] = None
+
+    async def ingestion_states(self) -> Optional[Dict[str, int]]:
+        """Files per ingestion state, the backlog as seen from the upload service."""
+        if self.ingestion_status is None:
+            return None
+        return await asyncio.to_thread(self.ingestion_status.counts)
+
+    async def upload_response(self, stored):
+        """Response body of a stored or duplicate upload (single-shot or resumable)"""
+        if stored["duplicate"]:
+            logger.info(f"♻️ Upload is identical to {stored['filename']}; not reparsed")
+            body = {
+                "message": "Identical document already uploaded - not reindexed",
+                "duplicate": True,
+                "document_id": stored["document_id"],
+                "filename": stored["filename"],
+                "size": stored["size"],
+                "path": stored["path"],
+            }
+            if self.ingestion_status is not None:
+                record = await asyncio.to_thread(self.ingestion_status.latest, stored["path"])
+                if record is not None:
+                    body.update({
+                        "upload_id": record["upload_id"],
+                        "state": record["state"],
+                        "status_url": f"/v1/uploads/{record['upload_id']}",
+                        "events_url": f"/v1/uploads/{record['upload_id']}/events",
+                    })
+            return body
+
+        logger.info(f"📄 File uploaded successfully: {stored['filename']} ({stored['size']} bytes)")
+        body = {
+            "message": "File uploaded and queued for RAG indexing",
+            "duplicate": False,
+            "replaced": stored["replaced"],
+            "document_id": stored["document_id"],
+            "filename": stored["filename"],
+            "size": stored["size"],
+            "path": stored["path"],
+            "status": "Queued for parsing - check /v1/health for the ingestion backlog",
+        }
+        if self.ingestion_status is not None:
+            record = await asyncio.to_thread(
+                self.ingestion_status.register_upload,
+                stored["filename"], stored["path"], stored["size"], stored["sha256"],
+            )
+            body.update({
+                "upload_id": record["upload_id"],
+                "state": record["state"],
+                "status": "received - follow status_url or events_url until the state is indexed",
+                "status_url": f"/v1/uploads/{record['upload_id']}",
+                "events_url": f"/v1/uploads/{record['upload_id']}/events",
+                "ingestion_states": await self.ingestion_states(),
+            })
+        return body
+
+    async def batch_response(self, batch):
+        """Response body of an extracted archive: one batch-status handle for all its documents"""
+        new = sum(not entry["duplicate"] for entry in batch["files"])
+        body = {
+            "message": (
+                f"Archive extracted: {new} new documents queued for RAG indexing, "
+                f"{len(batch['files']) - new} duplicates, {len(batch['skipped'])} skipped"
+            ),
+            "archive": batch["archive"],
+            "files": batch["files"],
+            "skipped": batch["skipped"],
+        }
+        if self.ingestion_status is not None:
+            status = await asyncio.to_thread(
+                self.ingestion_status.register_batch, batch["archive"], batch["files"], batch["skipped"]
+            )
+            body.update({
+                "batch_id": status["batch_id"],
+                "state": status["state"],
+                "files": status["files"],
+                "status": "follow status_url or events_url until the batch state is indexed",
+                "status_url": f"/v1/uploads/batches/{status['batch_id']}",
+                "events_url": f"/v1/uploads/batches/{status['batch_id']}/events",
+                "ingestion_states": await self.ingestion_states(),
+            })
+        return body
+
+    async def finish_upload(self, tmp_path, filename, sha256, size):
+        """Move a received document into ./data, or extract a received archive as one batch"""
+        if not is_archive(filename):
+            return await self.upload_response(await self.upload_store.adopt(tmp_path, filename, sha256, size))
+        try:
+            batch = await asyncio.to_thread(self.archive_extractor.extract, tmp_path, filename)
+        finally:
+            self.upload_store.discard(tmp_path)
+        return await self.batch_response(batch)
+
+    async def upload_handler(self, request):
+        """Handle file upload requests"""
+        try:
+            reader = await request.multipart()
+
+            while True:
+                part = await reader.next()
+                if part is None:
+                    break
+
+                if part.name == 'file':
+                    filename = part.filename
+                    if not filename:
+                        return web.json_response(
+                            {"error": "No filename provided"},
+                            status=400
+                        )
+
+                    # Validate file type
+                    file_ext = Path(filename).suffix.lower()
+                    if file_ext not in self.allowed_extensions and not is_archive(filename):
+                        return web.json_response(
+                            {"error": f"File type {file_ext} not supported. "
+                                      f"Allowed: {sorted(self.allowed_extensions)} or a ZIP/TAR archive of them"},
+                            status=400
+                        )
+
+                    # Stream to a temporary file and move it into ./data only once complete and new
+                    try:
+                        tmp_path, sha256, size = await self.upload_store.receive(part_chunks(part))
+                        return web.json_response(await self.finish_upload(tmp_path, filename, sha256, size))
+                    except UploadRejected as e:
+                        status = 413 if isinstance(e, UploadTooLarge) else 400
+                        return web.json_response({"error": str(e)}, status=status)
+                    except ArchiveError as e:
+                        return web.json_response({"error": str(e)}, status=400)
+
+            return web.json_response({"error": "No file found in request"}, status=400)
+
+        except Exception as e:
+            logger.error(f"❌ Upload error: {e}")
+            return web.json_response({"error": str(e)}, status=500)
+
+    async def health_handler(self, request):
+        """Liveness: answered by the event loop; unhealthy (503) when ./data is not writable"""
+        try:
+            file_count = len(list(self.data_dir.glob("*")))
+            writable = os.access(self.data_dir, os.W_OK)
+            return web.json_response({
+                "status": "healthy" if writable else "unhealthy",
+                "service": "Pharmaceutical RAG Upload Service",
+                "pid": os.getpid(),
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "data_directory": str(self.data_dir),
+                "data_directory_writable": writable,
+                "indexed_files": file_count,
+                "upload_endpoint": "/v1/upload",
+                "query_endpoint": "http://<indexer>:8000/v1/pw_ai_answer",
+                "supported_formats": sorted(self.allowed_extensions),
+                "supported_archives": [".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz"],
+                "ingestion_states": await self.ingestion_states()
+            }, status=200 if writable else 503)
+        except Exception as e:
+            return web.json_response({
+                "status": "error",
+                "error": str(e)
+            }, status=500)
+
+    async def metrics_handler(self, request):
+        """Upload, archive and resumable upload metrics of this process"""
+        return web.json_response(metrics_snapshot())
+
+    async def _watchdog_loop(self, interval_s: float) -> None:
+        while True:
+            sd_notify("WATCHDOG=1")  # Stops when the event loop is blocked; systemd then restarts the service
+            await asyncio.sleep(interval_s)
+
+    async def start(self, app: web.Application) -> None:
+        if self.upload_store.cleanup():
+            logger.info("🧹 Removed partial uploads of an interrupted run")
+        if sd_notify("READY=1") and os.environ.get("WATCHDOG_USEC"):
+            self._watchdog = asyncio.create_task(self._watchdog_loop(int(os.environ["WATCHDOG_USEC"]) / 2e6))
+
+    async def stop(self, app: web.Application) -> None:
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+
+    def create_app(self) -> web.Application:
+        """aiohttp application with the upload, health, metrics and status routes"""
+        app = web.Application()
+        app.router.add_post('/v1/upload', self.upload_handler)
+        app.router.add_get('/v1/health', self.health_handler)
+        app.router.add_get('/v1/metrics', self.metrics_handler)
+        ResumableUploadAPI(
+            self.upload_store, on_complete=self.finish_upload,
+            allowed_extensions=self.allowed_extensions | ARCHIVE_EXTENSIONS,
+        ).add_routes(app)
+        if self.ingestion_status is not None:
+            IngestionStatusAPI(self.ingestion_status, follow_interval_s=self.follow_interval_s).add_routes(app)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+    def run(self, host: str = "0.0.0.0", port: int = DEFAULT_PORT) -> None:
+        """Serve until terminated"""
+        logger.info(f"🎯 Upload service starting on http://{host}:{port} (pid {os.getpid()})")
+        logger.info(f"📁 Documents go to {self.data_dir.resolve()}")
+        web.run_app(self.create_app(), host=host, port=port, print=None)
+
+
+class UploadServiceSupervisor:
+    """
+    Runs upload_service.py as a child process and keeps it alive.
+
+    For app_openrouter_upload.py started without a process manager. The child
+    is restarted when it exits or when /v1/health fails ``failure_threshold``
+    times in a row (e.g. a blocked event loop), with exponential backoff
+    between restarts.
+
+    Args:
+        args: Command-line arguments of upload_service.py
+        health_url: Liveness probe; any answer other than 200 counts as a failure
+        check_interval_s: Seconds between probes
+        failure_threshold: Consecutive failed probes before a restart
+        startup_grace_s: Seconds after a start before probes count
+        max_backoff_s: Longest wait before a restart
+        command: Full command instead of upload_service.py (tests, wrappers)
+    """
+
+    def __init__(
+        self,
+        args: Sequence[str] = (),
+        health_url: str = f"http://127.0.0.1:{DEFAULT_PORT}/v1/health",
+        check_interval_s: float = 5.0,
+        failure_threshold: int = 3,
+        startup_grace_s: float = 30.0,
+        max_backoff_s: float = 60.0,
+        command: Optional[List[str]] = None,
+    ):
+        self.command = command or [sys.executable, os.path.abspath(__file__), *args]
+        self.health_url = health_url
+        self.check_interval_s = check_interval_s
+        self.failure_threshold = failure_threshold
+        self.startup_grace_s = startup_grace_s
+        self.max_backoff_s = max_backoff_s
+        self.process: Optional[subprocess.Popen] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._restarts = REGISTRY.counter(
+            "upload_service_restarts_total", "Upload service child restarts by reason (exited, unresponsive)"
+        )
+        self._up = REGISTRY.gauge("upload_service_up", "1 while the upload service answers its health probe")
+
+    def _spawn(self) -> None:
+        self.process = subprocess.Popen(self.command)
+        logger.info(f"🚀 Upload service started (pid {self.process.pid})")
+
+    def _terminate(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def probe(self) -> bool:
+        """One liveness probe of the child's /v1/health."""
+        try:
+            with urllib.request.urlopen(self.health_url, timeout=self.check_interval_s) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stopping.is_set():
+            self._spawn()
+            started = time.monotonic()
+            failures = 0
+            reason = None
+            while reason is None and not self._stopping.wait(self.check_interval_s):
+                if self.process.poll() is not None:
+                    reason = "exited"
+                elif self.probe():
+                    failures = 0
+                    backoff = 1.0
+                    self._up.set(1)
+                elif time.monotonic() - started >= self.startup_grace_s:
+                    failures += 1
+                    if failures >= self.failure_threshold:
+                        reason = "unresponsive"
+            self._up.set(0)
+            self._terminate()
+            if reason is None:
+                return
+            self._restarts.inc(reason=reason)
+            logger.warning(
+                f"⚠️ Upload service {reason} (exit code {self.process.returncode}); restarting in {backoff:.0f}s"
+            )
+            if self._stopping.wait(backoff):
+                return
+            backoff = min(backoff * 2, self.max_backoff_s)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="upload-service-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(30)
+        self._terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pharmaceutical RAG upload service")
+    parser.add_argument("--host", default=os.getenv("UPLOAD_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("UPLOAD_PORT", DEFAULT_PORT)))
+    parser.add_argument("--data-dir", default=os.getenv("UPLOAD_DATA_DIR", "./data"),
+                        help="Directory watched by the indexer")
+    parser.add_argument("--status-db", default=os.getenv("INGESTION_STATUS_DB", "ingestion_status.db"),
+                        help="Ingestion status database shared with the indexer ('' disables the status routes)")
+    parser.add_argument("--follow-interval", type=float, default=1.0,
+                        help="Seconds between polls for pipeline stages recorded by the indexer")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    tracker = IngestionStatusTracker(args.status_db) if args.status_db else None
+    UploadService(args.data_dir, tracker, follow_interval_s=args.follow_interval).run(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
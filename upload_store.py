@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Atomic, Content-Hashed Document Uploads
+
+Uploads used to be streamed in 8 KB chunks straight to ./data/<filename>. The
+Pathway fs watcher could pick up a half-written PDF, parse it, and parse it
+again once complete; re-uploading identical bytes overwrote the file and
+triggered another full parse.
+
+UploadStore writes an upload to a temporary file outside the watched
+directory, hashes it (SHA-256) while streaming, and only then decides:
+
+- the bytes are already in ./data (under any name): the temporary file is
+  dropped and the existing document is returned with ``duplicate: true``
+- otherwise the file is fsynced and atomically renamed into ./data, so the
+  pipeline only ever sees complete files (a new version of an existing name
+  replaces it in one step)
+
+The document id is the SHA-256 of the content, so the same document has the
+same id however often and under whatever name it is uploaded.
+
+Key Features:
+- Temporary file on the same filesystem, atomic rename into the data directory
+- Streaming SHA-256, duplicate detection across file names
+- Safe file names (no directory components) and an upload size limit
+- Upload outcome and byte counters on /v1/metrics
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Dict, Optional, Tuple
+
+import aiofiles
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 16
+
+
+class UploadRejected(ValueError):
+    """The upload has an unusable name or exceeds the size limit."""
+
+
+class UploadTooLarge(UploadRejected):
+    """The upload exceeds ``max_bytes``."""
+
+
+def safe_filename(filename: Optional[str]) -> str:
+    """The file name without directory components (``../../etc/passwd`` -> ``passwd``)."""
+    name = Path((filename or "").replace("\\", "/")).name.strip()
+    if name in ("", ".", ".."):
+        raise UploadRejected("No filename provided")
+    return name
+
+
+def fsync_file(path: str) -> None:
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def part_chunks(part, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Chunks of an aiohttp multipart body part."""
+    while True:
+        chunk = await part.read_chunk(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class UploadStore:
+    """
+    Writes uploads into the watched data directory atomically and without duplicates.
+
+    Args:
+        data_dir: Directory watched by the Pathway pipeline
+        tmp_dir: Directory for partial uploads; must be on the same filesystem
+            and outside ``data_dir`` (default: ``.uploads_tmp`` next to it)
+        max_bytes: Largest accepted upload
+    """
+
+    def __init__(self, data_dir: str = "./data", tmp_dir: Optional[str] = None, max_bytes: int = 200 * 1024 * 1024):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir = Path(tmp_dir) if tmp_dir else self.data_dir.resolve().parent / ".uploads_tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._by_hash: Optional[Dict[str, Path]] = None
+
+        self._uploads = REGISTRY.counter("uploads_total", "Uploads by outcome (stored, replaced, duplicate, rejected)")
+        self._bytes = REGISTRY.counter("upload_bytes_total", "Bytes received by the upload endpoint")
+
+    # ------------------------------------------------------------------
+    # Content index
+    # ------------------------------------------------------------------
+
+    def _index(self) -> Dict[str, Path]:
+        """SHA-256 -> file of the data directory, built on first use."""
+        if self._by_hash is None:
+            by_hash = {}
+            for path in sorted(self.data_dir.iterdir()):
+                if path.is_file():
+                    by_hash.setdefault(sha256_file(str(path)), path)
+            self._by_hash = by_hash
+            logger.info(f"🔑 Indexed {len(by_hash)} documents by content hash")
+        return self._by_hash
+
+    def _existing(self, sha256: str) -> Optional[Path]:
+        path = self._index().get(sha256)
+        if path is None:
+            return None
+        # Files may have been replaced or removed behind the store's back (rsync, manual edits)
+        if path.is_file() and sha256_file(str(path)) == sha256:
+            return path
+        del self._by_hash[sha256]
+        return None
+
+    def _commit(self, tmp_path: str, filename: str, sha256: str, size: int) -> Dict[str, Any]:
+        with self._lock:
+            existing = self._existing(sha256)
+            if existing is not None:
+                os.remove(tmp_path)
+                self._uploads.inc(outcome="duplicate")
+                logger.info(f"♻️ Duplicate upload of {existing.name} as {filename}; not reparsed")
+                return self._result(existing, sha256, size, duplicate=True)
+
+            target = self.data_dir / filename
+            replaced = target.exists()
+            if replaced:
+                self._by_hash = {h: p for h, p in self._index().items() if p != target}
+            os.replace(tmp_path, target)  # Atomic: the watcher never sees a partial file
+            self._index()[sha256] = target
+            self._uploads.inc(outcome="replaced" if replaced else "stored")
+            return self._result(target, sha256, size, replaced=replaced)
+
+    @staticmethod
+    def _result(path: Path, sha256: str, size: int, duplicate: bool = False, replaced: bool = False) -> Dict[str, Any]:
+        return {
+            "document_id": sha256,
+            "filename": path.name,
+            "path": str(path),
+            "size": size,
+            "sha256": sha256,
+            "duplicate": duplicate,
+            "replaced": replaced,
+        }
+
+    # ------------------------------------------------------------------
+    # Uploads
+    # ------------------------------------------------------------------
+
+    def _temp_path(self) -> str:
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, prefix="upload-", suffix=".part")
+        os.close(fd)
+        return tmp_path
+
+    def _too_large(self) -> UploadTooLarge:
+        self._uploads.inc(outcome="rejected")
+        return UploadTooLarge(f"File exceeds the upload limit of {self.max_bytes} bytes")
+
+    async def receive(self, chunks: AsyncIterator[bytes]) -> Tuple[str, str, int]:
+        """
+        Stream an upload into a temporary file, hashing it on the way.
+
+        Returns:
+            (tmp_path, sha256, size); hand the file to ``adopt``/``commit`` or ``discard`` it
+
+        Raises:
+            UploadTooLarge: More than ``max_bytes``
+        """
+        tmp_path = self._temp_path()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise self._too_large()
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+        self._bytes.inc(size)
+        return tmp_path, digest.hexdigest(), size
+
+    def spool(self, fileobj: BinaryIO) -> Tuple[str, str, int]:
+        """Blocking counterpart of ``receive`` for file objects such as archive members."""
+        tmp_path = self._temp_path()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for block in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                    size += len(block)
+                    if size > self.max_bytes:
+                        raise self._too_large()
+                    digest.update(block)
+                    f.write(block)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def commit(self, tmp_path: str, filename: str, sha256: str, size: int) -> Dict[str, Any]:
+        """
+        Move a complete temporary file into the data directory (blocking).
+
+        ``tmp_path`` must be on the filesystem of the data directory; it is
+        consumed either way.
+
+        Returns:
+            {"document_id", "filename", "path", "size", "sha256", "duplicate", "replaced"};
+            for duplicates ``filename`` and ``path`` are those of the existing document
+        """
+        try:
+            name = safe_filename(filename)
+            fsync_file(tmp_path)  # Cheap if the caller synced it already
+        except BaseException as e:
+            if isinstance(e, UploadRejected):
+                self._uploads.inc(outcome="rejected")
+            self.discard(tmp_path)
+            raise
+        return self._commit(tmp_path, name, sha256, size)
+
+    async def adopt(self, tmp_path: str, filename: str, sha256: str, size: int) -> Dict[str, Any]:
+        """``commit`` from the event loop, e.g. for a completed resumable upload."""
+        return await asyncio.to_thread(self.commit, tmp_path, filename, sha256, size)
+
+    async def save(self, filename: Optional[str], chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Store one uploaded file.
+
+        Args:
+            filename: Client-provided name; directory components are dropped
+            chunks: File content, e.g. ``part_chunks(part)``
+
+        Returns:
+            The ``commit`` result
+
+        Raises:
+            UploadRejected: Missing name or more than ``max_bytes``
+        """
+        try:
+            name = safe_filename(filename)
+        except UploadRejected:
+            self._uploads.inc(outcome="rejected")
+            raise
+        tmp_path, sha256, size = await self.receive(chunks)
+        return await self.adopt(tmp_path, name, sha256, size)
+
+    @staticmethod
+    def discard(tmp_path: str) -> None:
+        """Delete a temporary file that will not be committed."""
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self) -> int:
+        """Delete partial uploads left by a crash; returns their number."""
+        removed = 0
+        for path in self.tmp_dir.glob("upload-*.part"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Vector Compression for the Pharmaceutical Document Index
+
+With 384-dim float32 MiniLM vectors every chunk costs 1.5 KB of index memory.
+This module provides the compression options evaluated by compression_report.py
+and the PCA-reduced retriever factory used for serving.
+
+Key Features:
+- VectorCompressor: fp16, int8 (per-vector scale) and PCA codecs with
+  fit / encode / decode and bytes-per-vector accounting
+- PCAReducedEmbedder: wraps any embedder and projects its vectors onto a PCA
+  basis fitted on the corpus
+- CompressedUsearchKnnFactory: UsearchKnnFactory with a ``compression`` option
+- FullPrecisionRescorer: optional rerank stage that rescores the final
+  candidates with full-precision embeddings
+
+Pathway's USearch and brute-force indexes are native and keep float vectors,
+so only PCA reduction changes what the live index stores. fp16 and int8 are
+available to the report (and to any side store of full vectors) but not to
+the retriever factory.
+"""
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pathway as pw
+from pathway.stdlib.indexing import UsearchKnnFactory
+from pathway.xpacks.llm.embedders import BaseEmbedder
+
+from query_cache import QueryEmbeddingCache
+from reranker import _as_doc, chunk_id
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_METHODS = ("none", "fp16", "int8", "pca")
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12, None)
+    return vectors / norms
+
+
+class VectorCompressor:
+    """
+    Lossy codec for embedding vectors.
+
+    Args:
+        method: "none", "fp16", "int8" or "pca"
+        dimensions: Target dimension for "pca"
+
+    Methods:
+        fit(vectors): learn the PCA basis (no-op for the scalar codecs)
+        encode(vectors): compressed representation
+        decode(codes): float32 vectors usable for cosine search
+        bytes_per_vector(dim): storage cost of one encoded vector
+    """
+
+    def __init__(self, method: str = "none", dimensions: Optional[int] = None):
+        if method not in COMPRESSION_METHODS:
+            raise ValueError(f"Unknown compression method {method!r}, expected one of {COMPRESSION_METHODS}")
+        if method == "pca" and not dimensions:
+            raise ValueError("PCA compression requires `dimensions`")
+        self.method = method
+        self.dimensions = dimensions
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.method != "pca" or self.components is not None
+
+    def fit(self, vectors: np.ndarray) -> "VectorCompressor":
+        if self.method != "pca":
+            return self
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[0] < self.dimensions:
+            raise ValueError(
+                f"Need at least {self.dimensions} vectors to fit a {self.dimensions}-dim PCA, got {vectors.shape[0]}"
+            )
+        self.mean = vectors.mean(axis=0)
+        # Rows of vt are the principal axes, sorted by explained variance
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = vt[: self.dimensions].astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "fp16":
+            return vectors.astype(np.float16)
+        if self.method == "int8":
+            scale = np.clip(np.abs(vectors).max(axis=-1, keepdims=True), 1e-12, None) / 127.0
+            return np.round(vectors / scale).astype(np.int8), scale.astype(np.float32)
+        if self.method == "pca":
+            if self.components is None:
+                raise RuntimeError("PCA compressor used before fit()")
+            return ((vectors - self.mean) @ self.components.T).astype(np.float32)
+        return vectors
+
+    def decode(self, codes) -> np.ndarray:
+        if self.method == "int8":
+            values, scale = codes
+            return values.astype(np.float32) * scale
+        return np.asarray(codes, dtype=np.float32)
+
+    def bytes_per_vector(self, dim: int) -> int:
+        if self.method == "fp16":
+            return dim * 2
+        if self.method == "int8":
+            return dim + 4  # int8 values + float32 scale
+        if self.method == "pca":
+            return self.dimensions * 4
+        return dim * 4
+
+    def save(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components)
+
+    def load(self, path: str) -> "VectorCompressor":
+        data = np.load(path)
+        if data["components"].shape[0] != self.dimensions:
+            raise ValueError(f"{path} holds a {data['components'].shape[0]}-dim PCA, expected {self.dimensions}")
+        self.mean = data["mean"].astype(np.float32)
+        self.components = data["components"].astype(np.float32)
+        return self
+
+
+class PCAReducedEmbedder(BaseEmbedder):
+    """
+    Embedder that projects the vectors of another (synchronous) embedder onto a
+    fitted PCA basis. Used for both documents and queries so both live in the
+    reduced space.
+
+    Args:
+        embedder: Full-precision embedder, e.g. BatchedSentenceTransformerEmbedder
+        compressor: Fitted "pca" VectorCompressor
+    """
+
+    def __init__(self, embedder: pw.UDF, compressor: VectorCompressor):
+        if compressor.method != "pca" or not compressor.is_fitted:
+            raise ValueError("PCAReducedEmbedder needs a fitted PCA compressor")
+        super().__init__(max_batch_size=embedder.max_batch_size)
+        self.embedder = embedder
+        self.compressor = compressor
+
+    def __wrapped__(self, input: list[str], **kwargs) -> list[np.ndarray]:
+        single = isinstance(input, str)
+        texts = [input] if single else list(input)
+        vectors = np.asarray(self.embedder.__wrapped__(texts, **kwargs), dtype=np.float32)
+        reduced = list(self.compressor.encode(vectors))
+        return reduced[0] if single else reduced
+
+
+def fit_pca(embedder: pw.UDF, dimensions: int, data_dir: str = "./data", max_chunks: int = 5000) -> VectorCompressor:
+    """Fit a PCA compressor on embeddings of the corpus chunks in ``data_dir``."""
+    from benchmark_embedders import load_corpus_chunks
+
+    chunks = load_corpus_chunks(data_dir)[:max_chunks]
+    logger.info(f"📐 Fitting {dimensions}-dim PCA on {len(chunks)} chunks from {data_dir}")
+    vectors = []
+    batch_size = 256
+    for start in range(0, len(chunks), batch_size):
+        vectors.extend(embedder.__wrapped__(chunks[start:start + batch_size]))
+    return VectorCompressor("pca", dimensions).fit(np.asarray(vectors, dtype=np.float32))
+
+
+@dataclass(kw_only=True)
+class CompressedUsearchKnnFactory(UsearchKnnFactory):
+    """
+    UsearchKnnFactory that can PCA-reduce the stored vectors.
+
+    Args:
+        compression: "none" or "pca" (fp16/int8 are not supported by the native index)
+        pca_dimensions: Target dimension of the PCA projection
+        pca_path: Fitted basis; fitted on ``pca_fit_data_dir`` and saved here if missing
+        pca_fit_data_dir: Corpus used to fit the basis
+        pca_fit_max_chunks: Maximum chunks embedded for fitting
+    """
+
+    compression: str = "none"
+    pca_dimensions: int = 128
+    pca_path: str = "models/pca/pca_128.npz"
+    pca_fit_data_dir: str = "./data"
+    pca_fit_max_chunks: int = 5000
+
+    def __post_init__(self):
+        if self.compression in ("fp16", "int8"):
+            raise ValueError(
+                f"compression={self.compression!r} cannot be applied to the native USearch index; "
+                "use 'pca' or evaluate scalar quantization with compression_report.py"
+            )
+        if self.compression not in ("none", "pca"):
+            raise ValueError(f"Unknown compression {self.compression!r}")
+
+        if self.compression == "pca":
+            if self.embedder is None:
+                raise ValueError("PCA compression requires an embedder")
+            compressor = VectorCompressor("pca", self.pca_dimensions)
+            if Path(self.pca_path).exists():
+                compressor.load(self.pca_path)
+                logger.info(f"📐 Loaded PCA basis {self.pca_path}")
+            else:
+                compressor = fit_pca(
+                    self.embedder, self.pca_dimensions, self.pca_fit_data_dir, self.pca_fit_max_chunks
+                )
+                compressor.save(self.pca_path)
+                logger.info(f"💾 Saved PCA basis to {self.pca_path}")
+            self.embedder = PCAReducedEmbedder(self.embedder, compressor)
+            self.dimensions = None
+
+        super().__post_init__()
+
+
+class FullPrecisionRescorer(pw.UDF):
+    """
+    Rescores the final candidates with full-precision cosine similarity.
+
+    Plugs into PharmaRAGQuestionAnswerer as ``reranker`` when the index stores
+    PCA-reduced vectors: the reduced index selects ``search_topk`` candidates and
+    this stage reorders them with the original embedder. Candidate vectors are
+    kept in a bounded LRU keyed by chunk id.
+
+    Args:
+        embedder: Full-precision (synchronous) embedder
+        cache_size: Cached candidate vectors
+    """
+
+    def __init__(self, embedder: pw.UDF, *, cache_size: int = 20000):
+        super().__init__(max_batch_size=1024)
+        self.embedder = embedder
+        self.cache = QueryEmbeddingCache(cache_size, name="rescore_docs")
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return _unit(np.asarray(self.embedder.__wrapped__(texts), dtype=np.float32))
+
+    def _doc_vectors(self, docs: List[dict]) -> np.ndarray:
+        keys = [chunk_id(doc) for doc in docs]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self._embed([docs[i].get("text", "") for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+                self.cache.put(keys[i], vector)
+        return np.stack(vectors)
+
+    def __wrapped__(self, docs: list, queries: list[str], **kwargs) -> list[float]:
+        docs = [_as_doc(doc) for doc in docs]
+        unique_queries = list(dict.fromkeys(queries))
+        query_vectors = dict(zip(unique_queries, self._embed(unique_queries)))
+        doc_vectors = self._doc_vectors(docs)
+        return [float(doc_vectors[i] @ query_vectors[query]) for i, query in enumerate(queries)]
+
+    def __call__(self, doc: pw.ColumnExpression, query: pw.ColumnExpression, **kwargs) -> pw.ColumnExpression:
+        return super().__call__(doc, query, **kwargs)